@@ -92,6 +92,16 @@ def sample(
     return idx_next, probs
 
 
+def stack_cache(cache):
+    """每层 [head, N, head_dim] 的KV缓存拼成 [N_layer, N, 1, 512]"""
+    return torch.stack([item.transpose(0, 1).reshape(-1, 1, item.shape[0] * item.shape[2]) for item in cache])
+
+
+def unstack_cache(cache, num_heads):
+    """stack_cache 的逆过程"""
+    return [item.view(item.shape[0], num_heads, -1).transpose(0, 1) for item in cache.unbind(0)]
+
+
 class OnnxEncoder(nn.Module):
     def __init__(self, ar_text_embedding, bert_proj, ar_text_position):
         super().__init__()
@@ -130,6 +140,20 @@ class T2SFirstStageDecoder(nn.Module):
         self.num_layers = num_layers
 
     def forward(self, x, prompt):
+        y = prompt
+        logits, k, v, y_emb, x_example = self.decode(x, prompt)
+        k, v = stack_cache(k), stack_cache(v)
+        samples = sample(logits[0], y, top_k=self.top_k, top_p=1.0, repetition_penalty=1.35)[0].unsqueeze(0)
+
+        y = torch.concat([y, samples], dim=1)
+
+        return y, k, v, y_emb, x_example
+
+    def decode(self, x, prompt):
+        """
+        不含采样的部分, 返回 logits, k, v, y_emb, x_example, 其中 k, v 为每层一项 [head, N, head_dim] 的列表;
+        采样由调用方按请求参数进行
+        """
         y = prompt
         x_example = x[:, :, 0] * 0.0
         # N, 1, 512
@@ -166,24 +190,13 @@ class T2SFirstStageDecoder(nn.Module):
         x_attn_mask_pad = torch.cat([x_attn_mask, torch.ones_like(x_y_pad)], dim=1)
         y_attn_mask = torch.cat([y_x_pad, y_attn_mask], dim=1)
         xy_attn_mask = torch.concat([x_attn_mask_pad, y_attn_mask], dim=0)
-        cache["k"] = (
-            torch.matmul(x_attn_mask_pad[0].float().unsqueeze(-1), torch.zeros((1, 512)))
-            .unsqueeze(1)
-            .repeat(self.num_layers, 1, 1, 1)
-        )
-        cache["v"] = (
-            torch.matmul(x_attn_mask_pad[0].float().unsqueeze(-1), torch.zeros((1, 512)))
-            .unsqueeze(1)
-            .repeat(self.num_layers, 1, 1, 1)
-        )
+        # 每层的KV缓存分别保存, 写入同一个张量时每层都会导出为整个缓存的ScatterND
+        cache["k"] = [None] * self.num_layers
+        cache["v"] = [None] * self.num_layers
 
         xy_dec = self.h(xy_pos, mask=xy_attn_mask, cache=cache)
         logits = self.ar_predict_layer(xy_dec[:, -1])
-        samples = sample(logits[0], y, top_k=self.top_k, top_p=1.0, repetition_penalty=1.35)[0].unsqueeze(0)
-
-        y = torch.concat([y, samples], dim=1)
-
-        return y, cache["k"], cache["v"], cache["y_emb"], x_example
+        return logits, cache["k"], cache["v"], cache["y_emb"], x_example
 
 
 class T2SStageDecoder(nn.Module):
@@ -211,10 +224,22 @@ class T2SStageDecoder(nn.Module):
         self.num_layers = num_layers
 
     def forward(self, y, k, v, y_emb, x_example):
+        # k, v: [N_layer, N, 1, 512]
+        num_heads = self.h.layers[0].self_attn.num_heads
+        logits, k, v, y_emb = self.decode(y, unstack_cache(k, num_heads), unstack_cache(v, num_heads), y_emb, x_example)
+        k, v = stack_cache(k), stack_cache(v)
+        samples = sample(logits[0], y, top_k=self.top_k, top_p=1.0, repetition_penalty=1.35)[0].unsqueeze(0)
+
+        y = torch.concat([y, samples], dim=1)
+
+        return y, k, v, y_emb, logits, samples
+
+    def decode(self, y, k, v, y_emb, x_example):
+        """不含采样的部分, y 只用到最后一个token, k, v 为每层一项 [head, N, head_dim] 的列表; 返回 logits, k, v, y_emb"""
         cache = {
             "all_stage": self.num_layers,
-            "k": torch.nn.functional.pad(k, (0, 0, 0, 0, 0, 1)),
-            "v": torch.nn.functional.pad(v, (0, 0, 0, 0, 0, 1)),
+            "k": list(k),
+            "v": list(v),
             "y_emb": y_emb,
             "first_infer": 0,
             "stage": 0,
@@ -239,11 +264,7 @@ class T2SStageDecoder(nn.Module):
 
         xy_dec = self.h(xy_pos, mask=xy_attn_mask, cache=cache)
         logits = self.ar_predict_layer(xy_dec[:, -1])
-        samples = sample(logits[0], y, top_k=self.top_k, top_p=1.0, repetition_penalty=1.35)[0].unsqueeze(0)
-
-        y = torch.concat([y, samples], dim=1)
-
-        return y, cache["k"], cache["v"], cache["y_emb"], logits, samples
+        return logits, cache["k"], cache["v"], cache["y_emb"]
 
 
 class Text2SemanticDecoder(nn.Module):
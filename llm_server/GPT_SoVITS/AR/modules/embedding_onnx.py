@@ -50,7 +50,8 @@ class SinePositionalEmbedding(nn.Module):
         self.div_term = torch.exp(torch.arange(0, self.embedding_dim, 2) * -(math.log(10000.0) / self.embedding_dim))
 
     def extend_pe(self, x):
-        position = torch.cumsum(torch.ones_like(x[:, :, 0]), dim=1).transpose(0, 1)
+        # 位置从0开始, 与训练及PyTorch推理使用的 embedding.SinePositionalEmbedding 一致
+        position = (torch.cumsum(torch.ones_like(x[:, :, 0]), dim=1) - 1).transpose(0, 1)
         scpe = (position * self.div_term).unsqueeze(0)
         pe = torch.cat([torch.sin(scpe), torch.cos(scpe)]).permute(1, 2, 0)
         pe = pe.contiguous().view(1, -1, self.embedding_dim)
@@ -1,3 +1,6 @@
+from typing import Optional, Tuple
+
+from torch import Tensor
 from torch.nn.functional import *
 from torch.nn.functional import (
     _canonical_mask,
@@ -48,14 +51,19 @@ def multi_head_attention_forward_patched(
     proj_qkv = proj_qkv.unflatten(-1, (3, query.size(-1))).unsqueeze(0).transpose(0, -2).squeeze(-2).contiguous()
     q, k, v = proj_qkv[0], proj_qkv[1], proj_qkv[2]
 
+    q = q.view(-1, num_heads, head_dim).transpose(0, 1)
+    k = k.view(-1, num_heads, head_dim).transpose(0, 1)
+    v = v.view(-1, num_heads, head_dim).transpose(0, 1)
+
+    # 缓存按 [head, N, head_dim] 保存, 每步只需转置新token的k, v
     if cache["first_infer"] == 1:
         cache["k"][cache["stage"]] = k
         cache["v"][cache["stage"]] = v
     else:
-        cache["k"][cache["stage"]] = torch.cat([cache["k"][cache["stage"]][:-1], k], 0)
-        cache["v"][cache["stage"]] = torch.cat([cache["v"][cache["stage"]][:-1], v], 0)
-        k = cache["k"][cache["stage"]]
-        v = cache["v"][cache["stage"]]
+        k = torch.cat([cache["k"][cache["stage"]], k], 1)
+        v = torch.cat([cache["v"][cache["stage"]], v], 1)
+        cache["k"][cache["stage"]] = k
+        cache["v"][cache["stage"]] = v
     cache["stage"] = (cache["stage"] + 1) % cache["all_stage"]
 
     attn_mask = _canonical_mask(
@@ -68,10 +76,6 @@ def multi_head_attention_forward_patched(
     )
     attn_mask = attn_mask.unsqueeze(0)
 
-    q = q.view(-1, num_heads, head_dim).transpose(0, 1)
-    k = k.view(-1, num_heads, head_dim).transpose(0, 1)
-    v = v.view(-1, num_heads, head_dim).transpose(0, 1)
-
     dropout_p = 0.0
     attn_mask = attn_mask.unsqueeze(0)
     q = q.view(num_heads, -1, head_dim).unsqueeze(0)
@@ -1,8 +1,10 @@
 import gc
+import logging
 import math
 import os
 import random
 import sys
+import threading
 import time
 import traceback
 from copy import deepcopy
@@ -15,7 +17,6 @@ sys.path.append(now_dir)
 import os
 from typing import List, Tuple, Union
 
-import ffmpeg
 import librosa
 import numpy as np
 import torch
@@ -25,7 +26,7 @@ from AR.models.t2s_lightning_module import Text2SemanticLightningModule
 from BigVGAN.bigvgan import BigVGAN
 from feature_extractor.cnhubert import CNHubert
 from module.mel_processing import mel_spectrogram_torch, spectrogram_torch
-from module.models import SynthesizerTrn, SynthesizerTrnV3, Generator
+from module.models import SynthesizerTrn, SynthesizerTrnV3, Generator, scale_segment_lengths
 from peft import LoraConfig, get_peft_model
 from process_ckpt import get_sovits_version_from_path_fast, load_sovits_new
 from transformers import AutoModelForMaskedLM, AutoTokenizer
@@ -34,8 +35,14 @@ from tools.audio_sr import AP_BWE
 from tools.i18n.i18n import I18nAuto, scan_language_list
 from TTS_infer_pack.text_segmentation_method import splits
 from TTS_infer_pack.TextPreprocessor import TextPreprocessor
+from TTS_infer_pack.time_stretch import time_stretch
+from tools.inference_metrics import RequestTimings
+from tools.prefetch import cuda_side_stream, prefetch
+from tools.profiler_capture import profile_range
 from sv import SV
 
+logger = logging.getLogger(__name__)
+
 resample_transform_dict = {}
 
 
@@ -94,24 +101,8 @@ mel_fn_v4 = lambda x: mel_spectrogram_torch(
 
 
 def speed_change(input_audio: np.ndarray, speed: float, sr: int):
-    # 将 NumPy 数组转换为原始 PCM 流
-    raw_audio = input_audio.astype(np.int16).tobytes()
-
-    # 设置 ffmpeg 输入流
-    input_stream = ffmpeg.input("pipe:", format="s16le", acodec="pcm_s16le", ar=str(sr), ac=1)
-
-    # 变速处理
-    output_stream = input_stream.filter("atempo", speed)
-
-    # 输出流到管道
-    out, _ = output_stream.output("pipe:", format="s16le", acodec="pcm_s16le").run(
-        input=raw_audio, capture_stdout=True, capture_stderr=True
-    )
-
-    # 将管道输出解码为 NumPy 数组
-    processed_audio = np.frombuffer(out, np.int16)
-
-    return processed_audio
+    # 进程内WSOLA变速, 保持音高不变
+    return time_stretch(input_audio.astype(np.int16), speed, sr)
 
 
 class DictToAttrRecursive(dict):
@@ -453,6 +444,8 @@ class TTS:
         }
 
         self.stop_flag: bool = False
+        # 供T2S解码循环逐步检查的取消信号
+        self.stop_event: threading.Event = threading.Event()
         self.precision: torch.dtype = torch.float16 if self.configs.is_half else torch.float32
 
     def _init_models(
@@ -979,6 +972,7 @@ class TTS:
         Stop the inference process.
         """
         self.stop_flag = True
+        self.stop_event.set()
 
     @torch.no_grad()
     def run(self, inputs: dict):
@@ -1002,19 +996,24 @@ class TTS:
                     "batch_threshold": 0.75,      # float. threshold for batch splitting.
                     "split_bucket: True,          # bool. whether to split the batch into multiple buckets.
                     "return_fragment": False,     # bool. step by step return the audio fragment.
+                    "frontend_prefetch": 2,       # int. with return_fragment, number of batches the text frontend prepares ahead in a background thread; 0 runs it inline.
+                    "t2s_prefetch": 1,            # int. number of batches T2S decodes ahead in a background thread, overlapping the VITS decode of the previous fragment; 0 runs it inline. Ignored when a seed is set.
                     "speed_factor":1.0,           # float. control the speed of the synthesized audio.
+                    "speed_method": "vits",       # str. "vits": length regulation inside the VITS decoder; "stretch": decode at normal speed and time-stretch the output in-process (WSOLA), keeping bucketing and parallel decoding.
                     "fragment_interval":0.3,      # float. to control the interval of the audio fragment.
                     "seed": -1,                   # int. random seed for reproducibility.
                     "parallel_infer": True,       # bool. whether to use parallel inference.
                     "repetition_penalty": 1.35    # float. repetition penalty for T2S model.
                     "sample_steps": 32,           # int. number of sampling steps for VITS model V3.
                     "super_sampling": False,       # bool. whether to use super-sampling for audio when using VITS model V3.
+                    "timings": None,              # RequestTimings. optional, filled with per-stage timings of this run.
                 }
         returns:
             Tuple[int, np.ndarray]: sampling rate and audio data.
         """
         ########## variables initialization ###########
         self.stop_flag: bool = False
+        self.stop_event.clear()
         text: str = inputs.get("text", "")
         text_lang: str = inputs.get("text_lang", "")
         ref_audio_path: str = inputs.get("ref_audio_path", "")
@@ -1028,8 +1027,12 @@ class TTS:
         batch_size = inputs.get("batch_size", 1)
         batch_threshold = inputs.get("batch_threshold", 0.75)
         speed_factor = inputs.get("speed_factor", 1.0)
+        speed_method = inputs.get("speed_method", "vits")
+        timings = inputs.get("timings", None) or RequestTimings()
         split_bucket = inputs.get("split_bucket", True)
         return_fragment = inputs.get("return_fragment", False)
+        frontend_prefetch = inputs.get("frontend_prefetch", 2)
+        t2s_prefetch = inputs.get("t2s_prefetch", 1)
         fragment_interval = inputs.get("fragment_interval", 0.3)
         seed = inputs.get("seed", -1)
         seed = -1 if seed in ["", None] else seed
@@ -1052,9 +1055,17 @@ class TTS:
                 split_bucket = False
                 print(i18n("分段返回模式不支持分桶处理，已自动关闭分桶处理"))
 
-        if split_bucket and speed_factor == 1.0 and not (self.configs.use_vocoder and parallel_infer):
+        # 时域拉伸模式下模型按正常语速解码, 变速在后处理中完成, 不影响分桶与并行解码
+        stretch_factor = 1.0
+        if speed_factor != 1.0 and speed_method == "stretch":
+            print(i18n("语速通过时域拉伸调节"))
+            stretch_factor = speed_factor
+            speed_factor = 1.0
+
+        # VITS解码按句做长度调节, 语速调节只在V3/4模型下需要关闭分桶
+        if split_bucket and not (self.configs.use_vocoder and (parallel_infer or speed_factor != 1.0)):
             print(i18n("分桶处理模式已开启"))
-        elif speed_factor != 1.0:
+        elif split_bucket and speed_factor != 1.0:
             print(i18n("语速调节不支持分桶处理，已自动关闭分桶处理"))
             split_bucket = False
         elif self.configs.use_vocoder and parallel_infer:
@@ -1093,7 +1104,8 @@ class TTS:
         ):
             if not os.path.exists(ref_audio_path):
                 raise ValueError(f"{ref_audio_path} not exists")
-            self.set_ref_audio(ref_audio_path)
+            with profile_range("reference"):
+                self.set_ref_audio(ref_audio_path)
 
         aux_ref_audio_paths = aux_ref_audio_paths if aux_ref_audio_paths is not None else []
         paths = set(aux_ref_audio_paths) & set(self.prompt_cache["aux_ref_audio_paths"])
@@ -1125,9 +1137,11 @@ class TTS:
 
         ###### text preprocessing ########
         t1 = time.perf_counter()
+        timings.add("reference", t1 - t0)
         data: list = None
         if not return_fragment:
-            data = self.text_preprocessor.preprocess(text, text_lang, text_split_method, self.configs.version)
+            with profile_range("frontend"):
+                data = self.text_preprocessor.preprocess(text, text_lang, text_split_method, self.configs.version)
             if len(data) == 0:
                 yield 16000, np.zeros(int(16000), dtype=np.int16)
                 return
@@ -1143,7 +1157,7 @@ class TTS:
                 precision=self.precision,
             )
         else:
-            print(f"############ {i18n('切分文本')} ############")
+            logger.debug(f"############ {i18n('切分文本')} ############")
             texts = self.text_preprocessor.pre_seg_text(text, text_lang, text_split_method)
             data = []
             for i in range(len(texts)):
@@ -1153,11 +1167,10 @@ class TTS:
 
             def make_batch(batch_texts):
                 batch_data = []
-                print(f"############ {i18n('提取文本Bert特征')} ############")
-                for text in tqdm(batch_texts):
-                    phones, bert_features, norm_text = self.text_preprocessor.segment_and_extract_feature_for_text(
-                        text, text_lang, self.configs.version
-                    )
+                logger.debug(f"############ {i18n('提取文本Bert特征')} ############")
+                for phones, bert_features, norm_text in self.text_preprocessor.segment_and_extract_feature_for_texts(
+                    batch_texts, text_lang, self.configs.version
+                ):
                     if phones is None:
                         continue
                     res = {
@@ -1179,54 +1192,85 @@ class TTS:
                 )
                 return batch[0]
 
+            def make_batches(data):
+                # 在后台线程中执行, run() 的 no_grad 只对推理线程生效
+                with torch.no_grad():
+                    for batch_texts in data:
+                        batch = make_batch(batch_texts)
+                        if batch is not None:
+                            yield batch
+
+            data = prefetch(make_batches(data), frontend_prefetch, self.stop_event, name="frontend-prefetch")
+
         t2 = time.perf_counter()
+        timings.add("frontend", t2 - t1)
         try:
-            print("############ 推理 ############")
+            logger.debug("############ 推理 ############")
             ###### inference ######
             t_34 = 0.0
             t_45 = 0.0
             audio = []
             output_sr = self.configs.sampling_rate if not self.configs.use_vocoder else self.vocoder_configs["sr"]
-            for item in data:
-                t3 = time.perf_counter()
-                if return_fragment:
-                    item = make_batch(item)
-                    if item is None:
-                        continue
-
-                batch_phones: List[torch.LongTensor] = item["phones"]
-                # batch_phones:torch.LongTensor = item["phones"]
-                batch_phones_len: torch.LongTensor = item["phones_len"]
-                all_phoneme_ids: torch.LongTensor = item["all_phones"]
-                all_phoneme_lens: torch.LongTensor = item["all_phones_len"]
-                all_bert_features: torch.LongTensor = item["all_bert_features"]
-                norm_text: str = item["norm_text"]
-                max_len = item["max_len"]
-
-                print(i18n("前端处理后的文本(每句):"), norm_text)
-                if no_prompt_text:
-                    prompt = None
-                else:
-                    prompt = (
-                        self.prompt_cache["prompt_semantic"].expand(len(all_phoneme_ids), -1).to(self.configs.device)
-                    )
+            def predict_semantic(data):
+                # 在后台线程中执行, 与推理线程中上一个batch的VITS/声码器解码重叠
+                nonlocal t_34
+                t_ready = time.perf_counter()
+                for item in data:
+                    t3 = time.perf_counter()
+                    if return_fragment:
+                        # 分段返回模式下文本前端在后台线程中提前处理后面的分段, 只计入等待前端结果的时间
+                        timings.add("frontend", t3 - t_ready)
+
+                    all_phoneme_ids: torch.LongTensor = item["all_phones"]
+                    all_phoneme_lens: torch.LongTensor = item["all_phones_len"]
+                    all_bert_features: torch.LongTensor = item["all_bert_features"]
+                    norm_text: str = item["norm_text"]
+                    max_len = item["max_len"]
+
+                    logger.debug("%s %s", i18n("前端处理后的文本(每句):"), norm_text)
+                    if no_prompt_text:
+                        prompt = None
+                    else:
+                        prompt = (
+                            self.prompt_cache["prompt_semantic"]
+                            .expand(len(all_phoneme_ids), -1)
+                            .to(self.configs.device)
+                        )
 
-                print(f"############ {i18n('预测语义Token')} ############")
-                pred_semantic_list, idx_list = self.t2s_model.model.infer_panel(
-                    all_phoneme_ids,
-                    all_phoneme_lens,
-                    prompt,
-                    all_bert_features,
-                    # prompt_phone_len=ph_offset,
-                    top_k=top_k,
-                    top_p=top_p,
-                    temperature=temperature,
-                    early_stop_num=self.configs.hz * self.configs.max_sec,
-                    max_len=max_len,
-                    repetition_penalty=repetition_penalty,
-                )
+                    logger.debug(f"############ {i18n('预测语义Token')} ############")
+                    with torch.no_grad(), cuda_side_stream(self.configs.device), profile_range("t2s"):
+                        pred_semantic_list, idx_list = self.t2s_model.model.infer_panel(
+                            all_phoneme_ids,
+                            all_phoneme_lens,
+                            prompt,
+                            all_bert_features,
+                            # prompt_phone_len=ph_offset,
+                            top_k=top_k,
+                            top_p=top_p,
+                            temperature=temperature,
+                            early_stop_num=self.configs.hz * self.configs.max_sec,
+                            max_len=max_len,
+                            repetition_penalty=repetition_penalty,
+                            stop_event=self.stop_event,
+                        )
+                    t4 = time.perf_counter()
+                    t_34 += t4 - t3
+                    timings.add("t2s", t4 - t3)
+                    timings.tokens += sum(int(idx) for idx in idx_list)
+                    yield item["phones"], pred_semantic_list, idx_list, t4 - t3
+                    t_ready = time.perf_counter()
+
+            # 固定随机种子时T2S采样与VITS共用全局随机数生成器, 重叠执行后结果不可复现, 此时串行执行
+            semantics = prefetch(
+                predict_semantic(data), t2s_prefetch if seed == -1 else 0, self.stop_event, name="t2s-prefetch"
+            )
+            for batch_phones, pred_semantic_list, idx_list, t_t2s in semantics:
                 t4 = time.perf_counter()
-                t_34 += t4 - t3
+
+                # 已取消时跳过VITS解码, 立即释放资源
+                if self.stop_flag:
+                    yield 16000, np.zeros(int(16000), dtype=np.int16)
+                    return
 
                 refer_audio_spec = []
                 if self.is_v2pro:
@@ -1251,54 +1295,47 @@ class TTS:
                 # batch_audio_fragment = (self.vits_model.batched_decode(
                 #         pred_semantic, pred_semantic_len, batch_phones, batch_phones_len,refer_audio_spec
                 #     ))
-                print(f"############ {i18n('合成音频')} ############")
+                logger.debug(f"############ {i18n('合成音频')} ############")
                 if not self.configs.use_vocoder:
-                    if speed_factor == 1.0:
-                        print(f"{i18n('并行合成中')}...")
-                        # ## vits并行推理 method 2
-                        pred_semantic_list = [item[-idx:] for item, idx in zip(pred_semantic_list, idx_list)]
-                        upsample_rate = math.prod(self.vits_model.upsample_rates)
-                        audio_frag_idx = [
-                            pred_semantic_list[i].shape[0] * 2 * upsample_rate
-                            for i in range(0, len(pred_semantic_list))
-                        ]
-                        audio_frag_end_idx = [sum(audio_frag_idx[: i + 1]) for i in range(0, len(audio_frag_idx))]
-                        all_pred_semantic = (
-                            torch.cat(pred_semantic_list).unsqueeze(0).unsqueeze(0).to(self.configs.device)
-                        )
-                        _batch_phones = torch.cat(batch_phones).unsqueeze(0).to(self.configs.device)
+                    logger.debug(f"{i18n('并行合成中')}...")
+                    # ## vits并行推理 method 2
+                    # 语速不为1时每句单独做长度调节, 仍然一次解码整批
+                    pred_semantic_list = [item[-idx:] for item, idx in zip(pred_semantic_list, idx_list)]
+                    upsample_rate = math.prod(self.vits_model.upsample_rates)
+                    segment_lengths = [item.shape[0] for item in pred_semantic_list]
+                    frame_lengths = scale_segment_lengths(
+                        [length * 2 for length in segment_lengths], [speed_factor] * len(segment_lengths)
+                    )
+                    audio_frag_idx = [length * upsample_rate for length in frame_lengths]
+                    audio_frag_end_idx = [sum(audio_frag_idx[: i + 1]) for i in range(0, len(audio_frag_idx))]
+                    all_pred_semantic = torch.cat(pred_semantic_list).unsqueeze(0).unsqueeze(0).to(self.configs.device)
+                    _batch_phones = torch.cat(batch_phones).unsqueeze(0).to(self.configs.device)
+                    with profile_range("vits"):
                         if self.is_v2pro != True:
                             _batch_audio_fragment = self.vits_model.decode(
-                                all_pred_semantic, _batch_phones, refer_audio_spec, speed=speed_factor
+                                all_pred_semantic,
+                                _batch_phones,
+                                refer_audio_spec,
+                                speed=speed_factor,
+                                segment_lengths=segment_lengths if speed_factor != 1.0 else None,
                             ).detach()[0, 0, :]
                         else:
                             _batch_audio_fragment = self.vits_model.decode(
-                                all_pred_semantic, _batch_phones, refer_audio_spec, speed=speed_factor, sv_emb=sv_emb
+                                all_pred_semantic,
+                                _batch_phones,
+                                refer_audio_spec,
+                                speed=speed_factor,
+                                sv_emb=sv_emb,
+                                segment_lengths=segment_lengths if speed_factor != 1.0 else None,
                             ).detach()[0, 0, :]
-                        audio_frag_end_idx.insert(0, 0)
-                        batch_audio_fragment = [
-                            _batch_audio_fragment[audio_frag_end_idx[i - 1] : audio_frag_end_idx[i]]
-                            for i in range(1, len(audio_frag_end_idx))
-                        ]
-                    else:
-                        # ## vits串行推理
-                        for i, idx in enumerate(tqdm(idx_list)):
-                            phones = batch_phones[i].unsqueeze(0).to(self.configs.device)
-                            _pred_semantic = (
-                                pred_semantic_list[i][-idx:].unsqueeze(0).unsqueeze(0)
-                            )  # .unsqueeze(0)#mq要多unsqueeze一次
-                            if self.is_v2pro != True:
-                                audio_fragment = self.vits_model.decode(
-                                    _pred_semantic, phones, refer_audio_spec, speed=speed_factor
-                                ).detach()[0, 0, :]
-                            else:
-                                audio_fragment = self.vits_model.decode(
-                                    _pred_semantic, phones, refer_audio_spec, speed=speed_factor, sv_emb=sv_emb
-                                ).detach()[0, 0, :]
-                            batch_audio_fragment.append(audio_fragment)  ###试试重建不带上prompt部分
+                    audio_frag_end_idx.insert(0, 0)
+                    batch_audio_fragment = [
+                        _batch_audio_fragment[audio_frag_end_idx[i - 1] : audio_frag_end_idx[i]]
+                        for i in range(1, len(audio_frag_end_idx))
+                    ]
                 else:
                     if parallel_infer:
-                        print(f"{i18n('并行合成中')}...")
+                        logger.debug(f"{i18n('并行合成中')}...")
                         audio_fragments = self.using_vocoder_synthesis_batched_infer(
                             idx_list, pred_semantic_list, batch_phones, speed=speed_factor, sample_steps=sample_steps
                         )
@@ -1316,17 +1353,20 @@ class TTS:
 
                 t5 = time.perf_counter()
                 t_45 += t5 - t4
+                timings.add("vocoder" if self.configs.use_vocoder else "vits", t5 - t4)
                 if return_fragment:
-                    print("%.3f\t%.3f\t%.3f\t%.3f" % (t1 - t0, t2 - t1, t4 - t3, t5 - t4))
-                    yield self.audio_postprocess(
-                        [batch_audio_fragment],
-                        output_sr,
-                        None,
-                        speed_factor,
-                        False,
-                        fragment_interval,
-                        super_sampling if self.configs.use_vocoder and self.configs.version == "v3" else False,
-                    )
+                    logger.debug("%.3f\t%.3f\t%.3f\t%.3f" % (t1 - t0, t2 - t1, t_t2s, t5 - t4))
+                    with timings.measure("postprocess"):
+                        result = self.audio_postprocess(
+                            [batch_audio_fragment],
+                            output_sr,
+                            None,
+                            stretch_factor,
+                            False,
+                            fragment_interval,
+                            super_sampling if self.configs.use_vocoder and self.configs.version == "v3" else False,
+                        )
+                    yield result
                 else:
                     audio.append(batch_audio_fragment)
 
@@ -1335,19 +1375,21 @@ class TTS:
                     return
 
             if not return_fragment:
-                print("%.3f\t%.3f\t%.3f\t%.3f" % (t1 - t0, t2 - t1, t_34, t_45))
+                logger.debug("%.3f\t%.3f\t%.3f\t%.3f" % (t1 - t0, t2 - t1, t_34, t_45))
                 if len(audio) == 0:
                     yield 16000, np.zeros(int(16000), dtype=np.int16)
                     return
-                yield self.audio_postprocess(
-                    audio,
-                    output_sr,
-                    batch_index_list,
-                    speed_factor,
-                    split_bucket,
-                    fragment_interval,
-                    super_sampling if self.configs.use_vocoder and self.configs.version == "v3" else False,
-                )
+                with timings.measure("postprocess"):
+                    result = self.audio_postprocess(
+                        audio,
+                        output_sr,
+                        batch_index_list,
+                        stretch_factor,
+                        split_bucket,
+                        fragment_interval,
+                        super_sampling if self.configs.use_vocoder and self.configs.version == "v3" else False,
+                    )
+                yield result
 
         except Exception as e:
             traceback.print_exc()
@@ -1405,7 +1447,7 @@ class TTS:
         audio = torch.cat(audio, dim=0)
 
         if super_sampling:
-            print(f"############ {i18n('音频超采样')} ############")
+            logger.debug(f"############ {i18n('音频超采样')} ############")
             t1 = time.perf_counter()
             self.init_sr_model()
             if not self.sr_model_not_exist:
@@ -1414,17 +1456,14 @@ class TTS:
                 if max_audio > 1:
                     audio /= max_audio
             t2 = time.perf_counter()
-            print(f"超采样用时：{t2 - t1:.3f}s")
+            logger.debug(f"超采样用时：{t2 - t1:.3f}s")
         else:
             audio = audio.cpu().numpy()
 
-        audio = (audio * 32768).astype(np.int16)
+        if speed_factor != 1.0:
+            audio = time_stretch(audio, speed_factor, int(sr))
 
-        # try:
-        #     if speed_factor != 1.0:
-        #         audio = speed_change(audio, speed=speed_factor, sr=int(sr))
-        # except Exception as e:
-        #     print(f"Failed to change speed of audio: \n{e}")
+        audio = (audio * 32768).astype(np.int16)
 
         return sr, audio
 
@@ -1475,9 +1514,10 @@ class TTS:
             idx += chunk_len
             fea = torch.cat([fea_ref, fea_todo_chunk], 2).transpose(2, 1)
 
-            cfm_res = self.vits_model.cfm.inference(
-                fea, torch.LongTensor([fea.size(1)]).to(fea.device), mel2, sample_steps, inference_cfg_rate=0
-            )
+            with profile_range("cfm"):
+                cfm_res = self.vits_model.cfm.inference(
+                    fea, torch.LongTensor([fea.size(1)]).to(fea.device), mel2, sample_steps, inference_cfg_rate=0
+                )
             cfm_res = cfm_res[:, :, mel2.shape[2] :]
 
             mel2 = cfm_res[:, :, -T_min:]
@@ -1487,7 +1527,7 @@ class TTS:
         cfm_res = torch.cat(cfm_resss, 2)
         cfm_res = denorm_spec(cfm_res)
 
-        with torch.inference_mode():
+        with torch.inference_mode(), profile_range("vocoder"):
             wav_gen = self.vocoder(cfm_res)
             audio = wav_gen[0][0]  # .cpu().detach().numpy()
 
@@ -1574,9 +1614,10 @@ class TTS:
         bs = feat_chunks.shape[0]
         fea_ref = fea_ref.repeat(bs, 1, 1)
         fea = torch.cat([fea_ref, feat_chunks], 2).transpose(2, 1)
-        pred_spec = self.vits_model.cfm.inference(
-            fea, torch.LongTensor([fea.size(1)]).to(fea.device), mel2, sample_steps, inference_cfg_rate=0
-        )
+        with profile_range("cfm"):
+            pred_spec = self.vits_model.cfm.inference(
+                fea, torch.LongTensor([fea.size(1)]).to(fea.device), mel2, sample_steps, inference_cfg_rate=0
+            )
         pred_spec = pred_spec[:, :, -chunk_len:]
         dd = pred_spec.shape[1]
         pred_spec = pred_spec.permute(1, 0, 2).contiguous().view(dd, -1).unsqueeze(0)
@@ -1584,7 +1625,7 @@ class TTS:
 
         pred_spec = denorm_spec(pred_spec)
 
-        with torch.no_grad():
+        with torch.no_grad(), profile_range("vocoder"):
             wav_gen = self.vocoder(pred_spec)
             audio = wav_gen[0][0]  # .cpu().detach().numpy()
 
@@ -1,21 +1,20 @@
+import logging
 import os
 import sys
 import threading
 
-from tqdm import tqdm
-
 now_dir = os.getcwd()
 sys.path.append(now_dir)
 
 import re
 import torch
 from text.LangSegmenter import LangSegmenter
-from text import chinese
 from typing import Dict, List, Tuple
-from text.cleaner import clean_text
+from text.cleaner import clean_text, clean_text_batch
 from text import cleaned_text_to_sequence
 from transformers import AutoModelForMaskedLM, AutoTokenizer
 from TTS_infer_pack.text_segmentation_method import split_big_text, splits, get_method as get_seg_method
+from tools.bert_feature import BertFeatureExtractor
 
 from tools.i18n.i18n import I18nAuto, scan_language_list
 
@@ -23,6 +22,7 @@ language = os.environ.get("language", "Auto")
 language = sys.argv[-1] if sys.argv[-1] in scan_language_list() else language
 i18n = I18nAuto(language=language)
 punctuation = set(["!", "?", "…", ",", ".", "-"])
+logger = logging.getLogger(__name__)
 
 
 def get_first(text: str) -> str:
@@ -50,20 +50,26 @@ def merge_short_text_in_array(texts: str, threshold: int) -> list:
 
 
 class TextPreprocessor:
-    def __init__(self, bert_model: AutoModelForMaskedLM, tokenizer: AutoTokenizer, device: torch.device):
+    def __init__(
+        self,
+        bert_model: AutoModelForMaskedLM,
+        tokenizer: AutoTokenizer,
+        device: torch.device,
+        bert_cache_size: int = 256,
+    ):
         self.bert_model = bert_model
         self.tokenizer = tokenizer
         self.device = device
         self.bert_lock = threading.RLock()
+        self.bert_extractor = BertFeatureExtractor(tokenizer, bert_model, device, bert_cache_size)
 
     def preprocess(self, text: str, lang: str, text_split_method: str, version: str = "v2") -> List[Dict]:
-        print(f"############ {i18n('切分文本')} ############")
+        logger.debug(f"############ {i18n('切分文本')} ############")
         text = self.replace_consecutive_punctuation(text)
         texts = self.pre_seg_text(text, lang, text_split_method)
         result = []
-        print(f"############ {i18n('提取文本Bert特征')} ############")
-        for text in tqdm(texts):
-            phones, bert_features, norm_text = self.segment_and_extract_feature_for_text(text, lang, version)
+        logger.debug(f"############ {i18n('提取文本Bert特征')} ############")
+        for phones, bert_features, norm_text in self.segment_and_extract_feature_for_texts(texts, lang, version):
             if phones is None or norm_text == "":
                 continue
             res = {
@@ -80,8 +86,7 @@ class TextPreprocessor:
             return []
         if text[0] not in splits and len(get_first(text)) < 4:
             text = "。" + text if lang != "en" else "." + text
-        print(i18n("实际输入的目标文本:"))
-        print(text)
+        logger.debug("%s %s", i18n("实际输入的目标文本:"), text)
 
         seg_method = get_seg_method(text_split_method)
         text = seg_method(text)
@@ -110,8 +115,7 @@ class TextPreprocessor:
             else:
                 texts.append(text)
 
-        print(i18n("实际输入的目标文本(切句后):"))
-        print(texts)
+        logger.debug("%s %s", i18n("实际输入的目标文本(切句后):"), texts)
         return texts
 
     def segment_and_extract_feature_for_text(
@@ -119,89 +123,123 @@ class TextPreprocessor:
     ) -> Tuple[list, torch.Tensor, str]:
         return self.get_phones_and_bert(text, language, version)
 
+    def segment_and_extract_feature_for_texts(
+        self, texts: List[str], language: str, version: str = "v1"
+    ) -> List[Tuple[list, torch.Tensor, str]]:
+        return self.get_phones_and_bert_batch(texts, language, version)
+
     def get_phones_and_bert(self, text: str, language: str, version: str, final: bool = False):
+        return self.get_phones_and_bert_batch([text], language, version, final)[0]
+
+    def get_phones_and_bert_batch(self, texts: List[str], language: str, version: str, final: bool = False):
+        """多句一起处理, 所有中文片段的BERT特征一次batch提取"""
         with self.bert_lock:
-            text = re.sub(r' {2,}', ' ', text)
-            textlist = []
-            langlist = []
-            if language == "all_zh":
-                for tmp in LangSegmenter.getTexts(text,"zh"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_yue":
-                for tmp in LangSegmenter.getTexts(text,"zh"):
-                    if tmp["lang"] == "zh":
-                        tmp["lang"] = "yue"
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_ja":
-                for tmp in LangSegmenter.getTexts(text,"ja"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_ko":
-                for tmp in LangSegmenter.getTexts(text,"ko"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "en":
-                langlist.append("en")
-                textlist.append(text)
-            elif language == "auto":
-                for tmp in LangSegmenter.getTexts(text):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "auto_yue":
-                for tmp in LangSegmenter.getTexts(text):
-                    if tmp["lang"] == "zh":
-                        tmp["lang"] = "yue"
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            else:
-                for tmp in LangSegmenter.getTexts(text):
-                    if langlist:
-                        if (tmp["lang"] == "en" and langlist[-1] == "en") or (tmp["lang"] != "en" and langlist[-1] != "en"):
-                            textlist[-1] += tmp["text"]
-                            continue
-                    if tmp["lang"] == "en":
-                        langlist.append(tmp["lang"])
+            segments_list = self.clean_segments_batch(texts, language, version, final)
+            zh_features = iter(
+                self.bert_extractor(
+                    [
+                        (norm_text, word2ph)
+                        for segments in segments_list
+                        for lang, phones, word2ph, norm_text in segments
+                        if lang == "zh"
+                    ]
+                )
+            )
+            result = []
+            for segments in segments_list:
+                bert_list = []
+                for lang, phones, word2ph, norm_text in segments:
+                    if lang == "zh":
+                        bert_list.append(next(zh_features).to(self.device))
                     else:
-                        # 因无法区别中日韩文汉字,以用户输入为准
-                        langlist.append(language)
-                    textlist.append(tmp["text"])
-            # print(textlist)
-            # print(langlist)
-            phones_list = []
-            bert_list = []
-            norm_text_list = []
-            for i in range(len(textlist)):
-                lang = langlist[i]
-                phones, word2ph, norm_text = self.clean_text_inf(textlist[i], lang, version)
-                bert = self.get_bert_inf(phones, word2ph, norm_text, lang)
-                phones_list.append(phones)
-                norm_text_list.append(norm_text)
-                bert_list.append(bert)
-            bert = torch.cat(bert_list, dim=1)
-            phones = sum(phones_list, [])
-            norm_text = "".join(norm_text_list)
-
-            if not final and len(phones) < 6:
-                return self.get_phones_and_bert("." + text, language, version, final=True)
-
-            return phones, bert, norm_text
+                        bert_list.append(torch.zeros((1024, len(phones)), dtype=torch.float32).to(self.device))
+                bert = torch.cat(bert_list, dim=1)
+                phones = sum([segment[1] for segment in segments], [])
+                norm_text = "".join([segment[3] for segment in segments])
+                result.append((phones, bert, norm_text))
+            return result
+
+    def clean_segments(self, text: str, language: str, version: str, final: bool = False):
+        """按语种切分并完成g2p, 返回 [(语种, phones, word2ph, norm_text)]; 音素过少时在开头加标点重新处理"""
+        return self.clean_segments_batch([text], language, version, final)[0]
+
+    def clean_segments_batch(self, texts: List[str], language: str, version: str, final: bool = False):
+        """多句一起切分语种, 所有片段一起完成g2p(中文多音字合并为一次g2pW推理)"""
+        texts = [re.sub(r' {2,}', ' ', text) for text in texts]
+        splits_list = [self.split_languages(text, language) for text in texts]
+        cleaned = iter(
+            clean_text_batch(
+                [
+                    (seg_text, lang.replace("all_", ""))
+                    for textlist, langlist in splits_list
+                    for seg_text, lang in zip(textlist, langlist)
+                ],
+                version,
+            )
+        )
+        segments_list = []
+        for text, (textlist, langlist) in zip(texts, splits_list):
+            segments = []
+            for lang in langlist:
+                lang = lang.replace("all_", "")
+                phones, word2ph, norm_text = next(cleaned)
+                segments.append((lang, cleaned_text_to_sequence(phones, version), word2ph, norm_text))
+            if not final and sum(len(segment[1]) for segment in segments) < 6:
+                segments = self.clean_segments("." + text, language, version, final=True)
+            segments_list.append(segments)
+        return segments_list
+
+    def split_languages(self, text: str, language: str):
+        """按语种切分文本, 返回 (textlist, langlist)"""
+        textlist = []
+        langlist = []
+        if language == "all_zh":
+            for tmp in LangSegmenter.getTexts(text,"zh"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_yue":
+            for tmp in LangSegmenter.getTexts(text,"zh"):
+                if tmp["lang"] == "zh":
+                    tmp["lang"] = "yue"
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_ja":
+            for tmp in LangSegmenter.getTexts(text,"ja"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_ko":
+            for tmp in LangSegmenter.getTexts(text,"ko"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "en":
+            langlist.append("en")
+            textlist.append(text)
+        elif language == "auto":
+            for tmp in LangSegmenter.getTexts(text):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "auto_yue":
+            for tmp in LangSegmenter.getTexts(text):
+                if tmp["lang"] == "zh":
+                    tmp["lang"] = "yue"
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        else:
+            for tmp in LangSegmenter.getTexts(text):
+                if langlist:
+                    if (tmp["lang"] == "en" and langlist[-1] == "en") or (tmp["lang"] != "en" and langlist[-1] != "en"):
+                        textlist[-1] += tmp["text"]
+                        continue
+                if tmp["lang"] == "en":
+                    langlist.append(tmp["lang"])
+                else:
+                    # 因无法区别中日韩文汉字,以用户输入为准
+                    langlist.append(language)
+                textlist.append(tmp["text"])
+        return textlist, langlist
 
     def get_bert_feature(self, text: str, word2ph: list) -> torch.Tensor:
-        with torch.no_grad():
-            inputs = self.tokenizer(text, return_tensors="pt")
-            for i in inputs:
-                inputs[i] = inputs[i].to(self.device)
-            res = self.bert_model(**inputs, output_hidden_states=True)
-            res = torch.cat(res["hidden_states"][-3:-2], -1)[0].cpu()[1:-1]
-        assert len(word2ph) == len(text)
-        phone_level_feature = []
-        for i in range(len(word2ph)):
-            repeat_feature = res[i].repeat(word2ph[i], 1)
-            phone_level_feature.append(repeat_feature)
-        phone_level_feature = torch.cat(phone_level_feature, dim=0)
-        return phone_level_feature.T
+        return self.bert_extractor([(text, word2ph)])[0]
 
     def clean_text_inf(self, text: str, language: str, version: str = "v2"):
         language = language.replace("all_", "")
@@ -0,0 +1,89 @@
+"""
+In-process WSOLA (waveform similarity overlap-add) time stretching.
+
+Changes the speaking rate without changing pitch, without spawning ffmpeg.
+Fragments are stretched independently, so the same function serves both the
+whole-utterance post-process and per-fragment streaming output.
+"""
+
+from typing import List, Union
+
+import numpy as np
+import torch
+
+
+def _wsola(x: np.ndarray, speed: float, frame_length: int, tolerance: int) -> np.ndarray:
+    synthesis_hop = frame_length // 2
+    analysis_hop = synthesis_hop * speed
+    out_length = int(round(len(x) / speed))
+    window = np.hanning(frame_length).astype(np.float32)
+
+    # pad so that every analysis frame (plus search region) stays inside the signal
+    pad = frame_length + tolerance
+    x = np.pad(x, (tolerance, pad + int(np.ceil(analysis_hop)) + synthesis_hop))
+    num_frames = out_length // synthesis_hop + 1
+
+    y = np.zeros(num_frames * synthesis_hop + frame_length, dtype=np.float32)
+    norm = np.zeros_like(y)
+    delta = 0
+    for k in range(num_frames):
+        pos = int(round(k * analysis_hop)) + tolerance + delta
+        y[k * synthesis_hop : k * synthesis_hop + frame_length] += x[pos : pos + frame_length] * window
+        norm[k * synthesis_hop : k * synthesis_hop + frame_length] += window
+
+        # the natural continuation of the frame just written
+        template = x[pos + synthesis_hop : pos + synthesis_hop + frame_length]
+        next_pos = int(round((k + 1) * analysis_hop)) + tolerance
+        region = x[next_pos - tolerance : next_pos + tolerance + frame_length]
+        if len(region) < frame_length or not template.any():
+            delta = 0
+            continue
+        # pick the offset in the search region most similar to the continuation
+        corr = np.correlate(region, template, mode="valid")
+        delta = int(np.argmax(corr)) - tolerance
+
+    norm[norm < 1e-3] = 1.0
+    y = y / norm
+    return y[:out_length]
+
+
+def time_stretch(
+    audio: Union[np.ndarray, torch.Tensor],
+    speed: float,
+    sr: int,
+    frame_ms: float = 30.0,
+    tolerance_ms: float = 10.0,
+) -> Union[np.ndarray, torch.Tensor]:
+    """
+    Time-stretch a mono waveform; speed > 1 is faster (shorter), speed < 1 is slower.
+
+    Accepts float or int16 numpy arrays and torch tensors and returns the same type.
+    """
+    if speed == 1.0 or len(audio) == 0:
+        return audio
+
+    is_tensor = isinstance(audio, torch.Tensor)
+    if is_tensor:
+        device, dtype = audio.device, audio.dtype
+        x = audio.detach().float().cpu().numpy()
+    else:
+        dtype = audio.dtype
+        x = audio.astype(np.float32)
+
+    frame_length = max(64, int(sr * frame_ms / 1000) // 2 * 2)
+    tolerance = max(1, int(sr * tolerance_ms / 1000))
+    y = _wsola(x, speed, frame_length, tolerance)
+
+    if is_tensor:
+        return torch.from_numpy(y).to(device=device, dtype=dtype)
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        y = np.clip(np.round(y), info.min, info.max)
+    return y.astype(dtype)
+
+
+def time_stretch_batch(
+    audios: List[Union[np.ndarray, torch.Tensor]], speed: float, sr: int
+) -> List[Union[np.ndarray, torch.Tensor]]:
+    """Stretch every fragment of a batch with the same speed."""
+    return [time_stretch(audio, speed, sr) for audio in audios]
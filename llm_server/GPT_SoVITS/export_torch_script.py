@@ -3,7 +3,6 @@
 import argparse
 from io import BytesIO
 from typing import Optional
-from my_utils import load_audio
 import torch
 import torchaudio
 
@@ -16,8 +15,6 @@ from feature_extractor import cnhubert
 from AR.models.t2s_lightning_module import Text2SemanticLightningModule
 from module.models_onnx import SynthesizerTrn
 
-from inference_webui import get_phones_and_bert
-
 from sv import SV
 import kaldi as Kaldi
 
@@ -71,7 +68,7 @@ def logits_to_probs(
     previous_tokens: Optional[torch.Tensor] = None,
     temperature: float = 1.0,
     top_k: Optional[int] = None,
-    top_p: Optional[int] = None,
+    top_p: Optional[float] = None,
     repetition_penalty: float = 1.0,
 ):
     # if previous_tokens is not None:
@@ -116,7 +113,7 @@ def sample(
     previous_tokens,
     temperature: float = 1.0,
     top_k: Optional[int] = None,
-    top_p: Optional[int] = None,
+    top_p: Optional[float] = None,
     repetition_penalty: float = 1.35,
 ):
     probs = logits_to_probs(
@@ -524,7 +521,7 @@ class T2SModel(nn.Module):
 
         logits = self.ar_predict_layer(xy_dec[:, -1])
         logits = logits[:, :-1]
-        samples = sample(logits, y, top_k=top_k, top_p=1, repetition_penalty=1.35, temperature=1.0)[0]
+        samples = sample(logits, y, top_k=top_k, top_p=1.0, repetition_penalty=1.35, temperature=1.0)[0]
         y = torch.concat([y, samples], dim=1)
         y_emb = self.ar_audio_embedding(y[:, -1:])
         xy_pos = y_emb * self.ar_audio_position.x_scale + self.ar_audio_position.alpha * self.ar_audio_position.pe[
@@ -542,7 +539,7 @@ class T2SModel(nn.Module):
             if idx < 11:  ###至少预测出10个token不然不给停止（0.4s）
                 logits = logits[:, :-1]
 
-            samples = sample(logits, y, top_k=top_k, top_p=1, repetition_penalty=1.35, temperature=1.0)[0]
+            samples = sample(logits, y, top_k=top_k, top_p=1.0, repetition_penalty=1.35, temperature=1.0)[0]
 
             y = torch.concat([y, samples], dim=1)
 
@@ -567,7 +564,6 @@ class T2SModel(nn.Module):
 
 bert_path = os.environ.get("bert_path", "GPT_SoVITS/pretrained_models/chinese-roberta-wwm-ext-large")
 cnhubert_base_path = "GPT_SoVITS/pretrained_models/chinese-hubert-base"
-cnhubert.cnhubert_base_path = cnhubert_base_path
 
 
 @torch.jit.script
@@ -598,6 +594,7 @@ class MyBertModel(torch.nn.Module):
 class SSLModel(torch.nn.Module):
     def __init__(self):
         super().__init__()
+        cnhubert.cnhubert_base_path = cnhubert_base_path
         self.ssl = cnhubert.get_model().model
 
     def forward(self, ref_audio_16k) -> torch.Tensor:
@@ -654,6 +651,10 @@ def export_bert(output_path):
 
 
 def export(gpt_path, vits_path, ref_audio_path, ref_text, output_path, export_bert_and_ssl=False, device="cpu"):
+    # inference_webui 导入时会加载BERT等模型, 只在导出时导入, 使 api.py 可以复用本文件中的模型结构
+    from inference_webui import get_phones_and_bert
+    from tools.my_utils import load_audio
+
     if not os.path.exists(output_path):
         os.makedirs(output_path)
         print(f"目录已创建: {output_path}")
@@ -737,6 +738,9 @@ def export_prov2(
     device="cpu",
     is_half=True,
 ):
+    from inference_webui import get_phones_and_bert
+    from tools.my_utils import load_audio
+
     if sv_cn_model == None:
         init_sv_cn(device, is_half)
 
@@ -951,6 +955,9 @@ def test():
     parser.add_argument("--ref_text", required=True, help="Path to the reference text file")
     parser.add_argument("--output_path", required=True, help="Path to the output directory")
 
+    from inference_webui import get_phones_and_bert
+    from tools.my_utils import load_audio
+
     args = parser.parse_args()
     gpt_path = args.gpt_model
     vits_path = args.sovits_model
@@ -151,6 +151,11 @@ class DurationPredictor(nn.Module):
         return x * x_mask
 
 
+def scale_segment_lengths(segment_lengths, speeds):
+    """按各段语速计算长度调节后每段的帧数, 与 TextEncoder 中的插值保持一致"""
+    return [length if speed == 1 else int(length / speed) + 1 for length, speed in zip(segment_lengths, speeds)]
+
+
 class TextEncoder(nn.Module):
     def __init__(
         self,
@@ -209,7 +214,7 @@ class TextEncoder(nn.Module):
 
         self.proj = nn.Conv1d(hidden_channels, out_channels * 2, 1)
 
-    def forward(self, y, y_lengths, text, text_lengths, ge, speed=1, test=None):
+    def forward(self, y, y_lengths, text, text_lengths, ge, speed=1, test=None, segment_lengths=None):
         y_mask = torch.unsqueeze(commons.sequence_mask(y_lengths, y.size(2)), 1).to(y.dtype)
 
         y = self.ssl_proj(y * y_mask) * y_mask
@@ -223,7 +228,21 @@ class TextEncoder(nn.Module):
         text = self.encoder_text(text * text_mask, text_mask)
         y = self.mrte(y, y_mask, text, text_mask, ge)
         y = self.encoder2(y * y_mask, y_mask)
-        if speed != 1:
+        if segment_lengths is not None:
+            # 多段拼接解码时每段单独做长度调节, 段与段之间不互相插值
+            speeds = speed if isinstance(speed, (list, tuple)) else [speed] * len(segment_lengths)
+            new_lengths = scale_segment_lengths(segment_lengths, speeds)
+            segments = []
+            start = 0
+            for length, new_length in zip(segment_lengths, new_lengths):
+                segment = y[:, :, start : start + length]
+                if new_length != length:
+                    segment = F.interpolate(segment, size=new_length, mode="linear")
+                segments.append(segment)
+                start += length
+            y = torch.cat(segments, -1)
+            y_mask = F.interpolate(y_mask, size=y.shape[-1], mode="nearest")
+        elif speed != 1:
             y = F.interpolate(y, size=int(y.shape[-1] / speed) + 1, mode="linear")
             y_mask = F.interpolate(y_mask, size=y.shape[-1], mode="nearest")
         stats = self.proj(y) * y_mask
@@ -958,7 +977,12 @@ class SynthesizerTrn(nn.Module):
         return o, y_mask, (z, z_p, m_p, logs_p)
 
     @torch.no_grad()
-    def decode(self, codes, text, refer, noise_scale=0.5, speed=1, sv_emb=None):
+    def decode(self, codes, text, refer, noise_scale=0.5, speed=1, sv_emb=None, segment_lengths=None):
+        """
+        segment_lengths: 多句拼接成一条序列解码时每句的语义token数, 此时 speed 可以是每句的语速列表,
+                         每句的输出帧数见 scale_segment_lengths
+        """
+
         def get_ge(refer, sv_emb):
             ge = None
             if refer is not None:
@@ -987,6 +1011,7 @@ class SynthesizerTrn(nn.Module):
         text_lengths = torch.LongTensor([text.size(-1)]).to(text.device)
 
         quantized = self.quantizer.decode(codes)
+        frame_ratio = 2 if self.semantic_frame_rate == "25hz" else 1
         if self.semantic_frame_rate == "25hz":
             quantized = F.interpolate(quantized, size=int(quantized.shape[-1] * 2), mode="nearest")
         x, m_p, logs_p, y_mask = self.enc_p(
@@ -996,6 +1021,7 @@ class SynthesizerTrn(nn.Module):
             text_lengths,
             self.ge_to512(ge.transpose(2, 1)).transpose(2, 1) if self.is_v2pro else ge,
             speed,
+            segment_lengths=None if segment_lengths is None else [length * frame_ratio for length in segment_lengths],
         )
         z_p = m_p + torch.randn_like(m_p) * torch.exp(logs_p) * noise_scale
 
@@ -1,5 +1,7 @@
 import os
 import re
+import threading
+from functools import lru_cache
 
 import cn2an
 from pypinyin import lazy_pinyin, Style
@@ -31,12 +33,23 @@ if is_g2pw:
     from text.g2pw import G2PWPinyin, correct_pronunciation
 
     parent_directory = os.path.dirname(current_file_path)
-    g2pw = G2PWPinyin(
-        model_dir="GPT_SoVITS/text/G2PWModel",
-        model_source=os.environ.get("bert_path", "GPT_SoVITS/pretrained_models/chinese-roberta-wwm-ext-large"),
-        v_to_u=False,
-        neutral_tone_with_five=True,
-    )
+    g2pw = None
+    g2pw_lock = threading.Lock()
+
+
+def get_g2pw():
+    # 首次推理时再加载g2pW(ONNX会话与分词器), 导入本模块时不做初始化
+    global g2pw
+    if g2pw is None:
+        with g2pw_lock:
+            if g2pw is None:
+                g2pw = G2PWPinyin(
+                    model_dir="GPT_SoVITS/text/G2PWModel",
+                    model_source=os.environ.get("bert_path", "GPT_SoVITS/pretrained_models/chinese-roberta-wwm-ext-large"),
+                    v_to_u=False,
+                    neutral_tone_with_five=True,
+                )
+    return g2pw
 
 rep_map = {
     "：": ",",
@@ -59,24 +72,51 @@ rep_map = {
 tone_modifier = ToneSandhi()
 
 
+# 标点替换与过滤用到的正则只编译一次
+rep_pattern = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
+non_zh_pattern = re.compile(r"[^\u4e00-\u9fa5" + "".join(punctuation) + r"]+")
+non_zh_en_pattern = re.compile(r"[^\u4e00-\u9fa5A-Za-z" + "".join(punctuation) + r"]+")
+consecutive_punctuation_pattern = re.compile(
+    "([{0}])([{0}])+".format("".join(re.escape(p) for p in punctuation))
+)
+
+
 def replace_punctuation(text):
     text = text.replace("嗯", "恩").replace("呣", "母")
-    pattern = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
 
-    replaced_text = pattern.sub(lambda x: rep_map[x.group()], text)
+    replaced_text = rep_pattern.sub(lambda x: rep_map[x.group()], text)
 
-    replaced_text = re.sub(r"[^\u4e00-\u9fa5" + "".join(punctuation) + r"]+", "", replaced_text)
+    replaced_text = non_zh_pattern.sub("", replaced_text)
 
     return replaced_text
 
 
-def g2p(text):
+def split_sentences(text):
     pattern = r"(?<=[{0}])\s*".format("".join(punctuation))
-    sentences = [i for i in re.split(pattern, text) if i.strip() != ""]
+    return [i for i in re.split(pattern, text) if i.strip() != ""]
+
+
+def g2p(text):
+    sentences = split_sentences(text)
     phones, word2ph = _g2p(sentences)
     return phones, word2ph
 
 
+def prepare_g2p(texts):
+    """
+    一次g2pW推理多段规范化后文本中所有句子的多音字, 之后逐段调用 g2p 时直接使用缓存的结果
+    """
+    if not is_g2pw:
+        return
+    get_g2pw().prefetch([re.sub("[a-zA-Z]+", "", seg) for text in texts for seg in split_sentences(text)])
+
+
+@lru_cache(maxsize=4096)
+def _cut(seg):
+    # 词性标注结果按句缓存, 重复出现的句子不再重新分词
+    return tuple((word, pos) for word, pos in psg.lcut(seg))
+
+
 def _get_initials_finals(word):
     initials = []
     finals = []
@@ -184,7 +224,7 @@ def _g2p(segments):
         pinyins = []
         # Replace all English words in the sentence
         seg = re.sub("[a-zA-Z]+", "", seg)
-        seg_cut = psg.lcut(seg)
+        seg_cut = list(_cut(seg))
         seg_cut = tone_modifier.pre_merge_for_modify(seg_cut)
         initials = []
         finals = []
@@ -205,7 +245,7 @@ def _g2p(segments):
             print("pypinyin结果", initials, finals)
         else:
             # g2pw采用整句推理
-            pinyins = g2pw.lazy_pinyin(seg, neutral_tone_with_five=True, style=Style.TONE3)
+            pinyins = get_g2pw().lazy_pinyin(seg, neutral_tone_with_five=True, style=Style.TONE3)
 
             pre_word_length = 0
             for word, pos in seg_cut:
@@ -297,29 +337,26 @@ def _g2p(segments):
 
 def replace_punctuation_with_en(text):
     text = text.replace("嗯", "恩").replace("呣", "母")
-    pattern = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
 
-    replaced_text = pattern.sub(lambda x: rep_map[x.group()], text)
+    replaced_text = rep_pattern.sub(lambda x: rep_map[x.group()], text)
 
-    replaced_text = re.sub(r"[^\u4e00-\u9fa5A-Za-z" + "".join(punctuation) + r"]+", "", replaced_text)
+    replaced_text = non_zh_en_pattern.sub("", replaced_text)
 
     return replaced_text
 
 
 def replace_consecutive_punctuation(text):
-    punctuations = "".join(re.escape(p) for p in punctuation)
-    pattern = f"([{punctuations}])([{punctuations}])+"
-    result = re.sub(pattern, r"\1", text)
+    result = consecutive_punctuation_pattern.sub(r"\1", text)
     return result
 
 
+text_normalizer = TextNormalizer()
+
+
 def text_normalize(text):
     # https://github.com/PaddlePaddle/PaddleSpeech/tree/develop/paddlespeech/t2s/frontend/zh_normalization
-    tx = TextNormalizer()
-    sentences = tx.normalize(text)
-    dest_text = ""
-    for sentence in sentences:
-        dest_text += replace_punctuation(sentence)
+    sentences = text_normalizer.normalize(text)
+    dest_text = "".join(replace_punctuation(sentence) for sentence in sentences)
 
     # 避免重复标点引起的参考泄露
     dest_text = replace_consecutive_punctuation(dest_text)
@@ -1,5 +1,8 @@
 from text import cleaned_text_to_sequence
+import importlib
 import os
+import threading
+from collections import OrderedDict
 # if os.environ.get("version","v1")=="v1":
 #     from text import chinese
 #     from text.symbols import symbols
@@ -17,16 +20,75 @@ special = [
     # ('@', 'zh', "SP4")#不搞鬼畜了，和第二版保持一致吧
 ]
 
+# (text, language, version) -> (phones, word2ph, norm_text), 按最近使用淘汰
+cache_size = int(os.environ.get("clean_text_cache_size", 4096))
+cache = OrderedDict()
+cache_lock = threading.Lock()
+language_modules = {}
+
 
 def clean_text(text, language, version=None):
+    return clean_text_batch([(text, language)], version)[0]
+
+
+def clean_text_batch(items, version=None):
+    """
+    items: [(text, language)], 返回与 items 一一对应的 (phones, word2ph, norm_text)
+    命中缓存的直接返回; 其余的中文文本先统一规范化, 所有句子的多音字合并为一次g2pW推理
+    """
     if version is None:
         version = os.environ.get("version", "v2")
+    keys = [(text, language, version) for text, language in items]
+    results = {}
+    with cache_lock:
+        for key in keys:
+            if key in cache:
+                cache.move_to_end(key)
+                results[key] = cache[key]
+    pending = [key for key in dict.fromkeys(keys) if key not in results]
+
+    norm_texts = {}
+    zh_keys = [key for key in pending if key[1] == "zh" and not any(s in key[0] for s, l, _ in special if l == "zh")]
+    if zh_keys:
+        language_module = get_language_module("zh", version)
+        if hasattr(language_module, "prepare_g2p"):
+            for key in zh_keys:
+                norm_texts[key] = language_module.text_normalize(key[0])
+            language_module.prepare_g2p(list(norm_texts.values()))
+
+    for key in pending:
+        results[key] = _clean_text(key[0], key[1], version, norm_texts.get(key))
+    if pending and cache_size > 0:
+        with cache_lock:
+            for key in pending:
+                cache[key] = results[key]
+            while len(cache) > cache_size:
+                cache.popitem(last=False)
+
+    # 返回副本, 调用方修改结果时不影响缓存
+    return [
+        (list(phones), None if word2ph is None else list(word2ph), norm_text)
+        for phones, word2ph, norm_text in (results[key] for key in keys)
+    ]
+
+
+def get_language_module_map(version):
     if version == "v1":
-        symbols = symbols_v1.symbols
-        language_module_map = {"zh": "chinese", "ja": "japanese", "en": "english"}
-    else:
-        symbols = symbols_v2.symbols
-        language_module_map = {"zh": "chinese2", "ja": "japanese", "en": "english", "ko": "korean", "yue": "cantonese"}
+        return {"zh": "chinese", "ja": "japanese", "en": "english"}
+    return {"zh": "chinese2", "ja": "japanese", "en": "english", "ko": "korean", "yue": "cantonese"}
+
+
+def get_language_module(language, version):
+    # 语种模块在首次使用时导入, 未用到的语种不加载; 之后直接从 language_modules 取
+    module_name = get_language_module_map(version)[language]
+    if module_name not in language_modules:
+        language_modules[module_name] = importlib.import_module("text." + module_name)
+    return language_modules[module_name]
+
+
+def _clean_text(text, language, version, norm_text=None):
+    symbols = symbols_v1.symbols if version == "v1" else symbols_v2.symbols
+    language_module_map = get_language_module_map(version)
 
     if language not in language_module_map:
         language = "en"
@@ -34,11 +96,12 @@ def clean_text(text, language, version=None):
     for special_s, special_l, target_symbol in special:
         if special_s in text and language == special_l:
             return clean_special(text, language, special_s, target_symbol, version)
-    language_module = __import__("text." + language_module_map[language], fromlist=[language_module_map[language]])
-    if hasattr(language_module, "text_normalize"):
-        norm_text = language_module.text_normalize(text)
-    else:
-        norm_text = text
+    language_module = get_language_module(language, version)
+    if norm_text is None:
+        if hasattr(language_module, "text_normalize"):
+            norm_text = language_module.text_normalize(text)
+        else:
+            norm_text = text
     if language == "zh" or language == "yue":  ##########
         phones, word2ph = language_module.g2p(norm_text)
         assert len(phones) == sum(word2ph)
@@ -58,18 +121,13 @@ def clean_text(text, language, version=None):
 def clean_special(text, language, special_s, target_symbol, version=None):
     if version is None:
         version = os.environ.get("version", "v2")
-    if version == "v1":
-        symbols = symbols_v1.symbols
-        language_module_map = {"zh": "chinese", "ja": "japanese", "en": "english"}
-    else:
-        symbols = symbols_v2.symbols
-        language_module_map = {"zh": "chinese2", "ja": "japanese", "en": "english", "ko": "korean", "yue": "cantonese"}
+    symbols = symbols_v1.symbols if version == "v1" else symbols_v2.symbols
 
     """
     特殊静音段sp符号处理
     """
     text = text.replace(special_s, ",")
-    language_module = __import__("text." + language_module_map[language], fromlist=[language_module_map[language]])
+    language_module = get_language_module(language, version)
     norm_text = language_module.text_normalize(text)
     phones = language_module.g2p(norm_text)
     new_ph = []
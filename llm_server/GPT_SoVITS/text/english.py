@@ -1,9 +1,11 @@
 import pickle
 import os
 import re
+import threading
 import wordsegment
 from g2p_en import G2p
 
+from text import mmap_dict
 from text.symbols import punctuation
 
 from text.symbols2 import symbols
@@ -19,7 +21,7 @@ current_file_path = os.path.dirname(__file__)
 CMU_DICT_PATH = os.path.join(current_file_path, "cmudict.rep")
 CMU_DICT_FAST_PATH = os.path.join(current_file_path, "cmudict-fast.rep")
 CMU_DICT_HOT_PATH = os.path.join(current_file_path, "engdict-hot.rep")
-CACHE_PATH = os.path.join(current_file_path, "engdict_cache.pickle")
+CACHE_PATH = os.path.join(current_file_path, "engdict_cache.bin")
 NAMECACHE_PATH = os.path.join(current_file_path, "namedict_cache.pickle")
 
 
@@ -202,18 +204,23 @@ def hot_reload_hot(g2p_dict):
     return g2p_dict
 
 
-def cache_dict(g2p_dict, file_path):
-    with open(file_path, "wb") as pickle_file:
-        pickle.dump(g2p_dict, pickle_file)
+def encode_pron(pron):
+    # 音节之间用 " - " 分隔, 与 cmudict.rep 一致
+    return " - ".join(" ".join(syllable) for syllable in pron)
+
+
+def decode_pron(value):
+    return [syllable.split(" ") if syllable else [] for syllable in value.split(" - ")]
 
 
 def get_dict():
-    if os.path.exists(CACHE_PATH):
-        with open(CACHE_PATH, "rb") as pickle_file:
-            g2p_dict = pickle.load(pickle_file)
-    else:
-        g2p_dict = read_dict_new()
-        cache_dict(g2p_dict, CACHE_PATH)
+    # 词典以mmap方式打开, 查词时才解码对应的一项
+    g2p_dict = mmap_dict.load(
+        CACHE_PATH,
+        [CMU_DICT_PATH, CMU_DICT_FAST_PATH],
+        build=lambda: {word: encode_pron(pron) for word, pron in read_dict_new().items()},
+        decode=decode_pron,
+    )
 
     g2p_dict = hot_reload_hot(g2p_dict)
 
@@ -357,12 +364,23 @@ class en_G2p(G2p):
         return [phone for comp in comps for phone in self.qryword(comp)]
 
 
-_g2p = en_G2p()
+_g2p = None
+_g2p_lock = threading.Lock()
+
+
+def get_g2p():
+    # 首次使用时再加载 g2p_en 模型与词典, 导入本模块时不做初始化
+    global _g2p
+    if _g2p is None:
+        with _g2p_lock:
+            if _g2p is None:
+                _g2p = en_G2p()
+    return _g2p
 
 
 def g2p(text):
     # g2p_en 整段推理，剔除不存在的arpa返回
-    phone_list = _g2p(text)
+    phone_list = get_g2p()(text)
     phones = [ph if ph != "<unk>" else "UNK" for ph in phone_list if ph not in [" ", "<pad>", "UW", "</s>", "<s>"]]
 
     return replace_phs(phones)
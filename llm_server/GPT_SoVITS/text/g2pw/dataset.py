@@ -48,16 +48,20 @@ def prepare_onnx_input(
     phoneme_masks = []
     char_ids = []
     position_ids = []
+    # 同一句中的每个多音字各占一行, 每句只分词一次
+    tokenized = {}
 
     for idx in range(len(texts)):
         text = (truncated_texts if window_size else texts)[idx].lower()
         query_id = (truncated_query_ids if window_size else query_ids)[idx]
 
-        try:
-            tokens, text2token, token2text = tokenize_and_map(tokenizer=tokenizer, text=text)
-        except Exception:
-            print(f'warning: text "{text}" is invalid')
-            return {}
+        if text not in tokenized:
+            try:
+                tokenized[text] = tokenize_and_map(tokenizer=tokenizer, text=text)
+            except Exception:
+                print(f'warning: text "{text}" is invalid')
+                return {}
+        tokens, text2token, token2text = tokenized[text]
 
         text, query_id, tokens, text2token, token2text = _truncate(
             max_len=max_len, text=text, query_id=query_id, tokens=tokens, text2token=text2token, token2text=token2text
@@ -83,6 +87,15 @@ def prepare_onnx_input(
         char_ids.append(char_id)
         position_ids.append(position_id)
 
+    # 多句一起推理时补齐到最长的一句, 补齐部分的 attention_mask 为0
+    length = max(len(input_id) for input_id in input_ids)
+    pad_id = tokenizer.pad_token_id or 0
+    for input_id, token_type_id, attention_mask in zip(input_ids, token_type_ids, attention_masks):
+        padding = length - len(input_id)
+        input_id += [pad_id] * padding
+        token_type_id += [0] * padding
+        attention_mask += [0] * padding
+
     outputs = {
         "input_ids": np.array(input_ids).astype(np.int64),
         "token_type_ids": np.array(token_type_ids).astype(np.int64),
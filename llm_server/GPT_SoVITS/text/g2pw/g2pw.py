@@ -1,6 +1,5 @@
 # This code is modified from https://github.com/mozillazg/pypinyin-g2pW
 
-import pickle
 import os
 
 from pypinyin.constants import RE_HANS
@@ -8,10 +7,11 @@ from pypinyin.core import Pinyin, Style
 from pypinyin.seg.simpleseg import simple_seg
 from pypinyin.converter import UltimateConverter
 from pypinyin.contrib.tone_convert import to_tone
-from .onnx_api import G2PWOnnxConverter
+
+from text import mmap_dict
 
 current_file_path = os.path.dirname(__file__)
-CACHE_PATH = os.path.join(current_file_path, "polyphonic.pickle")
+CACHE_PATH = os.path.join(current_file_path, "polyphonic.bin")
 PP_DICT_PATH = os.path.join(current_file_path, "polyphonic.rep")
 PP_FIX_DICT_PATH = os.path.join(current_file_path, "polyphonic-fix.rep")
 
@@ -27,6 +27,9 @@ class G2PWPinyin(Pinyin):
         tone_sandhi=False,
         **kwargs,
     ):
+        # onnxruntime 与 transformers 在构造时才导入
+        from .onnx_api import G2PWOnnxConverter
+
         self._g2pw = G2PWOnnxConverter(
             model_dir=model_dir,
             style="pinyin",
@@ -43,6 +46,14 @@ class G2PWPinyin(Pinyin):
     def get_seg(self, **kwargs):
         return simple_seg
 
+    def prefetch(self, texts):
+        """
+        一次推理 texts 中所有汉字片段的多音字, 结果进入缓存, 之后逐段调用 lazy_pinyin 时直接命中
+        """
+        hans = [words for text in texts for words in self.seg(text) if RE_HANS.match(words)]
+        if hans:
+            self._g2pw(hans)
+
 
 class Converter(UltimateConverter):
     def __init__(self, g2pw_instance, v_to_u=False, neutral_tone_with_five=False, tone_sandhi=False, **kwargs):
@@ -109,20 +120,14 @@ def _remove_dup_and_empty(lst_list):
     return new_lst_list
 
 
-def cache_dict(polyphonic_dict, file_path):
-    with open(file_path, "wb") as pickle_file:
-        pickle.dump(polyphonic_dict, pickle_file)
-
-
 def get_dict():
-    if os.path.exists(CACHE_PATH):
-        with open(CACHE_PATH, "rb") as pickle_file:
-            polyphonic_dict = pickle.load(pickle_file)
-    else:
-        polyphonic_dict = read_dict()
-        cache_dict(polyphonic_dict, CACHE_PATH)
-
-    return polyphonic_dict
+    # 词典以mmap方式打开, 查词时才解码对应的一项
+    return mmap_dict.load(
+        CACHE_PATH,
+        [PP_DICT_PATH, PP_FIX_DICT_PATH],
+        build=lambda: {word: " ".join(pinyins) for word, pinyins in read_dict().items()},
+        decode=lambda value: value.split(" "),
+    )
 
 
 def read_dict():
@@ -3,8 +3,10 @@
 
 import json
 import os
+import threading
 import warnings
 import zipfile
+from collections import OrderedDict
 from typing import Any, Dict, List, Tuple
 
 import numpy as np
@@ -55,6 +57,19 @@ def predict(session, onnx_input: Dict[str, Any], labels: List[str]) -> Tuple[Lis
     return all_preds, all_confidences
 
 
+def session_threads() -> int:
+    """
+    g2pW推理的线程数, 可通过环境变量 g2pw_threads 指定.
+    CPU上默认最多4个线程: 文本前端在后台线程中与T2S/VITS推理同时进行, 线程过多时会与torch互相抢占CPU
+    """
+    threads = os.environ.get("g2pw_threads")
+    if threads:
+        return int(threads)
+    if torch.cuda.is_available():
+        return 2
+    return max(1, min(4, os.cpu_count() or 1))
+
+
 def download_and_decompress(model_dir: str = "G2PWModel/"):
     if not os.path.exists(model_dir):
         parent_directory = os.path.dirname(model_dir)
@@ -86,13 +101,18 @@ class G2PWOnnxConverter:
         style: str = "bopomofo",
         model_source: str = None,
         enable_non_tradional_chinese: bool = False,
+        cache_size: int = 1024,
+        max_batch_size: int = 32,
     ):
         uncompress_path = download_and_decompress(model_dir)
 
         sess_options = onnxruntime.SessionOptions()
         sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
         sess_options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
-        sess_options.intra_op_num_threads = 2 if torch.cuda.is_available() else 0
+        sess_options.intra_op_num_threads = session_threads()
+        sess_options.inter_op_num_threads = 1
+        # 推理间隙线程不自旋等待, 避免空转占用torch推理所需的CPU
+        sess_options.add_session_config_entry("session.intra_op.allow_spinning", "0")
         if "CUDAExecutionProvider" in onnxruntime.get_available_providers():
             self.session_g2pW = onnxruntime.InferenceSession(
                 os.path.join(uncompress_path, "g2pW.onnx"),
@@ -175,6 +195,12 @@ class G2PWOnnxConverter:
         if self.enable_opencc:
             self.cc = OpenCC("s2tw")
 
+        # 句子 -> 逐字拼音, 按最近使用淘汰; 模板化、重复的文本不再重新推理
+        self.cache_size = cache_size
+        self.max_batch_size = max_batch_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
     def _convert_bopomofo_to_pinyin(self, bopomofo: str) -> str:
         tone = bopomofo[-1]
         assert tone in "12345"
@@ -186,9 +212,35 @@ class G2PWOnnxConverter:
             return None
 
     def __call__(self, sentences: List[str]) -> List[List[str]]:
+        """
+        逐句返回拼音, 未命中缓存的句子合并为一次ONNX推理(每次最多 max_batch_size 句)
+        """
         if isinstance(sentences, str):
             sentences = [sentences]
 
+        with self.lock:
+            results = {sent: self.cache.get(sent) for sent in sentences}
+            for sent, result in results.items():
+                if result is not None:
+                    self.cache.move_to_end(sent)
+        missing = [sent for sent, result in results.items() if result is None]
+        if missing:
+            # 长度相近的句子放在同一次推理中, 减少补齐的计算量
+            missing.sort(key=len)
+            for start in range(0, len(missing), self.max_batch_size):
+                sents = missing[start : start + self.max_batch_size]
+                for sent, result in zip(sents, self._predict(sents)):
+                    results[sent] = result
+            if self.cache_size > 0:
+                with self.lock:
+                    for sent in missing:
+                        self.cache[sent] = results[sent]
+                    while len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+        # 返回副本, 调用方修改结果时不影响缓存
+        return [list(results[sent]) for sent in sentences]
+
+    def _predict(self, sentences: List[str]) -> List[List[str]]:
         if self.enable_opencc:
             translated_sentences = []
             for sent in sentences:
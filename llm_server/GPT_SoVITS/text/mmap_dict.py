@@ -0,0 +1,137 @@
+"""
+内存映射的只读字典
+
+词典按键排序后存为一个文件: 排序的键数组 + 偏移表, 打开时只做mmap, 查找时二分定位, 只解码命中的一项.
+不需要像pickle那样在每个进程启动时反序列化出完整的 dict, 多个worker进程共享同一份页缓存.
+
+文件格式(本机字节序, 仅作本机缓存):
+    magic(8字节) | 条目数 n(uint64) | 键偏移 uint64[n+1] | 值偏移 uint64[n+1] | 键(utf-8, 按字节序排序) | 值(utf-8)
+
+    cmu = load("engdict_cache.bin", ["cmudict.rep"], build=lambda: {...}, decode=lambda v: v.split(" "))
+"""
+
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import MutableMapping
+
+MAGIC = b"GSVDICT1"
+HEADER = struct.Struct("=8sQ")
+
+
+def write(path, items):
+    """items: {键: 值字符串}, 先写入临时文件再替换, 多个进程同时生成时不会读到写了一半的文件"""
+    entries = sorted((key.encode("utf-8"), value.encode("utf-8")) for key, value in items.items())
+    key_offsets = array("Q", [0])
+    value_offsets = array("Q", [0])
+    for key, value in entries:
+        key_offsets.append(key_offsets[-1] + len(key))
+        value_offsets.append(value_offsets[-1] + len(value))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        f.write(key_offsets.tobytes())
+        f.write(value_offsets.tobytes())
+        f.write(b"".join(key for key, _ in entries))
+        f.write(b"".join(value for _, value in entries))
+    os.replace(tmp_path, path)
+
+
+def load(path, sources, build, decode=None):
+    """
+    打开 path; 不存在、格式不符或早于任一源文件时调用 build() 重新生成
+    """
+    if not _is_fresh(path, sources):
+        write(path, build())
+    try:
+        return MmapDict(path, decode)
+    except ValueError:
+        write(path, build())
+        return MmapDict(path, decode)
+
+
+def _is_fresh(path, sources):
+    if not os.path.exists(path):
+        return False
+    mtime = os.path.getmtime(path)
+    return all(not os.path.exists(source) or os.path.getmtime(source) <= mtime for source in sources)
+
+
+class MmapDict(MutableMapping):
+    """
+    键为字符串的只读字典, 值按 decode 转换后返回(每次返回新对象, 调用方可以直接修改).
+    写入与删除(如热词覆盖、剔除错误读音)只记录在内存中, 不修改文件
+    """
+
+    def __init__(self, path, decode=None):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < HEADER.size:
+            raise ValueError(f"{path} 不是有效的词典文件")
+        magic, count = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f"{path} 不是有效的词典文件")
+        view = memoryview(self._mm)
+        start = HEADER.size
+        self._key_offsets = view[start : start + 8 * (count + 1)].cast("Q")
+        start += 8 * (count + 1)
+        self._value_offsets = view[start : start + 8 * (count + 1)].cast("Q")
+        self._keys_start = start + 8 * (count + 1)
+        self._values_start = self._keys_start + self._key_offsets[count]
+        self._count = count
+        self._decode = decode or (lambda value: value)
+        self._overrides = {}
+        self._deleted = set()
+
+    def _key(self, index):
+        return self._mm[self._keys_start + self._key_offsets[index] : self._keys_start + self._key_offsets[index + 1]]
+
+    def _find(self, key):
+        target = key.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._key(mid) < target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._count and self._key(low) == target:
+            return low
+        return -1
+
+    def __getitem__(self, key):
+        if key in self._overrides:
+            return self._overrides[key]
+        if key not in self._deleted:
+            index = self._find(key)
+            if index >= 0:
+                start = self._values_start + self._value_offsets[index]
+                end = self._values_start + self._value_offsets[index + 1]
+                return self._decode(self._mm[start:end].decode("utf-8"))
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._overrides:
+            return True
+        return key not in self._deleted and self._find(key) >= 0
+
+    def __setitem__(self, key, value):
+        self._overrides[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._overrides.pop(key, None)
+        self._deleted.add(key)
+
+    def __iter__(self):
+        for index in range(self._count):
+            key = self._key(index).decode("utf-8")
+            if key not in self._overrides and key not in self._deleted:
+                yield key
+        yield from self._overrides
+
+    def __len__(self):
+        return sum(1 for _ in self)
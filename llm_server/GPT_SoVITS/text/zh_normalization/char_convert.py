@@ -27,8 +27,12 @@ for i, item in enumerate(simplified_charcters):
     t2s_dict[traditional_characters[i]] = item
 
 
+# 逐字替换用 str.translate 查表完成
+t2s_table = str.maketrans(t2s_dict)
+
+
 def tranditional_to_simplified(text: str) -> str:
-    return "".join([t2s_dict[item] if item in t2s_dict else item for item in text])
+    return text.translate(t2s_table)
 
 
 def simplified_to_traditional(text: str) -> str:
@@ -14,6 +14,7 @@
 import re
 from typing import List
 
+from .char_convert import t2s_dict
 from .char_convert import tranditional_to_simplified
 from .chronology import RE_DATE
 from .chronology import RE_DATE2
@@ -48,16 +49,98 @@ from .num import replace_range
 from .num import replace_to_range
 from .num import replace_asmd
 from .num import replace_power
+from .num import power_map
 from .phonecode import RE_MOBILE_PHONE
 from .phonecode import RE_NATIONAL_UNIFORM_NUMBER
 from .phonecode import RE_TELEPHONE
 from .phonecode import replace_mobile
 from .phonecode import replace_phone
 from .quantifier import RE_TEMPERATURE
+from .quantifier import measure_dict
 from .quantifier import replace_measure
 from .quantifier import replace_temperature
 
 
+def _build_pre_translation():
+    # 繁体转简体与全角转半角合并为一次查表; 按原先的逐步转换计算每个字符的结果, 保证输出一致
+    table = {}
+    for char in set(t2s_dict) | {chr(code) for code in (*F2H_ASCII_LETTERS, *F2H_DIGITS)} | set(F2H_SPACE):
+        converted = tranditional_to_simplified(char).translate(F2H_ASCII_LETTERS).translate(F2H_DIGITS).translate(F2H_SPACE)
+        if converted != char:
+            table[ord(char)] = converted
+    return table
+
+
+PRE_TRANSLATION = _build_pre_translation()
+
+# 分句前去掉空格与特殊字符
+SPLIT_TRANSLATION = str.maketrans("", "", " ——《》【】<>{}()（）#&@“”^_|\\")
+
+# 数字、日期、电话、算式、次方、单位等读法替换都至少需要匹配其中一个字符(数字、运算符、上标、单位的首字母),
+# 句子中没有这些字符时各项替换都不会生效, 一次扫描后直接跳过
+RE_NSW_TRIGGER = re.compile(
+    r"[\d" + re.escape("+-×÷=") + "".join(power_map) + "".join(sorted({unit[0] for unit in measure_dict})) + "]"
+)
+
+# _post_replace 的逐字替换, 替换结果都是汉字, 与替换的先后顺序无关
+POST_REPLACE = {
+    "/": "每",
+    "①": "一",
+    "②": "二",
+    "③": "三",
+    "④": "四",
+    "⑤": "五",
+    "⑥": "六",
+    "⑦": "七",
+    "⑧": "八",
+    "⑨": "九",
+    "⑩": "十",
+    "α": "阿尔法",
+    "β": "贝塔",
+    "γ": "伽玛",
+    "Γ": "伽玛",
+    "δ": "德尔塔",
+    "Δ": "德尔塔",
+    "ε": "艾普西龙",
+    "ζ": "捷塔",
+    "η": "依塔",
+    "θ": "西塔",
+    "Θ": "西塔",
+    "ι": "艾欧塔",
+    "κ": "喀帕",
+    "λ": "拉姆达",
+    "Λ": "拉姆达",
+    "μ": "缪",
+    "ν": "拗",
+    "ξ": "克西",
+    "Ξ": "克西",
+    "ο": "欧米克伦",
+    "π": "派",
+    "Π": "派",
+    "ρ": "肉",
+    "ς": "西格玛",
+    "Σ": "西格玛",
+    "σ": "西格玛",
+    "τ": "套",
+    "υ": "宇普西龙",
+    "φ": "服艾",
+    "Φ": "服艾",
+    "χ": "器",
+    "ψ": "普赛",
+    "Ψ": "普赛",
+    "ω": "欧米伽",
+    "Ω": "欧米伽",
+    # 兜底数学运算，顺便兼容懒人用语
+    "+": "加",
+    "-": "减",
+    "×": "乘",
+    "÷": "除",
+    "=": "等",
+}
+# 替换后过滤的特殊字符, 比分句时多一个 "-"(已先替换为"减")
+POST_TRANSLATION = str.maketrans({**dict.fromkeys("-——《》【】<=>{}()（）#&@“”^_|\\"), **POST_REPLACE})
+
+
 class TextNormalizer:
     def __init__(self):
         self.SENTENCE_SPLITOR = re.compile(r"([：、，；。？！,;?!][”’]?)")
@@ -71,78 +154,43 @@ class TextNormalizer:
         """
         # Only for pure Chinese here
         if lang == "zh":
-            text = text.replace(" ", "")
-            # 过滤掉特殊字符
-            text = re.sub(r"[——《》【】<>{}()（）#&@“”^_|\\]", "", text)
+            # 过滤掉空格与特殊字符
+            text = text.translate(SPLIT_TRANSLATION)
         text = self.SENTENCE_SPLITOR.sub(r"\1\n", text)
         text = text.strip()
         sentences = [sentence.strip() for sentence in re.split(r"\n+", text)]
         return sentences
 
     def _post_replace(self, sentence: str) -> str:
-        sentence = sentence.replace("/", "每")
-        # sentence = sentence.replace('~', '至')
-        # sentence = sentence.replace('～', '至')
-        sentence = sentence.replace("①", "一")
-        sentence = sentence.replace("②", "二")
-        sentence = sentence.replace("③", "三")
-        sentence = sentence.replace("④", "四")
-        sentence = sentence.replace("⑤", "五")
-        sentence = sentence.replace("⑥", "六")
-        sentence = sentence.replace("⑦", "七")
-        sentence = sentence.replace("⑧", "八")
-        sentence = sentence.replace("⑨", "九")
-        sentence = sentence.replace("⑩", "十")
-        sentence = sentence.replace("α", "阿尔法")
-        sentence = sentence.replace("β", "贝塔")
-        sentence = sentence.replace("γ", "伽玛").replace("Γ", "伽玛")
-        sentence = sentence.replace("δ", "德尔塔").replace("Δ", "德尔塔")
-        sentence = sentence.replace("ε", "艾普西龙")
-        sentence = sentence.replace("ζ", "捷塔")
-        sentence = sentence.replace("η", "依塔")
-        sentence = sentence.replace("θ", "西塔").replace("Θ", "西塔")
-        sentence = sentence.replace("ι", "艾欧塔")
-        sentence = sentence.replace("κ", "喀帕")
-        sentence = sentence.replace("λ", "拉姆达").replace("Λ", "拉姆达")
-        sentence = sentence.replace("μ", "缪")
-        sentence = sentence.replace("ν", "拗")
-        sentence = sentence.replace("ξ", "克西").replace("Ξ", "克西")
-        sentence = sentence.replace("ο", "欧米克伦")
-        sentence = sentence.replace("π", "派").replace("Π", "派")
-        sentence = sentence.replace("ρ", "肉")
-        sentence = sentence.replace("ς", "西格玛").replace("Σ", "西格玛").replace("σ", "西格玛")
-        sentence = sentence.replace("τ", "套")
-        sentence = sentence.replace("υ", "宇普西龙")
-        sentence = sentence.replace("φ", "服艾").replace("Φ", "服艾")
-        sentence = sentence.replace("χ", "器")
-        sentence = sentence.replace("ψ", "普赛").replace("Ψ", "普赛")
-        sentence = sentence.replace("ω", "欧米伽").replace("Ω", "欧米伽")
-        # 兜底数学运算，顺便兼容懒人用语
-        sentence = sentence.replace("+", "加")
-        sentence = sentence.replace("-", "减")
-        sentence = sentence.replace("×", "乘")
-        sentence = sentence.replace("÷", "除")
-        sentence = sentence.replace("=", "等")
-        # re filter special characters, have one more character "-" than line 68
-        sentence = re.sub(r"[-——《》【】<=>{}()（）#&@“”^_|\\]", "", sentence)
-        return sentence
+        # 逐字替换与特殊字符过滤合并为一次查表
+        return sentence.translate(POST_TRANSLATION)
 
     def normalize_sentence(self, sentence: str) -> str:
         # basic character conversions
-        sentence = tranditional_to_simplified(sentence)
-        sentence = sentence.translate(F2H_ASCII_LETTERS).translate(F2H_DIGITS).translate(F2H_SPACE)
-
+        sentence = sentence.translate(PRE_TRANSLATION)
+        if RE_NSW_TRIGGER.search(sentence):
+            sentence = self._verbalize(sentence)
+        return self._post_replace(sentence)
+
+    def _verbalize(self, sentence: str) -> str:
+        # 各项替换有先后依赖(后面的正则匹配前面替换的结果), 按顺序执行;
+        # 必须包含某个字面字符才能匹配的正则, 在当前句子中没有该字符时跳过
         # number related NSW verbalization
-        sentence = RE_DATE.sub(replace_date, sentence)
-        sentence = RE_DATE2.sub(replace_date2, sentence)
+        if "年" in sentence:
+            sentence = RE_DATE.sub(replace_date, sentence)
+        if "-" in sentence or " " in sentence or "/" in sentence or "." in sentence:
+            sentence = RE_DATE2.sub(replace_date2, sentence)
 
         # range first
-        sentence = RE_TIME_RANGE.sub(replace_time, sentence)
-        sentence = RE_TIME.sub(replace_time, sentence)
+        if ":" in sentence:
+            sentence = RE_TIME_RANGE.sub(replace_time, sentence)
+            sentence = RE_TIME.sub(replace_time, sentence)
 
         # 处理~波浪号作为至的替换
-        sentence = RE_TO_RANGE.sub(replace_to_range, sentence)
-        sentence = RE_TEMPERATURE.sub(replace_temperature, sentence)
+        if "~" in sentence:
+            sentence = RE_TO_RANGE.sub(replace_to_range, sentence)
+        if "度" in sentence or "℃" in sentence or "°" in sentence:
+            sentence = RE_TEMPERATURE.sub(replace_temperature, sentence)
         sentence = replace_measure(sentence)
 
         # 处理数学运算
@@ -150,22 +198,27 @@ class TextNormalizer:
             sentence = RE_ASMD.sub(replace_asmd, sentence)
         sentence = RE_POWER.sub(replace_power, sentence)
 
-        sentence = RE_FRAC.sub(replace_frac, sentence)
-        sentence = RE_PERCENTAGE.sub(replace_percentage, sentence)
+        if "/" in sentence:
+            sentence = RE_FRAC.sub(replace_frac, sentence)
+        if "%" in sentence:
+            sentence = RE_PERCENTAGE.sub(replace_percentage, sentence)
         sentence = RE_MOBILE_PHONE.sub(replace_mobile, sentence)
 
         sentence = RE_TELEPHONE.sub(replace_phone, sentence)
-        sentence = RE_NATIONAL_UNIFORM_NUMBER.sub(replace_phone, sentence)
+        if "400" in sentence:
+            sentence = RE_NATIONAL_UNIFORM_NUMBER.sub(replace_phone, sentence)
 
-        sentence = RE_RANGE.sub(replace_range, sentence)
+        if "-" in sentence or "~" in sentence:
+            sentence = RE_RANGE.sub(replace_range, sentence)
 
-        sentence = RE_INTEGER.sub(replace_negative_num, sentence)
-        sentence = RE_VERSION_NUM.sub(replace_vrsion_num, sentence)
-        sentence = RE_DECIMAL_NUM.sub(replace_number, sentence)
+        if "-" in sentence:
+            sentence = RE_INTEGER.sub(replace_negative_num, sentence)
+        if "." in sentence:
+            sentence = RE_VERSION_NUM.sub(replace_vrsion_num, sentence)
+            sentence = RE_DECIMAL_NUM.sub(replace_number, sentence)
         sentence = RE_POSITIVE_QUANTIFIERS.sub(replace_positive_quantifier, sentence)
         sentence = RE_DEFAULT_NUM.sub(replace_default_num, sentence)
         sentence = RE_NUMBER.sub(replace_number, sentence)
-        sentence = self._post_replace(sentence)
 
         return sentence
 
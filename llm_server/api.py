@@ -22,9 +22,20 @@
 ·-mt` - `返回的音频编码格式, 流式默认ogg, 非流式默认wav, "wav", "ogg", "aac"`
 ·-st` - `返回的音频数据类型, 默认int16, "int16", "int32"`
 ·-cp` - `文本切分符号设定, 默认为空, 以",.，。"字符串的方式传入`
+`-bs` - `一起推理的句子数, 默认4, 1 表示逐句推理; v3/v4 的声码器仍逐句解码`
+`-pf` - `文本前端在后台线程中提前处理的batch数, 默认2, 0 表示与声学模型串行执行`
+`-pt` - `T2S在后台线程中提前解码的batch数, 默认1, 与前一组句子的VITS/声码器解码重叠; 0 表示串行执行`
+`-ib` - `推理后端, 默认"torch"; "onnx" 用 ONNX Runtime 在CPU上运行T2S与VITS(v1/v2/v2Pro), "torchscript" 用冻结的TorchScript图(v3/v4只包含T2S), 均逐句解码; 只用于本接口, api_v3.py(TTS_infer_pack)仍使用PyTorch模型`
+`-oq` - `ONNX后端对T2S做int8动态量化`
+`-od` - `ONNX后端导出模型的缓存目录, 默认"onnx_cache", 模型文件变化后自动重新导出`
+`-td` - `TorchScript后端导出模型的缓存目录, 默认"torchscript_cache", 模型文件变化后自动重新导出`
 
 `-hb` - `cnhubert路径`
 `-b` - `bert路径`
+`-bcs` - `按规范化文本缓存的BERT特征数量, 默认256, 0 表示不缓存`
+
+`-spd` - `已注册说话人的存储目录, 默认"speakers"`
+`-spc` - `常驻内存的说话人特征数量, 默认32`
 
 ## 调用:
 
@@ -119,6 +130,102 @@ RESP:
 失败: json, 400
 
 
+### 注册说话人
+
+endpoint: `/speakers`
+
+参考音频只需上传一次, 服务端预先提取参考音频与参考文本的特征并持久化 (`-spd` 目录下的 speaker.db),
+之后推理请求只需携带 `speaker_id`, 无需与本服务共享文件系统. 相同内容重复注册不会改变版本号
+
+POST (multipart/form-data):
+    `speaker_id=alice&prompt_text=一二三。&prompt_language=zh&file=@123.wav`
+
+RESP:
+成功: json, http code 200
+```json
+{
+    "code": 0,
+    "message": "Success",
+    "speaker_id": "alice",
+    "version": 1,
+    "prompt_text": "一二三。",
+    "prompt_language": "zh"
+}
+```
+失败: json, http code 400
+
+查询: GET `/speakers`, GET `/speakers/alice`
+删除: DELETE `/speakers/alice`
+
+使用已注册的说话人推理:
+POST:
+```json
+{
+    "speaker_id": "alice",
+    "speaker_version": 1,
+    "text": "先帝创业未半而中道崩殂，今天下三分，益州疲弊，此诚危急存亡之秋也。",
+    "text_language": "zh"
+}
+```
+
+RESP:
+说话人未注册: json, http code 404
+`speaker_version` 与当前版本不一致: json, http code 409
+
+
+### 取消推理
+
+endpoint: `/cancel`
+
+推理请求可通过 `request_id` 字段或 `X-Request-ID` 请求头指定请求ID, 之后可用该ID取消仍在进行的推理,
+T2S 解码在下一个解码步停止, 未开始的句子不再合成
+
+GET:
+    `http://127.0.0.1:9880/cancel?request_id=abc123`
+POST:
+```json
+{
+    "request_id": "abc123"
+}
+```
+
+RESP:
+成功: json, http code 200
+请求不存在或已完成: json, http code 404
+
+
+### 推理指标
+
+endpoint: `/metrics`
+
+Prometheus文本格式: 各阶段耗时分布(排队/参考音频/文本前端/T2S/VITS/声码器/打包), 实时率(RTF),
+T2S生成token数, 进行中的请求数, 进程/显存与各模型参数占用
+
+非流式模式的推理响应头中附带本次请求的耗时:
+`X-Request-ID`, `X-Timing-Queue`, `X-Timing-Reference`, `X-Timing-Frontend`, `X-Timing-T2S`, `X-Timing-Vits`,
+`X-Timing-Pack`, `X-Timing-Total`, `X-Timing-Stages-Total`, `X-Audio-Seconds`, `X-RTF`, `X-T2S-Tokens`, `X-T2S-Tokens-Per-Second`
+`X-Timing-Total`与`X-RTF`按墙钟时间计算; 流水线开启时各阶段并行, `X-Timing-Stages-Total`(阶段耗时之和)会大于墙钟时间
+
+流式模式下响应头在推理开始前发出, 结束后按请求ID查询:
+GET:
+    `http://127.0.0.1:9880/metrics/requests/abc123`
+
+RESP:
+成功: json, http code 200
+请求不存在或尚未完成: json, http code 404
+
+
+### 性能采集
+
+推理请求携带 `"profile": true` (GET 为 `profile=true`) 或请求头 `X-Profile: 1` 时,
+该请求在 torch.profiler 下执行, 响应头 `X-Profile-ID` 为采集ID (即请求ID).
+采集期间整段推理完成后才开始返回数据. 采集结果保存在 `--profile_dir`, 最多保留 `--profile_max` 个
+
+列出采集: GET `/profiles`
+Chrome trace (chrome://tracing 或 Perfetto 打开): GET `/profiles/abc123/trace`
+耗时最多的算子表: GET `/profiles/abc123/table`
+
+
 ### 命令控制
 
 endpoint: `/control`
@@ -141,6 +248,7 @@ RESP: 无
 """
 
 import argparse
+import math
 import os
 import re
 import sys
@@ -156,14 +264,21 @@ import torch
 import torchaudio
 import librosa
 import soundfile as sf
-from fastapi import FastAPI, Request, Query
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, Request, Query, File, Form, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, JSONResponse, Response, PlainTextResponse, FileResponse
 import uvicorn
 from transformers import AutoModelForMaskedLM, AutoTokenizer
 import numpy as np
 from feature_extractor import cnhubert
 from io import BytesIO
-from module.models import Generator, SynthesizerTrn, SynthesizerTrnV3
+from tools.audio_encoder import StreamEncoder
+from tools import onnx_backend
+from tools.bert_feature import BertFeatureExtractor
+from tools.inference_metrics import RequestTimings, inference_metrics
+from tools.prefetch import cuda_side_stream, prefetch
+from tools.profiler_capture import ProfilerCapture, capture_id_pattern, profile_range
+from module.models import Generator, SynthesizerTrn, SynthesizerTrnV3, scale_segment_lengths
 from peft import LoraConfig, get_peft_model
 from AR.models.t2s_lightning_module import Text2SemanticLightningModule
 from text import cleaned_text_to_sequence
@@ -178,11 +293,15 @@ from exception_handler import (
     log_response_info,
     start_cleanup_task
 )
-from text.cleaner import clean_text
+from text.cleaner import clean_text, clean_text_batch
 from module.mel_processing import spectrogram_torch
 import config as global_config
 import logging
-import subprocess
+import threading
+import sqlite3
+import hashlib
+import uuid
+from collections import OrderedDict
 
 
 class DefaultRefer:
@@ -368,10 +487,12 @@ def audio_sr(audio, sr):
 
 
 class Speaker:
-    def __init__(self, name, gpt, sovits, phones=None, bert=None, prompt=None):
+    def __init__(self, name, gpt, sovits, phones=None, bert=None, prompt=None, exported_models=None):
         self.name = name
         self.sovits = sovits
         self.gpt = gpt
+        # ONNX/TorchScript后端导出的T2S与VITS, 为 None 时使用PyTorch模型
+        self.exported_models = exported_models
         self.phones = phones
         self.bert = bert
         self.prompt = prompt
@@ -502,32 +623,37 @@ def get_gpt_weights(gpt_path):
     return gpt
 
 
+def get_exported_models(gpt_path, sovits_path, hps):
+    if infer_backend == "onnx":
+        exported_models = onnx_backend.load(gpt_path, sovits_path, hps, args.onnx_dir, args.onnx_quantize)
+    elif infer_backend == "torchscript":
+        # 导入时会编译 export_torch_script.py 中的TorchScript类, 只在使用该后端时导入
+        from tools import torchscript_backend
+
+        exported_models = torchscript_backend.load(gpt_path, sovits_path, hps, args.torchscript_dir, device, is_half)
+    else:
+        return None
+    if exported_models is None:
+        logger.warning(f"{infer_backend}后端不支持 {hps.model.version} 模型, 使用PyTorch推理")
+    else:
+        logger.info(f"{infer_backend}后端模型: {exported_models.model_dir}")
+    return exported_models
+
+
 def change_gpt_sovits_weights(gpt_path, sovits_path):
     try:
         gpt = get_gpt_weights(gpt_path)
         sovits = get_sovits_weights(sovits_path)
+        exported_models = get_exported_models(gpt_path, sovits_path, sovits.hps)
     except Exception as e:
         return JSONResponse({"code": 400, "message": str(e)}, status_code=400)
 
-    speaker_list["default"] = Speaker(name="default", gpt=gpt, sovits=sovits)
+    speaker_list["default"] = Speaker(name="default", gpt=gpt, sovits=sovits, exported_models=exported_models)
     return JSONResponse({"code": 0, "message": "Success"}, status_code=200)
 
 
 def get_bert_feature(text, word2ph):
-    with torch.no_grad():
-        inputs = tokenizer(text, return_tensors="pt")
-        for i in inputs:
-            inputs[i] = inputs[i].to(device)  #####输入是long不用管精度问题，精度随bert_model
-        res = bert_model(**inputs, output_hidden_states=True)
-        res = torch.cat(res["hidden_states"][-3:-2], -1)[0].cpu()[1:-1]
-    assert len(word2ph) == len(text)
-    phone_level_feature = []
-    for i in range(len(word2ph)):
-        repeat_feature = res[i].repeat(word2ph[i], 1)
-        phone_level_feature.append(repeat_feature)
-    phone_level_feature = torch.cat(phone_level_feature, dim=0)
-    # if(is_half==True):phone_level_feature=phone_level_feature.half()
-    return phone_level_feature.T
+    return bert_extractor([(text, word2ph)])[0]
 
 
 def clean_text_inf(text, language, version):
@@ -550,11 +676,74 @@ def get_bert_inf(phones, word2ph, norm_text, language):
     return bert
 
 
-from text import chinese
-
-
 def get_phones_and_bert(text, language, version, final=False):
-    text = re.sub(r' {2,}', ' ', text)
+    return get_phones_and_bert_batch([text], language, version, final)[0]
+
+
+def get_phones_and_bert_batch(texts, language, version, final=False):
+    """多句一起处理, 所有中文片段的BERT特征一次batch提取"""
+    segments_list = clean_segments_batch(texts, language, version, final)
+    zh_features = iter(
+        bert_extractor(
+            [
+                (norm_text, word2ph)
+                for segments in segments_list
+                for lang, phones, word2ph, norm_text in segments
+                if lang == "zh"
+            ]
+        )
+    )
+    result = []
+    for segments in segments_list:
+        bert_list = []
+        for lang, phones, word2ph, norm_text in segments:
+            if lang == "zh":
+                bert_list.append(next(zh_features).to(device))
+            else:
+                bert_list.append(
+                    torch.zeros((1024, len(phones)), dtype=torch.float16 if is_half == True else torch.float32).to(device)
+                )
+        bert = torch.cat(bert_list, dim=1)
+        phones = sum([segment[1] for segment in segments], [])
+        norm_text = "".join([segment[3] for segment in segments])
+        result.append((phones, bert.to(torch.float16 if is_half == True else torch.float32), norm_text))
+    return result
+
+
+def clean_segments(text, language, version, final=False):
+    """按语种切分并完成g2p, 返回 [(语种, phones, word2ph, norm_text)]; 音素过少时在开头加标点重新处理"""
+    return clean_segments_batch([text], language, version, final)[0]
+
+
+def clean_segments_batch(texts, language, version, final=False):
+    """多句一起切分语种, 所有片段一起完成g2p(中文多音字合并为一次g2pW推理)"""
+    texts = [re.sub(r' {2,}', ' ', text) for text in texts]
+    splits_list = [split_languages(text, language) for text in texts]
+    cleaned = iter(
+        clean_text_batch(
+            [
+                (seg_text, lang.replace("all_", ""))
+                for textlist, langlist in splits_list
+                for seg_text, lang in zip(textlist, langlist)
+            ],
+            version,
+        )
+    )
+    segments_list = []
+    for text, (textlist, langlist) in zip(texts, splits_list):
+        segments = []
+        for lang in langlist:
+            lang = lang.replace("all_", "")
+            phones, word2ph, norm_text = next(cleaned)
+            segments.append((lang, cleaned_text_to_sequence(phones, version), word2ph, norm_text))
+        if not final and sum(len(segment[1]) for segment in segments) < 6:
+            segments = clean_segments("." + text, language, version, final=True)
+        segments_list.append(segments)
+    return segments_list
+
+
+def split_languages(text, language):
+    """按语种切分文本, 返回 (textlist, langlist)"""
     textlist = []
     langlist = []
     if language == "all_zh":
@@ -600,24 +789,7 @@ def get_phones_and_bert(text, language, version, final=False):
                 # 因无法区别中日韩文汉字,以用户输入为准
                 langlist.append(language)
             textlist.append(tmp["text"])
-    phones_list = []
-    bert_list = []
-    norm_text_list = []
-    for i in range(len(textlist)):
-        lang = langlist[i]
-        phones, word2ph, norm_text = clean_text_inf(textlist[i], lang, version)
-        bert = get_bert_inf(phones, word2ph, norm_text, lang)
-        phones_list.append(phones)
-        norm_text_list.append(norm_text)
-        bert_list.append(bert)
-    bert = torch.cat(bert_list, dim=1)
-    phones = sum(phones_list, [])
-    norm_text = "".join(norm_text_list)
-
-    if not final and len(phones) < 6:
-        return get_phones_and_bert("." + text, language, version, final=True)
-
-    return phones, bert.to(torch.float16 if is_half == True else torch.float32), norm_text
+    return textlist, langlist
 
 
 class DictToAttrRecursive(dict):
@@ -678,11 +850,10 @@ def get_spepc(hps, filename, dtype, device, is_v2pro=False):
     return spec, audio
 
 
-def pack_audio(audio_bytes, data, rate):
-    if media_type == "ogg":
-        audio_bytes = pack_ogg(audio_bytes, data, rate)
-    elif media_type == "aac":
-        audio_bytes = pack_aac(audio_bytes, data, rate)
+def pack_audio(audio_bytes, data, rate, encoder=None):
+    if media_type in {"ogg", "aac"}:
+        # 同一请求的所有句子共用一个编码会话, 增量写出已编码的数据
+        audio_bytes.write(encoder.encode(data))
     else:
         # wav无法流式, 先暂存raw
         audio_bytes = pack_raw(audio_bytes, data, rate)
@@ -690,52 +861,6 @@ def pack_audio(audio_bytes, data, rate):
     return audio_bytes
 
 
-def pack_ogg(audio_bytes, data, rate):
-    # Author: AkagawaTsurunaki
-    # Issue:
-    #   Stack overflow probabilistically occurs
-    #   when the function `sf_writef_short` of `libsndfile_64bit.dll` is called
-    #   using the Python library `soundfile`
-    # Note:
-    #   This is an issue related to `libsndfile`, not this project itself.
-    #   It happens when you generate a large audio tensor (about 499804 frames in my PC)
-    #   and try to convert it to an ogg file.
-    # Related:
-    #   https://github.com/RVC-Boss/GPT-SoVITS/issues/1199
-    #   https://github.com/libsndfile/libsndfile/issues/1023
-    #   https://github.com/bastibe/python-soundfile/issues/396
-    # Suggestion:
-    #   Or split the whole audio data into smaller audio segment to avoid stack overflow?
-
-    def handle_pack_ogg():
-        with sf.SoundFile(audio_bytes, mode="w", samplerate=rate, channels=1, format="ogg") as audio_file:
-            audio_file.write(data)
-
-    import threading
-
-    # See: https://docs.python.org/3/library/threading.html
-    # The stack size of this thread is at least 32768
-    # If stack overflow error still occurs, just modify the `stack_size`.
-    # stack_size = n * 4096, where n should be a positive integer.
-    # Here we chose n = 4096.
-    stack_size = 4096 * 4096
-    try:
-        threading.stack_size(stack_size)
-        pack_ogg_thread = threading.Thread(target=handle_pack_ogg)
-        pack_ogg_thread.start()
-        pack_ogg_thread.join()
-    except RuntimeError as e:
-        # If changing the thread stack size is unsupported, a RuntimeError is raised.
-        print("RuntimeError: {}".format(e))
-        print("Changing the thread stack size is unsupported.")
-    except ValueError as e:
-        # If the specified stack size is invalid, a ValueError is raised and the stack size is unmodified.
-        print("ValueError: {}".format(e))
-        print("The specified stack size is invalid.")
-
-    return audio_bytes
-
-
 def pack_raw(audio_bytes, data, rate):
     audio_bytes.write(data.tobytes())
 
@@ -754,43 +879,6 @@ def pack_wav(audio_bytes, rate):
     return wav_bytes
 
 
-def pack_aac(audio_bytes, data, rate):
-    if is_int32:
-        pcm = "s32le"
-        bit_rate = "256k"
-    else:
-        pcm = "s16le"
-        bit_rate = "128k"
-    process = subprocess.Popen(
-        [
-            "ffmpeg",
-            "-f",
-            pcm,  # 输入16位有符号小端整数PCM
-            "-ar",
-            str(rate),  # 设置采样率
-            "-ac",
-            "1",  # 单声道
-            "-i",
-            "pipe:0",  # 从管道读取输入
-            "-c:a",
-            "aac",  # 音频编码器为AAC
-            "-b:a",
-            bit_rate,  # 比特率
-            "-vn",  # 不包含视频
-            "-f",
-            "adts",  # 输出AAC数据流格式
-            "pipe:1",  # 将输出写入管道
-        ],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    out, _ = process.communicate(input=data.tobytes())
-    audio_bytes.write(out)
-
-    return audio_bytes
-
-
 def read_clean_buffer(audio_bytes):
     audio_chunk = audio_bytes.getvalue()
     audio_bytes.truncate(0)
@@ -838,6 +926,191 @@ splits = {
 }
 
 
+# 请求级取消信号: request_id -> threading.Event
+cancel_events = {}
+cancel_events_lock = threading.Lock()
+
+
+def register_cancel_event(request_id):
+    stop_event = threading.Event()
+    if request_id:
+        with cancel_events_lock:
+            cancel_events[request_id] = stop_event
+    return stop_event
+
+
+def unregister_cancel_event(request_id):
+    if request_id:
+        with cancel_events_lock:
+            cancel_events.pop(request_id, None)
+
+
+def handle_cancel(request_id):
+    if is_empty(request_id):
+        return JSONResponse({"code": 400, "message": "缺少参数: request_id"}, status_code=400)
+    with cancel_events_lock:
+        stop_event = cancel_events.get(request_id)
+    if stop_event is None:
+        return JSONResponse({"code": 404, "message": "请求不存在或已完成"}, status_code=404)
+    stop_event.set()
+    logger.info(f"已取消推理请求: {request_id}")
+    return JSONResponse({"code": 0, "message": "Success"}, status_code=200)
+
+
+# 说话人注册表: 参考音频只上传一次并预先提取特征, 推理请求只需携带 speaker_id
+speaker_id_pattern = re.compile(r"^[A-Za-z0-9_\-]{1,64}$")
+
+
+class SpeakerRegistry:
+    def __init__(self, root_dir, cache_size):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+        self.db_file = os.path.join(root_dir, "speaker.db")
+        self.cache_size = cache_size
+        # (speaker_id, version) -> 预提取的特征, 按最近使用淘汰
+        self.features = OrderedDict()
+        # self.lock只保护特征缓存与speaker_locks; 特征提取耗时数秒, 在各说话人自己的锁内进行,
+        # 不阻塞其他说话人的推理请求
+        self.lock = threading.Lock()
+        self.speaker_locks = {}
+        with self.get_db() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS speaker (
+                    speaker_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    audio_path TEXT NOT NULL,
+                    prompt_text TEXT NOT NULL,
+                    prompt_lang TEXT NOT NULL,
+                    sha1 TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+
+    def get_db(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def get(self, speaker_id):
+        with self.get_db() as conn:
+            row = conn.execute("SELECT * FROM speaker WHERE speaker_id=?", (speaker_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self):
+        with self.get_db() as conn:
+            rows = conn.execute("SELECT * FROM speaker ORDER BY speaker_id").fetchall()
+        return [self.to_info(dict(row)) for row in rows]
+
+    @staticmethod
+    def to_info(speaker):
+        return {
+            "speaker_id": speaker["speaker_id"],
+            "version": speaker["version"],
+            "prompt_text": speaker["prompt_text"],
+            "prompt_language": speaker["prompt_lang"],
+        }
+
+    def register(self, speaker_id, audio_data, filename, prompt_text, prompt_language):
+        sha1 = hashlib.sha1(audio_data + f"|{prompt_text}|{prompt_language}".encode("utf-8")).hexdigest()
+        with self.speaker_lock(speaker_id):
+            speaker = self.get(speaker_id)
+            # 内容未变化时直接返回当前版本, 重复注册是幂等的
+            if speaker is not None and speaker["sha1"] == sha1:
+                return speaker
+            version = speaker["version"] + 1 if speaker else 1
+            ext = os.path.splitext(filename or "")[1] or ".wav"
+            audio_path = os.path.join(self.root_dir, f"{speaker_id}_v{version}{ext}")
+            tmp_path = audio_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio_data)
+            os.replace(tmp_path, audio_path)
+            try:
+                # 先提取特征, 参考音频无法处理时不写入注册表
+                features = get_prompt_features(audio_path, prompt_text, prompt_language)
+            except Exception:
+                os.remove(audio_path)
+                raise
+            with self.get_db() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO speaker(speaker_id, version, audio_path, prompt_text, prompt_lang, sha1, created_at) VALUES (?,?,?,?,?,?,?)",
+                    (speaker_id, version, audio_path, prompt_text, prompt_language, sha1, ttime()),
+                )
+            with self.lock:
+                self.put_features((speaker_id, version), features)
+                if speaker is not None:
+                    self.features.pop((speaker_id, speaker["version"]), None)
+            if speaker is not None:
+                if os.path.exists(speaker["audio_path"]):
+                    os.remove(speaker["audio_path"])
+            logger.info(f"说话人已注册: {speaker_id} v{version}")
+            return self.get(speaker_id)
+
+    def remove(self, speaker_id):
+        with self.speaker_lock(speaker_id):
+            speaker = self.get(speaker_id)
+            if speaker is None:
+                return False
+            with self.get_db() as conn:
+                conn.execute("DELETE FROM speaker WHERE speaker_id=?", (speaker_id,))
+            with self.lock:
+                self.features.pop((speaker_id, speaker["version"]), None)
+            if os.path.exists(speaker["audio_path"]):
+                os.remove(speaker["audio_path"])
+            return True
+
+    def speaker_lock(self, speaker_id):
+        with self.lock:
+            lock = self.speaker_locks.get(speaker_id)
+            if lock is None:
+                lock = self.speaker_locks[speaker_id] = threading.Lock()
+            return lock
+
+    def cached_features(self, key):
+        with self.lock:
+            features = self.features.get(key)
+            if features is None or features["sovits"] is not speaker_list["default"].sovits:
+                return None
+            self.features.move_to_end(key)
+            return features
+
+    def put_features(self, key, features):
+        self.features[key] = features
+        self.features.move_to_end(key)
+        while len(self.features) > self.cache_size:
+            self.features.popitem(last=False)
+
+    def get_features(self, speaker):
+        """取出预提取的特征; 服务重启、被淘汰或切换模型后重新提取"""
+        key = (speaker["speaker_id"], speaker["version"])
+        features = self.cached_features(key)
+        if features is not None:
+            return features
+        # 同一说话人的并发请求只提取一次
+        with self.speaker_lock(speaker["speaker_id"]):
+            features = self.cached_features(key)
+            if features is None:
+                features = get_prompt_features(speaker["audio_path"], speaker["prompt_text"], speaker["prompt_lang"])
+                with self.lock:
+                    self.put_features(key, features)
+            return features
+
+
+def handle_register_speaker(speaker_id, audio_data, filename, prompt_text, prompt_language):
+    if is_empty(speaker_id, prompt_text, prompt_language) or not audio_data:
+        return JSONResponse(
+            {"code": 400, "message": '缺少任意一项以下参数: "speaker_id", "file", "prompt_text", "prompt_language"'},
+            status_code=400,
+        )
+    if not speaker_id_pattern.match(speaker_id):
+        return JSONResponse({"code": 400, "message": "speaker_id 只能包含字母、数字、下划线和短横线"}, status_code=400)
+    if prompt_language.lower() not in dict_language:
+        return JSONResponse({"code": 400, "message": f"不支持的参考音频语种: {prompt_language}"}, status_code=400)
+    speaker = speaker_registry.register(speaker_id, audio_data, filename, prompt_text, prompt_language.lower())
+    return JSONResponse({"code": 0, "message": "Success", **SpeakerRegistry.to_info(speaker)}, status_code=200)
+
+
 @handle_audio_errors
 @handle_text_errors
 @handle_model_errors
@@ -855,33 +1128,66 @@ def get_tts_wav(
     sample_steps=32,
     if_sr=False,
     spk="default",
+    request_id=None,
+    prompt_features=None,
+    timings=None,
+    batch_size=None,
 ):
+    # 取消信号在生成器第一次被迭代时注册, 请求结束后注销
+    stop_event = register_cancel_event(request_id)
+    timings = timings or RequestTimings(request_id)
+    inference_metrics.start(timings)
+    try:
+        for chunk in _get_tts_wav(
+            ref_wav_path,
+            prompt_text,
+            prompt_language,
+            text,
+            text_language,
+            top_k,
+            top_p,
+            temperature,
+            speed,
+            inp_refs,
+            sample_steps,
+            if_sr,
+            spk,
+            stop_event,
+            prompt_features,
+            timings,
+            batch_size,
+        ):
+            timings.mark_first_chunk()
+            yield chunk
+        if stop_event.is_set():
+            timings.status = "cancelled"
+    except GeneratorExit:
+        # 客户端断开连接
+        timings.status = "cancelled"
+        raise
+    except Exception:
+        timings.status = "error"
+        raise
+    finally:
+        unregister_cancel_event(request_id)
+        inference_metrics.finish(timings)
+        logger.info(f"推理耗时: {timings.to_dict()}")
+
+
+def get_prompt_features(ref_wav_path, prompt_text, prompt_language, inp_refs=None, spk="default"):
+    """提取参考音频与参考文本的全部特征, 同一说话人的多次推理可直接复用"""
     infer_sovits = speaker_list[spk].sovits
     vq_model = infer_sovits.vq_model
     hps = infer_sovits.hps
     version = vq_model.version
 
-    infer_gpt = speaker_list[spk].gpt
-    t2s_model = infer_gpt.t2s_model
-    max_sec = infer_gpt.max_sec
-
-    if version == "v3":
-        if sample_steps not in [4, 8, 16, 32, 64, 128]:
-            sample_steps = 32
-    elif version == "v4":
-        if sample_steps not in [4, 8, 16, 32]:
-            sample_steps = 8
-
-    if if_sr and version != "v3":
-        if_sr = False
-
-    t0 = ttime()
     prompt_text = prompt_text.strip("\n")
     if prompt_text[-1] not in splits:
         prompt_text += "。" if prompt_language != "en" else "."
-    prompt_language, text = prompt_language, text.strip("\n")
     dtype = torch.float16 if is_half == True else torch.float32
     zero_wav = np.zeros(int(hps.data.sampling_rate * 0.3), dtype=np.float16 if is_half == True else np.float32)
+    refers = sv_emb = refer = mel2 = None
+    is_v2pro = version in {"v2Pro", "v2ProPlus"}
     with torch.no_grad():
         wav16k, sr = librosa.load(ref_wav_path, sr=16000)
         wav16k = torch.from_numpy(wav16k)
@@ -898,7 +1204,6 @@ def get_tts_wav(
         prompt_semantic = codes[0, 0]
         prompt = prompt_semantic.unsqueeze(0).to(device)
 
-        is_v2pro = version in {"v2Pro", "v2ProPlus"}
         if version not in {"v3", "v4"}:
             refers = []
             if is_v2pro:
@@ -921,73 +1226,6 @@ def get_tts_wav(
                     sv_emb = [sv_cn_model.compute_embedding3(audio_tensor)]
         else:
             refer, audio_tensor = get_spepc(hps, ref_wav_path, dtype, device)
-
-    t1 = ttime()
-    # os.environ['version'] = version
-    prompt_language = dict_language[prompt_language.lower()]
-    text_language = dict_language[text_language.lower()]
-    phones1, bert1, norm_text1 = get_phones_and_bert(prompt_text, prompt_language, version)
-    texts = text.split("\n")
-    audio_bytes = BytesIO()
-
-    for text in texts:
-        # 简单防止纯符号引发参考音频泄露
-        if only_punc(text):
-            continue
-
-        audio_opt = []
-        if text[-1] not in splits:
-            text += "。" if text_language != "en" else "."
-        phones2, bert2, norm_text2 = get_phones_and_bert(text, text_language, version)
-        bert = torch.cat([bert1, bert2], 1)
-
-        all_phoneme_ids = torch.LongTensor(phones1 + phones2).to(device).unsqueeze(0)
-        bert = bert.to(device).unsqueeze(0)
-        all_phoneme_len = torch.tensor([all_phoneme_ids.shape[-1]]).to(device)
-        t2 = ttime()
-        with torch.no_grad():
-            pred_semantic, idx = t2s_model.model.infer_panel(
-                all_phoneme_ids,
-                all_phoneme_len,
-                prompt,
-                bert,
-                # prompt_phone_len=ph_offset,
-                top_k=top_k,
-                top_p=top_p,
-                temperature=temperature,
-                early_stop_num=hz * max_sec,
-            )
-            pred_semantic = pred_semantic[:, -idx:].unsqueeze(0)
-        t3 = ttime()
-
-        if version not in {"v3", "v4"}:
-            if is_v2pro:
-                audio = (
-                    vq_model.decode(
-                        pred_semantic,
-                        torch.LongTensor(phones2).to(device).unsqueeze(0),
-                        refers,
-                        speed=speed,
-                        sv_emb=sv_emb,
-                    )
-                    .detach()
-                    .cpu()
-                    .numpy()[0, 0]
-                )
-            else:
-                audio = (
-                    vq_model.decode(
-                        pred_semantic, torch.LongTensor(phones2).to(device).unsqueeze(0), refers, speed=speed
-                    )
-                    .detach()
-                    .cpu()
-                    .numpy()[0, 0]
-                )
-        else:
-            phoneme_ids0 = torch.LongTensor(phones1).to(device).unsqueeze(0)
-            phoneme_ids1 = torch.LongTensor(phones2).to(device).unsqueeze(0)
-
-            fea_ref, ge = vq_model.decode_encp(prompt.unsqueeze(0), phoneme_ids0, refer)
             ref_audio, sr = torchaudio.load(ref_wav_path)
             ref_audio = ref_audio.to(device).float()
             if ref_audio.shape[0] == 2:
@@ -998,77 +1236,358 @@ def get_tts_wav(
                 ref_audio = resample(ref_audio, sr, tgt_sr, device)
             mel2 = mel_fn(ref_audio) if version == "v3" else mel_fn_v4(ref_audio)
             mel2 = norm_spec(mel2)
-            T_min = min(mel2.shape[2], fea_ref.shape[2])
-            mel2 = mel2[:, :, :T_min]
-            fea_ref = fea_ref[:, :, :T_min]
-            Tref = 468 if version == "v3" else 500
-            Tchunk = 934 if version == "v3" else 1000
-            if T_min > Tref:
-                mel2 = mel2[:, :, -Tref:]
-                fea_ref = fea_ref[:, :, -Tref:]
-                T_min = Tref
-            chunk_len = Tchunk - T_min
-            mel2 = mel2.to(dtype)
-            fea_todo, ge = vq_model.decode_encp(pred_semantic, phoneme_ids1, refer, ge, speed)
-            cfm_resss = []
-            idx = 0
-            while 1:
-                fea_todo_chunk = fea_todo[:, :, idx : idx + chunk_len]
-                if fea_todo_chunk.shape[-1] == 0:
-                    break
-                idx += chunk_len
-                fea = torch.cat([fea_ref, fea_todo_chunk], 2).transpose(2, 1)
-                cfm_res = vq_model.cfm.inference(
-                    fea, torch.LongTensor([fea.size(1)]).to(fea.device), mel2, sample_steps, inference_cfg_rate=0
-                )
-                cfm_res = cfm_res[:, :, mel2.shape[2] :]
-                mel2 = cfm_res[:, :, -T_min:]
-                fea_ref = fea_todo_chunk[:, :, -T_min:]
-                cfm_resss.append(cfm_res)
-            cfm_res = torch.cat(cfm_resss, 2)
-            cfm_res = denorm_spec(cfm_res)
-            if version == "v3":
-                if bigvgan_model == None:
-                    init_bigvgan()
-            else:  # v4
-                if hifigan_model == None:
-                    init_hifigan()
-            vocoder_model = bigvgan_model if version == "v3" else hifigan_model
-            with torch.inference_mode():
-                wav_gen = vocoder_model(cfm_res)
-                audio = wav_gen[0][0].cpu().detach().numpy()
-
-        max_audio = np.abs(audio).max()
-        if max_audio > 1:
-            audio /= max_audio
-        audio_opt.append(audio)
-        audio_opt.append(zero_wav)
-        audio_opt = np.concatenate(audio_opt, 0)
-        t4 = ttime()
-
-        if version in {"v1", "v2", "v2Pro", "v2ProPlus"}:
-            sr = 32000
-        elif version == "v3":
-            sr = 24000
-        else:
-            sr = 48000  # v4
-
-        if if_sr and sr == 24000:
-            audio_opt = torch.from_numpy(audio_opt).float().to(device)
-            audio_opt, sr = audio_sr(audio_opt.unsqueeze(0), sr)
-            max_audio = np.abs(audio_opt).max()
-            if max_audio > 1:
-                audio_opt /= max_audio
-            sr = 48000
-
-        if is_int32:
-            audio_bytes = pack_audio(audio_bytes, (audio_opt * 2147483647).astype(np.int32), sr)
-        else:
-            audio_bytes = pack_audio(audio_bytes, (audio_opt * 32768).astype(np.int16), sr)
-        # logger.info("%.3f\t%.3f\t%.3f\t%.3f" % (t1 - t0, t2 - t1, t3 - t2, t4 - t3))
-        if stream_mode == "normal":
-            audio_bytes, audio_chunk = read_clean_buffer(audio_bytes)
-            yield audio_chunk
+
+    phones1, bert1, norm_text1 = get_phones_and_bert(prompt_text, dict_language[prompt_language.lower()], version)
+    return {
+        "sovits": infer_sovits,
+        "prompt": prompt,
+        "refers": refers,
+        "sv_emb": sv_emb,
+        "refer": refer,
+        "mel2": mel2,
+        "phones1": phones1,
+        "bert1": bert1,
+    }
+
+
+def split_batches(texts, batch_size):
+    """
+    按batch_size把句子分组, 组内的句子一起做T2S与VITS解码.
+    流式返回时第一组只放一句, 首包延迟与逐句推理相同
+    """
+    if stream_mode == "normal" and batch_size > 1 and texts:
+        yield texts[:1]
+        texts = texts[1:]
+    for i in range(0, len(texts), batch_size):
+        yield texts[i : i + batch_size]
+
+
+def infer_semantic(
+    t2s_model, phones1, batch_phones, batch_bert, prompt, top_k, top_p, temperature, early_stop_num, stop_event
+):
+    """返回每句生成的语义token(一维), 多句时左侧补齐后一次batch解码, 已生成EOS的句子移出batch"""
+    if len(batch_phones) == 1:
+        all_phoneme_ids = torch.LongTensor(phones1 + batch_phones[0]).to(device).unsqueeze(0)
+        all_phoneme_len = torch.tensor([all_phoneme_ids.shape[-1]]).to(device)
+        pred_semantic, idx = t2s_model.model.infer_panel(
+            all_phoneme_ids,
+            all_phoneme_len,
+            prompt,
+            batch_bert[0].unsqueeze(0),
+            top_k=top_k,
+            top_p=top_p,
+            temperature=temperature,
+            early_stop_num=early_stop_num,
+            stop_event=stop_event,
+        )
+        return [pred_semantic[0, -idx:]]
+
+    all_phoneme_ids = [torch.LongTensor(phones1 + phones2).to(device) for phones2 in batch_phones]
+    all_phoneme_lens = torch.LongTensor([item.shape[-1] for item in all_phoneme_ids]).to(device)
+    y_list, idx_list = t2s_model.model.infer_panel_batch_infer(
+        all_phoneme_ids,
+        all_phoneme_lens,
+        prompt.expand(len(all_phoneme_ids), -1),
+        batch_bert,
+        top_k=top_k,
+        top_p=top_p,
+        temperature=temperature,
+        early_stop_num=early_stop_num,
+        stop_event=stop_event,
+    )
+    prompt_len = prompt.shape[-1]
+    return [y[prompt_len:] for y in y_list]
+
+
+def vits_decode(vq_model, pred_semantic_list, batch_phones, refers, sv_emb, speed, exported_models=None):
+    """
+    一组句子的语义token拼接成一条序列一次解码, 再按每句的输出帧数切分音频.
+    语速不为1时每句单独做长度调节, 切分位置与逐句解码的时长一致
+    """
+    segment_lengths = [item.shape[-1] for item in pred_semantic_list]
+    # ONNX后端生成的token在CPU上, 由PyTorch的VITS解码时需移到模型所在设备
+    codes = torch.cat(pred_semantic_list).view(1, 1, -1).to(device)
+    phones = torch.LongTensor(sum(batch_phones, [])).to(device).unsqueeze(0)
+    if exported_models is not None and exported_models.can_decode_vits(refers, speed):
+        audio = exported_models.decode_vits(codes, phones, refers[0], sv_emb[0] if sv_emb else None)[0, 0]
+    else:
+        audio = (
+            vq_model.decode(
+                codes,
+                phones,
+                refers,
+                speed=speed,
+                sv_emb=sv_emb,
+                segment_lengths=segment_lengths if speed != 1 else None,
+            )
+            .detach()
+            .cpu()
+            .numpy()[0, 0]
+        )
+    if len(segment_lengths) == 1:
+        return [audio]
+    upsample_rate = math.prod(vq_model.upsample_rates)
+    frame_lengths = scale_segment_lengths([length * 2 for length in segment_lengths], [speed] * len(segment_lengths))
+    audios = []
+    start = 0
+    for frame_length in frame_lengths:
+        end = start + frame_length * upsample_rate
+        audios.append(audio[start:end])
+        start = end
+    return audios
+
+
+def vocoder_decode(vq_model, pred_semantic, phones1, phones2, prompt, refer, mel2, speed, sample_steps, dtype):
+    version = vq_model.version
+    phoneme_ids0 = torch.LongTensor(phones1).to(device).unsqueeze(0)
+    phoneme_ids1 = torch.LongTensor(phones2).to(device).unsqueeze(0)
+
+    fea_ref, ge = vq_model.decode_encp(prompt.unsqueeze(0), phoneme_ids0, refer)
+    T_min = min(mel2.shape[2], fea_ref.shape[2])
+    mel2 = mel2[:, :, :T_min]
+    fea_ref = fea_ref[:, :, :T_min]
+    Tref = 468 if version == "v3" else 500
+    Tchunk = 934 if version == "v3" else 1000
+    if T_min > Tref:
+        mel2 = mel2[:, :, -Tref:]
+        fea_ref = fea_ref[:, :, -Tref:]
+        T_min = Tref
+    chunk_len = Tchunk - T_min
+    mel2 = mel2.to(dtype)
+    fea_todo, ge = vq_model.decode_encp(pred_semantic, phoneme_ids1, refer, ge, speed)
+    cfm_resss = []
+    idx = 0
+    while 1:
+        fea_todo_chunk = fea_todo[:, :, idx : idx + chunk_len]
+        if fea_todo_chunk.shape[-1] == 0:
+            break
+        idx += chunk_len
+        fea = torch.cat([fea_ref, fea_todo_chunk], 2).transpose(2, 1)
+        cfm_res = vq_model.cfm.inference(
+            fea, torch.LongTensor([fea.size(1)]).to(fea.device), mel2, sample_steps, inference_cfg_rate=0
+        )
+        cfm_res = cfm_res[:, :, mel2.shape[2] :]
+        mel2 = cfm_res[:, :, -T_min:]
+        fea_ref = fea_todo_chunk[:, :, -T_min:]
+        cfm_resss.append(cfm_res)
+    cfm_res = torch.cat(cfm_resss, 2)
+    cfm_res = denorm_spec(cfm_res)
+    if version == "v3":
+        if bigvgan_model == None:
+            init_bigvgan()
+    else:  # v4
+        if hifigan_model == None:
+            init_hifigan()
+    vocoder_model = bigvgan_model if version == "v3" else hifigan_model
+    with torch.inference_mode():
+        wav_gen = vocoder_model(cfm_res)
+        return wav_gen[0][0].cpu().detach().numpy()
+
+
+def _get_tts_wav(
+    ref_wav_path,
+    prompt_text,
+    prompt_language,
+    text,
+    text_language,
+    top_k,
+    top_p,
+    temperature,
+    speed,
+    inp_refs,
+    sample_steps,
+    if_sr,
+    spk,
+    stop_event,
+    prompt_features=None,
+    timings=None,
+    batch_size=None,
+):
+    timings = timings or RequestTimings()
+    infer_sovits = speaker_list[spk].sovits
+    vq_model = infer_sovits.vq_model
+    hps = infer_sovits.hps
+    version = vq_model.version
+
+    infer_gpt = speaker_list[spk].gpt
+    t2s_model = infer_gpt.t2s_model
+    max_sec = infer_gpt.max_sec
+    exported_models = speaker_list[spk].exported_models
+
+    if version == "v3":
+        if sample_steps not in [4, 8, 16, 32, 64, 128]:
+            sample_steps = 32
+    elif version == "v4":
+        if sample_steps not in [4, 8, 16, 32]:
+            sample_steps = 8
+
+    if if_sr and version != "v3":
+        if_sr = False
+
+    t0 = ttime()
+    # 已注册说话人的特征可直接复用, 模型切换后需重新提取
+    if prompt_features is None or prompt_features["sovits"] is not infer_sovits:
+        with profile_range("reference"):
+            prompt_features = get_prompt_features(ref_wav_path, prompt_text, prompt_language, inp_refs, spk)
+    prompt = prompt_features["prompt"]
+    refers = prompt_features["refers"]
+    sv_emb = prompt_features["sv_emb"]
+    refer = prompt_features["refer"]
+    phones1 = prompt_features["phones1"]
+    bert1 = prompt_features["bert1"]
+    text = text.strip("\n")
+    dtype = torch.float16 if is_half == True else torch.float32
+    zero_wav = np.zeros(int(hps.data.sampling_rate * 0.3), dtype=np.float16 if is_half == True else np.float32)
+
+    t1 = ttime()
+    timings.add("reference", t1 - t0)
+    # os.environ['version'] = version
+    text_language = dict_language[text_language.lower()]
+    texts = []
+    for text in text.split("\n"):
+        # 简单防止纯符号引发参考音频泄露
+        if only_punc(text):
+            continue
+        if text[-1] not in splits:
+            text += "。" if text_language != "en" else "."
+        texts.append(text)
+    audio_bytes = BytesIO()
+    encoder = None
+
+    def extract_features():
+        for batch in split_batches(texts, batch_size or default_batch_size):
+            batch_phones = []
+            batch_bert = []
+            for phones2, bert2, norm_text2 in get_phones_and_bert_batch(batch, text_language, version):
+                batch_phones.append(phones2)
+                batch_bert.append(torch.cat([bert1, bert2], 1).to(device))
+            yield batch_phones, batch_bert
+
+    def predict_semantic(features):
+        # 在后台线程中执行时, 与推理线程中上一组句子的VITS/声码器解码重叠
+        try:
+            while True:
+                if stop_event.is_set():
+                    logger.info("推理已取消, 停止后续句子")
+                    return
+                t1 = ttime()
+                with profile_range("frontend"):
+                    batch_phones, batch_bert = next(features, (None, None))
+                if batch_phones is None:
+                    return
+                t2 = ttime()
+                timings.add("frontend", t2 - t1)
+                with torch.no_grad(), cuda_side_stream(device), profile_range("t2s"):
+                    if exported_models is not None:
+                        # 导出的解码图只支持单句, 组内逐句解码
+                        pred_semantic_list = [
+                            exported_models.infer_semantic(
+                                phones1 + phones2, bert, prompt, top_k, top_p, temperature, hz * max_sec, stop_event
+                            )
+                            for phones2, bert in zip(batch_phones, batch_bert)
+                        ]
+                    else:
+                        pred_semantic_list = infer_semantic(
+                            t2s_model,
+                            phones1,
+                            batch_phones,
+                            batch_bert,
+                            prompt,
+                            top_k,
+                            top_p,
+                            temperature,
+                            hz * max_sec,
+                            stop_event,
+                        )
+                t3 = ttime()
+                timings.add("t2s", t3 - t2)
+                timings.tokens += sum(int(item.shape[-1]) for item in pred_semantic_list)
+                yield batch_phones, pred_semantic_list
+        finally:
+            features.close()
+
+    # 文本前端与T2S各在一个后台线程中提前处理后面的句子, 各阶段记录各自的计算耗时(frontend 为T2S等待前端结果的时间),
+    # 流水线开启时阶段之间互相重叠, 加起来会超过总耗时
+    features = prefetch(extract_features(), frontend_prefetch, stop_event, name="frontend-prefetch")
+    semantics = prefetch(predict_semantic(features), t2s_prefetch, stop_event, name="t2s-prefetch")
+    try:
+        for batch_phones, pred_semantic_list in semantics:
+            # T2S被取消时不再进行VITS/声码器解码
+            if stop_event.is_set():
+                logger.info("推理已取消, 跳过声码器解码")
+                break
+            t3 = ttime()
+
+            with profile_range("vits" if version not in {"v3", "v4"} else "vocoder"):
+                if version not in {"v3", "v4"}:
+                    audios = vits_decode(vq_model, pred_semantic_list, batch_phones, refers, sv_emb, speed, exported_models)
+                else:
+                    audios = [
+                        vocoder_decode(
+                            vq_model,
+                            pred_semantic.view(1, 1, -1),
+                            phones1,
+                            phones2,
+                            prompt,
+                            refer,
+                            prompt_features["mel2"],
+                            speed,
+                            sample_steps,
+                            dtype,
+                        )
+                        for pred_semantic, phones2 in zip(pred_semantic_list, batch_phones)
+                    ]
+            t4 = ttime()
+            timings.add("vits" if version not in {"v3", "v4"} else "vocoder", t4 - t3)
+
+            # 一组内的句子按原顺序逐句打包返回
+            for audio in audios:
+                max_audio = np.abs(audio).max()
+                if max_audio > 1:
+                    audio /= max_audio
+                audio_opt = np.concatenate([audio, zero_wav], 0)
+
+                if version in {"v1", "v2", "v2Pro", "v2ProPlus"}:
+                    sr = 32000
+                elif version == "v3":
+                    sr = 24000
+                else:
+                    sr = 48000  # v4
+
+                if if_sr and sr == 24000:
+                    with timings.measure("super_resolution"):
+                        audio_opt = torch.from_numpy(audio_opt).float().to(device)
+                        audio_opt, sr = audio_sr(audio_opt.unsqueeze(0), sr)
+                        max_audio = np.abs(audio_opt).max()
+                        if max_audio > 1:
+                            audio_opt /= max_audio
+                        sr = 48000
+                timings.audio_seconds += len(audio_opt) / sr
+                timings.sentences += 1
+
+                with timings.measure("pack"):
+                    if encoder is None and media_type in {"ogg", "aac"}:
+                        encoder = StreamEncoder(media_type, sr, "s32" if is_int32 else "s16")
+                    if is_int32:
+                        audio_bytes = pack_audio(audio_bytes, (audio_opt * 2147483647).astype(np.int32), sr, encoder)
+                    else:
+                        audio_bytes = pack_audio(audio_bytes, (audio_opt * 32768).astype(np.int16), sr, encoder)
+                if stream_mode == "normal":
+                    audio_bytes, audio_chunk = read_clean_buffer(audio_bytes)
+                    yield audio_chunk
+
+        if encoder is not None:
+            # 结束编码会话, 写出编码器中剩余的数据
+            with timings.measure("pack"):
+                audio_bytes.write(encoder.close())
+            if stream_mode == "normal":
+                audio_bytes, audio_chunk = read_clean_buffer(audio_bytes)
+                yield audio_chunk
+    finally:
+        # 客户端断开(如用户打断)时生成器在 yield 处收到 GeneratorExit, 同样需要停止后台线程并释放编码会话
+        semantics.close()
+        if encoder is not None:
+            encoder.close()
 
     if not stream_mode == "normal":
         if media_type == "wav":
@@ -1078,7 +1597,8 @@ def get_tts_wav(
                 sr = 48000 if if_sr else 24000
             else:
                 sr = 48000  # v4
-            audio_bytes = pack_wav(audio_bytes, sr)
+            with timings.measure("pack"):
+                audio_bytes = pack_wav(audio_bytes, sr)
         yield audio_bytes.getvalue()
 
 
@@ -1128,7 +1648,27 @@ def handle(
     inp_refs,
     sample_steps,
     if_sr,
+    request_id=None,
+    speaker_id=None,
+    speaker_version=None,
+    profile=False,
 ):
+    prompt_features = None
+    if not is_empty(speaker_id):
+        speaker = speaker_registry.get(speaker_id)
+        if speaker is None:
+            return JSONResponse({"code": 404, "message": f"说话人未注册: {speaker_id}"}, status_code=404)
+        if not is_empty(speaker_version) and int(speaker_version) != speaker["version"]:
+            return JSONResponse(
+                {"code": 409, "message": "说话人版本已变化", "version": speaker["version"]}, status_code=409
+            )
+        refer_wav_path, prompt_text, prompt_language = (
+            speaker["audio_path"],
+            speaker["prompt_text"],
+            speaker["prompt_lang"],
+        )
+        prompt_features = speaker_registry.get_features(speaker)
+
     if (
         refer_wav_path == ""
         or refer_wav_path is None
@@ -1150,8 +1690,9 @@ def handle(
     else:
         text = cut_text(text, cut_punc)
 
-    return StreamingResponse(
-        get_tts_wav(
+    timings = RequestTimings(request_id)
+    headers = {"X-Request-ID": timings.request_id}
+    generator = get_tts_wav(
             refer_wav_path,
             prompt_text,
             prompt_language,
@@ -1164,9 +1705,36 @@ def handle(
             inp_refs,
             sample_steps,
             if_sr,
-        ),
-        media_type="audio/" + media_type,
-    )
+            request_id=request_id,
+            prompt_features=prompt_features,
+            timings=timings,
+        )
+    if profile and profiler_capture.enabled:
+        capture_id = timings.request_id if capture_id_pattern.match(timings.request_id) else uuid.uuid4().hex
+        generator = profiler_capture.run(generator, capture_id)
+        headers["X-Profile-ID"] = capture_id
+    response = StreamingResponse(generator, media_type="audio/" + media_type, headers=headers)
+    response.timings = timings
+    return response
+
+
+async def with_timing_headers(result):
+    """
+    非流式模式下整段音频本来就在推理结束后一次返回, 先在线程池中完成推理,
+    再把各阶段耗时写入响应头; 流式模式的耗时通过 /metrics/requests/{request_id} 查询
+    """
+    timings = getattr(result, "timings", None)
+    if timings is None or stream_mode == "normal":
+        return result
+    body = b"".join([chunk async for chunk in result.body_iterator])
+    headers = timings.to_headers()
+    if "x-profile-id" in result.headers:
+        headers["X-Profile-ID"] = result.headers["x-profile-id"]
+    return Response(body, media_type=result.media_type, headers=headers)
+
+
+def is_profile_requested(request, flag):
+    return bool(flag) or request.headers.get("X-Profile", "").lower() in {"1", "true", "yes"}
 
 
 # --------------------------------
@@ -1227,9 +1795,21 @@ parser.add_argument("-sm", "--stream_mode", type=str, default="close", help="流
 parser.add_argument("-mt", "--media_type", type=str, default="wav", help="音频编码格式, wav / ogg / aac")
 parser.add_argument("-st", "--sub_type", type=str, default="int16", help="音频数据类型, int16 / int32")
 parser.add_argument("-cp", "--cut_punc", type=str, default="", help="文本切分符号设定, 符号范围,.;?!、，。？！；：…")
+parser.add_argument("-bs", "--batch_size", type=int, default=4, help="一起推理的句子数, 1 表示逐句推理")
+parser.add_argument("-pf", "--prefetch", type=int, default=2, help="文本前端提前处理的batch数, 0 表示不开启流水线")
+parser.add_argument("-pt", "--t2s_prefetch", type=int, default=1, help="T2S提前解码的batch数, 0 表示与VITS串行执行")
+parser.add_argument("-ib", "--infer_backend", type=str, default="torch", help="推理后端, torch / onnx / torchscript")
+parser.add_argument("-oq", "--onnx_quantize", action="store_true", default=False, help="ONNX后端对T2S做int8动态量化")
+parser.add_argument("-od", "--onnx_dir", type=str, default="onnx_cache", help="ONNX后端导出模型的缓存目录")
+parser.add_argument("-td", "--torchscript_dir", type=str, default="torchscript_cache", help="TorchScript后端导出模型的缓存目录")
 # 切割常用分句符为 `python ./api.py -cp ".?!。？！"`
 parser.add_argument("-hb", "--hubert_path", type=str, default=g_config.cnhubert_path, help="覆盖config.cnhubert_path")
 parser.add_argument("-b", "--bert_path", type=str, default=g_config.bert_path, help="覆盖config.bert_path")
+parser.add_argument("-bcs", "--bert_cache_size", type=int, default=256, help="缓存BERT特征的文本片段数, 0 表示不缓存")
+parser.add_argument("-spd", "--speaker_dir", type=str, default="speakers", help="已注册说话人的参考音频与数据库目录")
+parser.add_argument("-spc", "--speaker_cache_size", type=int, default=32, help="常驻内存的说话人特征数量")
+parser.add_argument("-prd", "--profile_dir", type=str, default="profiles", help="torch.profiler采集结果保存目录")
+parser.add_argument("-prn", "--profile_max", type=int, default=20, help="最多保留的采集数量, 0 表示禁止采集")
 
 args = parser.parse_args()
 sovits_path = args.sovits_path
@@ -1240,6 +1820,10 @@ host = args.bind_addr
 cnhubert_base_path = args.hubert_path
 bert_path = args.bert_path
 default_cut_punc = args.cut_punc
+default_batch_size = max(1, args.batch_size)
+frontend_prefetch = max(0, args.prefetch)
+t2s_prefetch = max(0, args.t2s_prefetch)
+infer_backend = args.infer_backend.lower()
 
 # 应用参数配置
 default_refer = DefaultRefer(args.default_refer_path, args.default_refer_text, args.default_refer_language)
@@ -1306,7 +1890,19 @@ if is_half:
 else:
     bert_model = bert_model.to(device)
     ssl_model = ssl_model.to(device)
+bert_extractor = BertFeatureExtractor(tokenizer, bert_model, device, args.bert_cache_size)
 change_gpt_sovits_weights(gpt_path=gpt_path, sovits_path=sovits_path)
+speaker_registry = SpeakerRegistry(args.speaker_dir, args.speaker_cache_size)
+profiler_capture = ProfilerCapture(args.profile_dir, args.profile_max)
+
+# /metrics 导出时统计各模型的参数占用(切换模型后取到的是新模型)
+inference_metrics.register_model("t2s", lambda: speaker_list["default"].gpt.t2s_model)
+inference_metrics.register_model("vits", lambda: speaker_list["default"].sovits.vq_model)
+inference_metrics.register_model("bert", lambda: bert_model)
+inference_metrics.register_model("ssl", lambda: ssl_model)
+inference_metrics.register_model("bigvgan", lambda: bigvgan_model)
+inference_metrics.register_model("hifigan", lambda: hifigan_model)
+inference_metrics.register_model("sv", lambda: sv_cn_model.embedding_model if sv_cn_model is not None else None)
 
 
 # --------------------------------
@@ -1403,7 +1999,9 @@ async def tts_endpoint(request: Request):
     try:
         log_request_info(request)
         json_post_raw = await request.json()
-        result = handle(
+        # 已注册说话人的特征未缓存时需要重新提取, 在线程池中执行以免阻塞事件循环
+        result = await run_in_threadpool(
+            handle,
             json_post_raw.get("refer_wav_path"),
             json_post_raw.get("prompt_text"),
             json_post_raw.get("prompt_language"),
@@ -1417,7 +2015,12 @@ async def tts_endpoint(request: Request):
             json_post_raw.get("inp_refs", []),
             json_post_raw.get("sample_steps", 32),
             json_post_raw.get("if_sr", False),
+            json_post_raw.get("request_id") or request.headers.get("X-Request-ID"),
+            json_post_raw.get("speaker_id"),
+            json_post_raw.get("speaker_version"),
+            is_profile_requested(request, json_post_raw.get("profile")),
         )
+        result = await with_timing_headers(result)
         log_response_info(result)
         return result
     except Exception as e:
@@ -1440,10 +2043,16 @@ async def tts_endpoint(
     inp_refs: list = Query(default=[]),
     sample_steps: int = 32,
     if_sr: bool = False,
+    request_id: str = None,
+    speaker_id: str = None,
+    speaker_version: int = None,
+    profile: bool = False,
 ):
     try:
         log_request_info(request)
-        result = handle(
+        # 已注册说话人的特征未缓存时需要重新提取, 在线程池中执行以免阻塞事件循环
+        result = await run_in_threadpool(
+            handle,
             refer_wav_path,
             prompt_text,
             prompt_language,
@@ -1457,6 +2066,55 @@ async def tts_endpoint(
             inp_refs,
             sample_steps,
             if_sr,
+            request_id or request.headers.get("X-Request-ID"),
+            speaker_id,
+            speaker_version,
+            is_profile_requested(request, profile),
+        )
+        result = await with_timing_headers(result)
+        log_response_info(result)
+        return result
+    except Exception as e:
+        return exception_handler.handle_exception(e, request)
+
+
+@app.post("/cancel")
+async def cancel(request: Request):
+    try:
+        log_request_info(request)
+        json_post_raw = await request.json()
+        result = handle_cancel(json_post_raw.get("request_id"))
+        log_response_info(result)
+        return result
+    except Exception as e:
+        return exception_handler.handle_exception(e, request)
+
+
+@app.get("/cancel")
+async def cancel(request: Request, request_id: str = None):
+    try:
+        log_request_info(request)
+        result = handle_cancel(request_id)
+        log_response_info(result)
+        return result
+    except Exception as e:
+        return exception_handler.handle_exception(e, request)
+
+
+@app.post("/speakers")
+async def register_speaker(
+    request: Request,
+    speaker_id: str = Form(...),
+    prompt_text: str = Form(...),
+    prompt_language: str = Form("zh"),
+    file: UploadFile = File(...),
+):
+    try:
+        log_request_info(request)
+        audio_data = await file.read()
+        # 注册时要提取参考音频特征(HuBERT/SoVITS/BERT), 放到线程池中执行以免阻塞事件循环
+        result = await run_in_threadpool(
+            handle_register_speaker, speaker_id, audio_data, file.filename, prompt_text, prompt_language
         )
         log_response_info(result)
         return result
@@ -1464,6 +2122,84 @@ async def tts_endpoint(
         return exception_handler.handle_exception(e, request)
 
 
+@app.get("/speakers")
+async def list_speakers(request: Request):
+    try:
+        log_request_info(request)
+        return JSONResponse({"code": 0, "speakers": speaker_registry.list()}, status_code=200)
+    except Exception as e:
+        return exception_handler.handle_exception(e, request)
+
+
+@app.get("/speakers/{speaker_id}")
+async def get_speaker(request: Request, speaker_id: str):
+    try:
+        log_request_info(request)
+        speaker = speaker_registry.get(speaker_id)
+        if speaker is None:
+            return JSONResponse({"code": 404, "message": f"说话人未注册: {speaker_id}"}, status_code=404)
+        return JSONResponse({"code": 0, **SpeakerRegistry.to_info(speaker)}, status_code=200)
+    except Exception as e:
+        return exception_handler.handle_exception(e, request)
+
+
+@app.delete("/speakers/{speaker_id}")
+async def delete_speaker(request: Request, speaker_id: str):
+    try:
+        log_request_info(request)
+        # 同一说话人正在注册时会等待其完成
+        if not await run_in_threadpool(speaker_registry.remove, speaker_id):
+            return JSONResponse({"code": 404, "message": f"说话人未注册: {speaker_id}"}, status_code=404)
+        return JSONResponse({"code": 0, "message": "Success"}, status_code=200)
+    except Exception as e:
+        return exception_handler.handle_exception(e, request)
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    try:
+        return PlainTextResponse(inference_metrics.render(), media_type="text/plain; version=0.0.4")
+    except Exception as e:
+        return exception_handler.handle_exception(e, request)
+
+
+@app.get("/metrics/requests/{request_id}")
+async def request_metrics(request: Request, request_id: str):
+    try:
+        log_request_info(request)
+        result = inference_metrics.get(request_id)
+        if result is None:
+            return JSONResponse({"code": 404, "message": "请求不存在或尚未完成"}, status_code=404)
+        return JSONResponse({"code": 0, **result}, status_code=200)
+    except Exception as e:
+        return exception_handler.handle_exception(e, request)
+
+
+@app.get("/profiles")
+async def list_profiles(request: Request):
+    try:
+        log_request_info(request)
+        return JSONResponse({"code": 0, "profiles": profiler_capture.list()}, status_code=200)
+    except Exception as e:
+        return exception_handler.handle_exception(e, request)
+
+
+@app.get("/profiles/{capture_id}/{kind}")
+async def get_profile(request: Request, capture_id: str, kind: str):
+    try:
+        log_request_info(request)
+        if kind not in {"trace", "table"}:
+            return JSONResponse({"code": 400, "message": "kind 只能是 trace 或 table"}, status_code=400)
+        path = profiler_capture.get_file(capture_id, kind)
+        if path is None:
+            return JSONResponse({"code": 404, "message": f"采集不存在: {capture_id}"}, status_code=404)
+        if kind == "trace":
+            return FileResponse(path, media_type="application/json", filename=os.path.basename(path))
+        return FileResponse(path, media_type="text/plain; charset=utf-8")
+    except Exception as e:
+        return exception_handler.handle_exception(e, request)
+
+
 if __name__ == "__main__":
     # 启动异常处理模块
     start_cleanup_task()
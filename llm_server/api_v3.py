@@ -19,16 +19,18 @@ import argparse
 import asyncio
 import aiofiles
 from fastapi import FastAPI, Response, UploadFile, File, Form
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse, FileResponse
 import uvicorn
 from io import BytesIO
 import numpy as np
 import soundfile as sf
-import subprocess
 import wave
 import signal
 
 from tools.i18n.i18n import I18nAuto
+from tools.audio_encoder import StreamEncoder, encode_audio
+from tools.inference_metrics import RequestTimings, inference_metrics
+from tools.profiler_capture import ProfilerCapture
 from GPT_SoVITS.TTS_infer_pack.TTS import TTS, TTS_Config
 from GPT_SoVITS.TTS_infer_pack.text_segmentation_method import get_method_names as get_cut_method_names
 from pydantic import BaseModel
@@ -40,6 +42,8 @@ parser = argparse.ArgumentParser(description="GPT-SoVITS api with role")
 parser.add_argument("-c", "--tts_config", type=str, default="GPT_SoVITS/configs/tts_infer.yaml")
 parser.add_argument("-a", "--bind_addr", type=str, default="127.0.0.1")
 parser.add_argument("-p", "--port", type=int, default=9880)
+parser.add_argument("-prd", "--profile_dir", type=str, default="profiles", help="torch.profiler采集结果保存目录")
+parser.add_argument("-prn", "--profile_max", type=int, default=20, help="最多保留的采集数量, 0 表示禁止采集")
 args = parser.parse_args()
 config_path = args.tts_config
 host = args.bind_addr
@@ -48,6 +52,7 @@ port = args.port
 # -------------------- TTS 初始化 --------------------
 tts_config = TTS_Config(config_path)
 tts_pipeline = TTS(tts_config)
+profiler_capture = ProfilerCapture(args.profile_dir, args.profile_max)
 
 # -------------------- 数据库初始化 --------------------
 DB_FILE = "role.db"
@@ -115,12 +120,7 @@ def pack_wav(io_buffer: BytesIO, data: np.ndarray, rate: int):
     return io_buffer
 
 def pack_aac(io_buffer: BytesIO, data: np.ndarray, rate: int):
-    proc = subprocess.Popen([
-        "ffmpeg", "-f", "s16le", "-ar", str(rate), "-ac", "1", "-i", "pipe:0",
-        "-c:a", "aac", "-b:a", "192k", "-vn", "-f", "adts", "pipe:1"
-    ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    out, _ = proc.communicate(input=data.tobytes())
-    io_buffer.write(out)
+    io_buffer.write(encode_audio(data, rate, "aac", bit_rate=192000))
     return io_buffer
 
 def pack_audio(io_buffer: BytesIO, data: np.ndarray, rate: int, media_type: str):
@@ -179,6 +179,7 @@ class TTS_Request(BaseModel):
     batch_threshold: float = 0.75
     split_bucket: bool = True
     speed_factor: float = 1.0
+    speed_method: str = "vits"
     fragment_interval: float = 0.3
     seed: int = -1
     media_type: str = "wav"
@@ -187,6 +188,7 @@ class TTS_Request(BaseModel):
     repetition_penalty: float = 1.35
     sample_steps: int = 32
     super_sampling: bool = False
+    profile: bool = False
 
 def check_params(req: dict):
     text: str = req.get("text", "")
@@ -213,6 +215,8 @@ def check_params(req: dict):
         return JSONResponse(status_code=400, content={"message": f"media_type {media_type} not supported"})
     if media_type == "ogg" and not streaming_mode:
         return JSONResponse(status_code=400, content={"message": "ogg only supported in streaming mode"})
+    if req.get("speed_method", "vits") not in ["vits", "stretch"]:
+        return JSONResponse(status_code=400, content={"message": f"speed_method {req.get('speed_method')} not supported"})
     if text_split_method not in cut_method_names:
         return JSONResponse(status_code=400, content={"message": f"text_split_method {text_split_method} not supported"})
     return None
@@ -225,23 +229,74 @@ async def tts_handle(req: dict):
     if check_res:
         return check_res
 
+    profile = req.pop("profile", False)
+    timings = RequestTimings()
+    req["timings"] = timings
+    headers = {"X-Request-ID": timings.request_id}
     try:
         tts_generator = tts_pipeline.run(req)
+        if profile and profiler_capture.enabled:
+            # 采集ID与请求ID相同, 整段推理在profiler下完成后再返回
+            tts_generator = profiler_capture.run(tts_generator, timings.request_id)
+            headers["X-Profile-ID"] = timings.request_id
         if streaming_mode:
             def streaming_generator(tts_generator: Generator, media_type: str):
                 first = True
-                for sr, chunk in tts_generator:
-                    if first and media_type == "wav":
-                        yield wave_header_chunk(sample_rate=sr)
-                        media_type = "raw"
-                        first = False
-                    yield pack_audio(BytesIO(), chunk, sr, media_type).getvalue()
+                encoder = None
+                inference_metrics.start(timings)
+                try:
+                    for sr, chunk in tts_generator:
+                        timings.audio_seconds += len(chunk) / sr
+                        timings.sentences += 1
+                        with timings.measure("pack"):
+                            if first and media_type == "wav":
+                                header = wave_header_chunk(sample_rate=sr)
+                                media_type = "raw"
+                                first = False
+                            else:
+                                header = b""
+                            if media_type in ("ogg", "aac"):
+                                # 整个流共用一个编码会话, 不再每个分片启动一次ffmpeg
+                                if encoder is None:
+                                    encoder = StreamEncoder(media_type, sr, bit_rate=192000)
+                                data = encoder.encode(chunk)
+                            else:
+                                data = pack_audio(BytesIO(), chunk, sr, media_type).getvalue()
+                        timings.mark_first_chunk()
+                        yield header + data
+                    if encoder is not None:
+                        with timings.measure("pack"):
+                            data = encoder.close()
+                        yield data
+                except GeneratorExit:
+                    timings.status = "cancelled"
+                    raise
+                except Exception:
+                    timings.status = "error"
+                    raise
+                finally:
+                    # 客户端断开时GeneratorExit跳过了上面的close, 在这里释放编码会话(ffmpeg回退时为子进程)与推理生成器
+                    if encoder is not None:
+                        encoder.close()
+                    tts_generator.close()
+                    inference_metrics.finish(timings)
             return StreamingResponse(streaming_generator(tts_generator, media_type),
-                                     media_type=f"audio/{media_type}")
+                                     media_type=f"audio/{media_type}",
+                                     headers=headers)
         else:
-            sr, audio_data = next(tts_generator)
-            audio_data = pack_audio(BytesIO(), audio_data, sr, media_type).getvalue()
-            return Response(audio_data, media_type=f"audio/{media_type}")
+            inference_metrics.start(timings)
+            try:
+                sr, audio_data = next(tts_generator)
+                timings.audio_seconds = len(audio_data) / sr
+                with timings.measure("pack"):
+                    audio_data = pack_audio(BytesIO(), audio_data, sr, media_type).getvalue()
+            except Exception:
+                timings.status = "error"
+                raise
+            finally:
+                inference_metrics.finish(timings)
+            headers.update(timings.to_headers())
+            return Response(audio_data, media_type=f"audio/{media_type}", headers=headers)
     except Exception as e:
         print(str(e))
         return JSONResponse(status_code=400, content={"message": "tts failed", "Exception": str(e)})
@@ -254,10 +309,10 @@ async def tts_get_endpoint(
     top_k: int = 5, top_p: float = 1, temperature: float = 1,
     text_split_method: str = "cut0", batch_size: int = 1,
     batch_threshold: float = 0.75, split_bucket: bool = True,
-    speed_factor: float = 1.0, fragment_interval: float = 0.3,
+    speed_factor: float = 1.0, speed_method: str = "vits", fragment_interval: float = 0.3,
     seed: int = -1, media_type: str = "wav", streaming_mode: bool = False,
     parallel_infer: bool = True, repetition_penalty: float = 1.35,
-    sample_steps: int = 32, super_sampling: bool = False,
+    sample_steps: int = 32, super_sampling: bool = False, profile: bool = False,
 ):
     req = {k: v for k, v in locals().items() if v is not None}
     req["text_lang"] = req["text_lang"].lower() if req.get("text_lang") else None
@@ -310,6 +365,51 @@ async def tts_role_post(json: dict):
         return JSONResponse(status_code=400, content={"message": "role and content required"})
     # 其余参数通过 **json 透传
     return await tts_role_handle(role, content, text_lang, **json)
+# -------------------- 取消接口 --------------------
+@APP.api_route("/stop", methods=["GET", "POST"])
+async def stop_endpoint():
+    # 单管线串行推理, 直接停止当前请求, T2S 在下一个解码步退出
+    tts_pipeline.stop()
+    return JSONResponse(status_code=200, content={"message": "success"})
+
+# -------------------- 指标接口 --------------------
+tts_metrics_models = {
+    "t2s": lambda: tts_pipeline.t2s_model,
+    "vits": lambda: tts_pipeline.vits_model,
+    "bert": lambda: tts_pipeline.bert_model,
+    "ssl": lambda: tts_pipeline.cnhuhbert_model,
+    "vocoder": lambda: tts_pipeline.vocoder,
+}
+for name, getter in tts_metrics_models.items():
+    inference_metrics.register_model(name, getter)
+
+@APP.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(inference_metrics.render(), media_type="text/plain; version=0.0.4")
+
+@APP.get("/metrics/requests/{request_id}")
+async def request_metrics_endpoint(request_id: str):
+    result = inference_metrics.get(request_id)
+    if result is None:
+        return JSONResponse(status_code=404, content={"message": "request not found or not finished"})
+    return JSONResponse(status_code=200, content=result)
+
+# -------------------- 性能采集 --------------------
+@APP.get("/profiles")
+async def list_profiles():
+    return JSONResponse(status_code=200, content={"profiles": profiler_capture.list()})
+
+@APP.get("/profiles/{capture_id}/{kind}")
+async def get_profile(capture_id: str, kind: str):
+    if kind not in ("trace", "table"):
+        return JSONResponse(status_code=400, content={"message": f"kind {kind} not supported"})
+    path = profiler_capture.get_file(capture_id, kind)
+    if path is None:
+        return JSONResponse(status_code=404, content={"message": "profile not found"})
+    if kind == "trace":
+        return FileResponse(path, media_type="application/json", filename=os.path.basename(path))
+    return FileResponse(path, media_type="text/plain; charset=utf-8")
+
 # -------------------- 控制接口 --------------------
 @APP.get("/control")
 async def control(command: str = None):
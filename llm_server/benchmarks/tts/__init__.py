@@ -0,0 +1,15 @@
+"""
+GPT-SoVITS CPU性能基准
+
+按配置构建随机权重的 T2S(Text2SemanticDecoder)、SoVITS(SynthesizerTrn v2/v2Pro)、BERT、HuBERT、
+说话人识别模型和 g2pW, 不需要下载任何预训练模型. 在不同文本长度、batch_size、线程数下
+分别计时 TTS.run (api_v3) 与 api.get_tts_wav (api) 的各推理阶段, 输出JSON结果, 可与基线对比.
+
+    cd llm_server
+    python -m benchmarks.tts.run --json results/base.json
+    # 修改代码后与基线对比, 耗时变差超过 --tolerance 时返回非0
+    python -m benchmarks.tts.run --baseline results/base.json
+
+随机权重的T2S不会自然生成EOS, 生成的语义token数按 --tokens-per-phone 与文本音素数固定,
+保证不同代码版本之间每次运行的解码步数相同.
+"""
@@ -0,0 +1,303 @@
+"""
+随机权重模型构建
+
+按GPT-SoVITS推理代码读取的格式写出全部模型文件:
+T2S ckpt({"config", "weight"}), SoVITS pth(v2Pro带版本头), BERT/HuBERT(save_pretrained目录),
+说话人识别模型和g2pW(onnx). 其中说话人识别模型与g2pW的路径在推理代码中写死为相对当前目录的
+GPT_SoVITS/..., 因此工作目录按同样的结构组织, 推理进程在工作目录中运行.
+
+full 与预训练模型结构一致, 计时接近真实模型; tiny 缩小层数与宽度, 用于快速回归对比.
+"""
+
+import json
+import math
+import os
+import sys
+
+import numpy as np
+import torch
+
+LLM_SERVER_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+GPT_SOVITS_DIR = os.path.join(LLM_SERVER_DIR, "GPT_SoVITS")
+
+# 推理代码中写死的相对路径
+SV_PATH = "GPT_SoVITS/pretrained_models/sv/pretrained_eres2netv2w24s4ep4.ckpt"
+G2PW_DIR = "GPT_SoVITS/text/G2PWModel"
+
+VERSIONS = ("v2", "v2Pro")
+SOVITS_CONFIGS = {"v2": "s2.json", "v2Pro": "s2v2Pro.json"}
+
+REFERENCE_TEXT = "今天天气很好，我们一起去公园散步吧。"
+REFERENCE_SECONDS = 4.0
+
+# 各模型相对预训练模型结构的修改. BERT隐层维度(1024)、HuBERT隐层维度(768)、
+# SoVITS的hidden/inter/gin_channels 在模型代码中写死, 不能缩小
+SIZES = {
+    "full": {
+        "t2s": {"embedding_dim": 512, "hidden_dim": 512, "head": 16, "n_layer": 24},
+        "sovits": {},
+        "bert": {"num_hidden_layers": 24, "num_attention_heads": 16, "intermediate_size": 4096},
+        "hubert": {},
+        "g2pw": {"hidden_size": 768, "num_hidden_layers": 12, "num_attention_heads": 12, "intermediate_size": 3072},
+    },
+    "tiny": {
+        "t2s": {"embedding_dim": 128, "hidden_dim": 128, "head": 4, "n_layer": 2},
+        "sovits": {"n_layers": 2, "filter_channels": 256, "upsample_initial_channel": 64},
+        "bert": {"num_hidden_layers": 2, "num_attention_heads": 16, "intermediate_size": 1024},
+        "hubert": {
+            "num_hidden_layers": 2,
+            "intermediate_size": 1024,
+            "conv_dim": (128,) * 7,
+        },
+        "g2pw": {"hidden_size": 128, "num_hidden_layers": 2, "num_attention_heads": 4, "intermediate_size": 256},
+    },
+}
+
+
+def setup_paths():
+    """与 api.py 相同, 让 GPT_SoVITS 下的模块可以直接导入"""
+    for path in (os.path.join(GPT_SOVITS_DIR, "eres2net"), GPT_SOVITS_DIR, LLM_SERVER_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def build_vocab():
+    """与中文BERT词表结构相同: 特殊符号 + ASCII + 中文标点 + 常用汉字, 每个汉字一个token"""
+    vocab = ["[PAD]"] + [f"[unused{i}]" for i in range(1, 100)] + ["[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    vocab += [chr(c) for c in range(33, 127) if not chr(c).isupper()]
+    vocab += list("，。！？、；：“”‘’（）《》【】…—～·")
+    vocab += [chr(c) for c in range(0x4E00, 0x9FA6)]
+    return vocab
+
+
+def t2s_config(size):
+    model = {"vocab_size": 1025, "phoneme_vocab_size": 732, "EOS": 1024, "dropout": 0.0}
+    model.update(SIZES[size]["t2s"])
+    return {"model": model, "data": {"max_sec": 54}, "inference": {"top_k": 15}, "train": {}, "optimizer": {}}
+
+
+def sovits_config(version, size):
+    with open(os.path.join(GPT_SOVITS_DIR, "configs", SOVITS_CONFIGS[version]), "r", encoding="utf-8") as f:
+        hps = json.load(f)
+    hps["model"].update(SIZES[size]["sovits"])
+    hps["model"]["version"] = version
+    return hps
+
+
+def _randomize_codebooks(model):
+    # 未训练的码本为全0(等待kmeans初始化), 提取参考音频语义token时所有帧会落到同一个码字上
+    for module in model.modules():
+        if hasattr(module, "embed") and hasattr(module, "inited"):
+            module.embed.data.normal_()
+            module.embed_avg.data.copy_(module.embed.data)
+            module.inited.data.fill_(1)
+
+
+def build_t2s(path, size):
+    from AR.models.t2s_lightning_module import Text2SemanticLightningModule
+
+    config = t2s_config(size)
+    model = Text2SemanticLightningModule(config, "****", is_train=False)
+    torch.save({"config": config, "weight": model.state_dict(), "info": f"benchmark-{size}"}, path)
+
+
+def build_sovits(path, version, size):
+    from module.models import SynthesizerTrn
+    from process_ckpt import my_save2
+
+    hps = sovits_config(version, size)
+    model = SynthesizerTrn(
+        hps["data"]["filter_length"] // 2 + 1,
+        hps["train"]["segment_size"] // hps["data"]["hop_length"],
+        n_speakers=hps["data"]["n_speakers"],
+        **hps["model"],
+    )
+    _randomize_codebooks(model)
+    # 与训练后导出的权重一致, 不含推理用不到的后验编码器
+    weight = {key: value for key, value in model.state_dict().items() if not key.startswith("enc_q.")}
+    data = {"config": hps, "weight": weight, "info": f"benchmark-{size}"}
+    if version == "v2":
+        torch.save(data, path)
+    else:
+        my_save2(data, path, version)
+
+
+def build_bert(path, size, vocab):
+    from transformers import BertConfig, BertForMaskedLM, BertTokenizerFast
+
+    os.makedirs(path, exist_ok=True)
+    vocab_path = os.path.join(path, "vocab.txt")
+    with open(vocab_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab) + "\n")
+    config = BertConfig(vocab_size=len(vocab), hidden_size=1024, **SIZES[size]["bert"])
+    BertForMaskedLM(config).eval().save_pretrained(path)
+    BertTokenizerFast(vocab_file=vocab_path, do_lower_case=True).save_pretrained(path)
+
+
+def build_hubert(path, size):
+    from transformers import HubertConfig, HubertModel, Wav2Vec2FeatureExtractor
+
+    config = HubertConfig(hidden_size=768, **SIZES[size]["hubert"])
+    HubertModel(config).eval().save_pretrained(path)
+    Wav2Vec2FeatureExtractor(
+        feature_size=1, sampling_rate=16000, padding_value=0.0, do_normalize=True, return_attention_mask=False
+    ).save_pretrained(path)
+
+
+def build_sv(path):
+    from ERes2NetV2 import ERes2NetV2
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    torch.save(ERes2NetV2(baseWidth=24, scale=4, expansion=4).state_dict(), path)
+
+
+class G2PWStandIn(torch.nn.Module):
+    """与g2pW相同的输入输出: BERT编码后取待预测字的位置, 加上字嵌入后分类到该字的候选读音"""
+
+    def __init__(self, vocab_size, num_chars, num_labels, size):
+        super().__init__()
+        from transformers import BertConfig, BertModel
+
+        config = BertConfig(vocab_size=vocab_size, **SIZES[size]["g2pw"])
+        self.bert = BertModel(config, add_pooling_layer=False)
+        self.char_embedding = torch.nn.Embedding(num_chars, config.hidden_size)
+        self.classifier = torch.nn.Linear(config.hidden_size, num_labels)
+
+    def forward(self, input_ids, token_type_ids, attention_mask, phoneme_mask, char_ids, position_ids):
+        hidden = self.bert(
+            input_ids=input_ids, token_type_ids=token_type_ids, attention_mask=attention_mask
+        ).last_hidden_state
+        selected = hidden[torch.arange(hidden.shape[0]), position_ids]
+        probs = torch.softmax(self.classifier(selected + self.char_embedding(char_ids)), dim=-1) * phoneme_mask
+        return probs / probs.sum(dim=-1, keepdim=True)
+
+
+def g2pw_charsets():
+    """按pypinyin的多音字表划分多音字/单音字, 标签为带声调数字的拼音"""
+    from pypinyin import Style, pinyin
+
+    polyphonic, monophonic = [], []
+    for code in range(0x4E00, 0x9FA6):
+        char = chr(code)
+        readings = pinyin(char, style=Style.TONE3, heteronym=True, neutral_tone_with_five=True)[0]
+        readings = [r for r in dict.fromkeys(readings) if r[-1:] in "12345" and r[:-1].isalpha()]
+        if len(readings) > 1:
+            polyphonic += [(char, reading) for reading in readings]
+        elif len(readings) == 1:
+            monophonic.append((char, readings[0]))
+    return polyphonic, monophonic
+
+
+def build_g2pw(path, size, vocab):
+    from text.g2pw.dataset import get_phoneme_labels
+
+    os.makedirs(path, exist_ok=True)
+    polyphonic, monophonic = g2pw_charsets()
+    with open(os.path.join(path, "POLYPHONIC_CHARS.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(f"{char}\t{label}" for char, label in polyphonic))
+    with open(os.path.join(path, "MONOPHONIC_CHARS.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(f"{char}\t{label}" for char, label in monophonic))
+    # 标签本身已经是拼音, 去掉声调后原样映射
+    syllables = sorted({label[:-1] for _, label in polyphonic + monophonic})
+    with open(os.path.join(path, "bopomofo_to_pinyin_wo_tune_dict.json"), "w", encoding="utf-8") as f:
+        json.dump({syllable: syllable for syllable in syllables}, f, ensure_ascii=False)
+    with open(os.path.join(path, "char_bopomofo_dict.json"), "w", encoding="utf-8") as f:
+        json.dump({}, f)
+    with open(os.path.join(path, "config.py"), "w", encoding="utf-8") as f:
+        f.write('model_source = "bert-base-chinese"\nuse_mask = True\nuse_char_phoneme = False\n')
+
+    labels, char2phonemes = get_phoneme_labels([list(item) for item in polyphonic])
+    model = G2PWStandIn(len(vocab), len(char2phonemes), len(labels), size).eval()
+    inputs = (
+        torch.ones(2, 8, dtype=torch.long),
+        torch.zeros(2, 8, dtype=torch.long),
+        torch.ones(2, 8, dtype=torch.long),
+        torch.ones(2, len(labels), dtype=torch.float32),
+        torch.zeros(2, dtype=torch.long),
+        torch.ones(2, dtype=torch.long),
+    )
+    names = ["input_ids", "token_type_ids", "attention_mask", "phoneme_mask", "char_ids", "position_ids"]
+    dynamic_axes = {name: {0: "batch"} for name in names}
+    for name in names[:3]:
+        dynamic_axes[name][1] = "tokens"
+    dynamic_axes["probs"] = {0: "batch"}
+    kwargs = {}
+    if "dynamo" in torch.onnx.export.__code__.co_varnames:
+        kwargs["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            inputs,
+            os.path.join(path, "g2pW.onnx"),
+            input_names=names,
+            output_names=["probs"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            **kwargs,
+        )
+
+
+def build_reference(path, seconds=REFERENCE_SECONDS, sr=32000):
+    """带颤音和噪声的谐波信号, 作为参考音频"""
+    import soundfile as sf
+
+    t = np.arange(int(seconds * sr)) / sr
+    f0 = 160 + 20 * np.sin(2 * math.pi * 3 * t)
+    phase = 2 * math.pi * np.cumsum(f0) / sr
+    wav = sum(np.sin(k * phase) / k for k in range(1, 8))
+    wav *= 0.5 + 0.5 * np.abs(np.sin(2 * math.pi * 2 * t))
+    wav += 0.01 * np.random.RandomState(0).randn(len(t))
+    wav = 0.3 * wav / np.abs(wav).max()
+    sf.write(path, wav.astype(np.float32), sr)
+
+
+def build_artifacts(workdir, size="tiny", versions=VERSIONS, seed=0, log=print):
+    """在工作目录中构建模型文件, 已构建且配置一致的直接复用, 返回各文件路径"""
+    setup_paths()
+    workdir = os.path.abspath(workdir)
+    weights_dir = os.path.join(workdir, "weights")
+    os.makedirs(weights_dir, exist_ok=True)
+    manifest_path = os.path.join(workdir, "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    if manifest.get("size") != size or manifest.get("seed") != seed:
+        manifest = {"size": size, "seed": seed, "built": []}
+
+    paths = {
+        "workdir": workdir,
+        "t2s": os.path.join(weights_dir, f"t2s-{size}.ckpt"),
+        "bert": os.path.join(weights_dir, f"bert-{size}"),
+        "hubert": os.path.join(weights_dir, f"hubert-{size}"),
+        "sv": os.path.join(workdir, SV_PATH),
+        "g2pw": os.path.join(workdir, G2PW_DIR),
+        "reference": os.path.join(workdir, "reference.wav"),
+        "reference_text": REFERENCE_TEXT,
+    }
+    for version in versions:
+        paths[f"sovits_{version}"] = os.path.join(weights_dir, f"sovits-{version}-{size}.pth")
+
+    vocab = build_vocab()
+    builders = {
+        "t2s": lambda: build_t2s(paths["t2s"], size),
+        "bert": lambda: build_bert(paths["bert"], size, vocab),
+        "hubert": lambda: build_hubert(paths["hubert"], size),
+        "sv": lambda: build_sv(paths["sv"]),
+        "g2pw": lambda: build_g2pw(paths["g2pw"], size, vocab),
+        "reference": lambda: build_reference(paths["reference"]),
+    }
+    for version in versions:
+        builders[f"sovits_{version}"] = lambda version=version: build_sovits(paths[f"sovits_{version}"], version, size)
+
+    for name, builder in builders.items():
+        if name in manifest["built"] and os.path.exists(paths[name]):
+            continue
+        log(f"构建随机权重模型: {name} ({size})")
+        # 每个模型单独设种子, 只重建其中一个时其余模型的权重不变
+        torch.manual_seed(seed + sum(map(ord, name)))
+        builder()
+        manifest["built"].append(name)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return paths
@@ -0,0 +1,322 @@
+"""
+基准测试进程
+
+由 run.py 在构建好的工作目录中启动(说话人识别模型与g2pW按相对当前目录的路径加载), 每个进程加载一个模型版本:
+TTS.run 与 api.get_tts_wav 都按 文本长度 × batch_size × 线程数 计时.
+各阶段耗时取自推理代码记录的 RequestTimings, 参考音频特征提取单独计时.
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+from benchmarks.tts.artifacts import REFERENCE_TEXT, setup_paths
+
+# 推理代码中的模块按 GPT_SoVITS 目录导入, 必须在导入推理代码之前设置
+setup_paths()
+
+import numpy as np
+import torch
+
+TEXTS = {
+    "short": "欢迎来到魔法角色扮演的世界。",
+    "medium": (
+        "清晨的阳光洒在古老的城墙上，街道两旁的小店陆续开门。"
+        "卖早点的老人熟练地揉着面团，空气里弥漫着豆浆的香味。"
+        "一只花猫懒洋洋地趴在台阶上，看着来来往往的行人。"
+        "新的一天就这样开始了。"
+    ),
+    "long": (
+        "很久以前，在一座被群山环绕的小镇上，住着一位年轻的魔法师。"
+        "她每天清晨都会爬上镇子后面的山坡，对着初升的太阳练习咒语。"
+        "镇上的人们一开始觉得她很奇怪，后来却渐渐习惯了山坡上闪烁的光芒。"
+        "有一年冬天，一场突如其来的暴风雪封住了所有的道路，镇上的粮食只够吃十几天。"
+        "年轻的魔法师没有犹豫，她带着自己的魔杖，顶着风雪走进了深山。"
+        "三天之后，人们在镇口看到了一条被融化的积雪铺成的小路，一直通向远方的城市。"
+        "从那以后，每当有人问起那条路是怎么来的，老人们总会笑着指向山坡上的那间小木屋。"
+        "而那位魔法师，依然每天清晨在山坡上练习她的咒语，仿佛什么都没有发生过一样。"
+    ),
+}
+
+
+class EosPacer:
+    """
+    固定T2S每句生成的token数
+
+    随机权重的T2S几乎不会采样到EOS, 会一直解码到最大长度. 在输出层上挂钩子:
+    每句按 (音素数 - 参考文本音素数) × tokens_per_phone 计算目标长度, 未到目标长度时屏蔽EOS, 到达后强制输出EOS.
+    batch解码时已结束的句子会从batch中移除, 钩子按同样的顺序移除对应的目标长度.
+    """
+
+    def __init__(self, decoder, tokens_per_phone, prompt_phones):
+        self.eos = decoder.EOS
+        self.tokens_per_phone = tokens_per_phone
+        self.prompt_phones = prompt_phones
+        self._pending = []
+        self._targets = []
+        self._forced = []
+        self._step = 0
+        self._handles = [
+            decoder.ar_text_embedding.register_forward_hook(self._on_text),
+            decoder.ar_predict_layer.register_forward_hook(self._on_logits),
+        ]
+
+    def _on_text(self, module, inputs, output):
+        x = inputs[0]
+        phones = x.shape[-1] - self.prompt_phones()
+        rows = x.shape[0] if x.dim() > 1 else 1
+        self._pending += [max(1, round(phones * self.tokens_per_phone))] * rows
+
+    def _on_logits(self, module, inputs, logits):
+        if self._pending:
+            # 新的一次解码
+            self._targets, self._pending, self._forced, self._step = self._pending, [], [], 0
+        elif self._forced and logits.shape[0] == len(self._targets) - len(self._forced):
+            self._targets = [target for i, target in enumerate(self._targets) if i not in self._forced]
+        self._step += 1
+        logits = logits.clone()
+        logits[:, self.eos] = -1e4
+        self._forced = [i for i, target in enumerate(self._targets) if self._step >= target]
+        if self._forced:
+            logits[self._forced, self.eos] = 1e4
+        return logits
+
+    def close(self):
+        for handle in self._handles:
+            handle.remove()
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def summarize(samples, **extra):
+    """多次运行的结果汇总, 耗时单位ms"""
+    walls = [s["wall"] * 1000 for s in samples]
+    stages = {}
+    for sample in samples:
+        for stage, seconds in sample["stages"].items():
+            stages.setdefault(stage, []).append(seconds * 1000)
+        # 未计入任何阶段的耗时(如推理结束后的gc); 流水线中各阶段重叠执行时为负
+        stages.setdefault("other", []).append((sample["wall"] - sum(sample["stages"].values())) * 1000)
+    audio_seconds = float(np.mean([s["audio_seconds"] for s in samples]))
+    tokens = float(np.mean([s["tokens"] for s in samples]))
+    t2s_ms = float(np.mean(stages["t2s"])) if "t2s" in stages else 0.0
+    result = dict(extra)
+    result.update({
+        "runs": len(samples),
+        "wall_ms": {
+            "mean": round(float(np.mean(walls)), 2),
+            "p50": round(percentile(walls, 50), 2),
+            "min": round(min(walls), 2),
+            "max": round(max(walls), 2),
+        },
+        "stages_ms": {stage: round(float(np.mean(values)), 2) for stage, values in stages.items() if stage != "queue"},
+        "tokens": tokens,
+        "audio_seconds": round(audio_seconds, 3),
+        "rtf": round(float(np.mean(walls)) / 1000 / audio_seconds, 4) if audio_seconds > 0 else None,
+        "tokens_per_second": round(tokens / (t2s_ms / 1000), 1) if t2s_ms > 0 else None,
+    })
+    return result
+
+
+def measure(fn, warmup, repeat):
+    for _ in range(warmup):
+        fn()
+    return [fn() for _ in range(repeat)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def prepare_langdetect():
+    """
+    LangSegmenter 切分语种时使用 fast_langdetect 的完整模型, 不存在时会下载.
+    未下载时改用 fast_langdetect 自带的精简模型, 返回实际使用的模型
+    """
+    import fast_langdetect
+    import text.LangSegmenter  # noqa: F401  导入时设置完整模型的缓存目录
+
+    detector = fast_langdetect.infer._default_detector
+    full_model = os.path.join(detector.config.cache_dir, fast_langdetect.infer.FASTTEXT_LARGE_MODEL_NAME)
+    if os.path.exists(full_model):
+        return "full"
+    detector.config.custom_model_path = str(fast_langdetect.infer._LOCAL_SMALL_MODEL_PATH)
+    return "lite"
+
+
+def bench_tts(paths, version, spec, log):
+    from TTS_infer_pack.TTS import TTS, TTS_Config
+    from tools.inference_metrics import RequestTimings
+
+    config = TTS_Config({
+        "custom": {
+            "device": "cpu",
+            "is_half": False,
+            "version": version,
+            "t2s_weights_path": paths["t2s"],
+            "vits_weights_path": paths[f"sovits_{version}"],
+            "bert_base_path": paths["bert"],
+            "cnhuhbert_base_path": paths["hubert"],
+        }
+    })
+    tts = TTS(config)
+    pacer = EosPacer(tts.t2s_model.model, spec["tokens_per_phone"], lambda: len(tts.prompt_cache["phones"]))
+    results = []
+
+    def reference():
+        tts.prompt_cache["ref_audio_path"] = None
+        return {"wall": timed(lambda: tts.set_ref_audio(paths["reference"]))}
+
+    def run(text, batch_size):
+        timings = RequestTimings()
+        inputs = {
+            "text": text,
+            "text_lang": "zh",
+            "ref_audio_path": paths["reference"],
+            "prompt_text": REFERENCE_TEXT,
+            "prompt_lang": "zh",
+            "top_k": 5,
+            "top_p": 1,
+            "temperature": 1,
+            "text_split_method": "cut5",
+            "batch_size": batch_size,
+            "split_bucket": True,
+            "parallel_infer": True,
+            "seed": spec["seed"],
+            "timings": timings,
+        }
+        audio_samples = 0
+        sr = 1
+        start = time.perf_counter()
+        for sr, audio in tts.run(inputs):
+            audio_samples += len(audio)
+        wall = time.perf_counter() - start
+        return {"wall": wall, "stages": timings.stages, "tokens": timings.tokens, "audio_seconds": audio_samples / sr}
+
+    try:
+        for threads in spec["threads"]:
+            torch.set_num_threads(threads)
+            samples = measure(reference, spec["warmup"], spec["repeat"])
+            ms = [s["wall"] * 1000 for s in samples]
+            results.append({
+                "target": "tts", "version": version, "stage": "reference", "threads": threads,
+                "wall_ms": {"mean": round(float(np.mean(ms)), 2), "p50": round(percentile(ms, 50), 2)},
+            })
+            for name in spec["texts"]:
+                for batch_size in spec["batch_sizes"]:
+                    log(f"tts {version} {name} batch_size={batch_size} threads={threads}")
+                    samples = measure(lambda: run(TEXTS[name], batch_size), spec["warmup"], spec["repeat"])
+                    results.append(summarize(
+                        samples, target="tts", version=version, text=name, chars=len(TEXTS[name]),
+                        batch_size=batch_size, threads=threads,
+                    ))
+    finally:
+        pacer.close()
+    return results
+
+
+def bench_api(paths, version, spec, log):
+    sys.argv = [
+        "api.py",
+        "-s", paths[f"sovits_{version}"],
+        "-g", paths["t2s"],
+        "-d", "cpu",
+        "-fp",
+        "-hb", paths["hubert"],
+        "-b", paths["bert"],
+        "-spd", "speakers",
+        "-prd", "profiles",
+        "-prn", "0",
+    ]
+    import api
+    from tools.inference_metrics import RequestTimings
+
+    state = {}
+
+    def reference():
+        wall = timed(lambda: state.update(
+            features=api.get_prompt_features(paths["reference"], REFERENCE_TEXT, "zh")
+        ))
+        return {"wall": wall}
+
+    reference()
+    pacer = EosPacer(
+        api.speaker_list["default"].gpt.t2s_model.model,
+        spec["tokens_per_phone"],
+        lambda: len(state["features"]["phones1"]),
+    )
+    results = []
+
+    def run(text, batch_size):
+        timings = RequestTimings()
+        torch.manual_seed(spec["seed"])
+        start = time.perf_counter()
+        # 与已注册说话人的推理相同, 参考音频特征直接复用
+        for _ in api.get_tts_wav(
+            paths["reference"], REFERENCE_TEXT, "zh", api.cut_text(text, "。！？"), "zh",
+            prompt_features=state["features"], timings=timings, batch_size=batch_size,
+        ):
+            pass
+        wall = time.perf_counter() - start
+        return {"wall": wall, "stages": timings.stages, "tokens": timings.tokens, "audio_seconds": timings.audio_seconds}
+
+    try:
+        for threads in spec["threads"]:
+            torch.set_num_threads(threads)
+            samples = measure(reference, spec["warmup"], spec["repeat"])
+            ms = [s["wall"] * 1000 for s in samples]
+            results.append({
+                "target": "api", "version": version, "stage": "reference", "threads": threads,
+                "wall_ms": {"mean": round(float(np.mean(ms)), 2), "p50": round(percentile(ms, 50), 2)},
+            })
+            for name in spec["texts"]:
+                for batch_size in spec["batch_sizes"]:
+                    log(f"api {version} {name} batch_size={batch_size} threads={threads}")
+                    samples = measure(lambda: run(TEXTS[name], batch_size), spec["warmup"], spec["repeat"])
+                    results.append(summarize(
+                        samples, target="api", version=version, text=name, chars=len(TEXTS[name]),
+                        batch_size=batch_size, threads=threads,
+                    ))
+    finally:
+        pacer.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS基准测试进程(由 benchmarks.tts.run 启动)")
+    parser.add_argument("--spec", required=True, help="测试配置json")
+    parser.add_argument("--output", required=True, help="结果保存路径")
+    args = parser.parse_args()
+    with open(args.spec, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    paths = spec["paths"]
+    # chinese2 导入时按环境变量 bert_path 加载g2pW的分词器
+    os.environ["bert_path"] = paths["bert"]
+
+    def log(message):
+        print(f"[bench] {message}", file=sys.stderr, flush=True)
+
+    langdetect = prepare_langdetect()
+    log(f"语种识别模型: {langdetect}")
+    results = []
+    if "tts" in spec["targets"]:
+        results += bench_tts(paths, spec["version"], spec, log)
+    if "api" in spec["targets"]:
+        results += bench_api(paths, spec["version"], spec, log)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "results": results,
+            "langdetect": langdetect,
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
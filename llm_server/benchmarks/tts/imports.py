@@ -0,0 +1,121 @@
+"""
+文本前端冷启动基准
+
+每次计时启动一个新进程: 导入文本前端模块, 再首次处理一句文本(按需加载g2pW、词典等),
+分别记录导入耗时、首次处理耗时与进程内存峰值, 对应 llm_server 启动与worker进程创建时的开销.
+预热进程不计入结果, 词典缓存文件在预热时生成.
+
+    cd llm_server
+    python -m benchmarks.tts.imports
+    python -m benchmarks.tts.imports --scenarios cleaner,zh --repeat 5 --json results/imports.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.tts.artifacts import GPT_SOVITS_DIR, LLM_SERVER_DIR, build_artifacts
+
+# 场景: (导入的模块, 首次处理的文本与语种); 文本为 None 时只计导入
+SCENARIOS = {
+    "cleaner": (["text.cleaner"], None),
+    "zh": (["text.cleaner", "text.chinese2"], ("欢迎来到魔法角色扮演的世界，重庆的长江大桥很长。", "zh")),
+    "en": (["text.cleaner", "text.english"], ("Welcome to the world of magic role play.", "en")),
+}
+
+CHILD_CODE = """
+import importlib, json, resource, sys, time
+modules, sample = json.loads(sys.argv[1])
+start = time.perf_counter()
+for module in modules:
+    importlib.import_module(module)
+imported = time.perf_counter()
+if sample is not None:
+    from text.cleaner import clean_text
+    clean_text(sample[0], sample[1], "v2")
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_call_ms": (done - imported) * 1000 if sample is not None else None,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def run_child(scenario, workdir, env):
+    modules, sample = SCENARIOS[scenario]
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-c", CHILD_CODE, json.dumps([modules, sample])],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if process.returncode != 0:
+        raise RuntimeError(f"场景 {scenario} 失败:\n{process.stderr[-3000:]}")
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["process_ms"] = wall_ms
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本前端冷启动基准(每次计时启动新进程)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔, 可选 " + ",".join(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3, help="每个场景计时的次数")
+    parser.add_argument("--warmup", type=int, default=1, help="每个场景预热的次数, 不计入结果")
+    parser.add_argument("--workdir", default=None, help="g2pW与BERT分词器所在目录, 与 benchmarks.tts.run 共用")
+    parser.add_argument("--json", default=None, help="结果保存路径")
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"--scenarios 不支持: {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or os.path.join(tempfile.gettempdir(), "gpt_sovits_bench_tiny")
+    paths = build_artifacts(workdir, "tiny", ["v2"])
+    env = dict(os.environ)
+    # 与 setup_paths 相同
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.join(GPT_SOVITS_DIR, "eres2net"), GPT_SOVITS_DIR, LLM_SERVER_DIR, env.get("PYTHONPATH", "")]
+    )
+    # chinese2 按环境变量 bert_path 加载g2pW的分词器
+    env["bert_path"] = paths["bert"]
+
+    results = []
+    header = f"{'scenario':<12}{'import':>10}{'first':>10}{'process':>10}{'rss_mb':>10}"
+    print(header)
+    print("-" * len(header))
+    for scenario in scenarios:
+        try:
+            for _ in range(args.warmup):
+                run_child(scenario, paths["workdir"], env)
+            runs = [run_child(scenario, paths["workdir"], env) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            lines = [line for line in str(e).splitlines() if line.strip()]
+            print(f"{scenario:<12}{'失败':>10}  {lines[-1]}")
+            continue
+        result = {"scenario": scenario, "repeat": args.repeat}
+        for key in ("import_ms", "first_call_ms", "process_ms", "max_rss_mb"):
+            values = [run[key] for run in runs if run[key] is not None]
+            result[key] = statistics.median(values) if values else None
+        results.append(result)
+        row = f"{scenario:<12}{result['import_ms']:>10.0f}"
+        row += f"{result['first_call_ms']:>10.0f}" if result["first_call_ms"] is not None else f"{'-':>10}"
+        row += f"{result['process_ms']:>10.0f}{result['max_rss_mb']:>10.0f}"
+        print(row)
+    print("(耗时为中位数, 单位: ms; process 包含解释器启动)")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
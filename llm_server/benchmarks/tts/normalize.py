@@ -0,0 +1,107 @@
+"""
+中文文本规范化: 标准输出校验与吞吐量基准
+
+normalize_corpus.txt 每行一段文本, 覆盖日期、时间、电话、分数、百分比、温度、单位、算式、次方、
+希腊字母、繁体与全角字符等情况. normalize_golden.jsonl 保存各段文本经 TextNormalizer.normalize
+与 chinese2.text_normalize 处理后的标准输出, 修改规范化代码后输出必须与之完全一致.
+
+    cd llm_server
+    python -m benchmarks.tts.normalize                 # 校验并计时, 输出不一致时返回非0
+    python -m benchmarks.tts.normalize --repeat 50 --json results/normalize.json
+    python -m benchmarks.tts.normalize --update        # 规范化规则有意修改后重新生成标准输出
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks.tts.artifacts import setup_paths
+
+# 推理代码中的模块按 GPT_SoVITS 目录导入, 必须在导入推理代码之前设置
+setup_paths()
+
+from text import chinese2
+from text.zh_normalization.text_normlization import TextNormalizer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(BENCH_DIR, "normalize_corpus.txt")
+GOLDEN_PATH = os.path.join(BENCH_DIR, "normalize_golden.jsonl")
+
+
+def load_corpus():
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def normalize(text):
+    return {"text": text, "sentences": TextNormalizer().normalize(text), "zh": chinese2.text_normalize(text)}
+
+
+def check(corpus):
+    """返回与标准输出不一致的项"""
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as f:
+        golden = {item["text"]: item for item in map(json.loads, f)}
+    mismatches = []
+    for text in corpus:
+        expected = golden.get(text)
+        actual = normalize(text)
+        if expected is None or expected != actual:
+            mismatches.append((expected, actual))
+    return mismatches
+
+
+def throughput(func, corpus, repeat):
+    chars = sum(len(text) for text in corpus) * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in corpus:
+            func(text)
+    return chars / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="中文文本规范化标准输出校验与吞吐量基准")
+    parser.add_argument("--repeat", type=int, default=20, help="计时时语料重复的次数")
+    parser.add_argument("--update", action="store_true", help="按当前代码重新生成标准输出")
+    parser.add_argument("--json", default=None, help="结果保存路径")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    if args.update:
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            for text in corpus:
+                f.write(json.dumps(normalize(text), ensure_ascii=False) + "\n")
+        print(f"标准输出已更新: {GOLDEN_PATH} ({len(corpus)} 条)")
+        return
+
+    mismatches = check(corpus)
+    for expected, actual in mismatches[:10]:
+        print(f"不一致: {actual['text']}")
+        print(f"  标准: {expected and {k: expected[k] for k in ('sentences', 'zh')}}")
+        print(f"  当前: {({k: actual[k] for k in ('sentences', 'zh')})}")
+    print(f"标准输出校验: {len(corpus) - len(mismatches)}/{len(corpus)} 一致")
+
+    # 预热, 导入与正则编译不计入
+    for text in corpus:
+        normalize(text)
+    normalizer = TextNormalizer()
+    results = {
+        "TextNormalizer.normalize": throughput(normalizer.normalize, corpus, args.repeat),
+        "chinese2.text_normalize": throughput(chinese2.text_normalize, corpus, args.repeat),
+    }
+    for name, chars_per_second in results.items():
+        print(f"{name:<28}{chars_per_second:>12,.0f} 字/秒")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"chars_per_second": results, "mismatches": len(mismatches)}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.json}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
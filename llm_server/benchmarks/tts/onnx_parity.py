@@ -0,0 +1,163 @@
+"""
+ONNX Runtime 后端: 与PyTorch推理的一致性校验与速度对比
+
+使用与 benchmarks.tts.run 相同的随机权重模型, 按 tools/onnx_backend.py 导出后与PyTorch模型对比:
+- T2S: top_k=1 贪心解码固定数量的token, 比较生成的语义token与耗时
+- VITS: noise_scale=0, 用同一组语义token解码, 比较音频的最大误差与耗时
+fp32 的token必须完全一致、音频误差不超过 --atol, 否则返回非0; int8量化(--quantize)只报告一致率与耗时.
+
+    cd llm_server
+    python -m benchmarks.tts.onnx_parity
+    python -m benchmarks.tts.onnx_parity --size full --tokens 300 --quantize --json results/onnx.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.tts.artifacts import build_artifacts, setup_paths
+
+# 推理代码中的模块按 GPT_SoVITS 目录导入, 必须在导入推理代码之前设置
+setup_paths()
+
+import numpy as np
+import torch
+
+from AR.models.t2s_lightning_module import Text2SemanticLightningModule
+from module.models import SynthesizerTrn
+from process_ckpt import load_sovits_new
+from TTS_infer_pack.TTS import DictToAttrRecursive
+from tools import onnx_backend
+
+
+def load_torch_models(gpt_path, sovits_path, version):
+    dict_s1 = torch.load(gpt_path, map_location="cpu", weights_only=False)
+    t2s_model = Text2SemanticLightningModule(dict_s1["config"], "****", is_train=False)
+    t2s_model.load_state_dict(dict_s1["weight"])
+    t2s_model = t2s_model.model.eval()
+
+    dict_s2 = load_sovits_new(sovits_path)
+    hps = DictToAttrRecursive(dict_s2["config"])
+    hps.model.semantic_frame_rate = "25hz"
+    hps.model.version = version
+    vq_model = SynthesizerTrn(
+        hps.data.filter_length // 2 + 1,
+        hps.train.segment_size // hps.data.hop_length,
+        n_speakers=hps.data.n_speakers,
+        **hps.model,
+    )
+    vq_model.load_state_dict(dict_s2["weight"], strict=False)
+    return t2s_model, vq_model.eval(), hps
+
+
+def timed(fn, repeat):
+    """返回最后一次的结果与最短耗时"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX Runtime 后端与PyTorch推理的一致性校验与速度对比")
+    parser.add_argument("--size", default="tiny", choices=["tiny", "full"], help="随机权重模型的规模")
+    parser.add_argument("--version", default="v2", choices=["v2", "v2Pro"], help="SoVITS模型版本")
+    parser.add_argument("--tokens", type=int, default=100, help="T2S解码的token数")
+    parser.add_argument("--phonemes", type=int, default=30, help="音素数")
+    parser.add_argument("--repeat", type=int, default=3, help="计时次数, 取最短耗时")
+    parser.add_argument("--threads", type=int, default=1, help="torch与ONNX Runtime使用的线程数")
+    parser.add_argument("--quantize", action="store_true", help="同时对比int8量化的T2S")
+    parser.add_argument("--atol", type=float, default=1e-3, help="fp32音频允许的最大误差")
+    parser.add_argument("--workdir", default=None, help="模型文件所在目录, 与 benchmarks.tts.run 共用")
+    parser.add_argument("--json", default=None, help="结果保存路径")
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    workdir = args.workdir or os.path.join(tempfile.gettempdir(), f"gpt_sovits_bench_{args.size}")
+    paths = build_artifacts(workdir, args.size, [args.version])
+    gpt_path, sovits_path = paths["t2s"], paths[f"sovits_{args.version}"]
+    t2s_model, vq_model, hps = load_torch_models(gpt_path, sovits_path, args.version)
+    cache_dir = os.path.join(paths["workdir"], "onnx_cache")
+
+    torch.manual_seed(0)
+    phoneme_ids = torch.randint(1, 300, (1, args.phonemes))
+    bert = torch.randn(1024, args.phonemes)
+    prompt = torch.randint(0, 1024, (1, 40))
+    refer = torch.randn(1, hps.data.filter_length // 2 + 1, 200).abs()
+    sv_emb = torch.randn(1, 20480) if vq_model.is_v2pro else None
+
+    def torch_t2s():
+        with torch.no_grad():
+            y, idx = t2s_model.infer_panel(
+                phoneme_ids,
+                torch.tensor([args.phonemes]),
+                prompt,
+                bert[None],
+                top_k=1,
+                top_p=1,
+                temperature=1,
+                early_stop_num=args.tokens,
+            )
+        return y[0, -idx:]
+
+    def torch_vits(codes):
+        with torch.no_grad():
+            sv = [sv_emb] if sv_emb is not None else None
+            return vq_model.decode(codes, phoneme_ids, [refer], noise_scale=0, sv_emb=sv).numpy()
+
+    reference, t2s_seconds = timed(torch_t2s, args.repeat)
+    codes = reference.view(1, 1, -1)
+    reference_audio, vits_seconds = timed(lambda: torch_vits(codes), args.repeat)
+    results = [{"backend": "torch", "tokens": len(reference), "t2s_s": t2s_seconds, "vits_s": vits_seconds}]
+
+    failed = False
+    for quantize in [False, True] if args.quantize else [False]:
+        start = time.perf_counter()
+        models = onnx_backend.load(gpt_path, sovits_path, hps, cache_dir, quantize, args.threads)
+        load_seconds = time.perf_counter() - start
+        tokens, t2s_seconds = timed(
+            lambda: models.infer_semantic(phoneme_ids[0].tolist(), bert, prompt, 1, 1, 1, args.tokens), args.repeat
+        )
+        audio, vits_seconds = timed(lambda: models.decode_vits(codes, phoneme_ids, refer, sv_emb, 0), args.repeat)
+        length = min(len(tokens), len(reference))
+        agreement = (tokens[:length] == reference[:length]).float().mean().item() if length else 0.0
+        result = {
+            "backend": "onnx-int8" if quantize else "onnx",
+            "tokens": len(tokens),
+            "t2s_s": t2s_seconds,
+            "vits_s": vits_seconds,
+            "load_s": load_seconds,
+            "token_agreement": agreement,
+            "audio_max_abs_diff": float(np.abs(audio - reference_audio).max()),
+        }
+        results.append(result)
+        if not quantize and (len(tokens) != len(reference) or agreement < 1 or result["audio_max_abs_diff"] > args.atol):
+            failed = True
+
+    header = f"{'backend':<12}{'tokens':>8}{'t2s_s':>10}{'vits_s':>10}{'load_s':>10}{'agree':>8}{'max_diff':>12}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        row = f"{result['backend']:<12}{result['tokens']:>8}{result['t2s_s']:>10.3f}{result['vits_s']:>10.3f}"
+        if "load_s" in result:
+            row += f"{result['load_s']:>10.1f}{result['token_agreement']:>8.1%}{result['audio_max_abs_diff']:>12.2e}"
+        print(row)
+    print("(load_s 包含首次导出; agree 为与PyTorch贪心解码的token一致率, max_diff 为VITS音频最大误差)")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"size": args.size, "version": args.version, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.json}")
+    if failed:
+        print("fp32 ONNX 结果与PyTorch不一致")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+TTS基准测试入口
+
+构建随机权重模型(已构建的直接复用), 每个模型版本启动一个测试进程, 汇总输出各组合的耗时与各阶段耗时.
+
+    cd llm_server
+    python -m benchmarks.tts.run --json results/base.json
+    python -m benchmarks.tts.run --size full --versions v2 --texts short,long --batch-sizes 1,4 --threads 4
+    # 与基线对比, p50耗时变差超过 --tolerance 时返回非0
+    python -m benchmarks.tts.run --baseline results/base.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import torch
+
+from benchmarks.tts.artifacts import LLM_SERVER_DIR, SIZES, VERSIONS, build_artifacts
+
+TARGETS = ("tts", "api")
+TEXT_NAMES = ("short", "medium", "long")
+
+
+def parse_list(value, cast=str):
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+def result_key(result):
+    if result.get("stage") == "reference":
+        return f"{result['target']}/{result['version']}/reference/t{result['threads']}"
+    return f"{result['target']}/{result['version']}/{result['text']}/bs{result['batch_size']}/t{result['threads']}"
+
+
+def run_worker(spec, workdir):
+    """在工作目录中启动测试进程, 推理代码按相对当前目录的路径加载说话人识别模型与g2pW"""
+    spec_path = os.path.join(workdir, f"spec-{spec['version']}.json")
+    output_path = os.path.join(workdir, f"result-{spec['version']}.json")
+    with open(spec_path, "w", encoding="utf-8") as f:
+        json.dump(spec, f, ensure_ascii=False, indent=2)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = LLM_SERVER_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    command = [sys.executable, "-m", "benchmarks.tts.bench", "--spec", spec_path, "--output", output_path]
+    log_path = os.path.join(workdir, f"bench-{spec['version']}.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.PIPE, text=True)
+        # 进度信息输出到stderr, 其余输出(推理代码的print)写入日志
+        for line in process.stderr:
+            if line.startswith("[bench]"):
+                print(line.rstrip(), flush=True)
+            else:
+                log.write(line)
+        process.wait()
+    if process.returncode != 0:
+        with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+            tail = "".join(f.readlines()[-30:])
+        raise RuntimeError(f"测试进程失败({spec['version']}), 日志: {log_path}\n{tail}")
+    with open(output_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_report(results):
+    header = (
+        f"{'target/version/text':<24}{'bs':>4}{'thr':>5}{'p50':>10}{'mean':>10}"
+        f"{'frontend':>10}{'t2s':>10}{'vits':>10}{'other':>10}{'tok/s':>8}{'audio':>8}{'rtf':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if r.get("stage") == "reference":
+            continue
+        stages = r["stages_ms"]
+        row = f"{r['target'] + '/' + r['version'] + '/' + r['text']:<24}{r['batch_size']:>4}{r['threads']:>5}"
+        row += f"{r['wall_ms']['p50']:>10.0f}{r['wall_ms']['mean']:>10.0f}"
+        for stage in ("frontend", "t2s", "vits", "other"):
+            row += f"{stages[stage]:>10.0f}" if stage in stages else f"{'-':>10}"
+        row += f"{r['tokens_per_second'] or 0:>8.0f}{r['audio_seconds']:>8.2f}{r['rtf'] or 0:>8.3f}"
+        print(row)
+    print("(耗时单位: ms, audio: 秒)")
+    for r in results:
+        if r.get("stage") == "reference":
+            print(f"参考音频特征提取 {r['target']}/{r['version']} threads={r['threads']}: {r['wall_ms']['p50']:.0f} ms")
+
+
+def compare(results, baseline, tolerance):
+    """与基线对比, 返回p50耗时变差超过tolerance的项"""
+    base = {result_key(r): r for r in baseline}
+    regressions = []
+    compared = 0
+    print(f"\n与基线对比（容差 {tolerance:.0%}）")
+    for r in results:
+        key = result_key(r)
+        if key not in base:
+            continue
+        before, after = base[key]["wall_ms"]["p50"], r["wall_ms"]["p50"]
+        change = after / before - 1 if before else 0.0
+        flag = ""
+        if change > tolerance:
+            flag = "  <-- 变差"
+            regressions.append(key)
+        stages = ""
+        for stage, ms in r.get("stages_ms", {}).items():
+            old = base[key].get("stages_ms", {}).get(stage)
+            # 不足1ms的阶段(如命中缓存的参考音频)波动比例没有意义
+            if old and old >= 1:
+                stages += f" {stage} {ms / old - 1:+.0%}"
+        print(f"  {key:<32} p50 {before:>9.0f} -> {after:>9.0f} ms ({change:+.1%}){flag}{stages}")
+        compared += 1
+    if compared == 0:
+        print("  没有与基线相同的组合(版本/文本/batch_size/线程数)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPT-SoVITS CPU基准测试(随机权重, 无需下载模型)")
+    parser.add_argument("--size", default="tiny", choices=sorted(SIZES), help="tiny: 缩小的模型; full: 与预训练模型结构一致")
+    parser.add_argument("--versions", default=",".join(VERSIONS), help="模型版本, 逗号分隔")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="tts: TTS.run(api_v3); api: api.get_tts_wav")
+    parser.add_argument("--texts", default=",".join(TEXT_NAMES), help="文本长度, 逗号分隔")
+    parser.add_argument("--batch-sizes", default="1,4", help="TTS.run 与 api.get_tts_wav 的 batch_size, 逗号分隔")
+    parser.add_argument("--threads", default=str(min(4, os.cpu_count() or 1)), help="torch线程数, 逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3, help="每个组合计时的次数")
+    parser.add_argument("--warmup", type=int, default=1, help="每个组合预热的次数, 不计入结果")
+    parser.add_argument("--tokens-per-phone", type=float, default=2.5, help="每个音素生成的语义token数(25Hz)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="模型文件与临时文件目录, 默认在系统临时目录下按 --size 复用")
+    parser.add_argument("--json", default=None, help="结果保存路径")
+    parser.add_argument("--baseline", default=None, help="对比的基线结果")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="p50耗时变差超过该比例时返回非0")
+    args = parser.parse_args()
+
+    versions = parse_list(args.versions)
+    targets = parse_list(args.targets)
+    texts = parse_list(args.texts)
+    for name, values, allowed in (("versions", versions, VERSIONS), ("targets", targets, TARGETS), ("texts", texts, TEXT_NAMES)):
+        unknown = set(values) - set(allowed)
+        if unknown:
+            parser.error(f"--{name} 不支持: {', '.join(sorted(unknown))}, 可选 {', '.join(allowed)}")
+
+    workdir = args.workdir or os.path.join(tempfile.gettempdir(), f"gpt_sovits_bench_{args.size}")
+    print(f"工作目录: {workdir}")
+    start = time.perf_counter()
+    paths = build_artifacts(workdir, args.size, versions, args.seed)
+    print(f"模型就绪 ({time.perf_counter() - start:.1f}s)")
+
+    config = {
+        "size": args.size,
+        "versions": versions,
+        "targets": targets,
+        "texts": texts,
+        "batch_sizes": parse_list(args.batch_sizes, int),
+        "threads": parse_list(args.threads, int),
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "tokens_per_phone": args.tokens_per_phone,
+        "seed": args.seed,
+    }
+    results = []
+    max_rss_mb = {}
+    langdetect = None
+    for version in versions:
+        spec = dict(config, version=version, paths=paths)
+        output = run_worker(spec, paths["workdir"])
+        results += output["results"]
+        max_rss_mb[version] = output["max_rss_mb"]
+        langdetect = output["langdetect"]
+
+    print()
+    print_report(results)
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": config,
+                "environment": {
+                    "python": platform.python_version(),
+                    "torch": torch.__version__,
+                    "platform": platform.platform(),
+                    "processor": platform.processor(),
+                    "cpu_count": os.cpu_count(),
+                    "max_rss_mb": max_rss_mb,
+                    "langdetect": langdetect,
+                },
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}).get("size") not in (None, args.size):
+            print(f"警告: 基线的模型规模为 {baseline['config']['size']}, 与本次 ({args.size}) 不同")
+        if compare(results, baseline["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
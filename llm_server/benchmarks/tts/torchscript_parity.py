@@ -0,0 +1,123 @@
+"""
+TorchScript 后端: 与PyTorch推理的一致性校验与速度对比
+
+与 benchmarks.tts.onnx_parity 相同的随机权重模型与输入, 按 tools/torchscript_backend.py 导出后与PyTorch模型对比:
+- T2S: top_k=1 贪心解码固定数量的token, 比较生成的语义token与耗时
+- VITS: noise_scale=0, 用同一组语义token解码, 比较音频的最大误差与耗时
+token必须完全一致、音频误差不超过 --atol, 否则返回非0.
+
+    cd llm_server
+    python -m benchmarks.tts.torchscript_parity
+    python -m benchmarks.tts.torchscript_parity --size full --tokens 300 --json results/torchscript.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.tts.artifacts import build_artifacts
+from benchmarks.tts.onnx_parity import load_torch_models, timed
+
+import numpy as np
+import torch
+
+from tools import torchscript_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TorchScript 后端与PyTorch推理的一致性校验与速度对比")
+    parser.add_argument("--size", default="tiny", choices=["tiny", "full"], help="随机权重模型的规模")
+    parser.add_argument("--version", default="v2", choices=["v2", "v2Pro"], help="SoVITS模型版本")
+    parser.add_argument("--tokens", type=int, default=100, help="T2S解码的token数")
+    parser.add_argument("--phonemes", type=int, default=30, help="音素数")
+    parser.add_argument("--repeat", type=int, default=3, help="计时次数, 取最短耗时")
+    parser.add_argument("--threads", type=int, default=1, help="torch使用的线程数")
+    parser.add_argument("--atol", type=float, default=1e-3, help="音频允许的最大误差")
+    parser.add_argument("--workdir", default=None, help="模型文件所在目录, 与 benchmarks.tts.run 共用")
+    parser.add_argument("--json", default=None, help="结果保存路径")
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    workdir = args.workdir or os.path.join(tempfile.gettempdir(), f"gpt_sovits_bench_{args.size}")
+    paths = build_artifacts(workdir, args.size, [args.version])
+    gpt_path, sovits_path = paths["t2s"], paths[f"sovits_{args.version}"]
+    t2s_model, vq_model, hps = load_torch_models(gpt_path, sovits_path, args.version)
+    cache_dir = os.path.join(paths["workdir"], "torchscript_cache")
+
+    torch.manual_seed(0)
+    phoneme_ids = torch.randint(1, 300, (1, args.phonemes))
+    bert = torch.randn(1024, args.phonemes)
+    prompt = torch.randint(0, 1024, (1, 40))
+    refer = torch.randn(1, hps.data.filter_length // 2 + 1, 200).abs()
+    sv_emb = torch.randn(1, 20480) if vq_model.is_v2pro else None
+
+    def torch_t2s():
+        with torch.no_grad():
+            y, idx = t2s_model.infer_panel(
+                phoneme_ids,
+                torch.tensor([args.phonemes]),
+                prompt,
+                bert[None],
+                top_k=1,
+                top_p=1,
+                temperature=1,
+                early_stop_num=args.tokens,
+            )
+        return y[0, -idx:]
+
+    def torch_vits(codes):
+        with torch.no_grad():
+            sv = [sv_emb] if sv_emb is not None else None
+            return vq_model.decode(codes, phoneme_ids, [refer], noise_scale=0, sv_emb=sv).numpy()
+
+    reference, t2s_seconds = timed(torch_t2s, args.repeat)
+    codes = reference.view(1, 1, -1)
+    reference_audio, vits_seconds = timed(lambda: torch_vits(codes), args.repeat)
+    results = [{"backend": "torch", "tokens": len(reference), "t2s_s": t2s_seconds, "vits_s": vits_seconds}]
+
+    start = time.perf_counter()
+    models = torchscript_backend.load(gpt_path, sovits_path, hps, cache_dir)
+    load_seconds = time.perf_counter() - start
+    tokens, t2s_seconds = timed(
+        lambda: models.infer_semantic(phoneme_ids[0].tolist(), bert, prompt, 1, 1, 1, args.tokens), args.repeat
+    )
+    audio, vits_seconds = timed(lambda: models.decode_vits(codes, phoneme_ids, refer, sv_emb, 0), args.repeat)
+    length = min(len(tokens), len(reference))
+    agreement = (tokens[:length] == reference[:length]).float().mean().item() if length else 0.0
+    result = {
+        "backend": "torchscript",
+        "tokens": len(tokens),
+        "t2s_s": t2s_seconds,
+        "vits_s": vits_seconds,
+        "load_s": load_seconds,
+        "token_agreement": agreement,
+        "audio_max_abs_diff": float(np.abs(audio - reference_audio).max()),
+    }
+    results.append(result)
+    failed = len(tokens) != len(reference) or agreement < 1 or result["audio_max_abs_diff"] > args.atol
+
+    header = f"{'backend':<12}{'tokens':>8}{'t2s_s':>10}{'vits_s':>10}{'load_s':>10}{'agree':>8}{'max_diff':>12}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        row = f"{result['backend']:<12}{result['tokens']:>8}{result['t2s_s']:>10.3f}{result['vits_s']:>10.3f}"
+        if "load_s" in result:
+            row += f"{result['load_s']:>10.1f}{result['token_agreement']:>8.1%}{result['audio_max_abs_diff']:>12.2e}"
+        print(row)
+    print("(load_s 包含首次导出; agree 为与PyTorch贪心解码的token一致率, max_diff 为VITS音频最大误差)")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"size": args.size, "version": args.version, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.json}")
+    if failed:
+        print("TorchScript 结果与PyTorch不一致")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+import time
+
+# to import modules from parent_dir
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_dir)
+
+import pytest
+
+from tools import profiler_capture
+from tools.prefetch import prefetch
+
+
+@pytest.fixture(autouse=True)
+def multi_core(monkeypatch):
+    # 单核时 prefetch 在当前线程中直接迭代, 测试后台线程路径需要假定有多个核
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+
+
+def wait_thread_exit(name, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not any(t.name == name for t in threading.enumerate()):
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def source(n, threads=None, closed=None, error_at=None):
+    try:
+        for i in range(n):
+            if threads is not None:
+                threads.add(threading.current_thread().name)
+            if i == error_at:
+                raise ValueError(f"item {i}")
+            yield i
+    finally:
+        if closed is not None:
+            closed.set()
+
+
+def double(upstream):
+    # 与 api.py 中的 predict_semantic 相同, 结束时关闭上一级流水线
+    try:
+        for item in upstream:
+            yield item * 2
+    finally:
+        upstream.close()
+
+
+def test_keeps_order_and_runs_in_background():
+    threads = set()
+    assert list(prefetch(source(50, threads), depth=2, name="test-order")) == list(range(50))
+    assert threads == {"test-order"}
+    assert wait_thread_exit("test-order")
+
+
+def test_runs_inline_on_single_core(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 1)
+    threads = set()
+    assert list(prefetch(source(5, threads), depth=2, name="test-inline")) == list(range(5))
+    assert threads == {threading.current_thread().name}
+
+
+def test_runs_inline_while_capturing(monkeypatch):
+    # profiler只采集当前线程, 采集时各级流水线都在采集线程中执行
+    monkeypatch.setattr(profiler_capture._local, "active", True, raising=False)
+    threads = set()
+    assert list(prefetch(source(5, threads), depth=2, name="test-capture")) == list(range(5))
+    assert threads == {threading.current_thread().name}
+
+
+def test_reraises_in_order():
+    results = []
+    with pytest.raises(ValueError, match="item 3"):
+        for item in prefetch(source(10, error_at=3), depth=2, name="test-error"):
+            results.append(item)
+    assert results == [0, 1, 2]
+    assert wait_thread_exit("test-error")
+
+
+def test_close_stops_worker_and_closes_source():
+    closed = threading.Event()
+    stream = prefetch(source(10000, closed=closed), depth=2, name="test-close")
+    assert next(stream) == 0
+    stream.close()
+    assert wait_thread_exit("test-close")
+    assert closed.wait(5.0)
+
+
+def test_close_propagates_through_chain():
+    closed = threading.Event()
+    first = prefetch(source(10000, closed=closed), depth=2, name="test-chain-1")
+    second = prefetch(double(first), depth=1, name="test-chain-2")
+    assert [next(second) for _ in range(3)] == [0, 2, 4]
+    second.close()
+    assert wait_thread_exit("test-chain-2")
+    assert wait_thread_exit("test-chain-1")
+    assert closed.wait(5.0)
+
+
+def test_stop_event_ends_iteration_and_worker():
+    stop_event = threading.Event()
+    closed = threading.Event()
+    results = []
+    for item in prefetch(source(10000, closed=closed), depth=2, stop_event=stop_event, name="test-stop"):
+        results.append(item)
+        if item == 2:
+            stop_event.set()
+    # 停止前已放入队列的项仍按顺序返回, 之后不再产生新的项
+    assert results == list(range(len(results)))
+    assert len(results) <= 3 + 2
+    assert wait_thread_exit("test-stop")
+    assert closed.wait(5.0)
@@ -0,0 +1,174 @@
+"""
+流式音频编码会话
+
+每个流式请求创建一个编码器, 逐块送入PCM, 增量取出已编码的容器数据(aac/adts, ogg/opus, mp3),
+避免每个音频块都启动一次ffmpeg进程.
+优先使用PyAV在进程内编码, 未安装PyAV时退回到整个会话共用一个常驻ffmpeg进程.
+"""
+
+import queue
+import subprocess
+import threading
+
+import numpy as np
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+# media_type -> (容器格式, PyAV编码器, ffmpeg编码器)
+CODECS = {
+    "aac": ("adts", "aac", "aac"),
+    "ogg": ("ogg", "libopus", "libopus"),
+    "opus": ("ogg", "libopus", "libopus"),
+    "mp3": ("mp3", "libmp3lame", "libmp3lame"),
+}
+
+# opus只支持固定的几种采样率, 统一重采样到48k
+OPUS_RATE = 48000
+
+
+class _Sink:
+    """PyAV的输出对象, 收集容器写出的数据供增量读取"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class _PyAVEncoder:
+    def __init__(self, media_type, rate, sample_format, bit_rate):
+        container_format, codec, _ = CODECS[media_type]
+        out_rate = OPUS_RATE if codec == "libopus" else rate
+        self.rate = rate
+        self.sample_format = sample_format
+        self.sink = _Sink()
+        # ogg默认攒满1秒才写出一页, 缩短页时长以便及时输出
+        options = {"page_duration": "100000"} if container_format == "ogg" else {}
+        self.container = av.open(self.sink, mode="w", format=container_format, options=options)
+        self.stream = self.container.add_stream(codec, rate=out_rate)
+        self.stream.bit_rate = bit_rate
+        self.stream.codec_context.layout = "mono"
+        self.codec_context = self.stream.codec_context
+        self.resampler = av.AudioResampler(format=self.codec_context.format.name, layout="mono", rate=out_rate)
+        # 编码器要求固定的帧长, 用fifo重新分块
+        self.fifo = av.AudioFifo()
+
+    def _mux(self, frame):
+        for packet in self.stream.encode(frame):
+            self.container.mux(packet)
+
+    def _encode_fifo(self, final=False):
+        frame_size = self.codec_context.frame_size or 1024
+        while True:
+            frame = self.fifo.read(frame_size)
+            if frame is None:
+                break
+            self._mux(frame)
+        if final and self.fifo.samples:
+            self._mux(self.fifo.read())
+
+    def encode(self, data):
+        frame = av.AudioFrame.from_ndarray(data.reshape(1, -1), format=self.sample_format, layout="mono")
+        frame.sample_rate = self.rate
+        for resampled in self.resampler.resample(frame):
+            self.fifo.write(resampled)
+        self._encode_fifo()
+        return self.sink.drain()
+
+    def close(self):
+        for resampled in self.resampler.resample(None):
+            self.fifo.write(resampled)
+        self._encode_fifo(final=True)
+        self._mux(None)
+        self.container.close()
+        return self.sink.drain()
+
+
+class _FFmpegEncoder:
+    def __init__(self, media_type, rate, sample_format, bit_rate):
+        container_format, _, codec = CODECS[media_type]
+        pcm = "s32le" if sample_format == "s32" else "s16le"
+        command = ["ffmpeg", "-loglevel", "error", "-f", pcm, "-ar", str(rate), "-ac", "1", "-i", "pipe:0"]
+        if codec == "libopus":
+            command += ["-ar", str(OPUS_RATE)]
+        command += ["-c:a", codec, "-b:a", str(bit_rate), "-vn", "-flush_packets", "1", "-f", container_format, "pipe:1"]
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0
+        )
+        self.output = queue.Queue()
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def _read(self):
+        while True:
+            data = self.process.stdout.read(4096)
+            if not data:
+                break
+            self.output.put(data)
+
+    def _drain(self):
+        chunks = []
+        while True:
+            try:
+                chunks.append(self.output.get_nowait())
+            except queue.Empty:
+                return b"".join(chunks)
+
+    def encode(self, data):
+        self.process.stdin.write(data.tobytes())
+        return self._drain()
+
+    def close(self):
+        self.process.stdin.close()
+        self.reader.join()
+        self.process.wait()
+        return self._drain()
+
+
+class StreamEncoder:
+    """
+    一个音频流的编码会话
+
+    用法:
+        encoder = StreamEncoder("aac", 32000)
+        for chunk in chunks:  # int16/int32 PCM
+            yield encoder.encode(chunk)
+        yield encoder.close()
+    """
+
+    def __init__(self, media_type, rate, sample_format="s16", bit_rate=None):
+        if media_type not in CODECS:
+            raise ValueError(f"不支持的编码格式: {media_type}")
+        if bit_rate is None:
+            bit_rate = 256000 if sample_format == "s32" else 128000
+        backend = _PyAVEncoder if av is not None else _FFmpegEncoder
+        self.encoder = backend(media_type, rate, sample_format, bit_rate)
+        self.closed = False
+
+    def encode(self, data: np.ndarray) -> bytes:
+        """送入一块PCM, 返回目前已编码完成的数据(可能为空)"""
+        return self.encoder.encode(np.ascontiguousarray(data))
+
+    def close(self) -> bytes:
+        """结束编码, 返回剩余数据"""
+        if self.closed:
+            return b""
+        self.closed = True
+        return self.encoder.close()
+
+
+def encode_audio(data: np.ndarray, rate: int, media_type: str, sample_format="s16", bit_rate=None) -> bytes:
+    """一次性编码整段音频"""
+    encoder = StreamEncoder(media_type, rate, sample_format, bit_rate)
+    return encoder.encode(data) + encoder.close()
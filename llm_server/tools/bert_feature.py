@@ -0,0 +1,80 @@
+"""
+批量提取中文BERT特征
+
+一组句子中所有中文片段按长度排序后补齐成batch, 一次前向得到各片段的字级特征, 再按 word2ph 展开为音素级特征.
+前面是按规范化文本索引的LRU缓存, 开场白、结束语等重复出现的句子不再重新计算.
+缓存保存字级特征, 与g2p版本无关, 占用约为音素级特征的一半.
+
+    extractor = BertFeatureExtractor(tokenizer, bert_model, device)
+    features = extractor([(norm_text, word2ph), ...])  # 每项 [1024, 音素数]
+"""
+
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+class BertFeatureExtractor:
+    def __init__(self, tokenizer, bert_model, device, cache_size=256, max_batch_size=16):
+        self.tokenizer = tokenizer
+        self.bert_model = bert_model
+        self.device = device
+        self.cache_size = cache_size
+        self.max_batch_size = max_batch_size
+        # norm_text -> 字级特征(CPU), 按最近使用淘汰
+        self.cache = OrderedDict()
+        self.lock = threading.RLock()
+
+    def __call__(self, items):
+        """items: [(norm_text, word2ph)], 返回与 items 一一对应的音素级特征 [1024, sum(word2ph)]"""
+        with self.lock:
+            char_features = {}
+            missing = []
+            for norm_text, word2ph in items:
+                assert len(word2ph) == len(norm_text)
+                if norm_text in char_features:
+                    continue
+                cached = self.cache.get(norm_text)
+                if cached is not None:
+                    self.cache.move_to_end(norm_text)
+                    char_features[norm_text] = cached
+                else:
+                    char_features[norm_text] = None
+                    missing.append(norm_text)
+
+            # 长度相近的片段放在同一个batch中, 减少补齐的计算量
+            missing.sort(key=len)
+            for start in range(0, len(missing), self.max_batch_size):
+                texts = missing[start : start + self.max_batch_size]
+                for norm_text, feature in zip(texts, self.forward(texts)):
+                    char_features[norm_text] = feature
+                    self.put(norm_text, feature)
+
+            return [
+                char_features[norm_text][: len(word2ph)].repeat_interleave(torch.tensor(word2ph), dim=0).T
+                for norm_text, word2ph in items
+            ]
+
+    def forward(self, texts):
+        with torch.no_grad():
+            inputs = self.tokenizer(texts, return_tensors="pt", padding=True)
+            lengths = inputs["attention_mask"].sum(1).tolist()
+            for i in inputs:
+                inputs[i] = inputs[i].to(self.device)
+            res = self.bert_model(**inputs, output_hidden_states=True)
+            hidden = res["hidden_states"][-3].cpu()
+        # 去掉 [CLS] 与 [SEP] 以及补齐部分, 复制一份避免缓存引用整个batch的输出
+        return [hidden[i, 1 : lengths[i] - 1].clone() for i in range(len(texts))]
+
+    def put(self, norm_text, feature):
+        if self.cache_size <= 0:
+            return
+        self.cache[norm_text] = feature
+        self.cache.move_to_end(norm_text)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
@@ -0,0 +1,53 @@
+"""
+导出推理后端(ONNX / TorchScript)共用的导出缓存
+
+导出结果按模型文件(路径、大小、修改时间)与后端自己的导出参数计算指纹, 保存在 cache_dir/<指纹> 下,
+模型文件或导出逻辑变化后指纹随之变化, 重新导出. 导出目录中的 meta.json 最后写入, 作为导出完成的标记.
+
+    model_dir = ensure_exported(cache_dir, fingerprint([gpt_path, sovits_path], EXPORT_VERSION, quantize), export)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+from torch import nn
+
+
+def fingerprint(paths, *items):
+    """paths 为模型文件, items 为影响导出结果的其他参数(导出逻辑版本、精度、设备等), 需可JSON序列化"""
+    values = list(items)
+    for path in paths:
+        stat = os.stat(path)
+        values += [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+    return hashlib.sha1(json.dumps(values).encode("utf-8")).hexdigest()[:16]
+
+
+def ensure_exported(cache_dir, key, export):
+    """返回 cache_dir/key; 尚未导出时调用 export(output_dir) 导出(较慢, 只在模型文件变化后进行一次)"""
+    model_dir = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(model_dir, "meta.json")):
+        return model_dir
+    # 先导出到临时目录, 中途失败或多个进程同时导出时不会留下不完整的结果
+    tmp_dir = f"{model_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    try:
+        export(tmp_dir)
+        if os.path.exists(model_dir):
+            shutil.rmtree(model_dir)
+        os.replace(tmp_dir, model_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return model_dir
+
+
+class VitsDecoder(nn.Module):
+    """导出用的VITS解码: 语速固定为1, noise_scale 作为输入(校验时可以设为0)"""
+
+    def __init__(self, vq_model):
+        super().__init__()
+        self.vq_model = vq_model
+
+    def forward(self, codes, text, refer, noise_scale, sv_emb=None):
+        return self.vq_model(codes, text, refer, noise_scale=noise_scale, sv_emb=sv_emb)
@@ -0,0 +1,284 @@
+"""
+推理阶段耗时统计
+
+每个请求记录参考音频处理、文本前端、T2S解码、VITS/声码器、打包等阶段的耗时,
+以及生成的语义token数、音频时长、排队等待时间, 计算实时率(RTF)与T2S解码速度(tokens/s).
+汇总结果以Prometheus文本格式从 /metrics 导出, 单个请求的结果可写入响应头或按request_id查询.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import torch
+
+# 直方图桶边界(秒)
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 响应头中输出的阶段
+HEADER_STAGES = ("queue", "reference", "frontend", "t2s", "vits", "vocoder", "super_resolution", "postprocess", "pack")
+
+
+class RequestTimings:
+    """一次推理请求的各阶段耗时"""
+
+    def __init__(self, request_id=None):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.created_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self.first_chunk_at = None
+        self.stages = OrderedDict()
+        self.tokens = 0
+        self.audio_seconds = 0.0
+        self.sentences = 0
+        self.status = "ok"
+
+    def start(self):
+        """推理真正开始执行(生成器第一次被迭代), 之前的时间记为排队等待"""
+        self.started_at = time.perf_counter()
+        self.add("queue", self.started_at - self.created_at)
+
+    def finish(self):
+        """推理结束(正常完成、取消或出错)"""
+        if self.finished_at is None:
+            self.finished_at = time.perf_counter()
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def mark_first_chunk(self):
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+
+    @property
+    def compute_seconds(self):
+        """从开始执行到结束的墙钟时间; 流水线开启时各阶段并行执行, 不能用阶段耗时相加"""
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    @property
+    def stage_seconds(self):
+        """各阶段耗时之和(不含排队), 仅作分解参考, 并行执行时会大于墙钟时间"""
+        return sum(seconds for stage, seconds in self.stages.items() if stage != "queue")
+
+    @property
+    def rtf(self):
+        return self.compute_seconds / self.audio_seconds if self.audio_seconds > 0 else None
+
+    @property
+    def tokens_per_second(self):
+        t2s = self.stages.get("t2s", 0.0)
+        return self.tokens / t2s if t2s > 0 else None
+
+    def to_dict(self):
+        result = {
+            "request_id": self.request_id,
+            "status": self.status,
+            "stages": {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            "tokens": self.tokens,
+            "sentences": self.sentences,
+            "audio_seconds": round(self.audio_seconds, 3),
+            "compute_seconds": round(self.compute_seconds, 4),
+            "stage_seconds": round(self.stage_seconds, 4),
+        }
+        if self.rtf is not None:
+            result["rtf"] = round(self.rtf, 4)
+        if self.tokens_per_second is not None:
+            result["tokens_per_second"] = round(self.tokens_per_second, 1)
+        if self.first_chunk_at is not None and self.started_at is not None:
+            result["first_chunk_seconds"] = round(self.first_chunk_at - self.created_at, 4)
+        return result
+
+    def to_headers(self):
+        headers = {"X-Request-ID": self.request_id}
+        for stage in HEADER_STAGES:
+            if stage in self.stages:
+                headers[f"X-Timing-{stage.replace('_', '-').title()}"] = f"{self.stages[stage]:.4f}"
+        headers["X-Timing-Total"] = f"{self.compute_seconds:.4f}"
+        headers["X-Timing-Stages-Total"] = f"{self.stage_seconds:.4f}"
+        headers["X-Audio-Seconds"] = f"{self.audio_seconds:.3f}"
+        headers["X-T2S-Tokens"] = str(self.tokens)
+        if self.rtf is not None:
+            headers["X-RTF"] = f"{self.rtf:.4f}"
+        if self.tokens_per_second is not None:
+            headers["X-T2S-Tokens-Per-Second"] = f"{self.tokens_per_second:.1f}"
+        return headers
+
+
+class _Histogram:
+    def __init__(self, buckets, window=1024):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def render(self, name, labels=""):
+        sep = "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        recent = sorted(self.recent)
+        for q in QUANTILES if recent else ():
+            value = recent[min(len(recent) - 1, int(q * len(recent)))]
+            lines.append(f'{name}_recent{{{labels}{sep}quantile="{q}"}} {value}')
+        return lines
+
+
+def _process_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        # ru_maxrss在Linux上单位为KB(峰值), 只在没有/proc时作为近似
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def module_bytes(module):
+    """模型参数与buffer占用的字节数"""
+    if module is None:
+        return 0
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class InferenceMetrics:
+    """推理指标汇总"""
+
+    def __init__(self, recent_size=256):
+        self._lock = threading.Lock()
+        self.stage_histograms = OrderedDict()
+        self.rtf_histogram = _Histogram(RTF_BUCKETS)
+        self.first_chunk_histogram = _Histogram(BUCKETS)
+        self.requests = {}
+        self.tokens_total = 0
+        self.audio_seconds_total = 0.0
+        self.compute_seconds_total = 0.0
+        self.in_flight = 0
+        # 最近请求的详细耗时, 供流式请求事后按request_id查询
+        self.recent = OrderedDict()
+        self.recent_size = recent_size
+        # 模型名 -> 返回nn.Module的函数, 导出时统计参数占用
+        self.model_getters = OrderedDict()
+
+    def start(self, timings):
+        with self._lock:
+            self.in_flight += 1
+        timings.start()
+
+    def finish(self, timings):
+        timings.finish()
+        with self._lock:
+            self.in_flight -= 1
+            for stage, seconds in timings.stages.items():
+                histogram = self.stage_histograms.get(stage)
+                if histogram is None:
+                    histogram = self.stage_histograms[stage] = _Histogram(BUCKETS)
+                histogram.observe(seconds)
+            if timings.rtf is not None:
+                self.rtf_histogram.observe(timings.rtf)
+            if timings.first_chunk_at is not None:
+                self.first_chunk_histogram.observe(timings.first_chunk_at - timings.created_at)
+            self.requests[timings.status] = self.requests.get(timings.status, 0) + 1
+            self.tokens_total += timings.tokens
+            self.audio_seconds_total += timings.audio_seconds
+            self.compute_seconds_total += timings.compute_seconds
+            self.recent[timings.request_id] = timings.to_dict()
+            while len(self.recent) > self.recent_size:
+                self.recent.popitem(last=False)
+
+    def get(self, request_id):
+        with self._lock:
+            return self.recent.get(request_id)
+
+    def register_model(self, name, getter):
+        self.model_getters[name] = getter
+
+    def memory_stats(self):
+        """进程与显存占用(字节)"""
+        stats = {"process_rss": _process_rss_bytes()}
+        if torch.cuda.is_available():
+            stats["cuda_allocated"] = torch.cuda.memory_allocated()
+            stats["cuda_reserved"] = torch.cuda.memory_reserved()
+            stats["cuda_max_allocated"] = torch.cuda.max_memory_allocated()
+        return stats
+
+    def model_stats(self):
+        """各模型参数占用(字节)"""
+        stats = OrderedDict()
+        for name, getter in self.model_getters.items():
+            try:
+                stats[name] = module_bytes(getter())
+            except Exception:
+                pass
+        return stats
+
+    def render(self, prefix="tts"):
+        lines = []
+        with self._lock:
+            lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for stage, histogram in self.stage_histograms.items():
+                lines.extend(histogram.render(f"{prefix}_stage_seconds", f'stage="{stage}"'))
+            lines.append(f"# TYPE {prefix}_rtf histogram")
+            lines.extend(self.rtf_histogram.render(f"{prefix}_rtf"))
+            lines.append(f"# TYPE {prefix}_first_chunk_seconds histogram")
+            lines.extend(self.first_chunk_histogram.render(f"{prefix}_first_chunk_seconds"))
+            lines.append(f"# TYPE {prefix}_requests_total counter")
+            for status, count in self.requests.items():
+                lines.append(f'{prefix}_requests_total{{status="{status}"}} {count}')
+            lines.append(f"# TYPE {prefix}_t2s_tokens_total counter")
+            lines.append(f"{prefix}_t2s_tokens_total {self.tokens_total}")
+            lines.append(f"# TYPE {prefix}_audio_seconds_total counter")
+            lines.append(f"{prefix}_audio_seconds_total {self.audio_seconds_total}")
+            lines.append(f"# TYPE {prefix}_compute_seconds_total counter")
+            lines.append(f"{prefix}_compute_seconds_total {self.compute_seconds_total}")
+            lines.append(f"# TYPE {prefix}_requests_in_flight gauge")
+            lines.append(f"{prefix}_requests_in_flight {self.in_flight}")
+        lines.append(f"# TYPE {prefix}_memory_bytes gauge")
+        for kind, value in self.memory_stats().items():
+            lines.append(f'{prefix}_memory_bytes{{kind="{kind}"}} {value}')
+        lines.append(f"# TYPE {prefix}_model_bytes gauge")
+        for model, value in self.model_stats().items():
+            lines.append(f'{prefix}_model_bytes{{model="{model}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+# 创建全局实例
+inference_metrics = InferenceMetrics()
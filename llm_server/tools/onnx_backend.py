@@ -0,0 +1,321 @@
+"""
+ONNX Runtime 推理后端(CPU)
+
+T2S拆成三个图: 文本编码(t2s_encoder)、首步解码(t2s_fsdec, 处理参考音频的语义token并建立KV缓存)、
+逐步解码(t2s_sdec, 每步输入上一个token与KV缓存), 再加上VITS解码(vits). 模型结构取自 onnx_export.py 使用的
+AR/models/t2s_model_onnx.py 与 module/models_onnx.py, 区别是解码图只输出logits, 采样在图外用与PyTorch推理
+相同的 sample 完成, top_k/top_p/temperature 等请求参数照常生效.
+KV缓存每层一个输入/输出, 逐步解码时通过 I/O binding 以 OrtValue 的形式把上一步的输出直接作为下一步的输入,
+不经过numpy复制, 也不需要在图中把各层拼接成一个张量再拆开.
+
+导出结果由 tools/export_cache.py 按模型文件缓存在 cache_dir 下, 模型文件变化后重新导出;
+quantize=True 时对T2S各图的 MatMul/Gemm 做int8动态量化.
+只接入了 api.py(-ib onnx); api_v3.py 使用的 TTS_infer_pack 按填充后的整批句子解码, 仍使用PyTorch模型.
+生成的语义token在CPU上, 语速调节或多参考音频时回退到PyTorch的VITS, 调用方需把token移到模型所在设备.
+
+    models = load(gpt_path, sovits_path, hps, "onnx_cache", quantize=True)
+    pred_semantic = models.infer_semantic(phones, bert, prompt, top_k=15, top_p=1, temperature=1, early_stop_num=2700)
+    audio = models.decode_vits(codes, text, refer)
+"""
+
+import inspect
+import json
+import os
+
+import numpy as np
+import torch
+from torch import nn
+
+from tools.export_cache import VitsDecoder, ensure_exported, fingerprint
+
+# 导出逻辑修改后递增, 已有的导出结果随之失效
+EXPORT_VERSION = 1
+# v3/v4 使用CFM与声码器, 不在导出范围内
+SUPPORTED_VERSIONS = {"v1", "v2", "v2Pro", "v2ProPlus"}
+T2S_GRAPHS = ("t2s_encoder", "t2s_fsdec", "t2s_sdec")
+
+
+def kv_names(num_layers, prefix=""):
+    return [f"{prefix}k{i}" for i in range(num_layers)] + [f"{prefix}v{i}" for i in range(num_layers)]
+
+
+class FirstStageStep(nn.Module):
+    """导出 T2SFirstStageDecoder.decode, 输出 logits, y_emb, x_example, 每层的k, 每层的v"""
+
+    def __init__(self, decoder):
+        super().__init__()
+        self.decoder = decoder
+
+    def forward(self, x, prompts):
+        logits, k, v, y_emb, x_example = self.decoder.decode(x, prompts)
+        return (logits, y_emb, x_example, *k, *v)
+
+
+class StageStep(nn.Module):
+    """导出 T2SStageDecoder.decode, 输入 iy, iy_emb, ix_example, 每层的k, 每层的v; 输出 logits, y_emb, 每层的k, 每层的v"""
+
+    def __init__(self, decoder):
+        super().__init__()
+        self.decoder = decoder
+
+    def forward(self, iy, iy_emb, ix_example, *kv):
+        num_layers = len(kv) // 2
+        logits, k, v, y_emb = self.decoder.decode(iy, kv[:num_layers], kv[num_layers:], iy_emb, ix_example)
+        return (logits, y_emb, *k, *v)
+
+
+def onnx_export(model, inputs, path, input_names, output_names, dynamic_axes, opset_version=16):
+    kwargs = {}
+    # 新版torch默认使用dynamo导出, 这里的模型按TorchScript导出器的写法编写
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    torch.onnx.export(
+        model,
+        inputs,
+        path,
+        input_names=input_names,
+        output_names=output_names,
+        dynamic_axes=dynamic_axes,
+        opset_version=opset_version,
+        **kwargs,
+    )
+
+
+def export(gpt_path, sovits_path, hps, output_dir, quantize=False):
+    """按 hps(get_sovits_weights 得到的配置)导出四个图到 output_dir"""
+    from AR.models.t2s_lightning_module_onnx import Text2SemanticLightningModule
+    from module.models_onnx import SynthesizerTrn
+    from process_ckpt import load_sovits_new
+
+    dict_s1 = torch.load(gpt_path, map_location="cpu", weights_only=False)
+    t2s_model = Text2SemanticLightningModule(dict_s1["config"], "****", is_train=False)
+    t2s_model.load_state_dict(dict_s1["weight"])
+    t2s_model = t2s_model.model.eval()
+    t2s_model.init_onnx()
+
+    vq_model = SynthesizerTrn(
+        hps.data.filter_length // 2 + 1,
+        hps.train.segment_size // hps.data.hop_length,
+        n_speakers=hps.data.n_speakers,
+        **hps.model,
+    )
+    vq_model.load_state_dict(load_sovits_new(sovits_path)["weight"], strict=False)
+    vq_model.eval()
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = lambda name: os.path.join(output_dir, f"{name}.onnx")
+    with torch.no_grad():
+        phoneme_ids = torch.randint(1, t2s_model.phoneme_vocab_size, (1, 24))
+        bert = torch.randn((1, 1024, phoneme_ids.shape[1]))
+        onnx_export(
+            t2s_model.onnx_encoder,
+            (phoneme_ids, bert),
+            path("t2s_encoder"),
+            ["phoneme_ids", "bert"],
+            ["x"],
+            {"phoneme_ids": {1: "x_length"}, "bert": {2: "x_length"}, "x": {1: "x_length"}},
+        )
+        x = t2s_model.onnx_encoder(phoneme_ids, bert)
+        prompts = torch.randint(0, t2s_model.EOS, (1, 12))
+        num_layers = t2s_model.num_layers
+        # 每层的k, v: [head, N, head_dim]
+        kv_axes = {name: {1: "kv_length"} for name in kv_names(num_layers)}
+        onnx_export(
+            FirstStageStep(t2s_model.first_stage_decoder),
+            (x, prompts),
+            path("t2s_fsdec"),
+            ["x", "prompts"],
+            ["logits", "y_emb", "x_example"] + kv_names(num_layers),
+            {
+                "x": {1: "x_length"},
+                "prompts": {1: "prompts_length"},
+                "y_emb": {1: "y_length"},
+                "x_example": {1: "x_length"},
+                **kv_axes,
+            },
+        )
+        logits, k, v, y_emb, x_example = t2s_model.first_stage_decoder.decode(x, prompts)
+        onnx_export(
+            StageStep(t2s_model.stage_decoder),
+            (prompts[:, -1:], y_emb, x_example, *k, *v),
+            path("t2s_sdec"),
+            ["iy", "iy_emb", "ix_example"] + kv_names(num_layers, "i"),
+            ["logits", "y_emb"] + kv_names(num_layers),
+            {
+                "iy_emb": {1: "iy_length"},
+                "ix_example": {1: "x_length"},
+                "y_emb": {1: "y_length"},
+                **{name: {1: "ikv_length"} for name in kv_names(num_layers, "i")},
+                **kv_axes,
+            },
+        )
+
+        codes = torch.randint(0, 1024, (1, 1, 30))
+        text = torch.randint(1, 300, (1, 24))
+        refer = torch.randn((1, hps.data.filter_length // 2 + 1, 80))
+        inputs = [codes, text, refer, torch.tensor(0.5)]
+        input_names = ["codes", "text", "refer", "noise_scale"]
+        if vq_model.is_v2pro:
+            inputs.append(torch.randn((1, 20480)))
+            input_names.append("sv_emb")
+        onnx_export(
+            VitsDecoder(vq_model),
+            tuple(inputs),
+            path("vits"),
+            input_names,
+            ["audio"],
+            {"codes": {2: "codes_length"}, "text": {1: "text_length"}, "refer": {2: "refer_length"}, "audio": {2: "audio_length"}},
+            opset_version=17,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        # VITS以卷积为主, int8卷积在CPU上不一定更快, 只量化T2S
+        for name in T2S_GRAPHS:
+            quantize_dynamic(
+                path(name), path(f"{name}.int8"), weight_type=QuantType.QInt8, op_types_to_quantize=["MatMul", "Gemm"]
+            )
+            os.replace(path(f"{name}.int8"), path(name))
+
+    with open(os.path.join(output_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "gpt_path": os.path.abspath(gpt_path),
+                "sovits_path": os.path.abspath(sovits_path),
+                "version": hps.model.version,
+                "quantize": bool(quantize),
+                "eos": t2s_model.EOS,
+                "upsample_rates": list(vq_model.upsample_rates),
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+def load(gpt_path, sovits_path, hps, cache_dir, quantize=False, threads=None):
+    """返回 OnnxModels; 模型版本不支持时返回 None. 没有对应的导出结果时先导出(较慢, 只在模型文件变化后进行一次)"""
+    if hps.model.version not in SUPPORTED_VERSIONS:
+        return None
+    model_dir = ensure_exported(
+        cache_dir,
+        fingerprint([gpt_path, sovits_path], EXPORT_VERSION, bool(quantize)),
+        lambda output_dir: export(gpt_path, sovits_path, hps, output_dir, quantize),
+    )
+    return OnnxModels(model_dir, threads)
+
+
+class OnnxModels:
+    def __init__(self, model_dir, threads=None):
+        import onnxruntime as ort
+
+        with open(os.path.join(model_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.model_dir = model_dir
+        self.eos = self.meta["eos"]
+        self.version = self.meta["version"]
+        self.upsample_rates = self.meta["upsample_rates"]
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or torch.get_num_threads()
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.sessions = {
+            name: ort.InferenceSession(
+                os.path.join(model_dir, f"{name}.onnx"), options, providers=["CPUExecutionProvider"]
+            )
+            for name in T2S_GRAPHS + ("vits",)
+        }
+        self.vits_inputs = {item.name for item in self.sessions["vits"].get_inputs()}
+        # 逐步解码中上一步输出、下一步输入的状态(y_emb与每层的KV缓存), 输入名为输出名加前缀 i
+        self.states = [item.name for item in self.sessions["t2s_sdec"].get_outputs()][1:]
+
+    def infer_semantic(
+        self,
+        phoneme_ids,
+        bert,
+        prompt,
+        top_k,
+        top_p,
+        temperature,
+        early_stop_num=-1,
+        stop_event=None,
+        repetition_penalty=1.35,
+    ):
+        """
+        与 Text2SemanticDecoder.infer_panel 相同的解码过程(单句)
+        phoneme_ids: 参考文本与目标文本的音素id列表, bert: [1024, 音素数], prompt: [1, 参考音频token数]
+        返回生成的语义token(一维, 不含EOS)
+        """
+        from AR.models.utils import sample
+
+        x = self.sessions["t2s_encoder"].run(
+            ["x"],
+            {
+                "phoneme_ids": np.asarray([phoneme_ids], dtype=np.int64),
+                "bert": bert.float().cpu().numpy()[None],
+            },
+        )[0]
+        y = prompt.cpu().long()
+        prefix_len = y.shape[1]
+
+        fsdec = self.sessions["t2s_fsdec"]
+        binding = fsdec.io_binding()
+        binding.bind_cpu_input("x", x)
+        binding.bind_cpu_input("prompts", y.numpy())
+        outputs = [item.name for item in fsdec.get_outputs()]
+        for name in outputs:
+            binding.bind_output(name, "cpu")
+        fsdec.run_with_iobinding(binding)
+        values = dict(zip(outputs, binding.get_outputs()))
+        logits = values["logits"]
+        states = [values[name] for name in self.states]
+
+        sdec = self.sessions["t2s_sdec"]
+        binding = sdec.io_binding()
+        binding.bind_ortvalue_input("ix_example", values["x_example"])
+        for idx in range(1500):
+            logits = torch.from_numpy(logits.numpy())
+            if idx < 11:  # 至少预测出10个token才允许停止, 与 infer_panel 相同
+                logits = logits[:, :-1]
+            samples = sample(
+                logits, y, top_k=top_k, top_p=top_p, repetition_penalty=repetition_penalty, temperature=temperature
+            )[0]
+            y = torch.concat([y, samples], dim=1)
+
+            stop = early_stop_num != -1 and (y.shape[1] - prefix_len) > early_stop_num
+            if stop_event is not None and stop_event.is_set():
+                stop = True
+            if torch.argmax(logits, dim=-1)[0] == self.eos or samples[0, 0] == self.eos:
+                stop = True
+            if stop:
+                break
+
+            # 上一步输出的KV缓存直接绑定为这一步的输入
+            binding.bind_cpu_input("iy", samples.numpy().astype(np.int64))
+            for name, value in zip(self.states, states):
+                binding.bind_ortvalue_input(f"i{name}", value)
+            binding.clear_binding_outputs()
+            binding.bind_output("logits", "cpu")
+            for name in self.states:
+                binding.bind_output(name, "cpu")
+            sdec.run_with_iobinding(binding)
+            logits, *states = binding.get_outputs()
+        return y[0, prefix_len:-1]
+
+    def can_decode_vits(self, refers, speed):
+        """语速调节与多参考音频平均音色由PyTorch的VITS处理"""
+        return speed == 1 and len(refers) == 1
+
+    def decode_vits(self, codes, text, refer, sv_emb=None, noise_scale=0.5):
+        """codes: [1, 1, T], text: [1, 音素数], refer: [1, 频点数, 帧数]; 返回 [1, 1, 采样点数] 的numpy数组"""
+        inputs = {
+            "codes": codes.cpu().long().numpy(),
+            "text": text.cpu().long().numpy(),
+            "refer": refer.float().cpu().numpy(),
+            "noise_scale": np.asarray(noise_scale, dtype=np.float32),
+        }
+        if "sv_emb" in self.vits_inputs:
+            inputs["sv_emb"] = sv_emb.float().cpu().numpy()
+        return self.sessions["vits"].run(["audio"], inputs)[0]
@@ -0,0 +1,101 @@
+"""
+多句推理的流水线
+
+多句推理时, 后面句子的文本前端(G2P、BERT特征)与T2S解码放到后台线程中提前计算,
+与推理线程中前一句的VITS/声码器解码重叠. 每一级后台线程最多领先 depth 项,
+结果通过有界队列按原顺序交给下一级; 推理线程提前结束(取消、异常、客户端断开)时,
+各级后台线程在当前项完成后依次退出.
+
+    features = prefetch(extract_features(), depth=2)
+    for item in prefetch(predict_semantic(features), depth=1):
+        ...
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import torch
+
+from tools.profiler_capture import is_capturing
+
+_done = object()
+
+
+def prefetch(iterable, depth=2, stop_event=None, name="prefetch"):
+    """
+    在后台线程中迭代 iterable, 按原顺序逐项返回; depth <= 0 或只有一个CPU核时在当前线程中直接迭代
+    (单核时后台线程只会与推理线程争抢CPU). 当前线程正在做profiler采集时也直接迭代, 采集与阶段标注只在采集线程中生效.
+    后台线程抛出的异常在对应位置重新抛出
+    """
+    if depth <= 0 or (os.cpu_count() or 1) <= 1 or is_capturing():
+        yield from iterable
+        return
+
+    items = queue.Queue(maxsize=depth)
+    closed = threading.Event()
+
+    def put(item):
+        # 队列已满时定期检查是否已关闭, 避免推理线程退出后后台线程一直阻塞
+        while not closed.is_set():
+            if stop_event is not None and stop_event.is_set():
+                return False
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run():
+        try:
+            for item in iterable:
+                if closed.is_set() or not put((item, None)):
+                    return
+        except BaseException as e:
+            put((None, e))
+            return
+        finally:
+            # 在后台线程中关闭上一级流水线, 使其后台线程也退出
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+        put((_done, None))
+
+    worker = threading.Thread(target=run, name=name, daemon=True)
+    worker.start()
+    try:
+        while True:
+            try:
+                item, error = items.get(timeout=0.1)
+            except queue.Empty:
+                if stop_event is not None and stop_event.is_set():
+                    return
+                if not worker.is_alive() and items.empty():
+                    return
+                continue
+            if error is not None:
+                raise error
+            if item is _done:
+                return
+            yield item
+    finally:
+        closed.set()
+
+
+@contextmanager
+def cuda_side_stream(device):
+    """
+    当前线程在独立的CUDA stream上计算, 与其他线程默认stream上的计算并行.
+    开始时等待默认stream上已提交的计算(如前端生成的BERT特征), 退出时等待本stream完成,
+    交给其他线程的结果可以直接使用. 不是CUDA设备时不做任何事
+    """
+    if not str(device).startswith("cuda") or not torch.cuda.is_available():
+        yield
+        return
+    stream = torch.cuda.Stream(device)
+    stream.wait_stream(torch.cuda.default_stream(device))
+    with torch.cuda.stream(stream):
+        yield
+    stream.synchronize()
@@ -0,0 +1,125 @@
+"""
+按请求开启的torch.profiler采集
+
+带 profile 标记的推理请求在 torch.profiler 下完整执行一次, 导出 Chrome trace (chrome://tracing / Perfetto 打开)
+和按耗时排序的算子表, 保存在有上限的目录中, 超过上限时删除最旧的采集.
+推理代码中用 profile_range("t2s") 等标注阶段, 未采集时返回空的上下文管理器, 不产生额外开销.
+"""
+
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import torch
+
+_local = threading.local()
+_null_range = nullcontext()
+
+capture_id_pattern = re.compile(r"^[A-Za-z0-9_\-]{1,64}$")
+
+
+def is_capturing():
+    """当前线程是否正在采集; 采集时流水线各级在当前线程中串行执行, 各阶段都能出现在采集结果中"""
+    return getattr(_local, "active", False)
+
+
+def profile_range(name):
+    """标注一个推理阶段; 只有当前线程正在采集时才生效"""
+    if is_capturing():
+        return torch.profiler.record_function(name)
+    return _null_range
+
+
+class ProfilerCapture:
+    def __init__(self, root_dir, max_captures=20, row_limit=50):
+        self.root_dir = root_dir
+        self.max_captures = max_captures
+        self.row_limit = row_limit
+        # 同一时间只采集一个请求, 避免多个profiler相互干扰
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_captures > 0
+
+    def trace_path(self, capture_id):
+        return os.path.join(self.root_dir, f"{capture_id}.trace.json")
+
+    def table_path(self, capture_id):
+        return os.path.join(self.root_dir, f"{capture_id}.ops.txt")
+
+    @contextmanager
+    def session(self, capture_id):
+        """在当前线程中采集一段推理"""
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        with self._lock:
+            _local.active = True
+            try:
+                with torch.profiler.profile(activities=activities, record_shapes=True) as prof:
+                    yield
+            finally:
+                _local.active = False
+            self._export(prof, capture_id)
+
+    def run(self, generator, capture_id):
+        """
+        在同一线程中把推理生成器完整执行一遍并采集, 再逐个返回结果.
+        StreamingResponse 每次迭代可能切换线程, 而采集需要整个推理在同一线程内完成, 因此采集时不再流式返回.
+        """
+        with self.session(capture_id):
+            chunks = list(generator)
+        yield from chunks
+
+    def _export(self, prof, capture_id):
+        sort_by = "self_cuda_time_total" if torch.cuda.is_available() else "self_cpu_time_total"
+        prof.export_chrome_trace(self.trace_path(capture_id))
+        with open(self.table_path(capture_id), "w", encoding="utf-8") as f:
+            f.write(prof.key_averages().table(sort_by=sort_by, row_limit=self.row_limit))
+        self._evict()
+
+    def _evict(self):
+        captures = self.list()
+        for capture in captures[self.max_captures :]:
+            for path in (self.trace_path(capture["id"]), self.table_path(capture["id"])):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        """已保存的采集, 最新的在前"""
+        captures = []
+        for filename in os.listdir(self.root_dir):
+            if not filename.endswith(".trace.json"):
+                continue
+            capture_id = filename[: -len(".trace.json")]
+            path = self.trace_path(capture_id)
+            try:
+                mtime = os.path.getmtime(path)
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            captures.append(
+                {
+                    "id": capture_id,
+                    "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(mtime)),
+                    "trace_size": size,
+                    "_mtime": mtime,
+                }
+            )
+        captures.sort(key=lambda capture: capture["_mtime"], reverse=True)
+        for capture in captures:
+            del capture["_mtime"]
+        return captures
+
+    def get_file(self, capture_id, kind):
+        """kind: trace / table; 不存在时返回None"""
+        if not capture_id_pattern.match(capture_id):
+            return None
+        path = self.trace_path(capture_id) if kind == "trace" else self.table_path(capture_id)
+        return path if os.path.exists(path) else None
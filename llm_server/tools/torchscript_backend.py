@@ -0,0 +1,251 @@
+"""
+TorchScript 推理后端
+
+模型结构取自 export_torch_script.py: T2S 使用其中的 T2SModel(Transformer层为TorchScript类); 与 T2SModel.forward
+的区别是 top_k/top_p/temperature/repetition_penalty/early_stop_num 作为输入, 输出与 Text2SemanticDecoder.infer_panel
+相同(不含EOS).
+解码分为两个编译后的方法: forward 处理参考音频与文本并解码第一个token, decode_step 每次解码一个token,
+逐步循环在Python中进行, 每步之间检查 stop_event, 打断或取消的请求最多再执行一步解码.
+VITS(v1/v2/v2Pro/v2ProPlus)按 VitsModel 加载后 trace, v3/v4 只导出T2S, CFM与声码器仍使用PyTorch模型.
+导出时 torch.jit.freeze 冻结权重, 加载后再用 torch.jit.optimize_for_inference 做推理优化.
+
+导出结果由 tools/export_cache.py 按模型文件、设备与精度缓存在 cache_dir 下, 模型文件变化后重新导出.
+
+    models = load(gpt_path, sovits_path, hps, "torchscript_cache", device, is_half)
+    pred_semantic = models.infer_semantic(phones, bert, prompt, top_k=15, top_p=1, temperature=1, early_stop_num=2700)
+    audio = models.decode_vits(codes, text, refer)
+"""
+
+import json
+import os
+from typing import List, Tuple
+
+import torch
+from torch import Tensor
+from torch.nn import functional as F
+
+from export_torch_script import T2SModel, VitsModel, get_raw_t2s_model, sample
+from tools.export_cache import VitsDecoder, ensure_exported, fingerprint
+
+# 导出逻辑修改后递增, 已有的导出结果随之失效
+EXPORT_VERSION = 2
+# v3/v4 使用CFM与声码器, 只导出T2S
+VITS_VERSIONS = {"v1", "v2", "v2Pro", "v2ProPlus"}
+
+
+class T2SDecoder(T2SModel):
+    def forward(
+        self,
+        phoneme_ids: Tensor,
+        bert: Tensor,
+        prompts: Tensor,
+        top_k: int,
+        top_p: float,
+        temperature: float,
+        repetition_penalty: float,
+        early_stop_num: int,
+    ) -> Tuple[Tensor, List[Tensor], List[Tensor], bool]:
+        """
+        处理参考音频与文本并解码第一个token, 返回 (y, k_cache, v_cache, 是否结束)
+        phoneme_ids: [1, 音素数], bert: [1024, 音素数], prompts: [1, 参考音频token数]
+        """
+        x = self.ar_text_embedding(phoneme_ids)
+        x = x + self.bert_proj(bert.T.unsqueeze(0).to(dtype=self.bert_proj.weight.dtype))
+        x = self.ar_text_position(x)
+
+        y = prompts
+        x_len = x.shape[1]
+        y_emb = self.ar_audio_embedding(y)
+        y_len = y_emb.shape[1]
+        xy_pos = torch.concat([x, self.ar_audio_position(y_emb)], dim=1)
+
+        src_len = x_len + y_len
+        x_attn_mask_pad = F.pad(torch.zeros((x_len, x_len), dtype=torch.bool), (0, y_len), value=True)
+        y_attn_mask = F.pad(torch.triu(torch.ones(y_len, y_len, dtype=torch.bool), diagonal=1), (x_len, 0), value=False)
+        xy_attn_mask = torch.concat([x_attn_mask_pad, y_attn_mask], dim=0).view(1, 1, src_len, src_len).to(x.device)
+
+        xy_dec, k_cache, v_cache = self.t2s_transformer.process_prompt(xy_pos, xy_attn_mask, None)
+        y, stop = self.sample_next(
+            xy_dec, y, 0, y_len, top_k, top_p, temperature, repetition_penalty, early_stop_num
+        )
+        return y, k_cache, v_cache, stop
+
+    @torch.jit.export
+    def decode_step(
+        self,
+        y: Tensor,
+        k_cache: List[Tensor],
+        v_cache: List[Tensor],
+        idx: int,
+        prefix_len: int,
+        top_k: int,
+        top_p: float,
+        temperature: float,
+        repetition_penalty: float,
+        early_stop_num: int,
+    ) -> Tuple[Tensor, List[Tensor], List[Tensor], bool]:
+        """解码第 idx 个token(idx >= 1), 每次调用只执行一步, 由调用方在步与步之间检查取消"""
+        y_emb = self.ar_audio_embedding(y[:, -1:])
+        xy_pos = y_emb * self.ar_audio_position.x_scale + self.ar_audio_position.alpha * self.ar_audio_position.pe[
+            :, prefix_len + idx - 1
+        ].to(dtype=y_emb.dtype, device=y_emb.device)
+        xy_dec, k_cache, v_cache = self.t2s_transformer.decode_next_token(xy_pos, k_cache, v_cache)
+        y, stop = self.sample_next(
+            xy_dec, y, idx, prefix_len, top_k, top_p, temperature, repetition_penalty, early_stop_num
+        )
+        return y, k_cache, v_cache, stop
+
+    def sample_next(
+        self,
+        xy_dec: Tensor,
+        y: Tensor,
+        idx: int,
+        prefix_len: int,
+        top_k: int,
+        top_p: float,
+        temperature: float,
+        repetition_penalty: float,
+        early_stop_num: int,
+    ) -> Tuple[Tensor, bool]:
+        logits = self.ar_predict_layer(xy_dec[:, -1])
+        if idx < 11:  # 至少预测出10个token才允许停止, 与 infer_panel 相同
+            logits = logits[:, :-1]
+
+        samples = sample(
+            logits, y, temperature=temperature, top_k=top_k, top_p=top_p, repetition_penalty=repetition_penalty
+        )[0]
+        y = torch.concat([y, samples], dim=1)
+
+        if early_stop_num != -1 and (y.shape[1] - prefix_len) > early_stop_num:
+            return y, True
+        if torch.argmax(logits, dim=-1)[0] == self.EOS or samples[0, 0] == self.EOS:
+            return y, True
+        return y, False
+
+
+def export(gpt_path, sovits_path, hps, output_dir, device="cpu", is_half=False):
+    """按 hps(get_sovits_weights 得到的配置)导出 t2s.pt 与 vits.pt(v3/v4 没有) 到 output_dir"""
+    dtype = torch.float16 if is_half else torch.float32
+    version = hps.model.version
+    os.makedirs(output_dir, exist_ok=True)
+
+    raw_t2s = get_raw_t2s_model(torch.load(gpt_path, map_location="cpu", weights_only=False))
+    raw_t2s = raw_t2s.to(device=device, dtype=dtype)
+    t2s = torch.jit.script(T2SDecoder(raw_t2s).eval())
+    torch.jit.save(torch.jit.freeze(t2s, preserved_attrs=["decode_step"]), os.path.join(output_dir, "t2s.pt"))
+
+    if version in VITS_VERSIONS:
+        vits = VitsModel(sovits_path, version, is_half=is_half, device=device)
+        inputs = [
+            torch.randint(0, 1024, (1, 1, 30), device=device),
+            torch.randint(1, 300, (1, 24), device=device),
+            torch.randn((1, hps.data.filter_length // 2 + 1, 80), device=device, dtype=dtype),
+            torch.tensor(0.5, device=device, dtype=dtype),
+        ]
+        if vits.vq_model.is_v2pro:
+            inputs.append(torch.randn((1, 20480), device=device, dtype=dtype))
+        with torch.no_grad():
+            traced = torch.jit.trace(VitsDecoder(vits.vq_model).eval(), tuple(inputs), check_trace=False)
+        torch.jit.save(torch.jit.freeze(traced), os.path.join(output_dir, "vits.pt"))
+
+    with open(os.path.join(output_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "gpt_path": os.path.abspath(gpt_path),
+                "sovits_path": os.path.abspath(sovits_path),
+                "version": version,
+                "device": str(device),
+                "spec_channels": hps.data.filter_length // 2 + 1,
+                "is_half": bool(is_half),
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+def load(gpt_path, sovits_path, hps, cache_dir, device="cpu", is_half=False):
+    """返回 TorchScriptModels. 没有对应的导出结果时先导出(较慢, 只在模型文件变化后进行一次)"""
+    model_dir = ensure_exported(
+        cache_dir,
+        fingerprint(
+            [gpt_path, sovits_path], EXPORT_VERSION, torch.__version__, torch.device(device).type, bool(is_half)
+        ),
+        lambda output_dir: export(gpt_path, sovits_path, hps, output_dir, device, is_half),
+    )
+    return TorchScriptModels(model_dir, device)
+
+
+class TorchScriptModels:
+    def __init__(self, model_dir, device="cpu"):
+        with open(os.path.join(model_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.model_dir = model_dir
+        self.version = self.meta["version"]
+        self.dtype = torch.float16 if self.meta["is_half"] else torch.float32
+        self.t2s = torch.jit.optimize_for_inference(
+            torch.jit.load(os.path.join(model_dir, "t2s.pt"), device), other_methods=["decode_step"]
+        )
+        vits_path = os.path.join(model_dir, "vits.pt")
+        self.vits = None
+        if os.path.exists(vits_path):
+            self.vits = torch.jit.optimize_for_inference(torch.jit.load(vits_path, device))
+        self.warmup(device)
+
+    def warmup(self, device):
+        """TorchScript在前两次调用时记录输入形状并优化图, 加载后先用短输入运行, 首个请求不需要等待优化"""
+        phoneme_ids = [1] * 4
+        text = torch.LongTensor([phoneme_ids]).to(device)
+        refer = torch.zeros((1, self.meta["spec_channels"], 20), device=device)
+        sv_emb = torch.zeros((1, 20480), device=device) if self.version in {"v2Pro", "v2ProPlus"} else None
+        for _ in range(2):
+            codes = self.infer_semantic(phoneme_ids, torch.zeros((1024, 4)), text, 15, 1, 1, early_stop_num=2)
+            if self.vits is not None:
+                self.decode_vits(codes.view(1, 1, -1), text, refer, sv_emb)
+
+    def infer_semantic(
+        self,
+        phoneme_ids,
+        bert,
+        prompt,
+        top_k,
+        top_p,
+        temperature,
+        early_stop_num=-1,
+        stop_event=None,
+        repetition_penalty=1.35,
+    ):
+        """
+        与 Text2SemanticDecoder.infer_panel 相同的解码过程(单句), 参数与 OnnxModels.infer_semantic 相同.
+        每解码一步检查一次 stop_event
+        """
+        if stop_event is not None and stop_event.is_set():
+            return prompt.new_zeros(0)
+        device = prompt.device
+        params = (int(top_k), float(top_p), float(temperature), float(repetition_penalty), int(early_stop_num))
+        prefix_len = prompt.shape[1]
+        with torch.no_grad():
+            y, k_cache, v_cache, stop = self.t2s(
+                torch.LongTensor([phoneme_ids]).to(device),
+                bert.to(device=device, dtype=self.dtype),
+                prompt.long(),
+                *params,
+            )
+            for idx in range(1, 1500):
+                if stop or (stop_event is not None and stop_event.is_set()):
+                    break
+                y, k_cache, v_cache, stop = self.t2s.decode_step(y, k_cache, v_cache, idx, prefix_len, *params)
+        return y[0, prefix_len:-1]
+
+    def can_decode_vits(self, refers, speed):
+        """v3/v4、语速调节与多参考音频平均音色由PyTorch模型处理"""
+        return self.vits is not None and speed == 1 and len(refers) == 1
+
+    def decode_vits(self, codes, text, refer, sv_emb=None, noise_scale=0.5):
+        """codes: [1, 1, T], text: [1, 音素数], refer: [1, 频点数, 帧数]; 返回 [1, 1, 采样点数] 的numpy数组"""
+        noise_scale = torch.tensor(noise_scale, device=codes.device, dtype=self.dtype)
+        inputs = [codes.long(), text.long(), refer.to(self.dtype), noise_scale]
+        if sv_emb is not None:
+            inputs.append(sv_emb.to(self.dtype))
+        with torch.no_grad():
+            return self.vits(*inputs).float().cpu().numpy()
@@ -168,3 +168,17 @@ async def process_voice_message(
                 os.remove(temp_path)
             except Exception as e:
                 print(f"清理临时文件失败: {e}")
+
+@router.get("/tts-backends")
+async def get_tts_backends(probe: bool = False):
+    """获取llm_server后端池状态，probe=true时立即做一次探活"""
+    from app.services.tts_backend_pool import tts_backend_pool
+    
+    if probe:
+        backends = await tts_backend_pool.check_all()
+    else:
+        backends = tts_backend_pool.status()
+    return {
+        "success": True,
+        "backends": backends
+    }
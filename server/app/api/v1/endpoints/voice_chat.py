@@ -2,6 +2,10 @@ import json
 import uuid
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from app.services.voice_chat_service import voice_chat_service
+from app.core.logging_config import set_request_id
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -10,11 +14,13 @@ router = APIRouter()
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket端点用于实时语音聊天"""
     client_id = str(uuid.uuid4())
+    # 该连接及其派生任务的日志都带上连接ID
+    set_request_id(client_id.replace("-", "")[:16])
     
     try:
         # 建立连接
         await websocket.accept()
-        print(f"WebSocket连接已建立: {client_id}")
+        logger.info(f"WebSocket连接已建立: {client_id}")
         
         # 初始化语音聊天服务
         await voice_chat_service.connect(websocket, client_id)
@@ -28,9 +34,9 @@ async def websocket_endpoint(websocket: WebSocket):
             await voice_chat_service.handle_message(websocket, client_id, message)
             
     except WebSocketDisconnect:
-        print(f"客户端断开连接: {client_id}")
+        logger.info(f"客户端断开连接: {client_id}")
     except Exception as e:
-        print(f"WebSocket错误: {e}")
+        logger.error(f"WebSocket错误: {e}")
         try:
             await websocket.close()
         except:
@@ -3,7 +3,7 @@
 """
 
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -40,9 +40,39 @@ class Settings(BaseSettings):
     SPEECH_RECOGNITION_LANGUAGE: str = "zh-CN"
     TTS_LANGUAGE: str = "zh"
     TTS_SPEED: float = 1.0
-    
+
+    # 流式语音(VAD)配置
+    VOICE_STREAM_SAMPLE_RATE: int = 16000
+    VOICE_VAD_THRESHOLD_DB: float = -40.0
+    VOICE_VAD_MIN_SPEECH_MS: int = 300
+    VOICE_VAD_END_SILENCE_MS: int = 600
+    VOICE_VAD_HOP_MS: int = 20
+    VOICE_VAD_MAX_SIL_KEPT_MS: int = 200
+    VOICE_VAD_MAX_UTTERANCE_MS: int = 30000
+    VOICE_PARTIAL_ASR_INTERVAL_MS: int = 1200
+
+    # 预生成话术池配置（问候语/冷场搭话）
+    VOICE_POOL_ENABLED: bool = True
+    VOICE_POOL_SIZE: int = 3
+    VOICE_POOL_MAX_CHARACTERS: int = 50
+    VOICE_POOL_MAX_AGE_SECONDS: int = 1800  # 预生成话术的最长保存时间，超过后不再使用
+
     # LLM服务器配置
     LLM_SERVER_URL: str = "http://localhost:9880"
+    # 多个llm_server实例，配置后在它们之间负载均衡（为空时只使用LLM_SERVER_URL）
+    LLM_SERVER_URLS: List[str] = []
+    TTS_BACKEND_MAX_CONCURRENCY: int = 2
+    TTS_HEALTH_CHECK_INTERVAL: float = 30.0
+    TTS_HEALTH_CHECK_TIMEOUT: float = 60.0
+    TTS_CIRCUIT_FAILURE_THRESHOLD: int = 3
+    TTS_CIRCUIT_RESET_SECONDS: float = 30.0
+    # 健康检查使用的探活合成请求（未配置参考音频时使用该后端上最近一次真实请求的已注册说话人，都没有时不探活）
+    TTS_CANARY_TEXT: str = "你好。"
+    TTS_CANARY_REFER_WAV_PATH: str = ""
+    TTS_CANARY_PROMPT_TEXT: str = ""
+    TTS_CANARY_PROMPT_LANGUAGE: str = "zh"
+    # 在llm_server上注册说话人，推理请求只携带speaker_id（llm_server不支持时自动回退为传参考音频路径）
+    TTS_SPEAKER_REGISTRY_ENABLED: bool = True
     
     # 服务器配置
     SERVER_URL: str = "http://localhost:8000"
@@ -50,19 +80,40 @@ class Settings(BaseSettings):
     # 文件存储配置
     UPLOAD_DIR: str = "static/uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
-    
+    # 参考音频本地缓存
+    REFERENCE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # 512MB
+    REFERENCE_CACHE_REVALIDATE_SECONDS: int = 300
+    # 后台上传七牛云
+    UPLOAD_WORKER_CONCURRENCY: int = 2
+    UPLOAD_MAX_RETRIES: int = 3
+    UPLOAD_PART_SIZE: int = 4 * 1024 * 1024  # 4MB
+    UPLOAD_LOCAL_RETENTION_SECONDS: int = 3600  # 上传完成后本地副本保留时间
+
     # 七牛云存储配置
     QINIU_ACCESS_KEY: str = ""
     QINIU_SECRET_KEY: str = ""
     QINIU_BUCKET_NAME: str = ""
     QINIU_DOMAIN: str = ""
     QINIU_USE_HTTPS: bool = True
+    # 上传域名，留空时按空间所在区域自动选择（压测时指向本地桩服务）
+    QINIU_UP_HOST: str = ""
     
     # 七牛云AI API配置
     QINIU_AI_API_KEY: Optional[str] = None
     QINIU_AI_BASE_URL: str = "https://openai.qiniu.com/v1"
     QINIU_AI_BACKUP_URL: str = "https://api.qnaigc.com/v1"
     
+    # 日志配置
+    LOG_LEVEL: str = "INFO"
+    # 按logger单独设置级别，如 {"app.services.ai_service": "DEBUG"}
+    LOG_LEVELS: Dict[str, str] = {}
+    # 按logger对INFO及以下级别采样，如 {"app.services.voice_chat_service": 0.1}
+    LOG_SAMPLE_RATES: Dict[str, float] = {}
+    LOG_FORMAT: str = "text"  # text 或 json
+    LOG_FILE: str = "logs/app.log"
+    LOG_QUEUE_SIZE: int = 10000  # 队列满时丢弃日志而不阻塞
+    LOG_MAX_MESSAGE_LENGTH: int = 2000
+    
     # 安全配置
     SECRET_KEY: str = "your-secret-key-here"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
@@ -17,8 +17,10 @@ engine = create_engine(
 )
 
 # 异步数据库引擎（用于应用）
-# 将MySQL URL转换为异步URL
+# 将MySQL URL转换为异步URL，SQLite（本地开发、压测）使用aiosqlite驱动
 async_database_url = settings.DATABASE_URL.replace("mysql+pymysql://", "mysql+aiomysql://")
+if async_database_url.startswith("sqlite://"):
+    async_database_url = async_database_url.replace("sqlite://", "sqlite+aiosqlite://", 1)
 
 async_engine = create_async_engine(
     async_database_url,
@@ -0,0 +1,202 @@
+"""
+日志配置
+所有日志先进入有界队列，由后台线程写入文件和控制台，请求处理协程不会阻塞在IO上；
+支持按logger设置级别和采样率、截断过长的消息，并在每条日志中附带请求ID
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from app.core.config import settings
+
+# 当前请求ID，由 logging_middleware / WebSocket连接设置
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def set_request_id(request_id: Optional[str] = None) -> str:
+    """设置当前上下文的请求ID，返回实际使用的ID"""
+    request_id = request_id or new_request_id()
+    request_id_var.set(request_id)
+    return request_id
+
+
+def truncate(value: Any, max_length: Optional[int] = None) -> str:
+    """把任意对象转成字符串并截断，用于记录请求参数、响应体等大对象"""
+    max_length = max_length or settings.LOG_MAX_MESSAGE_LENGTH
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= max_length:
+        return text
+    return f"{text[:max_length]}...(共{len(text)}字符)"
+
+
+class Truncated:
+    """延迟截断，作为 %s 参数传给logger，日志级别未启用时不会生成repr"""
+
+    __slots__ = ("value", "max_length")
+
+    def __init__(self, value: Any, max_length: Optional[int] = None):
+        self.value = value
+        self.max_length = max_length
+
+    def __str__(self) -> str:
+        return truncate(self.value, self.max_length)
+
+
+class RequestContextFilter(logging.Filter):
+    """在记录上附加请求ID（必须在调用方线程中执行，contextvar在后台线程中不可见）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """按logger对INFO及以下级别的日志采样，WARNING及以上总是保留"""
+
+    def __init__(self, sample_rates: Dict[str, float]):
+        super().__init__()
+        self.sample_rates = sample_rates
+        self._cache: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            # 最长前缀匹配，与logging的层级一致
+            parts = name.split(".")
+            for i in range(len(parts), 0, -1):
+                prefix = ".".join(parts[:i])
+                if prefix in self.sample_rates:
+                    rate = self.sample_rates[prefix]
+                    break
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志并计数，而不是阻塞调用方"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 在调用方线程中完成消息格式化和截断（异常堆栈不截断），后台线程只负责写出
+        record = copy.copy(record)
+        record.msg = truncate(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # 停止时队列可能是满的，等待后台线程腾出空间
+        self.queue.put(self._sentinel)
+
+
+class JSONFormatter(logging.Formatter):
+    """每行一个JSON对象的结构化日志"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                    + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class TruncatingFormatter(logging.Formatter):
+    """文本格式日志"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return super().format(record)
+
+
+def setup_logging():
+    """初始化异步日志，重复调用无副作用"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    formatter = JSONFormatter() if settings.LOG_FORMAT == "json" else TruncatingFormatter()
+    handlers = [logging.StreamHandler()]
+    if settings.LOG_FILE:
+        log_dir = os.path.dirname(settings.LOG_FILE)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        handlers.append(logging.FileHandler(settings.LOG_FILE, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(RequestContextFilter())
+    _queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATES))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = _QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """停止后台写日志线程，写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    return {
+        "queued": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+    }
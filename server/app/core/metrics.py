@@ -0,0 +1,231 @@
+"""
+进程内指标统计
+记录各处理阶段（数据库、LLM、参考音频下载、TTS、ASR、上传、导出等）的耗时分布与调用次数，
+以Prometheus文本格式从 /metrics 导出；分位数(p50/p95/p99)基于最近的采样窗口计算
+"""
+
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 阶段耗时直方图的桶边界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, description: str, callback: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.description = description
+        # 设置了callback时在导出时取值，用于队列长度等由其他模块维护的状态
+        self.callback = callback
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        if self.callback is not None:
+            try:
+                lines.append(f"{self.name} {float(self.callback())}")
+            except Exception:
+                pass
+            return lines
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class _HistogramSeries:
+    def __init__(self, buckets: Tuple[float, ...], window: int):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+
+class Histogram:
+    """
+    直方图: 累计桶计数可在Prometheus端聚合计算分位数，
+    同时导出基于最近window次观测的p50/p95/p99，便于直接查看
+    """
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, window: int = 1024):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+        self._series: Dict[LabelKey, _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(self.buckets, self.window)
+            series.counts[bisect.bisect_left(self.buckets, value)] += 1
+            series.sum += value
+            series.count += 1
+            series.recent.append(value)
+
+    def quantiles(self, **labels) -> Dict[float, float]:
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            recent = sorted(series.recent) if series else []
+        return self._quantiles(recent)
+
+    @staticmethod
+    def _quantiles(recent: List[float]) -> Dict[float, float]:
+        if not recent:
+            return {}
+        return {q: recent[min(len(recent) - 1, int(q * len(recent)))] for q in QUANTILES}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        quantile_lines = [f"# TYPE {self.name}_recent summary"]
+        with self._lock:
+            snapshot = [
+                (key, list(series.counts), series.sum, series.count, sorted(series.recent))
+                for key, series in sorted(self._series.items())
+            ]
+        for key, counts, total, count, recent in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', repr(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+            for q, value in self._quantiles(recent).items():
+                quantile_lines.append(f"{self.name}_recent{_format_labels(key, [('quantile', str(q))])} {value}")
+        return lines + quantile_lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(Counter(name, description))
+
+    def gauge(self, name: str, description: str, callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(name, description, callback))
+
+    def histogram(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 创建全局实例
+metrics = MetricsRegistry()
+
+stage_duration = metrics.histogram("app_stage_duration_seconds", "各处理阶段耗时")
+stage_errors = metrics.counter("app_stage_errors_total", "各处理阶段失败次数")
+http_request_duration = metrics.histogram("app_http_request_duration_seconds", "HTTP请求总耗时")
+http_requests = metrics.counter("app_http_requests_total", "HTTP请求数")
+http_in_flight = metrics.gauge("app_http_requests_in_flight", "正在处理的HTTP请求数")
+
+
+@contextmanager
+def stage(name: str):
+    """
+    记录一个处理阶段的耗时，同步和异步代码中都可以使用:
+
+        with stage("tts.reference_download"):
+            path = await reference_audio_cache.acquire(url)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        # 用户打断不算失败
+        stage_duration.observe(time.perf_counter() - start, stage=name, status="cancelled")
+        raise
+    except Exception:
+        stage_duration.observe(time.perf_counter() - start, stage=name, status="error")
+        stage_errors.inc(stage=name)
+        raise
+    stage_duration.observe(time.perf_counter() - start, stage=name, status="ok")
+
+
+def timed(name: str):
+    """把整个函数作为一个阶段计时的装饰器，支持同步和异步函数"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -9,18 +9,13 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from app.core.exceptions import BaseCustomException
+from app.core.logging_config import setup_logging, set_request_id
+from app.core.metrics import http_request_duration, http_requests, http_in_flight
 import time
 from typing import Callable
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/app.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# 配置日志（队列异步写出）
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -96,6 +91,9 @@ class GlobalExceptionHandler:
 async def logging_middleware(request: Request, call_next: Callable):
     """请求日志中间件"""
     start_time = time.time()
+    # 沿用调用方传入的请求ID，没有则生成一个，之后该请求的所有日志都带上它
+    request_id = set_request_id(request.headers.get("X-Request-ID"))
+    http_in_flight.inc()
     
     # 记录请求开始
     logger.info(f"请求开始: {request.method} {request.url}")
@@ -115,6 +113,8 @@ async def logging_middleware(request: Request, call_next: Callable):
         
         # 添加处理时间到响应头
         response.headers["X-Process-Time"] = str(process_time)
+        response.headers["X-Request-ID"] = request_id
+        _record_request(request, response.status_code, process_time)
         
         return response
         
@@ -128,9 +128,19 @@ async def logging_middleware(request: Request, call_next: Callable):
             f"异常: {str(exc)} - "
             f"处理时间: {process_time:.3f}s"
         )
+        _record_request(request, 500, process_time)
         
         # 重新抛出异常，让全局异常处理器处理
         raise exc
+    finally:
+        http_in_flight.dec()
+
+def _record_request(request: Request, status_code: int, process_time: float):
+    """按路由模板（而不是实际路径）记录请求耗时，避免路径参数造成标签爆炸"""
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    http_request_duration.observe(process_time, method=request.method, path=path)
+    http_requests.inc(method=request.method, path=path, status=str(status_code))
 
 def setup_exception_handlers(app):
     """设置异常处理器"""
@@ -4,6 +4,7 @@ AI角色扮演后端主应用
 """
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
@@ -15,6 +16,9 @@ from app.core.config import settings
 from app.core.database import init_db
 from app.api.v1.api import api_router
 from app.core.middleware import setup_exception_handlers
+from app.core.logging_config import shutdown_logging, get_logging_stats
+from app.core.metrics import metrics
+from app.services.storage_upload_service import storage_upload_service
 from app.api.v1.endpoints.voice_chat import router as voice_chat_router
 
 # 加载环境变量
@@ -25,9 +29,12 @@ async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时初始化数据库
     await init_db()
+    # 继续上次运行中未完成的七牛云上传与本地清理
+    await storage_upload_service.start()
     yield
     # 关闭时清理资源
-    pass
+    await storage_upload_service.stop()
+    shutdown_logging()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -76,6 +83,17 @@ async def health_check():
     """健康检查端点"""
     return {"status": "healthy", "message": "服务正常运行"}
 
+# 由其他模块维护的状态在导出时取值
+metrics.gauge("app_upload_pending", "等待上传到七牛云的文件数",
+              lambda: storage_upload_service.get_stats()["pending"])
+metrics.gauge("app_log_queue_size", "日志队列中待写出的记录数", lambda: get_logging_stats()["queued"])
+metrics.gauge("app_log_dropped_total", "日志队列已满时丢弃的记录数", lambda: get_logging_stats()["dropped"])
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus格式的指标（各阶段耗时分布、请求数、进行中的语音会话等）"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
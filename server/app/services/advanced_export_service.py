@@ -16,6 +16,7 @@ from app.services.tts_cache_service import tts_cache_service
 from app.services.qiniu_podcast_tts_service import qiniu_podcast_tts_service
 from app.services.tts_service import TTSService
 from app.services.static_asset_service import static_asset_service
+from app.core.metrics import timed
 
 class AdvancedExportService(ExportService):
     """高级音频导出服务"""
@@ -25,6 +26,7 @@ class AdvancedExportService(ExportService):
         self.tts_cache = tts_cache_service
         self.tts_service = TTSService()
     
+    @timed("export.advanced_podcast")
     async def generate_advanced_podcast_audio(
         self,
         messages: List[Dict],
@@ -343,12 +345,13 @@ class AdvancedExportService(ExportService):
             # 上传到存储服务
             print("上传用户音色文件到存储服务...")
             if static_asset_service.use_qiniu:
-                # 使用七牛云存储直接上传字节数据
-                from app.services.qiniu_service import qiniu_service
-                result = qiniu_service.upload_data(
+                # 七牛云ASR需要公网URL，等待上传完成；上传在线程池中进行，不阻塞事件循环
+                from app.services.storage_upload_service import storage_upload_service
+                result = await storage_upload_service.store(
                     data=voice_data,
                     key=f"user_voices/{filename}",
-                    mime_type="audio/wav"
+                    mime_type="audio/wav",
+                    wait=True
                 )
                 if result["success"]:
                     voice_url = result["url"]
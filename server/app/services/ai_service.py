@@ -5,10 +5,15 @@ AI服务 - 负责与LLM模型交互
 from typing import List, Dict, Optional
 from app.core.config import settings
 from app.core.exceptions import AIResponseError
+from app.core.logging_config import Truncated, truncate
+from app.core.metrics import timed
 import openai
 import json
-import requests
+import httpx
 import time
+import logging
+
+logger = logging.getLogger(__name__)
 
 class AIService:
     """AI服务类"""
@@ -18,6 +23,7 @@ class AIService:
         self.model = settings.QINIU_MODEL
         self.max_tokens = settings.OPENAI_MAX_TOKENS
     
+    @timed("llm.generate_response")
     async def generate_response(
         self,
         character_id: str,
@@ -28,15 +34,14 @@ class AIService:
         try:
             # 获取角色信息
             character_info = await self._get_character_info(character_id)
-            print('角色信息', character_info)
+            logger.debug("角色信息: %s", Truncated(character_info))
             # 构建系统提示
-            print('构建系统提示')
             system_prompt = self._build_system_prompt(character_info)
             messages = [{"role": "system", "content": system_prompt}]
             messages.extend(session_history[-10:])
             messages.append({"role": "user", "content": user_message})
             
-            url = "https://openai.qiniu.com/v1/chat/completions"
+            url = f"{settings.QINIU_AI_BASE_URL}/chat/completions"
             headers = {
                 "Authorization": "Bearer "+self.api_key,
                 "Content-Type": "application/json"
@@ -47,27 +52,22 @@ class AIService:
                 "messages": messages
             }
             
-            print('请求参数:', payload)
+            logger.debug("请求参数: %s", Truncated(payload))
             
             # 发送请求
-            # response = requests.post(url, json=payload, headers=headers)
-
-            # 将上面的发送请求改为下面的，即可强制禁用代理，开不开vpn皆可使用
-            session = requests.Session()
-            session.trust_env = False  # 禁用系统环境变量中的代理设置
-
-            response = session.post(
-                url,
-                json=payload,
-                headers=headers,
-                timeout=10
-            )
+            # 使用异步客户端，所在任务被取消（用户打断/挂断）时请求会立即中止
+            # trust_env=False 强制禁用代理，开不开vpn皆可使用
+            async with httpx.AsyncClient(trust_env=False, timeout=10) as client:
+                response = await client.post(
+                    url,
+                    json=payload,
+                    headers=headers
+                )
 
-            print('响应状态码:', response.status_code)
-            print('响应内容:', response.text)
+            logger.debug("响应状态码: %s, 响应内容: %s", response.status_code, Truncated(response.text))
             
             if response.status_code != 200:
-                raise AIResponseError(f"API请求失败，状态码: {response.status_code}, 响应: {response.text}")
+                raise AIResponseError(f"API请求失败，状态码: {response.status_code}, 响应: {truncate(response.text, 500)}")
             
             response_data = response.json()
             message = response_data['choices'][0]['message']
@@ -81,10 +81,7 @@ class AIService:
             }
             
         except Exception as e:
-            print(f"AI服务异常: {e}")
-            print(f"异常类型: {type(e)}")
-            import traceback
-            print(f"异常堆栈: {traceback.format_exc()}")
+            logger.error(f"AI服务异常: {type(e).__name__}: {e}", exc_info=True)
             raise AIResponseError(f"AI响应生成失败: {str(e)}")
     
     
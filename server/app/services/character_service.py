@@ -105,6 +105,7 @@ class CharacterService:
         
         await self.db.commit()
         await self.db.refresh(character)
+        self._invalidate_utterances(character_id)
         return character
 
     async def delete_character(self, character_id: str) -> bool:
@@ -136,6 +137,7 @@ class CharacterService:
             # 最后删除角色
             await self.db.delete(character)
             await self.db.commit()
+            self._invalidate_utterances(character_id)
             return True
             
         except Exception as e:
@@ -143,6 +145,12 @@ class CharacterService:
             print(f"删除角色失败: {e}")
             return False
 
+    def _invalidate_utterances(self, character_id: str):
+        """参考音频、声音等变化后，按旧设定预生成的问候语/搭话不再使用"""
+        # voice_chat_service 依赖本模块，在这里导入避免循环导入
+        from app.services.voice_chat_service import voice_chat_service
+        voice_chat_service.utterance_pool.invalidate(character_id)
+
     async def get_popular_characters(self, limit: int = 10) -> List[Character]:
         """获取热门角色"""
         query = select(Character).where(Character.is_popular == True).order_by(Character.popularity.desc()).limit(limit)
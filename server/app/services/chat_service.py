@@ -8,6 +8,8 @@ from sqlalchemy.orm import selectinload
 from typing import List, Optional
 from app.models.chat import ChatSession, ChatMessage
 from app.models.character import Character
+from app.services.storage_upload_service import storage_upload_service
+from app.core.metrics import timed
 import uuid
 from datetime import datetime
 
@@ -17,6 +19,7 @@ class ChatService:
     def __init__(self, db: AsyncSession):
         self.db = db
     
+    @timed("db.get_or_create_session")
     async def get_or_create_session(
         self, 
         character_id: str, 
@@ -49,6 +52,7 @@ class ChatService:
         
         return session
     
+    @timed("db.get_session")
     async def get_session_by_id(self, session_id: str) -> Optional[ChatSession]:
         """根据ID获取会话"""
         query = select(ChatSession).options(
@@ -59,6 +63,7 @@ class ChatService:
         result = await self.db.execute(query)
         return result.scalar_one_or_none()
     
+    @timed("db.get_user_sessions")
     async def get_user_sessions(
         self,
         user_id: Optional[str] = None,
@@ -87,6 +92,7 @@ class ChatService:
         result = await self.db.execute(query)
         return result.scalars().all()
     
+    @timed("db.add_message")
     async def add_message(
         self,
         session_id: str,
@@ -101,7 +107,8 @@ class ChatService:
             session_id=session_id,
             content=content,
             is_user=is_user,
-            audio_url=audio_url,
+            # 音频已在后台上传到七牛云时直接保存七牛云URL
+            audio_url=storage_upload_service.resolve(audio_url),
             message_metadata=message_metadata or {}
         )
         
@@ -116,6 +123,7 @@ class ChatService:
         await self.db.refresh(message)
         return message
     
+    @timed("db.get_session_messages")
     async def get_session_messages(
         self,
         session_id: str,
@@ -152,6 +160,7 @@ class ChatService:
             for msg in messages
         ]
     
+    @timed("db.delete_session")
     async def delete_session(self, session_id: str) -> bool:
         """删除会话"""
         session = await self.get_session_by_id(session_id)
@@ -26,6 +26,7 @@ from app.core.config import settings
 from app.services.tts_service import TTSService
 from app.services.static_asset_service import static_asset_service
 from app.services.qiniu_podcast_tts_service import qiniu_podcast_tts_service
+from app.core.metrics import timed
 
 
 class ExportService:
@@ -45,6 +46,7 @@ class ExportService:
             return text.encode('utf-8', errors='ignore').decode('utf-8')
         return str(text)
     
+    @timed("export.text")
     async def generate_text_export(
         self, 
         messages: List[Dict], 
@@ -358,6 +360,7 @@ class ExportService:
         buffer.seek(0)
         return buffer.getvalue()
     
+    @timed("export.podcast")
     async def generate_podcast_audio(
         self, 
         messages: List[Dict], 
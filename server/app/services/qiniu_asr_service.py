@@ -11,6 +11,7 @@ import tempfile
 from typing import Optional, Dict, Any
 from app.core.config import settings
 from app.services.qiniu_service import qiniu_service
+from app.core.metrics import timed
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +34,7 @@ class QiniuASRService:
         """检查ASR服务是否可用"""
         return self.enabled
     
+    @timed("asr.speech_to_text")
     async def speech_to_text(self, audio_url: str, language: str = "zh") -> str:
         """
         使用七牛云ASR API进行语音识别
@@ -122,6 +124,7 @@ class QiniuASRService:
             logger.error(f"解析ASR响应失败: {e}")
             return ""
     
+    @timed("asr.speech_to_text_from_file")
     async def speech_to_text_from_file(self, file_content: bytes, filename: str, language: str = "zh") -> str:
         """
         从文件内容进行语音识别
@@ -6,8 +6,9 @@
 import os
 import uuid
 from typing import Optional, Dict, Any, List
-from qiniu import Auth, put_file, put_data, put_stream, BucketManager, build_batch_delete
-from qiniu import http
+from qiniu import Auth, put_file, put_data, put_stream, BucketManager, build_batch_delete, UploadProgressRecorder
+from qiniu import http, Zone
+from qiniu import config as qiniu_config
 from app.core.config import settings
 import logging
 
@@ -34,6 +35,11 @@ class QiniuService:
             self.auth = Auth(self.access_key, self.secret_key)
             # 创建bucket管理对象
             self.bucket_manager = BucketManager(self.auth)
+            if settings.QINIU_UP_HOST:
+                # 指定上传域名后不再查询空间所在区域
+                qiniu_config.set_default(
+                    default_zone=Zone(up_host=settings.QINIU_UP_HOST, up_host_backup=settings.QINIU_UP_HOST)
+                )
     
     def is_enabled(self) -> bool:
         """检查七牛云服务是否可用"""
@@ -150,6 +156,65 @@ class QiniuService:
                 "error": str(e)
             }
     
+    def upload_file_resumable(
+        self,
+        file_path: str,
+        key: str,
+        mime_type: str = "application/octet-stream",
+        record_dir: str = None
+    ) -> Dict[str, Any]:
+        """
+        分片上传文件到七牛云，大文件（如导出的音频）中断后可从已完成的分片继续
+        
+        Args:
+            file_path: 本地文件路径
+            key: 七牛云存储的文件名
+            mime_type: MIME类型
+            record_dir: 分片上传进度记录目录
+            
+        Returns:
+            上传结果字典
+        """
+        if not self.enabled:
+            raise Exception("七牛云服务未启用")
+        
+        try:
+            token = self.get_upload_token(key)
+            recorder = UploadProgressRecorder(record_dir) if record_dir else None
+            # 超过4MB的文件自动走分片上传，进度记录在record_dir中
+            ret, info = put_file(
+                token,
+                key,
+                file_path,
+                mime_type=mime_type,
+                upload_progress_recorder=recorder,
+                part_size=settings.UPLOAD_PART_SIZE,
+                version="v2",
+                bucket_name=self.bucket_name
+            )
+            
+            if info.status_code == 200:
+                return {
+                    "success": True,
+                    "key": key,
+                    "url": self.get_file_url(key),
+                    "hash": ret.get("hash"),
+                    "size": ret.get("fsize")
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"上传失败: {info.error}",
+                    "status_code": info.status_code
+                }
+                
+        except Exception as e:
+            logger.error(f"分片上传文件失败: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
     def upload_stream(self, stream, key: str = None, mime_type: str = None) -> Dict[str, Any]:
         """
         上传流数据到七牛云
@@ -0,0 +1,212 @@
+"""
+参考音频本地缓存 - 七牛云上的角色参考音频只下载一次，供llm_server重复使用
+以URL为键，按ETag做条件请求重新验证，总大小超限时按LRU淘汰；
+下载写入临时文件后原子重命名，同一URL的并发请求共享一次下载
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional, Set
+import httpx
+from app.core.config import settings
+from app.core.metrics import timed
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceAudioCache:
+    """参考音频缓存"""
+
+    def __init__(self):
+        self.cache_dir = os.path.join(settings.UPLOAD_DIR, "reference_cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.metadata_file = os.path.join(self.cache_dir, "cache_metadata.json")
+        self.max_bytes = settings.REFERENCE_CACHE_MAX_BYTES
+        self.revalidate_seconds = settings.REFERENCE_CACHE_REVALIDATE_SECONDS
+        # 同一URL的下载/验证串行执行，并发请求共享结果
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # 正在被llm_server使用的文件不参与淘汰
+        self._in_use: Dict[str, int] = {}
+        # 被替换或淘汰时仍在使用的文件，最后一次 release() 时删除
+        self._pending_removal: Set[str] = set()
+        self._load_metadata()
+
+    def _load_metadata(self):
+        """加载缓存元数据，丢弃文件已不存在的条目"""
+        try:
+            with open(self.metadata_file, "r", encoding="utf-8") as f:
+                self.metadata: Dict[str, Dict[str, Any]] = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.metadata = {}
+        self.metadata = {
+            key: entry for key, entry in self.metadata.items()
+            if os.path.exists(os.path.join(self.cache_dir, entry["filename"]))
+        }
+
+    def _save_metadata(self):
+        """原子写入缓存元数据"""
+        tmp_path = f"{self.metadata_file}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.metadata, f, ensure_ascii=False)
+            os.replace(tmp_path, self.metadata_file)
+        except Exception as e:
+            logger.warning(f"保存参考音频缓存元数据失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _cache_key(url: str) -> str:
+        # 去掉查询参数（私有空间的签名每次都不同），内容变化由ETag判断
+        return hashlib.sha1(url.split("?")[0].encode("utf-8")).hexdigest()
+
+    def _path(self, entry: Dict[str, Any]) -> str:
+        return os.path.join(self.cache_dir, entry["filename"])
+
+    async def acquire(self, url: str) -> str:
+        """获取URL对应的本地文件路径，调用 release() 之前该文件不会被淘汰"""
+        local_path = await self._get(self._cache_key(url), url)
+        self._in_use[local_path] = self._in_use.get(local_path, 0) + 1
+        return local_path
+
+    def release(self, local_path: str):
+        """释放 acquire() 返回的文件"""
+        count = self._in_use.get(local_path, 0) - 1
+        if count > 0:
+            self._in_use[local_path] = count
+        else:
+            self._in_use.pop(local_path, None)
+            if local_path in self._pending_removal:
+                self._pending_removal.discard(local_path)
+                # 内容恢复为同一文件时，新的缓存条目仍引用它
+                if not any(self._path(entry) == local_path for entry in self.metadata.values()):
+                    self._delete(local_path)
+
+    async def _get(self, key: str, url: str) -> str:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self.metadata.get(key)
+            now = time.time()
+            if entry and os.path.exists(self._path(entry)):
+                if now - entry["validated_at"] < self.revalidate_seconds:
+                    entry["accessed_at"] = now
+                    return self._path(entry)
+                entry = await self._revalidate(key, url, entry)
+            else:
+                entry = await self._download(key, url, None)
+            entry["accessed_at"] = time.time()
+            self.metadata[key] = entry
+            # 本次返回的文件尚未计入 _in_use，不能被淘汰
+            self._evict(keep=key)
+            self._save_metadata()
+            return self._path(entry)
+
+    async def _revalidate(self, key: str, url: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """带ETag的条件请求，未变化时只刷新验证时间"""
+        try:
+            return await self._download(key, url, entry)
+        except Exception as e:
+            # 源站不可用时继续使用本地副本
+            logger.warning(f"参考音频重新验证失败，使用本地缓存: {url} ({e})")
+            entry["validated_at"] = time.time()
+            return entry
+
+    @timed("storage.reference_download")
+    async def _download(self, key: str, url: str, entry: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and entry:
+                    entry["validated_at"] = time.time()
+                    return entry
+                response.raise_for_status()
+
+                # 先写临时文件，边下载边计算内容哈希，完成后原子重命名
+                ext = os.path.splitext(url.split("?")[0])[1] or ".wav"
+                tmp_path = os.path.join(self.cache_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+                digest = hashlib.sha1()
+                size = 0
+                try:
+                    with open(tmp_path, "wb") as f:
+                        async for chunk in response.aiter_bytes():
+                            f.write(chunk)
+                            digest.update(chunk)
+                            size += len(chunk)
+                    content_hash = digest.hexdigest()
+                    # 文件名包含内容哈希，内容变化后路径也变化，llm_server不会误用旧的参考音频特征
+                    filename = f"{key[:16]}_{content_hash[:16]}{ext}"
+                    os.replace(tmp_path, os.path.join(self.cache_dir, filename))
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+
+                etag = response.headers.get("ETag")
+
+        if entry and entry["filename"] != filename:
+            self._remove_file(entry)
+        now = time.time()
+        logger.info(f"参考音频已缓存: {url} -> {filename} ({size} 字节)")
+        return {
+            "url": url.split("?")[0],
+            "filename": filename,
+            "etag": etag,
+            "hash": content_hash,
+            "size": size,
+            "validated_at": now,
+            "accessed_at": now,
+        }
+
+    def _remove_file(self, entry: Dict[str, Any]):
+        path = self._path(entry)
+        if path in self._in_use:
+            self._pending_removal.add(path)
+            return
+        self._delete(path)
+
+    @staticmethod
+    def _delete(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"删除参考音频缓存失败: {e}")
+
+    def _evict(self, keep: Optional[str] = None):
+        """总大小超过上限时按最近访问时间淘汰，keep 对应的条目不淘汰"""
+        total = sum(entry["size"] for entry in self.metadata.values())
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self.metadata.items(), key=lambda item: item[1]["accessed_at"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep or self._path(entry) in self._in_use:
+                continue
+            self._remove_file(entry)
+            # 锁保留: 其他协程可能正持有或等待该锁, 删除后新调用方会建新锁, 同一文件可能被并发下载
+            del self.metadata[key]
+            total -= entry["size"]
+            logger.info(f"淘汰参考音频缓存: {entry['url']}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return {
+            "entries": len(self.metadata),
+            "total_size": sum(entry["size"] for entry in self.metadata.values()),
+            "max_size": self.max_bytes,
+            "in_use": len(self._in_use),
+            "pending_removal": len(self._pending_removal),
+            "cache_dir": self.cache_dir,
+        }
+
+
+# 创建全局实例
+reference_audio_cache = ReferenceAudioCache()
@@ -9,6 +9,7 @@ import uuid
 from typing import Optional, Dict, Any, List
 from fastapi import UploadFile
 from app.services.qiniu_service import qiniu_service
+from app.services.storage_upload_service import storage_upload_service
 from app.core.config import settings
 import logging
 
@@ -67,7 +68,8 @@ class StaticAssetService:
         file: UploadFile, 
         asset_type: str, 
         subfolder: str = "",
-        custom_filename: str = None
+        custom_filename: str = None,
+        wait: bool = False
     ) -> Dict[str, Any]:
         """
         上传静态资源
@@ -77,6 +79,7 @@ class StaticAssetService:
             asset_type: 资源类型
             subfolder: 子文件夹
             custom_filename: 自定义文件名
+            wait: 是否等待七牛云上传完成，默认先返回本地URL、后台上传
             
         Returns:
             上传结果
@@ -101,63 +104,28 @@ class StaticAssetService:
             else:
                 file_key = self.generate_file_key(asset_type, file.filename, subfolder)
             
-            if self.use_qiniu:
-                # 使用七牛云存储
-                result = qiniu_service.upload_data(
-                    data=content,
-                    key=file_key,
-                    mime_type=file.content_type
-                )
-                
-                if result["success"]:
-                    return {
-                        "success": True,
-                        "url": result["url"],
-                        "key": result["key"],
-                        "size": result["size"],
-                        "storage": "qiniu",
-                        "asset_type": asset_type
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": f"七牛云上传失败: {result['error']}"
-                    }
-            else:
-                # 使用本地存储
-                upload_dir = os.path.join(settings.UPLOAD_DIR, self.get_folder_path(asset_type))
-                if subfolder:
-                    upload_dir = os.path.join(upload_dir, subfolder)
-                
-                os.makedirs(upload_dir, exist_ok=True)
-                
-                # 生成本地文件名
-                if custom_filename:
-                    local_filename = custom_filename
-                else:
-                    file_ext = os.path.splitext(file.filename)[1]
-                    local_filename = f"{uuid.uuid4().hex}{file_ext}"
-                
-                file_path = os.path.join(upload_dir, local_filename)
-                
-                # 保存文件
-                with open(file_path, "wb") as f:
-                    f.write(content)
-                
-                # 构建访问URL
-                relative_path = f"/static/uploads/{self.get_folder_path(asset_type)}"
-                if subfolder:
-                    relative_path += f"/{subfolder}"
-                relative_path += f"/{local_filename}"
-                
-                return {
-                    "success": True,
-                    "url": f"{settings.SERVER_URL}{relative_path}",
-                    "key": local_filename,
-                    "size": len(content),
-                    "storage": "local",
-                    "asset_type": asset_type
-                }
+            # 先写入本地，启用七牛云时由后台worker上传，不阻塞事件循环
+            result = await storage_upload_service.store(
+                data=content,
+                key=file_key,
+                mime_type=file.content_type or "application/octet-stream",
+                wait=wait
+            )
+            if not result["success"]:
+                return result
+            
+            url = result["url"]
+            if result["storage"] == "local":
+                url = f"{settings.SERVER_URL}{url}"
+            return {
+                "success": True,
+                "url": url,
+                "key": result["key"],
+                "size": result["size"],
+                "storage": result["storage"],
+                "pending": result["pending"],
+                "asset_type": asset_type
+            }
                 
         except Exception as e:
             logger.error(f"上传资源失败: {e}")
@@ -172,9 +140,9 @@ class StaticAssetService:
         return await self.upload_asset(file, "avatars", subfolder)
     
     async def upload_reference_audio(self, file: UploadFile, character_id: str = None) -> Dict[str, Any]:
-        """上传参考音频"""
+        """上传参考音频（七牛云ASR需要公网URL，等待上传完成）"""
         subfolder = f"character_{character_id}" if character_id else "default"
-        return await self.upload_asset(file, "reference_audios", subfolder)
+        return await self.upload_asset(file, "reference_audios", subfolder, wait=True)
     
     async def upload_generated_voice(self, file: UploadFile, session_id: str = None) -> Dict[str, Any]:
         """上传生成的语音"""
@@ -0,0 +1,336 @@
+"""
+异步对象存储上传服务
+文件先写入本地并立即返回本地URL，由后台worker限并发地提升到七牛云，
+完成后在数据库中把本地URL原子地替换为七牛云URL；大文件使用可断点续传的分片上传。
+待上传和待清理的文件记录在磁盘上，服务重启后继续处理
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+from sqlalchemy import update
+from app.core.config import settings
+from app.services.qiniu_service import qiniu_service
+from app.core.metrics import timed
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UploadJob:
+    """一次待提升到七牛云的本地文件"""
+
+    def __init__(self, file_path: str, key: str, mime_type: str, local_urls: List[str]):
+        self.file_path = file_path
+        self.key = key
+        self.mime_type = mime_type
+        self.local_urls = local_urls
+        self.created_at = time.time()
+        # 已提升到七牛云、等待清理本地副本时为七牛云URL
+        self.remote_url: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file_path": self.file_path,
+            "key": self.key,
+            "mime_type": self.mime_type,
+            "local_urls": self.local_urls,
+            "created_at": self.created_at,
+            "remote_url": self.remote_url,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UploadJob":
+        job = cls(data["file_path"], data["key"], data["mime_type"], data["local_urls"])
+        job.created_at = data.get("created_at", job.created_at)
+        job.remote_url = data.get("remote_url")
+        return job
+
+
+class StorageUploadService:
+    """异步上传服务"""
+
+    def __init__(self):
+        self.concurrency = settings.UPLOAD_WORKER_CONCURRENCY
+        self.max_retries = settings.UPLOAD_MAX_RETRIES
+        self.local_retention = settings.UPLOAD_LOCAL_RETENTION_SECONDS
+        # 分片上传进度记录，进程重启后大文件可从已完成的分片继续
+        self.record_dir = os.path.join(settings.UPLOAD_DIR, ".upload_progress")
+        # 待上传/待清理的任务，每个任务一个JSON文件，完成清理后删除
+        self.job_dir = os.path.join(settings.UPLOAD_DIR, ".upload_jobs")
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # 事件循环只弱引用任务，保留期内等待的清理任务需要保留引用
+        self._cleanup_tasks: Set[asyncio.Task] = set()
+        # 本地URL -> 七牛云URL，晚于替换写入数据库的记录可据此修正
+        self._promoted: "OrderedDict[str, str]" = OrderedDict()
+        self._max_promoted = 10000
+        self._pending = 0
+        self._failed = 0
+
+    def is_enabled(self) -> bool:
+        return qiniu_service.is_enabled()
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def start(self):
+        """恢复上次运行中未完成的任务：未上传的重新排队，已上传的继续等待清理本地副本"""
+        if not self.is_enabled() or not os.path.isdir(self.job_dir):
+            return
+        loop = asyncio.get_event_loop()
+        jobs = await loop.run_in_executor(None, self._load_jobs)
+        resumed = 0
+        for job in jobs:
+            if job.remote_url:
+                self._remember_promoted(job.local_urls, job.remote_url)
+                self._schedule_local_cleanup(job.file_path, job.local_urls, job.remote_url, job.key)
+            else:
+                self._enqueue(job)
+                resumed += 1
+        if jobs:
+            logger.info(f"恢复未完成的上传任务: {resumed} 个待上传，{len(jobs) - resumed} 个待清理")
+
+    async def stop(self):
+        """停止上传worker与待执行的本地清理，任务记录保留在磁盘上，下次启动时继续"""
+        tasks = self._workers + list(self._cleanup_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._cleanup_tasks.clear()
+
+    def _job_path(self, key: str) -> str:
+        return os.path.join(self.job_dir, f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json")
+
+    def _save_job(self, job: UploadJob):
+        self._write_local(self._job_path(job.key), json.dumps(job.to_dict(), ensure_ascii=False).encode("utf-8"))
+
+    def _drop_job(self, key: str):
+        try:
+            os.remove(self._job_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _load_jobs(self) -> List[UploadJob]:
+        """读取任务记录，本地文件已不存在的任务直接丢弃"""
+        jobs = []
+        for filename in os.listdir(self.job_dir):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(self.job_dir, filename)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = UploadJob.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"上传任务记录无效，已丢弃 {filename}: {e}")
+                os.remove(path)
+                continue
+            if not os.path.exists(job.file_path):
+                os.remove(path)
+                continue
+            jobs.append(job)
+        return sorted(jobs, key=lambda job: job.created_at)
+
+    def _enqueue(self, job: UploadJob):
+        self._ensure_workers()
+        self._pending += 1
+        self._queue.put_nowait(job)
+
+    @staticmethod
+    def _write_local(file_path: str, data: bytes):
+        """原子写入本地文件"""
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+
+    @timed("storage.store")
+    async def store(
+        self,
+        data: bytes,
+        key: str,
+        mime_type: str = "application/octet-stream",
+        wait: bool = False
+    ) -> Dict[str, Any]:
+        """
+        保存文件并（在启用七牛云时）提升到对象存储
+
+        Args:
+            data: 文件内容
+            key: 存储key，同时作为 static/uploads 下的相对路径
+            mime_type: MIME类型
+            wait: 是否等待上传完成（需要立即得到公网URL的场景，如七牛云ASR）
+
+        Returns:
+            上传结果，未等待时url为本地URL，pending表示仍在后台上传
+        """
+        file_path = os.path.join(settings.UPLOAD_DIR, key)
+        local_url = f"/static/uploads/{key}"
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._write_local, file_path, data)
+
+        result = {
+            "success": True,
+            "url": local_url,
+            "key": key,
+            "size": len(data),
+            "storage": "local",
+            "pending": False
+        }
+        if not self.is_enabled():
+            return result
+
+        if wait:
+            upload_result = await self._upload(file_path, key, mime_type)
+            if not upload_result["success"]:
+                return {"success": False, "error": f"七牛云上传失败: {upload_result['error']}"}
+            job = UploadJob(file_path, key, mime_type, [])
+            job.remote_url = upload_result["url"]
+            await loop.run_in_executor(None, self._save_job, job)
+            self._schedule_local_cleanup(file_path, [], job.remote_url, key)
+            return {
+                "success": True,
+                "url": upload_result["url"],
+                "key": key,
+                "size": len(data),
+                "storage": "qiniu",
+                "pending": False
+            }
+
+        # 数据库中可能保存相对路径或带SERVER_URL的完整本地URL，两种形式都需要替换
+        job = UploadJob(file_path, key, mime_type, [local_url, f"{settings.SERVER_URL}{local_url}"])
+        # 先落盘再排队，进程退出时未完成的任务在下次启动时恢复
+        await loop.run_in_executor(None, self._save_job, job)
+        self._enqueue(job)
+        result["pending"] = True
+        return result
+
+    def resolve(self, url: Optional[str]) -> Optional[str]:
+        """若本地URL已提升到七牛云，返回七牛云URL"""
+        if not url:
+            return url
+        return self._promoted.get(url, url)
+
+    @timed("storage.qiniu_upload")
+    async def _upload(self, file_path: str, key: str, mime_type: str) -> Dict[str, Any]:
+        loop = asyncio.get_event_loop()
+        os.makedirs(self.record_dir, exist_ok=True)
+        return await loop.run_in_executor(
+            None, qiniu_service.upload_file_resumable, file_path, key, mime_type, self.record_dir
+        )
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._promote(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed += 1
+                logger.error(f"提升文件到七牛云失败 {job.key}: {e}")
+            finally:
+                self._pending -= 1
+
+    async def _promote(self, job: UploadJob):
+        for attempt in range(self.max_retries):
+            result = await self._upload(job.file_path, job.key, job.mime_type)
+            if result["success"]:
+                break
+            logger.warning(f"上传七牛云失败（第{attempt + 1}次） {job.key}: {result['error']}")
+            await asyncio.sleep(2 ** attempt)
+        else:
+            # 多次失败后保留本地文件与本地URL，不影响访问；任务记录保留，下次启动时重试
+            self._failed += 1
+            return
+
+        remote_url = result["url"]
+        self._remember_promoted(job.local_urls, remote_url)
+
+        await self._swap_urls(job.local_urls, remote_url, job.key)
+        job.remote_url = remote_url
+        await asyncio.get_event_loop().run_in_executor(None, self._save_job, job)
+        logger.info(f"文件已提升到七牛云: {job.key} ({time.time() - job.created_at:.1f}s)")
+        self._schedule_local_cleanup(job.file_path, job.local_urls, remote_url, job.key)
+
+    def _remember_promoted(self, local_urls: List[str], remote_url: str):
+        for local_url in local_urls:
+            self._promoted[local_url] = remote_url
+            self._promoted.move_to_end(local_url)
+        while len(self._promoted) > self._max_promoted:
+            self._promoted.popitem(last=False)
+
+    @timed("db.swap_storage_urls")
+    async def _swap_urls(self, local_urls: List[str], remote_url: str, key: str):
+        """在同一个事务中把数据库里引用本地URL的记录替换为七牛云URL"""
+        from app.core.database import AsyncSessionLocal
+        from app.models.chat import ChatMessage
+        from app.models.character import Character
+
+        async with AsyncSessionLocal() as db:
+            for local_url in local_urls:
+                await db.execute(
+                    update(ChatMessage)
+                    .where(ChatMessage.audio_url == local_url)
+                    .values(audio_url=remote_url)
+                )
+                await db.execute(
+                    update(Character)
+                    .where(Character.avatar == local_url)
+                    .values(avatar=remote_url)
+                )
+                await db.execute(
+                    update(Character)
+                    .where(Character.reference_audio_path == local_url)
+                    .values(reference_audio_path=remote_url, storage_type="qiniu", storage_key=key)
+                )
+            await db.commit()
+
+    def _schedule_local_cleanup(
+        self,
+        file_path: str,
+        local_urls: List[str],
+        remote_url: str = None,
+        key: str = None
+    ):
+        """保留期结束后删除本地副本，仍持有本地URL的客户端在此期间可继续访问"""
+        async def cleanup():
+            await asyncio.sleep(self.local_retention)
+            try:
+                if local_urls:
+                    # 再替换一次，覆盖替换之后才写入数据库的记录
+                    await self._swap_urls(local_urls, remote_url, key)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                if key:
+                    self._drop_job(key)
+            except Exception as e:
+                logger.warning(f"清理本地文件失败 {file_path}: {e}")
+
+        task = asyncio.create_task(cleanup())
+        self._cleanup_tasks.add(task)
+        task.add_done_callback(self._cleanup_tasks.discard)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.is_enabled(),
+            "pending": self._pending,
+            "failed": self._failed,
+            "promoted": len(self._promoted),
+            "concurrency": self.concurrency,
+        }
+
+
+# 创建全局实例
+storage_upload_service = StorageUploadService()
@@ -0,0 +1,159 @@
+"""
+流式语音端点检测(VAD)
+基于 llm_server/tools/slicer2.Slicer 的RMS静音判定逻辑改写为流式版本，
+按帧接收PCM数据，实时判断说话开始与结束
+"""
+
+import io
+import wave
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class StreamingVAD:
+    """流式VAD
+
+    参数含义与 Slicer 保持一致（毫秒为单位）:
+        threshold: 静音判定的dB阈值，RMS低于该值的帧视为静音
+        min_length: 一段有效语音的最短时长，过短的片段视为噪声丢弃
+        min_interval: 语音中出现多长的静音即判定为说话结束
+        hop_size: 帧移
+        max_sil_kept: 语音前后保留的最长静音
+    """
+
+    def __init__(
+        self,
+        sr: int = 16000,
+        threshold: float = -40.0,
+        min_length: int = 300,
+        min_interval: int = 600,
+        hop_size: int = 20,
+        max_sil_kept: int = 200,
+        max_utterance: int = 30000,
+    ):
+        if not min_length >= hop_size or not min_interval >= hop_size:
+            raise ValueError("The following condition must be satisfied: min_length >= hop_size and min_interval >= hop_size")
+        if not max_sil_kept >= hop_size:
+            raise ValueError("The following condition must be satisfied: max_sil_kept >= hop_size")
+        self.sr = sr
+        self.threshold = 10 ** (threshold / 20.0)
+        self.hop_size = round(sr * hop_size / 1000)
+        self.win_size = min(round(sr * min_interval / 1000), 4 * self.hop_size)
+        self.min_length = round(sr * min_length / 1000 / self.hop_size)
+        self.min_interval = round(sr * min_interval / 1000 / self.hop_size)
+        self.max_sil_kept = round(sr * max_sil_kept / 1000 / self.hop_size)
+        self.max_utterance = round(sr * max_utterance / 1000 / self.hop_size)
+        self.reset()
+
+    def reset(self):
+        """清空所有状态，开始新的会话"""
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._window = np.zeros(self.win_size, dtype=np.float32)
+        self._preroll = deque(maxlen=self.max_sil_kept)
+        self._reset_utterance()
+
+    def _reset_utterance(self):
+        self._frames: List[np.ndarray] = []
+        self.in_speech = False
+        self._voiced_frames = 0
+        self._silence_frames = 0
+
+    @property
+    def speech_samples(self) -> int:
+        """当前语音段中已收到的样本数（不含结尾静音）"""
+        return (len(self._frames) - self._silence_frames) * self.hop_size
+
+    def _frame_rms(self, frame: np.ndarray) -> float:
+        # 与 get_rms 一致：在 win_size 长度的滑动窗口上计算能量
+        self._window = np.concatenate([self._window[len(frame):], frame])
+        return float(np.sqrt(np.mean(self._window ** 2)))
+
+    def feed(self, samples: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        输入一段PCM数据(float32, -1~1)，返回期间产生的事件
+
+        事件类型:
+            {"type": "speech_start"}
+            {"type": "end_of_speech", "audio": np.ndarray}
+            {"type": "discard"}  过短的语音段被当作噪声丢弃
+        """
+        events = []
+        data = np.concatenate([self._pending, samples.astype(np.float32)])
+        n_frames = len(data) // self.hop_size
+        for i in range(n_frames):
+            frame = data[i * self.hop_size : (i + 1) * self.hop_size]
+            event = self._process_frame(frame)
+            if event is not None:
+                events.append(event)
+        self._pending = data[n_frames * self.hop_size :]
+        return events
+
+    def _process_frame(self, frame: np.ndarray) -> Optional[Dict[str, Any]]:
+        silent = self._frame_rms(frame) < self.threshold
+
+        if not self.in_speech:
+            if silent:
+                self._preroll.append(frame)
+                return None
+            # 说话开始：保留开头最多 max_sil_kept 的静音
+            self.in_speech = True
+            self._frames = list(self._preroll)
+            self._preroll.clear()
+            self._frames.append(frame)
+            self._voiced_frames = 1
+            return {"type": "speech_start"}
+
+        self._frames.append(frame)
+        if silent:
+            self._silence_frames += 1
+        else:
+            self._voiced_frames += 1
+            self._silence_frames = 0
+
+        if self._silence_frames >= self.min_interval:
+            return self._finish_utterance()
+        if len(self._frames) >= self.max_utterance:
+            return self._finish_utterance()
+        return None
+
+    def _finish_utterance(self) -> Dict[str, Any]:
+        if self._voiced_frames < self.min_length:
+            self._reset_utterance()
+            return {"type": "discard"}
+        # 结尾只保留 max_sil_kept 的静音
+        drop = max(0, self._silence_frames - self.max_sil_kept)
+        frames = self._frames[: len(self._frames) - drop] if drop else self._frames
+        audio = np.concatenate(frames)
+        self._reset_utterance()
+        return {"type": "end_of_speech", "audio": audio}
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        """流结束时强制结束当前语音段"""
+        if not self.in_speech:
+            return None
+        return self._finish_utterance()
+
+    def current_audio(self) -> np.ndarray:
+        """当前正在进行的语音段（用于中间识别结果）"""
+        if not self._frames:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(self._frames)
+
+
+def pcm16_to_float(data: bytes) -> np.ndarray:
+    """16位小端PCM转换为float32"""
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def float_to_wav_bytes(audio: np.ndarray, sr: int) -> bytes:
+    """float32音频编码为16位WAV字节"""
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sr)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
@@ -0,0 +1,264 @@
+"""
+TTS后端池 - 在多个llm_server实例之间做负载均衡
+提供主动健康检查（真实合成探活）、最少未完成请求路由、单后端并发上限、熔断，
+以及按角色的粘性路由，使每个后端的参考音频/说话人缓存保持命中
+"""
+
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Set
+import httpx
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TTSBackend:
+    """单个llm_server实例的状态"""
+
+    def __init__(self, url: str, max_concurrency: int):
+        self.url = url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.circuit_open_until = 0.0
+        self.last_latency: Optional[float] = None
+        self.last_error: Optional[str] = None
+        # 最近一次探活结果: ok / failed / unknown(没有可用的探活参考音频) / busy(并发已满，由真实请求反映健康状况)
+        self.last_probe: Optional[str] = None
+        # 未配置探活参考音频时，用该后端上最近一次成功请求所用的已注册说话人探活
+        self.canary_speaker: Optional[Dict[str, Any]] = None
+
+    def is_available(self, now: float) -> bool:
+        return self.healthy and now >= self.circuit_open_until
+
+    def has_capacity(self) -> bool:
+        return self.outstanding < self.max_concurrency
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "circuit_open": time.monotonic() < self.circuit_open_until,
+            "outstanding": self.outstanding,
+            "max_concurrency": self.max_concurrency,
+            "consecutive_failures": self.consecutive_failures,
+            "last_latency": self.last_latency,
+            "last_error": self.last_error,
+            "last_probe": self.last_probe,
+        }
+
+
+class BackendLease:
+    """一次请求占用的后端，调用方可通过 fail() 标记该次请求失败"""
+
+    def __init__(self, backend: TTSBackend):
+        self.backend = backend
+        self.url = backend.url
+        self.failed = False
+        self.error: Optional[str] = None
+
+    def fail(self, error: str = ""):
+        self.failed = True
+        self.error = error
+
+
+class TTSBackendPool:
+    """llm_server 后端池"""
+
+    def __init__(self):
+        urls = settings.LLM_SERVER_URLS or [settings.LLM_SERVER_URL]
+        self.backends: List[TTSBackend] = [
+            TTSBackend(url, settings.TTS_BACKEND_MAX_CONCURRENCY) for url in urls
+        ]
+        self.health_check_interval = settings.TTS_HEALTH_CHECK_INTERVAL
+        self.failure_threshold = settings.TTS_CIRCUIT_FAILURE_THRESHOLD
+        self.circuit_reset_seconds = settings.TTS_CIRCUIT_RESET_SECONDS
+        self._health_task: Optional[asyncio.Task] = None
+
+    def _ensure_health_task(self):
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    def _sticky_order(self, character_id: Optional[str]) -> List[TTSBackend]:
+        """按角色做rendezvous哈希排序，后端增减时只有少量角色会迁移"""
+        if not character_id:
+            return list(self.backends)
+
+        def weight(backend: TTSBackend) -> int:
+            digest = hashlib.md5(f"{character_id}|{backend.url}".encode("utf-8")).hexdigest()
+            return int(digest[:16], 16)
+
+        return sorted(self.backends, key=weight, reverse=True)
+
+    def _select(self, character_id: Optional[str], exclude: Set[str]) -> TTSBackend:
+        now = time.monotonic()
+        candidates = [b for b in self._sticky_order(character_id) if b.url not in exclude]
+        available = [b for b in candidates if b.is_available(now)]
+        if not available:
+            # 全部不可用时仍选择一个，避免直接拒绝请求
+            available = candidates or list(self.backends)
+        # 粘性后端有空闲并发时优先使用
+        if available[0].has_capacity():
+            return available[0]
+        # 否则选择未完成请求最少的后端
+        return min(available, key=lambda b: b.outstanding / b.max_concurrency)
+
+    @asynccontextmanager
+    async def acquire(self, character_id: Optional[str] = None, exclude: Optional[Set[str]] = None):
+        """
+        占用一个后端
+
+        用法:
+            async with tts_backend_pool.acquire(character_id) as lease:
+                ... 请求 lease.url ...
+        """
+        self._ensure_health_task()
+        backend = self._select(character_id, exclude or set())
+        backend.outstanding += 1
+        try:
+            async with backend.semaphore:
+                lease = BackendLease(backend)
+                start = time.monotonic()
+                try:
+                    yield lease
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._record_failure(backend, str(e))
+                    raise
+                else:
+                    if lease.failed:
+                        self._record_failure(backend, lease.error)
+                    else:
+                        self._record_success(backend, time.monotonic() - start)
+        finally:
+            backend.outstanding -= 1
+
+    def remember_canary(self, url: str, speaker: Optional[Dict[str, Any]]):
+        """
+        记录一次成功请求所用的已注册说话人，供该后端探活使用
+
+        不记录参考音频路径：缓存中的参考音频会被淘汰或替换，且路径只在本机有效
+        """
+        if settings.TTS_CANARY_REFER_WAV_PATH or not speaker:
+            return
+        for backend in self.backends:
+            if backend.url == url.rstrip("/"):
+                backend.canary_speaker = {
+                    "speaker_id": speaker["speaker_id"],
+                    "speaker_version": speaker["version"],
+                }
+
+    def _record_success(self, backend: TTSBackend, latency: float):
+        backend.consecutive_failures = 0
+        backend.circuit_open_until = 0.0
+        backend.healthy = True
+        backend.last_latency = latency
+        backend.last_error = None
+
+    def _record_failure(self, backend: TTSBackend, error: Optional[str]):
+        backend.consecutive_failures += 1
+        backend.last_error = error
+        if backend.consecutive_failures >= self.failure_threshold:
+            backend.circuit_open_until = time.monotonic() + self.circuit_reset_seconds
+            logger.warning(f"TTS后端熔断 {self.circuit_reset_seconds}s: {backend.url} ({error})")
+
+    def _canary_request(self, backend: TTSBackend) -> Dict[str, Any]:
+        request_data = {
+            "text": settings.TTS_CANARY_TEXT,
+            "text_language": "zh",
+        }
+        if settings.TTS_CANARY_REFER_WAV_PATH:
+            request_data.update({
+                "refer_wav_path": settings.TTS_CANARY_REFER_WAV_PATH,
+                "prompt_text": settings.TTS_CANARY_PROMPT_TEXT,
+                "prompt_language": settings.TTS_CANARY_PROMPT_LANGUAGE,
+            })
+        elif backend.canary_speaker:
+            request_data.update(backend.canary_speaker)
+        return request_data
+
+    async def probe(self, backend: TTSBackend) -> Optional[bool]:
+        """
+        用一次真实的短文本合成探测后端是否可用
+
+        Returns:
+            True/False 为探活结果；None 表示本轮未探活（没有可用的参考音频，或后端并发已满），不改变健康状态
+        """
+        request_data = self._canary_request(backend)
+        if "refer_wav_path" not in request_data and "speaker_id" not in request_data:
+            # 没有配置探活参考音频、该后端上也还没有已注册的说话人时无法做真实合成，业务错误也不能说明模型可用
+            backend.last_probe = "unknown"
+            return None
+        if not backend.has_capacity():
+            # 探活与真实请求共用并发配额；并发已满时真实请求的成败已经反映后端状态
+            backend.last_probe = "busy"
+            return None
+        backend.outstanding += 1
+        try:
+            async with backend.semaphore:
+                start = time.monotonic()
+                async with httpx.AsyncClient(timeout=settings.TTS_HEALTH_CHECK_TIMEOUT) as client:
+                    response = await client.post(f"{backend.url}/", json=request_data)
+            # 只有返回了音频才算可用，合成结果至少要比WAV文件头长
+            if (
+                response.status_code == 200
+                and response.headers.get("content-type", "").startswith("audio/")
+                and len(response.content) > 44
+            ):
+                backend.last_latency = time.monotonic() - start
+                backend.last_probe = "ok"
+                return True
+            if "speaker_id" in request_data and response.status_code in (404, 409):
+                # 记录的说话人已被删除或重新注册，不能据此判断后端不可用，等下一次真实请求重新记录
+                backend.canary_speaker = None
+                backend.last_probe = "unknown"
+                return None
+            backend.last_error = f"探活失败: {response.status_code}"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            backend.last_error = f"探活失败: {e}"
+        finally:
+            backend.outstanding -= 1
+        backend.last_probe = "failed"
+        return False
+
+    async def check_all(self) -> List[Dict[str, Any]]:
+        """对所有后端做一次探活并返回状态"""
+        results = await asyncio.gather(*(self.probe(b) for b in self.backends))
+        for backend, ok in zip(self.backends, results):
+            if ok is None:
+                continue
+            if ok and not backend.healthy:
+                logger.info(f"TTS后端恢复: {backend.url}")
+            elif not ok and backend.healthy:
+                logger.warning(f"TTS后端不可用: {backend.url} ({backend.last_error})")
+            backend.healthy = ok
+            if ok:
+                backend.consecutive_failures = 0
+                backend.circuit_open_until = 0.0
+        return self.status()
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self.check_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"TTS后端健康检查异常: {e}")
+            await asyncio.sleep(self.health_check_interval)
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [b.to_dict() for b in self.backends]
+
+
+# 创建全局实例
+tts_backend_pool = TTSBackendPool()
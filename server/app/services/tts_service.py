@@ -2,15 +2,21 @@
 TTS语音合成服务 - 调用llm_server进行语音生成
 """
 
+import hashlib
 import httpx
 import os
+import re
 import uuid
 import asyncio
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set, Tuple
 from app.core.config import settings
 from app.core.exceptions import VoiceProcessingError
-from app.services.static_asset_service import static_asset_service
+from app.services.storage_upload_service import storage_upload_service
+from app.services.reference_audio_cache import reference_audio_cache
 from app.services.qiniu_text_service import qiniu_text_service
+from app.services.tts_backend_pool import tts_backend_pool
+from app.core.logging_config import Truncated, request_id_var, truncate
+from app.core.metrics import timed, stage
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,7 +27,13 @@ class TTSService:
     def __init__(self):
         self.llm_server_url = settings.LLM_SERVER_URL
         self.timeout = 600.0  # 600秒超时
+        self.use_speaker_registry = settings.TTS_SPEAKER_REGISTRY_ENABLED
+        # (llm_server地址, speaker_id) -> 已注册的说话人信息，后端不支持注册时为None
+        self._speakers: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+        # 事件循环只弱引用任务，通知llm_server取消的任务在完成前需要保留引用
+        self._cancel_tasks: Set[asyncio.Task] = set()
     
+    @timed("tts.generate_voice")
     async def generate_voice(
         self,
         text: str,
@@ -60,6 +72,7 @@ class TTSService:
             # 调用llm_server进行语音合成
             return await self._call_llm_server_tts(
                 text=text,
+                character_id=character_id,
                 text_language=text_language,
                 reference_audio_path=character_data["reference_audio_path"],
                 reference_audio_text=character_data.get("reference_audio_text", ""),
@@ -77,17 +90,20 @@ class TTSService:
         text_language: str,
         reference_audio_path: str,
         reference_audio_text: str = "",
-        reference_audio_language: str = "zh"
+        reference_audio_language: str = "zh",
+        character_id: Optional[str] = None
     ) -> str:
-        """调用llm_server进行TTS"""
-        temp_file_path = None
+        """调用llm_server进行TTS，character_id用于粘性路由到同一后端"""
+        cached_reference_path = None
+        local_reference_path = None
         try:
             # 预处理文本：将英文转换为拟声词
             processed_text = text
             if qiniu_text_service.is_enabled():
                 try:
                     logger.info(f"预处理文本: {text[:100]}...")
-                    processed_text = await qiniu_text_service.english_to_onomatopoeia(text)
+                    with stage("tts.text_preprocess"):
+                        processed_text = await qiniu_text_service.english_to_onomatopoeia(text)
                     logger.info(f"文本处理完成: {processed_text[:100]}...")
                 except Exception as e:
                     logger.warning(f"文本处理失败，使用原始文本: {e}")
@@ -96,46 +112,39 @@ class TTSService:
                 logger.info("七牛云文本处理服务未启用，使用原始文本")
             # 处理七牛云存储的文件
             if reference_audio_path.startswith("http"):
-                # 这是七牛云URL，需要下载到本地临时文件
-                from app.services.file_download_service import file_download_service
-                
-                # 从URL中提取文件名
-                filename = os.path.basename(reference_audio_path.split('?')[0])
-                if not filename:
-                    filename = f"temp_audio_{uuid.uuid4().hex}.wav"
-                
-                # 下载文件到本地临时文件
-                download_result = await file_download_service.download_file_to_temp(
-                    reference_audio_path, 
-                    filename
-                )
-                
-                if not download_result["success"]:
-                    raise VoiceProcessingError(f"下载参考音频失败: {download_result['error']}")
-                
-                temp_file_path = download_result["local_path"]
-                # 将绝对路径转换为LLM服务器可以访问的相对路径
-                # 从绝对路径中提取相对路径部分
-                if "static" in temp_file_path:
-                    # 找到static在路径中的位置，然后构造相对路径
-                    static_index = temp_file_path.find("static")
-                    relative_path = temp_file_path[static_index:]
+                # 这是七牛云URL，从本地缓存获取（首次使用或内容变化时才会下载）
+                try:
+                    with stage("tts.reference_cache"):
+                        cached_reference_path = await reference_audio_cache.acquire(reference_audio_path)
+                except Exception as e:
+                    raise VoiceProcessingError(f"下载参考音频失败: {e}")
+                local_reference_path = cached_reference_path
+                if "static" in cached_reference_path:
                     # LLM服务器在llm_server目录，server在../server目录
-                    llm_server_refer_path = os.path.join("..", "server", relative_path)
+                    static_index = cached_reference_path.find("static")
+                    llm_server_refer_path = os.path.join("..", "server", cached_reference_path[static_index:])
                 else:
-                    # 如果路径中没有static，直接使用绝对路径
-                    llm_server_refer_path = temp_file_path
+                    llm_server_refer_path = os.path.abspath(cached_reference_path)
                 
             elif reference_audio_path.startswith("/static/uploads/"):
                 # 本地文件，构造llm_server可以访问的路径
                 relative_path = reference_audio_path.replace("/static/uploads/", "")
                 llm_server_refer_path = os.path.join("..", "server", "static", "uploads", relative_path)
+                local_reference_path = os.path.join(settings.UPLOAD_DIR, relative_path)
             else:
                 # 如果已经是绝对路径，直接使用
                 llm_server_refer_path = reference_audio_path
+                if os.path.exists(reference_audio_path):
+                    local_reference_path = reference_audio_path
+            
+            # 请求ID用于在调用方取消时通知llm_server停止推理
+            # 在当前请求ID后追加后缀，llm_server的日志可与server端对应，取消时又能唯一定位
+            parent_request_id = request_id_var.get()
+            request_id = uuid.uuid4().hex if parent_request_id == "-" else f"{parent_request_id}-{uuid.uuid4().hex[:8]}"
             
             # 构建请求数据，使用llm_server的API格式
             request_data = {
+                "request_id": request_id,
                 "refer_wav_path": llm_server_refer_path,
                 "prompt_text": reference_audio_text,
                 "prompt_language": reference_audio_language,
@@ -149,41 +158,75 @@ class TTSService:
                 "if_sr": False
             }
             
-            print(f"准备调用LLM服务器TTS: {self.llm_server_url}")
-            print(f"请求参数: {request_data}")
-            logger.info(f"调用LLM服务器TTS: {self.llm_server_url}")
-            logger.info(f"请求参数: {request_data}")
+            logger.debug("请求参数: %s", Truncated(request_data))
             
-            # 发送请求到llm_server - 使用正确的端点 /
-            print(f"发送POST请求到: {self.llm_server_url}/")
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.llm_server_url}/",
-                    json=request_data
-                )
-                print(f"LLM服务器响应状态: {response.status_code}")
+            # 通过后端池选择llm_server实例，连接失败时换一个实例重试一次
+            tried = set()
+            attempts = min(2, len(tts_backend_pool.backends))
+            for attempt in range(attempts):
+                async with tts_backend_pool.acquire(character_id, exclude=tried) as lease:
+                    tried.add(lease.url)
+                    logger.debug(f"发送POST请求到: {lease.url}/")
+                    try:
+                        speaker = None
+                        if self.use_speaker_registry and local_reference_path:
+                            speaker = await self._ensure_speaker(
+                                lease.url, character_id, local_reference_path,
+                                reference_audio_text, reference_audio_language
+                            )
+                        async with httpx.AsyncClient(timeout=self.timeout) as client:
+                            with stage("tts.synthesize"):
+                                response = await client.post(
+                                    f"{lease.url}/",
+                                    json=self._speaker_request(request_data, speaker),
+                                    headers={"X-Request-ID": request_id}
+                                )
+                            if speaker and response.status_code in (404, 409):
+                                # llm_server的注册信息丢失或版本已变化，重新注册后重试
+                                logger.warning(f"说话人 {speaker['speaker_id']} 在 {lease.url} 上失效，重新注册")
+                                self._speakers.pop((lease.url, speaker["speaker_id"]), None)
+                                speaker = await self._ensure_speaker(
+                                    lease.url, character_id, local_reference_path,
+                                    reference_audio_text, reference_audio_language
+                                )
+                                with stage("tts.synthesize"):
+                                    response = await client.post(
+                                        f"{lease.url}/",
+                                        json=self._speaker_request(request_data, speaker),
+                                        headers={"X-Request-ID": request_id}
+                                    )
+                    except asyncio.CancelledError:
+                        # 调用方已取消（用户打断或挂断），通知llm_server在下一个解码步停止
+                        task = asyncio.ensure_future(self._cancel_llm_server_request(request_id, lease.url))
+                        self._cancel_tasks.add(task)
+                        task.add_done_callback(self._cancel_tasks.discard)
+                        raise
+                    except httpx.ConnectError as e:
+                        lease.fail(str(e))
+                        if attempt + 1 < attempts:
+                            logger.warning(f"LLM服务器连接失败，切换实例重试: {lease.url}")
+                            continue
+                        raise
+                    logger.debug(f"LLM服务器响应状态: {response.status_code}")
+                    if response.status_code >= 500:
+                        lease.fail(f"HTTP {response.status_code}")
                 
                 if response.status_code == 200:
+                    tts_backend_pool.remember_canary(lease.url, speaker)
                     # 保存生成的音频文件
                     audio_data = response.content
-                    print(f"llm_server返回的音频数据大小: {len(audio_data)} 字节")
+                    logger.debug(f"llm_server返回的音频数据大小: {len(audio_data)} 字节")
                     if len(audio_data) == 0:
-                        print("警告：llm_server返回的音频数据为空")
-                    
-                    # 检查音频数据的前几个字节，确认是否为有效的音频文件
-                    if len(audio_data) > 0:
-                        print(f"音频数据前16字节: {audio_data[:16].hex()}")
+                        logger.warning("llm_server返回的音频数据为空")
+                    elif audio_data[:4] != b'RIFF':
                         # WAV文件应该以"RIFF"开头
-                        if audio_data[:4] == b'RIFF':
-                            print("音频数据格式正确：WAV文件")
-                        else:
-                            print("警告：音频数据格式可能不正确")
+                        logger.warning(f"音频数据格式可能不正确，前16字节: {audio_data[:16].hex()}")
                     
                     return await self._save_generated_audio(audio_data, "wav")
                 else:
                     logger.error(f"LLM服务器返回错误状态: {response.status_code}")
                     error_text = response.text
-                    logger.error(f"错误信息: {error_text}")
+                    logger.error(f"错误信息: {truncate(error_text)}")
                     raise VoiceProcessingError(f"LLM服务器响应错误: {response.status_code} - {error_text}")
                 
         except httpx.TimeoutException:
@@ -193,16 +236,92 @@ class TTSService:
         except Exception as e:
             raise VoiceProcessingError(f"调用LLM服务器失败: {str(e)}")
         finally:
-            # 保留临时文件用于调试，不自动删除
-            if temp_file_path and os.path.exists(temp_file_path):
-                logger.info(f"参考音频文件保留用于调试: {temp_file_path}")
-                # 注释掉自动删除，保留文件用于检查
-                # try:
-                #     from app.services.file_download_service import file_download_service
-                #     file_download_service.cleanup_temp_file(temp_file_path)
-                #     logger.info(f"临时文件已清理: {temp_file_path}")
-                # except Exception as cleanup_error:
-                #     logger.warning(f"清理临时文件失败: {cleanup_error}")
+            if cached_reference_path:
+                reference_audio_cache.release(cached_reference_path)
+    
+    @timed("tts.register_speaker")
+    async def _ensure_speaker(
+        self,
+        server_url: str,
+        character_id: Optional[str],
+        local_reference_path: str,
+        prompt_text: str,
+        prompt_language: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        确保参考音频已在llm_server上注册为说话人，参考音频只在首次使用或内容变化时上传
+        
+        Returns:
+            {"speaker_id", "version"}，后端不支持说话人注册或注册失败时返回None（回退为传参考音频路径）
+        """
+        if character_id:
+            speaker_id = re.sub(r"[^A-Za-z0-9_\-]", "_", character_id)[:64]
+        else:
+            speaker_id = f"ref_{hashlib.sha1(local_reference_path.encode('utf-8')).hexdigest()[:16]}"
+        key = (server_url, speaker_id)
+        # 缓存的参考音频文件名包含内容哈希，路径不变即内容不变
+        fingerprint = [local_reference_path, prompt_text, prompt_language]
+        if key in self._speakers:
+            speaker = self._speakers[key]
+            if speaker is None or speaker["fingerprint"] == fingerprint:
+                return speaker
+        
+        try:
+            with open(local_reference_path, "rb") as f:
+                audio_data = f.read()
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.post(
+                    f"{server_url}/speakers",
+                    data={
+                        "speaker_id": speaker_id,
+                        "prompt_text": prompt_text,
+                        "prompt_language": prompt_language,
+                    },
+                    files={"file": (os.path.basename(local_reference_path), audio_data, "audio/wav")}
+                )
+        except httpx.RequestError as e:
+            logger.warning(f"注册说话人失败，使用参考音频路径: {e}")
+            return None
+        
+        if response.status_code in (404, 405):
+            # 旧版本llm_server没有注册接口
+            logger.info(f"{server_url} 不支持说话人注册，使用参考音频路径")
+            self._speakers[key] = None
+            return None
+        if response.status_code != 200:
+            logger.warning(f"注册说话人失败，使用参考音频路径: {response.status_code} - {response.text}")
+            return None
+        
+        result = response.json()
+        speaker = {
+            "speaker_id": result["speaker_id"],
+            "version": result["version"],
+            "fingerprint": fingerprint,
+        }
+        self._speakers[key] = speaker
+        logger.info(f"说话人已注册: {speaker_id} v{speaker['version']} @ {server_url}")
+        return speaker
+    
+    def _speaker_request(self, request_data: Dict[str, Any], speaker: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """已注册说话人时只发送speaker_id，不再传参考音频路径"""
+        if not speaker:
+            return request_data
+        payload = {
+            key: value for key, value in request_data.items()
+            if key not in ("refer_wav_path", "prompt_text", "prompt_language")
+        }
+        payload["speaker_id"] = speaker["speaker_id"]
+        payload["speaker_version"] = speaker["version"]
+        return payload
+    
+    async def _cancel_llm_server_request(self, request_id: str, server_url: str):
+        """通知llm_server取消正在进行的推理"""
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                await client.post(f"{server_url}/cancel", json={"request_id": request_id})
+            logger.info(f"已通知llm_server取消推理: {request_id}")
+        except Exception as e:
+            logger.warning(f"通知llm_server取消推理失败: {e}")
     
     async def _generate_default_voice(self, text: str, language: str) -> str:
         """生成默认语音（降级方案）"""
@@ -224,52 +343,34 @@ class TTSService:
             logger.error(f"默认TTS生成失败: {str(e)}")
             raise VoiceProcessingError("语音生成失败")
     
+    @timed("tts.save_audio")
     async def _save_generated_audio(self, audio_data: bytes, format: str = "wav") -> str:
         """保存生成的音频文件"""
         try:
             # 生成唯一文件名
             filename = f"tts_{uuid.uuid4().hex}.{format}"
             
-            if static_asset_service.use_qiniu:
-                # 使用七牛云存储
-                from app.services.qiniu_service import qiniu_service
-                key = f"generated_voices/{filename}"
-                result = qiniu_service.upload_data(
-                    data=audio_data,
-                    key=key,
-                    mime_type="audio/wav"
-                )
-                
-                if result["success"]:
-                    return result["url"]
-                else:
-                    raise VoiceProcessingError(f"七牛云上传失败: {result['error']}")
-            else:
-                # 使用本地存储
-                output_dir = os.path.join(settings.UPLOAD_DIR, "generated_voices")
-                os.makedirs(output_dir, exist_ok=True)
-                
-                file_path = os.path.join(output_dir, filename)
-                
-                # 保存文件
-                with open(file_path, "wb") as f:
-                    f.write(audio_data)
-                
-                # 返回相对路径，前端通过Next.js代理访问
-                return f"/static/uploads/generated_voices/{filename}"
+            # 先写入本地并返回本地URL，启用七牛云时由后台worker上传并替换数据库中的URL
+            result = await storage_upload_service.store(
+                data=audio_data,
+                key=f"generated_voices/{filename}",
+                mime_type=f"audio/{format}"
+            )
+            if not result["success"]:
+                raise VoiceProcessingError(result["error"])
+            
+            # 返回相对路径，前端通过Next.js代理访问
+            return result["url"]
             
         except Exception as e:
             raise VoiceProcessingError(f"保存音频文件失败: {str(e)}")
     
     async def test_llm_server_connection(self) -> bool:
-        """测试LLM服务器连接"""
+        """测试LLM服务器连接 - 对所有后端做一次真实合成探活，任一可用即返回True"""
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                # 尝试访问根端点，即使返回错误也说明服务器在运行
-                response = await client.get(f"{self.llm_server_url}/")
-                print(f"llm_server连接测试 - 状态码: {response.status_code}")
-                # 只要不是连接错误，就认为服务器可用
-                return True
+            status = await tts_backend_pool.check_all()
+            print(f"llm_server连接测试: {status}")
+            return any(backend["healthy"] for backend in status)
         except Exception as e:
             print(f"llm_server连接测试失败: {e}")
             return False
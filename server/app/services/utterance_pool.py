@@ -0,0 +1,169 @@
+"""
+预生成话术池 - 为每个角色预先生成问候语和冷场时的主动搭话（文本+语音）
+通话开始或用户长时间沉默时直接取用，空闲时在后台补充
+角色更新（参考音频、声音等变化）时由 invalidate 丢弃旧话术，超过 VOICE_POOL_MAX_AGE_SECONDS 的话术也不再使用
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 话术类型 -> 生成时使用的提示
+UTTERANCE_PROMPTS = {
+    "greeting": "请说一句简短的问候语，欢迎用户开始对话",
+    "restart": "用户长时间没有说话，请主动发起对话",
+}
+
+Generator = Callable[[str, str], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class UtterancePool:
+    """按角色缓存预生成话术的池子
+
+    generate(character_id, prompt) 负责调用LLM与TTS，返回 {"text", "audioUrl"}，失败时返回None
+    """
+
+    def __init__(self, generate: Generator):
+        self.generate = generate
+        self.enabled = settings.VOICE_POOL_ENABLED
+        self.pool_size = settings.VOICE_POOL_SIZE
+        self.max_characters = settings.VOICE_POOL_MAX_CHARACTERS
+        self.max_age = settings.VOICE_POOL_MAX_AGE_SECONDS
+        # (character_id, kind) -> 待使用的话术 (生成时间, 话术)，按生成先后排列
+        self._pools: "OrderedDict[Tuple[str, str], Deque[Tuple[float, Dict[str, Any]]]]" = OrderedDict()
+        # character_id -> 失效次数，生成期间角色被更新时丢弃生成结果
+        self._versions: Dict[str, int] = {}
+        # (character_id, kind) -> 最近已播放过的文本，补充时避免重复
+        self._recent: Dict[Tuple[str, str], Deque[str]] = {}
+        self._queue: "asyncio.Queue[Tuple[str, str]]" = None
+        self._queued = set()
+        self._worker: Optional[asyncio.Task] = None
+        self._active_turns = 0
+        self._idle: Optional[asyncio.Event] = None
+
+    def take(self, character_id: str, kind: str) -> Optional[Dict[str, Any]]:
+        """取出一条话术，取出后即从池中移除，保证同一条不会被重复播放"""
+        if not self.enabled or not character_id:
+            return None
+        key = (character_id, kind)
+        pool = self._pools.get(key)
+        item = None
+        self._expire(key)
+        if pool:
+            _, item = pool.popleft()
+            self._pools.move_to_end(key)
+            self._recent_for(key).append(item["text"])
+        self.schedule_refill(character_id, kind)
+        return item
+
+    def schedule_refill(self, character_id: str, kind: Optional[str] = None):
+        """将角色的话术池加入后台补充队列"""
+        if not self.enabled or not character_id:
+            return
+        self._ensure_worker()
+        kinds = [kind] if kind else list(UTTERANCE_PROMPTS)
+        for k in kinds:
+            key = (character_id, k)
+            if key not in self._pools:
+                self._pools[key] = deque()
+                self._evict()
+            self._expire(key)
+            if key in self._queued or len(self._pools[key]) >= self.pool_size:
+                continue
+            self._queued.add(key)
+            self._queue.put_nowait(key)
+
+    def invalidate(self, character_id: str):
+        """角色信息更新后调用：丢弃按旧声音/设定生成的话术，进行中的生成结果也不再入池"""
+        if not character_id:
+            return
+        self._versions[character_id] = self._versions.get(character_id, 0) + 1
+        for kind in UTTERANCE_PROMPTS:
+            pool = self._pools.get((character_id, kind))
+            if pool:
+                pool.clear()
+                logger.info(f"角色已更新，清空预生成话术: {character_id} {kind}")
+
+    def turn_started(self):
+        """前台对话开始，暂停后台补充，让出LLM/TTS资源"""
+        self._ensure_worker()
+        self._active_turns += 1
+        self._idle.clear()
+
+    def turn_finished(self):
+        self._active_turns = max(0, self._active_turns - 1)
+        if self._active_turns == 0 and self._idle is not None:
+            self._idle.set()
+
+    def _recent_for(self, key: Tuple[str, str]) -> Deque[str]:
+        if key not in self._recent:
+            self._recent[key] = deque(maxlen=self.pool_size * 2)
+        return self._recent[key]
+
+    def _expire(self, key: Tuple[str, str]):
+        """丢弃超过最大保存时间的话术"""
+        pool = self._pools.get(key)
+        deadline = time.monotonic() - self.max_age
+        while pool and pool[0][0] < deadline:
+            pool.popleft()
+
+    def _evict(self):
+        """超出角色数量上限时淘汰最久未使用的角色"""
+        while len(self._pools) > self.max_characters * len(UTTERANCE_PROMPTS):
+            key, _ = self._pools.popitem(last=False)
+            self._recent.pop(key, None)
+            character_id = key[0]
+            if not any((character_id, kind) in self._pools for kind in UTTERANCE_PROMPTS):
+                self._versions.pop(character_id, None)
+
+    def _ensure_worker(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._idle = asyncio.Event()
+            self._idle.set()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._refill_loop())
+
+    async def _refill_loop(self):
+        """后台补充话术，一次只生成一条，且只在没有前台对话时进行"""
+        while True:
+            key = await self._queue.get()
+            try:
+                # 限制尝试次数，避免LLM反复生成相同文本时无限重试
+                for _ in range(self.pool_size * 2):
+                    self._expire(key)
+                    if key not in self._pools or len(self._pools[key]) >= self.pool_size:
+                        break
+                    await self._idle.wait()
+                    if not await self._refill_one(key):
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"补充话术池失败 {key}: {e}")
+            finally:
+                self._queued.discard(key)
+
+    async def _refill_one(self, key: Tuple[str, str]) -> bool:
+        character_id, kind = key
+        version = self._versions.get(character_id, 0)
+        item = await self.generate(character_id, UTTERANCE_PROMPTS[kind])
+        if not item or not item.get("text", "").strip() or not item.get("audioUrl"):
+            return False
+        pool = self._pools.get(key)
+        if pool is None:
+            return False
+        # 生成期间角色被更新，结果使用的是旧声音，丢弃后按新设定重新生成
+        if self._versions.get(character_id, 0) != version:
+            return True
+        # 与池中或最近播放过的文本相同则丢弃，避免用户听到重复内容
+        text = item["text"].strip()
+        if text in self._recent_for(key) or any(p["text"].strip() == text for _, p in pool):
+            return True
+        pool.append((time.monotonic(), item))
+        return True
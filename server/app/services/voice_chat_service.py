@@ -4,14 +4,25 @@ import base64
 import tempfile
 import os
 import time
-from typing import Dict, Any
+import uuid
+import functools
+from typing import Dict, Any, Optional
 from fastapi import WebSocket
 import httpx
 from app.services.tts_service import TTSService
 from app.services.voice_service import VoiceService
 from app.services.ai_service import AIService
 from app.services.character_service import CharacterService
+from app.services.utterance_pool import UtterancePool, UTTERANCE_PROMPTS
+from app.services.streaming_vad import StreamingVAD, pcm16_to_float, float_to_wav_bytes
+from app.services.storage_upload_service import storage_upload_service
 from app.core.database import get_db
+from app.core.config import settings
+from app.core.logging_config import truncate
+from app.core.metrics import metrics, stage, timed
+import logging
+
+logger = logging.getLogger(__name__)
 
 class VoiceChatService:
     def __init__(self):
@@ -19,60 +30,136 @@ class VoiceChatService:
         self.voice_service = VoiceService()
         self.ai_service = AIService()
         self.active_connections: Dict[str, WebSocket] = {}
+        # 流式输入会话状态（VAD、中间识别任务等），按client_id区分
+        self.stream_sessions: Dict[str, Dict[str, Any]] = {}
+        # 每个连接当前进行中的一轮对话（LLM + TTS），用于打断时取消
+        self.turn_tasks: Dict[str, asyncio.Task] = {}
+        # 每个角色预生成的问候语/搭话
+        self.utterance_pool = UtterancePool(self._generate_pooled_utterance)
         
     async def connect(self, websocket: WebSocket, client_id: str):
         """建立WebSocket连接"""
         self.active_connections[client_id] = websocket
-        print(f"语音聊天连接已建立: {client_id}")
+        logger.info(f"语音聊天连接已建立: {client_id}")
         
     async def disconnect(self, client_id: str):
         """断开WebSocket连接"""
+        session = self.stream_sessions.pop(client_id, None)
+        if session:
+            self._cancel_partial_task(session)
+        # 挂断后不再需要的LLM/TTS工作立即停止
+        self.cancel_turn(client_id)
         if client_id in self.active_connections:
             del self.active_connections[client_id]
-            print(f"语音聊天连接已断开: {client_id}")
+            logger.info(f"语音聊天连接已断开: {client_id}")
     
     async def handle_message(self, websocket: WebSocket, client_id: str, message: Dict[str, Any]):
         """处理WebSocket消息"""
         try:
             message_type = message.get("type")
             
+            # 耗时的一轮对话在独立任务中执行，消息循环可继续接收打断/挂断
             if message_type == "init":
-                await self._handle_init(websocket, message)
+                self._start_turn_task(client_id, self._handle_init(websocket, message))
             elif message_type == "audio":
-                await self._handle_audio(websocket, client_id, message)
+                # 新的一段语音会打断仍在进行的回复
+                self._start_turn_task(client_id, self._handle_audio(websocket, client_id, message))
             elif message_type == "silence_timeout":
-                await self._handle_silence_timeout(websocket, client_id, message)
+                if client_id in self.turn_tasks:
+                    logger.info("当前回复尚未完成，忽略静音超时")
+                    return
+                self._start_turn_task(client_id, self._handle_silence_timeout(websocket, client_id, message))
+            elif message_type == "interrupt":
+                await self._handle_interrupt(websocket, client_id, message)
             elif message_type == "ready":
                 await self._handle_ready(websocket, client_id, message)
+            elif message_type == "stream_start":
+                await self._handle_stream_start(websocket, client_id, message)
+            elif message_type == "audio_frame":
+                await self._handle_audio_frame(websocket, client_id, message)
+            elif message_type == "stream_end":
+                await self._handle_stream_end(websocket, client_id, message)
             else:
                 await self._send_error(websocket, f"未知消息类型: {message_type}")
                 
         except Exception as e:
-            print(f"处理消息失败: {e}")
+            logger.error(f"处理消息失败: {e}")
             await self._send_error(websocket, f"处理消息失败: {str(e)}")
     
+    def _start_turn_task(self, client_id: str, coro) -> asyncio.Task:
+        """启动新一轮对话任务，同一连接上未完成的上一轮会被取消"""
+        self.cancel_turn(client_id)
+        task = asyncio.create_task(coro)
+        self.turn_tasks[client_id] = task
+        task.add_done_callback(lambda t: self._on_turn_done(client_id, t))
+        return task
+    
+    def _on_turn_done(self, client_id: str, task: asyncio.Task):
+        if self.turn_tasks.get(client_id) is task:
+            del self.turn_tasks[client_id]
+    
+    def cancel_turn(self, client_id: str) -> bool:
+        """取消连接上正在进行的一轮对话，返回是否确实取消了任务"""
+        task = self.turn_tasks.pop(client_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            logger.info(f"已取消进行中的回复: {client_id}")
+            return True
+        return False
+    
+    async def _handle_interrupt(self, websocket: WebSocket, client_id: str, message: Dict[str, Any]):
+        """处理打断消息 - 用户在角色说话时开口"""
+        cancelled = self.cancel_turn(client_id)
+        await self._send_message(websocket, {
+            "type": "interrupted",
+            "cancelled": cancelled
+        })
+    
     async def _handle_init(self, websocket: WebSocket, message: Dict[str, Any]):
         """处理初始化消息"""
         character_id = message.get("characterId")
         character_name = message.get("characterName")
         
-        print(f"初始化语音聊天: {character_name} (ID: {character_id})")
+        logger.info(f"初始化语音聊天: {character_name} (ID: {character_id})")
         
-        # 生成问候语
+        # 优先使用预生成的问候语，无需等待LLM和TTS
+        pooled = self.utterance_pool.take(character_id, "greeting")
+        if pooled:
+            await self._send_message(websocket, {
+                "type": "greeting",
+                "text": pooled["text"],
+                "audioUrl": storage_upload_service.resolve(pooled["audioUrl"])
+            })
+            logger.info("预生成问候语发送完成")
+        else:
+            await self._generate_greeting(websocket, character_id, character_name)
+        # 通话期间在空闲时补充该角色的问候语与搭话
+        self.utterance_pool.schedule_refill(character_id)
+        
+        # 发送初始化确认
+        await self._send_message(websocket, {
+            "type": "init_success",
+            "characterId": character_id,
+            "characterName": character_name
+        })
+    
+    async def _generate_greeting(self, websocket: WebSocket, character_id: str, character_name: str):
+        """实时生成问候语（话术池为空时使用）"""
+        self.utterance_pool.turn_started()
         try:
-            print("开始生成问候语...")
+            logger.debug("开始生成问候语...")
             greeting_result = await self.ai_service.generate_response(
                 character_id=character_id,
-                user_message="请说一句简短的问候语，欢迎用户开始对话",
+                user_message=UTTERANCE_PROMPTS["greeting"],
                 session_history=[]
             )
             
             greeting_text = greeting_result.get("content", "")
-            print(f"生成的问候语: {greeting_text}")
+            logger.info(f"生成的问候语: {greeting_text}")
             
             if greeting_text.strip():
                 # 生成问候语音频
-                print("开始生成问候语音频...")
+                logger.debug("开始生成问候语音频...")
                 greeting_audio_url = await self._generate_voice_response(greeting_text, character_id)
                 
                 # 发送问候语
@@ -81,9 +168,9 @@ class VoiceChatService:
                     "text": greeting_text,
                     "audioUrl": greeting_audio_url
                 })
-                print("问候语发送完成")
+                logger.info("问候语发送完成")
             else:
-                print("问候语生成失败，使用默认问候语")
+                logger.warning("问候语生成失败，使用默认问候语")
                 await self._send_message(websocket, {
                     "type": "greeting",
                     "text": f"你好！我是{character_name}，很高兴和你聊天！",
@@ -91,123 +178,66 @@ class VoiceChatService:
                 })
                 
         except Exception as e:
-            print(f"生成问候语失败: {e}")
+            logger.error(f"生成问候语失败: {e}")
             # 使用默认问候语
             await self._send_message(websocket, {
                 "type": "greeting",
                 "text": f"你好！我是{character_name}，很高兴和你聊天！",
                 "audioUrl": None
             })
-        
-        # 发送初始化确认
-        await self._send_message(websocket, {
-            "type": "init_success",
-            "characterId": character_id,
-            "characterName": character_name
-        })
+        finally:
+            self.utterance_pool.turn_finished()
     
     async def _handle_audio(self, websocket: WebSocket, client_id: str, message: Dict[str, Any]):
         """处理音频数据 - 电话模式：七牛云ASR -> AI服务 -> llm_server TTS"""
         try:
-            print(f"收到音频消息，客户端ID: {client_id}")
-            print(f"消息内容: {message}")
-            
             # 获取角色ID
             character_id = message.get("characterId")
-            print(f"🔍 音频处理中的角色ID: {character_id}")
             
             # 获取音频数据
             audio_data = message.get("data", [])
             if not audio_data:
-                print("音频数据为空")
+                logger.warning("音频数据为空")
                 await self._send_error(websocket, "音频数据为空")
                 return
             
-            print(f"音频数据长度: {len(audio_data)}")
-            
             # 将音频数据转换为字节
             audio_bytes = bytes(audio_data)
-            print(f"音频字节长度: {len(audio_bytes)}")
-            print(f"音频数据前10个字节: {audio_data[:10]}...")  # 只显示前10个字节
+            logger.info(f"收到音频消息: 角色ID {character_id}, {len(audio_bytes)} 字节")
             
             # 保存临时音频文件
             with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_file:
                 temp_file.write(audio_bytes)
                 temp_audio_path = temp_file.name
-                print(f"临时音频文件保存到: {temp_audio_path}")
+                logger.debug(f"临时音频文件保存到: {temp_audio_path}")
             
             try:
                 # 1. 使用七牛云ASR进行语音识别
-                print("开始七牛云ASR语音识别...")
                 from app.services.qiniu_asr_service import qiniu_asr_service
                 from app.services.qiniu_service import qiniu_service
                 
                 # 上传音频到七牛云存储
-                print("上传音频到七牛云存储...")
-                upload_result = qiniu_service.upload_file(temp_audio_path, f"voice_chat/{client_id}_{int(time.time())}.webm")
+                with stage("asr.upload_audio"):
+                    upload_result = qiniu_service.upload_file(temp_audio_path, f"voice_chat/{client_id}_{int(time.time())}.webm")
                 if not upload_result.get("success"):
-                    print(f"音频上传失败: {upload_result}")
+                    logger.error(f"音频上传失败: {truncate(upload_result)}")
                     await self._send_error(websocket, "音频上传失败")
                     return
                 
                 audio_url = upload_result.get("url")
-                print(f"音频上传成功，URL: {audio_url}")
+                logger.debug(f"音频上传成功，URL: {audio_url}")
                 
                 # 调用七牛云ASR
                 transcript = await qiniu_asr_service.speech_to_text(audio_url, "zh")
-                print(f"七牛云ASR识别结果: {transcript}")
+                logger.info(f"七牛云ASR识别结果: {transcript}")
                 
                 if not transcript.strip():
                     # 如果没有识别到内容，不发送错误，继续监听
-                    print("未识别到语音内容，继续监听...")
+                    logger.info("未识别到语音内容，继续监听...")
                     return
                 
-                # 发送识别结果
-                await self._send_message(websocket, {
-                    "type": "transcript",
-                    "text": transcript
-                })
-                
-                # 2. 使用现有的AI服务生成回复
-                print("开始AI服务生成回复...")
-                character_id = message.get("characterId")
-                if not character_id:
-                    await self._send_error(websocket, "缺少角色ID")
-                    return
-                
-                # 获取会话历史（这里简化处理，实际应该从数据库获取）
-                session_history = []
-                
-                ai_response_result = await self.ai_service.generate_response(
-                    character_id=character_id,
-                    user_message=transcript,
-                    session_history=session_history
-                )
-                
-                ai_response = ai_response_result.get("content", "")
-                print(f"AI服务回复: {ai_response}")
-                
-                if not ai_response.strip():
-                    await self._send_error(websocket, "AI回复生成失败")
-                    return
-                
-                # 3. 使用llm_server进行TTS
-                print("开始llm_server TTS...")
-                audio_url = await self._generate_voice_response(ai_response, character_id)
-                
-                if audio_url:
-                    # 发送AI回复和音频
-                    await self._send_message(websocket, {
-                        "type": "response",
-                        "text": ai_response,
-                        "audioUrl": audio_url
-                    })
-                else:
-                    # 只发送文本回复
-                    await self._send_message(websocket, {
-                        "type": "response",
-                        "text": ai_response
-                    })
+                # 2-3. AI服务生成回复并进行TTS
+                await self._respond_to_transcript(websocket, message.get("characterId"), transcript)
                 
             finally:
                 # 清理临时文件
@@ -215,78 +245,293 @@ class VoiceChatService:
                     os.unlink(temp_audio_path)
                     
         except Exception as e:
-            print(f"处理音频失败: {e}")
+            logger.error(f"处理音频失败: {e}")
             await self._send_error(websocket, f"处理音频失败: {str(e)}")
     
+    async def _respond_to_transcript(self, websocket: WebSocket, character_id: str, transcript: str):
+        """根据识别结果生成AI回复与语音并发送给客户端"""
+        self.utterance_pool.turn_started()
+        try:
+            await self._generate_reply(websocket, character_id, transcript)
+        finally:
+            self.utterance_pool.turn_finished()
+    
+    @timed("voice.reply")
+    async def _generate_reply(self, websocket: WebSocket, character_id: str, transcript: str):
+        # 发送识别结果
+        await self._send_message(websocket, {
+            "type": "transcript",
+            "text": transcript
+        })
+        
+        # 使用现有的AI服务生成回复
+        logger.debug("开始AI服务生成回复...")
+        if not character_id:
+            await self._send_error(websocket, "缺少角色ID")
+            return
+        
+        # 获取会话历史（这里简化处理，实际应该从数据库获取）
+        session_history = []
+        
+        ai_response_result = await self.ai_service.generate_response(
+            character_id=character_id,
+            user_message=transcript,
+            session_history=session_history
+        )
+        
+        ai_response = ai_response_result.get("content", "")
+        logger.info(f"AI服务回复: {truncate(ai_response, 200)}")
+        
+        if not ai_response.strip():
+            await self._send_error(websocket, "AI回复生成失败")
+            return
+        
+        # 使用llm_server进行TTS
+        logger.debug("开始llm_server TTS...")
+        audio_url = await self._generate_voice_response(ai_response, character_id)
+        
+        if audio_url:
+            # 发送AI回复和音频
+            await self._send_message(websocket, {
+                "type": "response",
+                "text": ai_response,
+                "audioUrl": audio_url
+            })
+        else:
+            # 只发送文本回复
+            await self._send_message(websocket, {
+                "type": "response",
+                "text": ai_response
+            })
+    
+    async def _handle_stream_start(self, websocket: WebSocket, client_id: str, message: Dict[str, Any]):
+        """开始流式音频输入 - 客户端之后以 audio_frame 持续发送小段PCM"""
+        sample_rate = int(message.get("sampleRate") or settings.VOICE_STREAM_SAMPLE_RATE)
+        old_session = self.stream_sessions.pop(client_id, None)
+        if old_session:
+            self._cancel_partial_task(old_session)
+        
+        self.stream_sessions[client_id] = {
+            "character_id": message.get("characterId"),
+            "sample_rate": sample_rate,
+            "vad": StreamingVAD(
+                sr=sample_rate,
+                threshold=settings.VOICE_VAD_THRESHOLD_DB,
+                min_length=settings.VOICE_VAD_MIN_SPEECH_MS,
+                min_interval=settings.VOICE_VAD_END_SILENCE_MS,
+                hop_size=settings.VOICE_VAD_HOP_MS,
+                max_sil_kept=settings.VOICE_VAD_MAX_SIL_KEPT_MS,
+                max_utterance=settings.VOICE_VAD_MAX_UTTERANCE_MS,
+            ),
+            "partial_task": None,
+            "partial_text": "",
+            "partial_samples": 0,
+        }
+        logger.info(f"流式语音输入已开始: {client_id}, 采样率: {sample_rate}")
+        await self._send_message(websocket, {
+            "type": "stream_ready",
+            "sampleRate": sample_rate
+        })
+    
+    async def _handle_audio_frame(self, websocket: WebSocket, client_id: str, message: Dict[str, Any]):
+        """处理流式音频帧 - base64编码的16位单声道PCM"""
+        session = self.stream_sessions.get(client_id)
+        if not session:
+            await self._send_error(websocket, "流式语音未初始化，请先发送 stream_start")
+            return
+        
+        data = message.get("data")
+        if not data:
+            return
+        samples = pcm16_to_float(base64.b64decode(data))
+        vad: StreamingVAD = session["vad"]
+        
+        for event in vad.feed(samples):
+            if event["type"] == "speech_start":
+                session["partial_text"] = ""
+                session["partial_samples"] = 0
+                await self._send_message(websocket, {"type": "vad", "event": "speech_start"})
+                # 用户开口即打断角色当前的回复
+                if self.cancel_turn(client_id):
+                    await self._send_message(websocket, {"type": "interrupted", "cancelled": True})
+            elif event["type"] == "discard":
+                self._cancel_partial_task(session)
+            elif event["type"] == "end_of_speech":
+                await self._send_message(websocket, {"type": "vad", "event": "end_of_speech"})
+                self._start_turn(websocket, client_id, session, event["audio"])
+        
+        # 说话过程中按固定间隔做中间识别，同一时间只保留一个识别任务
+        if vad.in_speech:
+            interval = session["sample_rate"] * settings.VOICE_PARTIAL_ASR_INTERVAL_MS // 1000
+            partial_task = session["partial_task"]
+            if (
+                vad.speech_samples - session["partial_samples"] >= interval
+                and (partial_task is None or partial_task.done())
+            ):
+                session["partial_task"] = asyncio.create_task(
+                    self._run_partial_asr(websocket, client_id, session, vad.current_audio(), vad.speech_samples)
+                )
+    
+    async def _handle_stream_end(self, websocket: WebSocket, client_id: str, message: Dict[str, Any]):
+        """结束流式音频输入，未结束的语音段立即作为一轮对话处理"""
+        session = self.stream_sessions.get(client_id)
+        if not session:
+            return
+        event = session["vad"].flush()
+        if event and event["type"] == "end_of_speech":
+            await self._send_message(websocket, {"type": "vad", "event": "end_of_speech"})
+            self._start_turn(websocket, client_id, session, event["audio"])
+    
+    def _start_turn(self, websocket: WebSocket, client_id: str, session: Dict[str, Any], audio):
+        """检测到说话结束后立即启动 ASR -> LLM -> TTS"""
+        # 中间识别结果已覆盖整段语音时直接复用，省去一次ASR
+        reuse_text = ""
+        if session["partial_text"] and session["partial_samples"] >= len(audio) - session["vad"].max_sil_kept * session["vad"].hop_size:
+            reuse_text = session["partial_text"]
+        # 仍在进行的中间识别无论是否复用都要取消，否则会在重置后写回旧结果，被下一段语音误用
+        self._cancel_partial_task(session)
+        session["partial_text"] = ""
+        session["partial_samples"] = 0
+        self._start_turn_task(
+            client_id,
+            self._run_stream_turn(websocket, client_id, session["character_id"], audio, session["sample_rate"], reuse_text)
+        )
+    
+    async def _run_partial_asr(self, websocket: WebSocket, client_id: str, session: Dict[str, Any], audio, covered_samples: int):
+        """对说话中的音频做中间识别"""
+        try:
+            text = await self._recognize_pcm(client_id, audio, session["sample_rate"])
+            if text.strip():
+                session["partial_text"] = text
+                session["partial_samples"] = covered_samples
+                await self._send_message(websocket, {
+                    "type": "partial_transcript",
+                    "text": text
+                })
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"中间识别失败: {e}")
+    
+    async def _run_stream_turn(self, websocket: WebSocket, client_id: str, character_id: str, audio, sample_rate: int, transcript: str = ""):
+        """流式输入的一轮对话"""
+        try:
+            if not transcript:
+                transcript = await self._recognize_pcm(client_id, audio, sample_rate)
+            logger.info(f"流式识别结果: {transcript}")
+            if not transcript.strip():
+                logger.info("未识别到语音内容，继续监听...")
+                return
+            await self._respond_to_transcript(websocket, character_id, transcript)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"处理流式语音失败: {e}")
+            await self._send_error(websocket, f"处理音频失败: {str(e)}")
+    
+    async def _recognize_pcm(self, client_id: str, audio, sample_rate: int) -> str:
+        """将PCM编码为WAV上传后调用七牛云ASR"""
+        from app.services.qiniu_asr_service import qiniu_asr_service
+        from app.services.qiniu_service import qiniu_service
+        
+        wav_bytes = float_to_wav_bytes(audio, sample_rate)
+        key = f"voice_chat/{client_id}_{uuid.uuid4().hex}.wav"
+        loop = asyncio.get_event_loop()
+        # 上传在线程池中执行，避免阻塞后续音频帧的接收
+        upload_result = await loop.run_in_executor(
+            None,
+            functools.partial(qiniu_service.upload_data, data=wav_bytes, key=key, mime_type="audio/wav")
+        )
+        if not upload_result.get("success"):
+            raise Exception(f"音频上传失败: {upload_result.get('error')}")
+        return await qiniu_asr_service.speech_to_text(upload_result["url"], "zh")
+    
+    def _cancel_partial_task(self, session: Dict[str, Any]):
+        partial_task = session.get("partial_task")
+        if partial_task is not None and not partial_task.done():
+            partial_task.cancel()
+        session["partial_task"] = None
+    
     async def _handle_silence_timeout(self, websocket: WebSocket, client_id: str, message: Dict[str, Any]):
         """处理静音超时 - AI主动说话"""
         try:
-            print("处理静音超时，AI主动说话...")
-            print(f"收到的消息: {message}")
-            
             # 获取角色ID
             character_id = message.get("characterId")
-            print(f"角色ID: {character_id}")
+            logger.info(f"处理静音超时，AI主动说话: 角色ID {character_id}")
             if not character_id:
                 await self._send_error(websocket, "缺少角色ID")
                 return
             
-            print("开始调用AI服务生成回复...")
-            try:
-                # 生成AI主动说话的内容
-                ai_response_result = await self.ai_service.generate_response(
-                    character_id=character_id,
-                    user_message="用户长时间没有说话，请主动发起对话",
-                    session_history=[]
-                )
-            except Exception as ai_error:
-                print(f"AI服务调用失败: {ai_error}")
-                await self._send_error(websocket, f"AI服务调用失败: {str(ai_error)}")
-                return
-            
-            print(f"AI服务返回结果: {ai_response_result}")
-            ai_response = ai_response_result.get("content", "")
-            print(f"AI主动回复内容: '{ai_response}'")
-            print(f"回复内容长度: {len(ai_response)}")
-            print(f"回复内容是否为空: {not ai_response.strip()}")
-            
-            if not ai_response.strip():
-                print("AI回复为空，发送错误消息")
-                await self._send_error(websocket, "AI回复生成失败")
-                return
-            
-            # 生成语音回复
-            audio_url = await self._generate_voice_response(ai_response, character_id)
-            
-            if audio_url:
-                # 发送AI回复和音频
-                await self._send_message(websocket, {
-                    "type": "response",
-                    "text": ai_response,
-                    "audioUrl": audio_url
-                })
-            else:
-                # 只发送文本回复
+            # 优先使用预生成的搭话
+            pooled = self.utterance_pool.take(character_id, "restart")
+            if pooled:
                 await self._send_message(websocket, {
                     "type": "response",
-                    "text": ai_response
+                    "text": pooled["text"],
+                    "audioUrl": storage_upload_service.resolve(pooled["audioUrl"])
                 })
+                return
+            
+            self.utterance_pool.turn_started()
+            try:
+                await self._generate_restart(websocket, character_id)
+            finally:
+                self.utterance_pool.turn_finished()
                 
         except Exception as e:
-            print(f"处理静音超时失败: {e}")
+            logger.error(f"处理静音超时失败: {e}")
             await self._send_error(websocket, f"处理静音超时失败: {str(e)}")
     
+    async def _generate_restart(self, websocket: WebSocket, character_id: str):
+        """实时生成主动搭话（话术池为空时使用）"""
+        try:
+            # 生成AI主动说话的内容
+            ai_response_result = await self.ai_service.generate_response(
+                character_id=character_id,
+                user_message=UTTERANCE_PROMPTS["restart"],
+                session_history=[]
+            )
+        except Exception as ai_error:
+            logger.error(f"AI服务调用失败: {ai_error}")
+            await self._send_error(websocket, f"AI服务调用失败: {str(ai_error)}")
+            return
+        
+        ai_response = ai_response_result.get("content", "")
+        logger.info(f"AI主动回复内容: {truncate(ai_response, 200)}")
+        
+        if not ai_response.strip():
+            logger.warning("AI回复为空，发送错误消息")
+            await self._send_error(websocket, "AI回复生成失败")
+            return
+        
+        # 生成语音回复
+        audio_url = await self._generate_voice_response(ai_response, character_id)
+        
+        if audio_url:
+            # 发送AI回复和音频
+            await self._send_message(websocket, {
+                "type": "response",
+                "text": ai_response,
+                "audioUrl": audio_url
+            })
+        else:
+            # 只发送文本回复
+            await self._send_message(websocket, {
+                "type": "response",
+                "text": ai_response
+            })
+    
     async def _handle_ready(self, websocket: WebSocket, client_id: str, message: Dict[str, Any]):
         """处理ready消息 - 准备开始下一轮录音"""
         try:
-            print("收到ready消息，准备开始下一轮录音")
+            logger.info("收到ready消息，准备开始下一轮录音")
             # 这里可以添加一些准备逻辑，比如重置状态等
             await self._send_message(websocket, {
                 "type": "ready_ack",
                 "message": "准备开始录音"
             })
         except Exception as e:
-            print(f"处理ready消息失败: {e}")
+            logger.error(f"处理ready消息失败: {e}")
     
     async def _generate_ai_response(self, user_input: str, client_id: str) -> str:
         """生成AI回复"""
@@ -304,9 +549,26 @@ class VoiceChatService:
             return random.choice(responses)
             
         except Exception as e:
-            print(f"生成AI回复失败: {e}")
+            logger.error(f"生成AI回复失败: {e}")
             return "抱歉，我现在无法回复你的消息。"
     
+    async def _generate_pooled_utterance(self, character_id: str, prompt: str) -> Optional[Dict[str, Any]]:
+        """为话术池生成一条话术（文本+语音）"""
+        try:
+            result = await self.ai_service.generate_response(
+                character_id=character_id,
+                user_message=prompt,
+                session_history=[]
+            )
+            text = result.get("content", "")
+            if not text.strip():
+                return None
+            audio_url = await self._generate_voice_response(text, character_id)
+            return {"text": text, "audioUrl": audio_url}
+        except Exception as e:
+            logger.error(f"预生成话术失败: {e}")
+            return None
+    
     async def _generate_voice_response(self, text: str, character_id: str) -> str:
         """生成语音回复"""
         try:
@@ -316,14 +578,13 @@ class VoiceChatService:
             
             async with AsyncSessionLocal() as db:
                 character_service = CharacterService(db)
-                print(f"🔍 查找角色ID: {character_id}")
                 character = await character_service.get_character_by_id(character_id)
                 
                 if not character:
-                    print(f"❌ 角色 {character_id} 不存在，使用默认TTS")
+                    logger.warning(f"角色 {character_id} 不存在，使用默认TTS")
                     return await self.tts_service._generate_default_voice(text, "zh")
                 else:
-                    print(f"✅ 找到角色: {character.name} (ID: {character.id})")
+                    logger.debug(f"找到角色: {character.name} (ID: {character.id})")
                 
                 # 构建角色数据
                 character_data = {
@@ -332,7 +593,7 @@ class VoiceChatService:
                     "reference_audio_language": character.reference_audio_language or "zh"
                 }
                 
-                print(f"角色 {character.name} 的参考音频: {character.reference_audio_path}")
+                logger.debug(f"角色 {character.name} 的参考音频: {character.reference_audio_path}")
                 
                 audio_url = await self.tts_service.generate_voice(
                     text=text,
@@ -344,7 +605,7 @@ class VoiceChatService:
                 return audio_url
             
         except Exception as e:
-            print(f"生成语音回复失败: {e}")
+            logger.error(f"生成语音回复失败: {e}")
             return None
     
     async def _send_message(self, websocket: WebSocket, message: Dict[str, Any]):
@@ -352,7 +613,7 @@ class VoiceChatService:
         try:
             await websocket.send_text(json.dumps(message, ensure_ascii=False))
         except Exception as e:
-            print(f"发送消息失败: {e}")
+            logger.error(f"发送消息失败: {e}")
     
     async def _send_error(self, websocket: WebSocket, error_message: str):
         """发送错误消息"""
@@ -363,3 +624,10 @@ class VoiceChatService:
 
 # 全局实例
 voice_chat_service = VoiceChatService()
+
+metrics.gauge("app_voice_sessions_in_flight", "当前WebSocket语音会话数",
+              lambda: len(voice_chat_service.active_connections))
+metrics.gauge("app_voice_streams_in_flight", "正在进行流式语音输入的会话数",
+              lambda: len(voice_chat_service.stream_sessions))
+metrics.gauge("app_voice_turns_in_flight", "正在进行的语音对话轮次数",
+              lambda: sum(1 for task in voice_chat_service.turn_tasks.values() if not task.done()))
@@ -0,0 +1,10 @@
+"""
+端到端压测工具
+
+用本地桩服务替代七牛云大模型(chat/completions)、ASR(/voice/asr)、播客TTS(/voice/tts)、
+七牛云存储和llm_server, 启动 server/app 后按比例混合发送文字聊天、WebSocket流式语音会话和导出请求,
+输出各接口的吞吐量与尾延迟, 不消耗七牛云额度.
+
+    cd server
+    python -m benchmarks.loadtest.run --duration 60 --users 20
+"""
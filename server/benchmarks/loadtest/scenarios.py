@@ -0,0 +1,329 @@
+"""
+压测场景
+
+每个虚拟用户持有自己的登录令牌, 按配置的比例循环执行:
+- chat: POST /chat/message (LLM + TTS + 数据库读写)
+- voice: WebSocket /ws/voice-chat 会话, 以实时速度发送PCM帧, 经VAD断句后 ASR -> LLM -> TTS
+- export_text / export_audio: 导出当前会话
+各接口的耗时与失败记录在 Recorder 中.
+"""
+
+import asyncio
+import base64
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+import websockets
+
+DEFAULT_MIX = {"chat": 60, "voice": 25, "export_text": 10, "export_audio": 5}
+USER_MESSAGES = ["你好", "给我讲讲你自己吧", "你平时喜欢做什么？", "今天心情不太好", "我们聊聊最近看的书吧"]
+
+FRAME_MS = 20
+
+
+class ScenarioError(Exception):
+    """场景执行失败（已记录到 Recorder）"""
+
+
+class Recorder:
+    """按接口记录耗时(秒)与失败"""
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.started_at = time.perf_counter()
+
+    def reset(self):
+        self.durations.clear()
+        self.errors.clear()
+        self.started_at = time.perf_counter()
+
+    def record(self, name: str, seconds: float, error: Optional[str] = None):
+        if error is None:
+            self.durations[name].append(seconds)
+        else:
+            self.errors[name][error[:120]] += 1
+
+    def summary(self, elapsed: Optional[float] = None) -> Dict[str, Dict]:
+        elapsed = elapsed or (time.perf_counter() - self.started_at)
+        result = {}
+        for name in sorted(set(self.durations) | set(self.errors)):
+            values = np.array(self.durations.get(name, []), dtype=np.float64) * 1000
+            errors = sum(self.errors.get(name, Counter()).values())
+            stats = {
+                "count": int(len(values)),
+                "errors": errors,
+                "throughput": round(len(values) / elapsed, 3) if elapsed > 0 else 0.0,
+            }
+            if len(values):
+                stats.update({
+                    "mean_ms": round(float(values.mean()), 1),
+                    "p50_ms": round(float(np.percentile(values, 50)), 1),
+                    "p90_ms": round(float(np.percentile(values, 90)), 1),
+                    "p95_ms": round(float(np.percentile(values, 95)), 1),
+                    "p99_ms": round(float(np.percentile(values, 99)), 1),
+                    "max_ms": round(float(values.max()), 1),
+                })
+            if errors:
+                stats["top_errors"] = dict(self.errors[name].most_common(3))
+            result[name] = stats
+        return result
+
+
+def pcm_frames(seconds: float, sample_rate: int, speech: bool) -> List[str]:
+    """生成base64编码的16位PCM帧, speech=True时为有起伏的音调, 否则为静音"""
+    frame_samples = sample_rate * FRAME_MS // 1000
+    total = int(seconds * sample_rate) // frame_samples * frame_samples
+    if speech:
+        t = np.arange(total) / sample_rate
+        envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 3.0 * t)
+        samples = 0.3 * envelope * np.sin(2 * np.pi * 200.0 * t)
+    else:
+        samples = np.zeros(total)
+    pcm = (samples * 32767).astype("<i2").tobytes()
+    step = frame_samples * 2
+    return [base64.b64encode(pcm[i:i + step]).decode("ascii") for i in range(0, len(pcm), step)]
+
+
+class LoadContext:
+    """压测共享的配置与状态"""
+
+    def __init__(
+        self,
+        base_url: str,
+        character: Dict,
+        recorder: Recorder,
+        timeout: float = 60.0,
+        voice_turns: int = 2,
+        speech_seconds: float = 1.5,
+        sample_rate: int = 16000,
+        realtime: bool = True,
+        think_time: float = 1.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_url = f"{self.base_url}/api/v1"
+        self.ws_url = self.base_url.replace("http://", "ws://").replace("https://", "wss://") + "/ws/voice-chat"
+        self.character = character
+        self.recorder = recorder
+        self.timeout = timeout
+        self.voice_turns = voice_turns
+        self.sample_rate = sample_rate
+        self.realtime = realtime
+        self.think_time = think_time
+        self.speech_frames = pcm_frames(speech_seconds, sample_rate, speech=True)
+        self.silence_frame = pcm_frames(FRAME_MS / 1000, sample_rate, speech=False)[0]
+
+
+class VirtualUser:
+    def __init__(self, ctx: LoadContext, token: str, client: httpx.AsyncClient, seed: int):
+        self.ctx = ctx
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.client = client
+        self.rng = random.Random(seed)
+        self.session_id: Optional[str] = None
+
+    async def _request(self, name: str, method: str, path: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(
+                method, f"{self.ctx.api_url}{path}", headers=self.headers, timeout=self.ctx.timeout, **kwargs
+            )
+        except httpx.HTTPError as e:
+            self.ctx.recorder.record(name, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+            raise ScenarioError(name) from e
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            self.ctx.recorder.record(name, elapsed, f"HTTP {response.status_code}: {response.text[:80]}")
+            raise ScenarioError(name)
+        self.ctx.recorder.record(name, elapsed)
+        return response
+
+    async def chat(self):
+        response = await self._request(
+            "POST /chat/message", "POST", "/chat/message",
+            json={"character_id": self.ctx.character["id"], "message": self.rng.choice(USER_MESSAGES)},
+        )
+        self.session_id = response.json()["session_id"]
+
+    async def export_text(self):
+        if self.session_id is None:
+            await self.chat()
+        await self._request(
+            "POST /chat/export/text", "POST", "/chat/export/text",
+            json={"sessionId": self.session_id, "characterId": self.ctx.character["id"],
+                  "format": self.rng.choice(["word", "pdf"])},
+        )
+
+    async def export_audio(self):
+        if self.session_id is None:
+            await self.chat()
+        await self._request(
+            "POST /chat/export/audio", "POST", "/chat/export/audio",
+            json={"sessionId": self.session_id, "characterId": self.ctx.character["id"]},
+        )
+
+    async def voice(self):
+        recorder = self.ctx.recorder
+        start = time.perf_counter()
+        try:
+            async with websockets.connect(self.ctx.ws_url, max_size=None, open_timeout=self.ctx.timeout) as ws:
+                inbox: asyncio.Queue = asyncio.Queue()
+                reader = asyncio.create_task(self._read(ws, inbox))
+                try:
+                    await self._voice_session(ws, inbox, start)
+                finally:
+                    reader.cancel()
+        except ScenarioError:
+            raise
+        except Exception as e:
+            recorder.record("WS voice session", time.perf_counter() - start, f"{type(e).__name__}: {e}")
+            raise ScenarioError("WS voice session") from e
+        recorder.record("WS voice session", time.perf_counter() - start)
+
+    async def _voice_session(self, ws, inbox: asyncio.Queue, start: float):
+        ctx = self.ctx
+        await ws.send(json.dumps({
+            "type": "init", "characterId": ctx.character["id"], "characterName": ctx.character["name"],
+        }))
+        # 初始化包括问候语（话术池未命中时需要等待LLM+TTS）
+        await self._expect(inbox, "init_success", "WS init", start)
+
+        await ws.send(json.dumps({"type": "stream_start", "characterId": ctx.character["id"], "sampleRate": ctx.sample_rate}))
+        await self._expect(inbox, "stream_ready", "WS stream_start", time.perf_counter())
+
+        for _ in range(ctx.voice_turns):
+            for frame in ctx.speech_frames:
+                await self._send_frame(ws, frame)
+            # 持续发送静音直到服务端判定说话结束，从该时刻起计算一轮对话的响应时间
+            end_of_speech = None
+            deadline = time.perf_counter() + 5.0
+            while end_of_speech is None and time.perf_counter() < deadline:
+                await self._send_frame(ws, ctx.silence_frame)
+                while not inbox.empty():
+                    message = inbox.get_nowait()
+                    self._raise_on_error(message, "WS voice turn")
+                    if message.get("type") == "vad" and message.get("event") == "end_of_speech":
+                        end_of_speech = time.perf_counter()
+            if end_of_speech is None:
+                self.ctx.recorder.record("WS voice turn", 0.0, "未检测到说话结束")
+                raise ScenarioError("WS voice turn")
+            await self._expect(inbox, "response", "WS voice turn", end_of_speech)
+            await asyncio.sleep(self.rng.uniform(0.2, 1.0))
+
+        await ws.send(json.dumps({"type": "stream_end"}))
+
+    async def _send_frame(self, ws, frame: str):
+        await ws.send(json.dumps({"type": "audio_frame", "data": frame}))
+        if self.ctx.realtime:
+            await asyncio.sleep(FRAME_MS / 1000)
+
+    @staticmethod
+    async def _read(ws, inbox: asyncio.Queue):
+        try:
+            async for raw in ws:
+                inbox.put_nowait(json.loads(raw))
+        except websockets.ConnectionClosed:
+            pass
+        inbox.put_nowait({"type": "closed"})
+
+    def _raise_on_error(self, message: Dict, name: str):
+        if message.get("type") in ("error", "closed"):
+            error = message.get("message") or message.get("type")
+            self.ctx.recorder.record(name, 0.0, str(error))
+            raise ScenarioError(name)
+
+    async def _expect(self, inbox: asyncio.Queue, message_type: str, name: str, start: float) -> Dict:
+        """等待指定类型的消息并记录从start开始的耗时, 其间的其他消息忽略"""
+        deadline = start + self.ctx.timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            try:
+                message = await asyncio.wait_for(inbox.get(), timeout=max(remaining, 0.001))
+            except asyncio.TimeoutError:
+                self.ctx.recorder.record(name, time.perf_counter() - start, "timeout")
+                raise ScenarioError(name)
+            self._raise_on_error(message, name)
+            if message.get("type") == message_type:
+                self.ctx.recorder.record(name, time.perf_counter() - start)
+                return message
+
+
+async def register_users(base_url: str, count: int, run_id: str, timeout: float = 30.0) -> List[str]:
+    """注册压测用户, 返回访问令牌"""
+    tokens = []
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        for i in range(count):
+            username = f"lt_{run_id}_{i}"
+            response = await client.post(f"{base_url}/api/v1/auth/register", json={
+                "username": username,
+                "email": f"{username}@example.com",
+                "password": "loadtest-password",
+            })
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+    return tokens
+
+
+async def create_character(base_url: str, token: str, reference_url: str, reference_text: str,
+                           run_id: str, timeout: float = 30.0) -> Dict:
+    """创建使用桩参考音频的压测角色"""
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        response = await client.post(
+            f"{base_url}/api/v1/characters/",
+            headers={"Authorization": f"Bearer {token}"},
+            json={
+                "name": f"压测角色{run_id}",
+                "description": "压测使用的角色",
+                "personality": "友好、耐心",
+                "background": "用于压测的虚拟角色",
+                "category": "loadtest",
+                "reference_audio_path": reference_url,
+                "reference_audio_text": reference_text,
+                "reference_audio_language": "zh",
+            },
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+async def run_load(ctx: LoadContext, tokens: List[str], duration: float, mix: Dict[str, float],
+                   warmup: float = 0.0, seed: int = 0) -> float:
+    """所有虚拟用户并发执行到时间结束, 返回统计窗口的时长(秒)"""
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    measure_start = time.perf_counter() + warmup
+    deadline = measure_start + duration
+
+    async def reset_after_warmup():
+        # 预热期间的请求不计入统计
+        if warmup > 0:
+            await asyncio.sleep(warmup)
+        ctx.recorder.reset()
+
+    async def user_loop(user: VirtualUser):
+        # 错开各用户的起始时间，避免所有请求在同一时刻到达
+        await asyncio.sleep(user.rng.uniform(0, min(ctx.think_time, 1.0)))
+        while time.perf_counter() < deadline:
+            scenario = user.rng.choices(names, weights)[0]
+            try:
+                await getattr(user, scenario)()
+            except ScenarioError:
+                pass
+            if ctx.think_time > 0:
+                await asyncio.sleep(user.rng.expovariate(1.0 / ctx.think_time))
+
+    limits = httpx.Limits(max_connections=len(tokens) * 2, max_keepalive_connections=len(tokens))
+    async with httpx.AsyncClient(limits=limits) as client:
+        users = [VirtualUser(ctx, token, client, seed + i) for i, token in enumerate(tokens)]
+        await asyncio.gather(reset_after_warmup(), *(user_loop(user) for user in users))
+    return time.perf_counter() - ctx.recorder.started_at
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:8]
@@ -0,0 +1,423 @@
+"""
+压测用的桩服务
+
+在本地模拟 server/app 依赖的外部服务, 响应格式与真实服务一致, 延迟按配置的分布随机产生:
+- 七牛云大模型: POST /v1/chat/completions, POST /v1/voice/asr, POST /v1/voice/tts, GET /v1/voice/list
+- 七牛云存储: 表单上传(POST /)、分片上传v2(/buckets/...)、按key下载(GET /{key})
+- llm_server: POST /、POST /speakers、POST /cancel, 每个实例同一时间只推理 --llm-concurrency 个请求
+
+单独启动(通常由 run.py 自动启动):
+
+    python -m benchmarks.loadtest.stubs --llm-instances 2 --latency chat=lognormal:1.0:0.5
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import math
+import random
+import signal
+import time
+import uuid
+import wave
+from collections import OrderedDict
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, File, Form, Request, Response, UploadFile
+from fastapi.responses import JSONResponse
+
+# 各桩接口的默认延迟分布（秒）
+DEFAULT_LATENCIES = {
+    "chat": "lognormal:0.8:0.4",
+    "asr": "lognormal:0.4:0.3",
+    "podcast_tts": "lognormal:0.6:0.3",
+    "llm_server": "lognormal:0.3:0.3",
+    "upload": "lognormal:0.05:0.5",
+    "download": "fixed:0.01",
+}
+
+# 参考音频的存储key，压测角色的 reference_audio_path 指向它
+REFERENCE_KEY = "loadtest/reference.wav"
+REFERENCE_TEXT = "今天天气不错，我们出去走走吧。"
+
+CHAT_REPLIES = [
+    "你好呀，很高兴见到你！今天想聊点什么呢？",
+    "这是个好问题。让我想想，我觉得最重要的是保持好奇心，然后一步一步去尝试。",
+    "哈哈，你说得对。不过换个角度看，事情也许没有那么复杂。",
+    "我明白你的意思。其实我小时候也遇到过类似的事情，后来慢慢就想通了。",
+    "嗯，我们可以先从简单的部分开始，等熟悉之后再挑战更难的内容。",
+]
+ASR_TEXTS = ["你好", "今天过得怎么样", "给我讲个故事吧", "你最喜欢什么", "我们聊聊天吧"]
+
+
+class Latency:
+    """
+    延迟分布, 格式为 分布:参数...:
+
+        fixed:0.1            固定0.1秒
+        uniform:0.1:0.5      0.1~0.5秒均匀分布
+        normal:0.5:0.1       均值0.5, 标准差0.1 (截断为非负)
+        lognormal:0.8:0.4    中位数0.8秒, 对数标准差0.4 (长尾)
+        exponential:0.3      均值0.3秒
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        name, *params = spec.split(":")
+        self.name = name
+        self.params = [float(p) for p in params]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+        if name not in expected:
+            raise ValueError(f"不支持的延迟分布: {name}")
+        if len(self.params) != expected[name]:
+            raise ValueError(f"延迟分布 {name} 需要 {expected[name]} 个参数: {spec}")
+
+    def sample(self) -> float:
+        p = self.params
+        if self.name == "fixed":
+            return p[0]
+        if self.name == "uniform":
+            return random.uniform(p[0], p[1])
+        if self.name == "normal":
+            return max(0.0, random.gauss(p[0], p[1]))
+        if self.name == "lognormal":
+            return p[0] * math.exp(random.gauss(0.0, p[1]))
+        return random.expovariate(1.0 / p[0]) if p[0] > 0 else 0.0
+
+    async def sleep(self, extra: float = 0.0):
+        await asyncio.sleep(self.sample() + extra)
+
+
+class StubConfig:
+    """桩服务配置, 由命令行参数构建"""
+
+    def __init__(self, latencies=None, error_rates=None, seconds_per_char=0.25, tts_rtf=0.3,
+                 sample_rate=32000, llm_concurrency=1):
+        specs = dict(DEFAULT_LATENCIES)
+        specs.update(latencies or {})
+        self.latencies = {name: Latency(spec) for name, spec in specs.items()}
+        self.error_rates = error_rates or {}
+        # 合成音频时长按文字数估算, 推理耗时 = 延迟分布采样 + 音频时长 * tts_rtf
+        self.seconds_per_char = seconds_per_char
+        self.tts_rtf = tts_rtf
+        self.sample_rate = sample_rate
+        self.llm_concurrency = llm_concurrency
+
+    def should_fail(self, name: str) -> bool:
+        return random.random() < self.error_rates.get(name, 0.0)
+
+
+class AudioFactory:
+    """生成指定时长的WAV, 按0.1秒取整后缓存, 避免桩服务本身占用过多CPU"""
+
+    def __init__(self, sample_rate: int, max_entries: int = 128):
+        self.sample_rate = sample_rate
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+
+    def wav(self, seconds: float) -> bytes:
+        key = max(1, int(round(seconds * 10)))
+        data = self._cache.get(key)
+        if data is not None:
+            self._cache.move_to_end(key)
+            return data
+        t = np.arange(int(self.sample_rate * key / 10)) / self.sample_rate
+        samples = (0.3 * np.sin(2 * np.pi * 220.0 * t) * 32767).astype(np.int16)
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.sample_rate)
+            f.writeframes(samples.tobytes())
+        data = buffer.getvalue()
+        self._cache[key] = data
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return data
+
+
+def _error(name: str) -> JSONResponse:
+    return JSONResponse(status_code=500, content={"error": f"injected {name} failure"})
+
+
+def create_ai_app(config: StubConfig, audio: AudioFactory) -> FastAPI:
+    """七牛云大模型接口"""
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        await config.latencies["chat"].sleep()
+        if config.should_fail("chat"):
+            return _error("chat")
+        content = random.choice(CHAT_REPLIES)
+        prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_chars, "completion_tokens": len(content),
+                      "total_tokens": prompt_chars + len(content)},
+        }
+
+    @app.post("/v1/voice/asr")
+    async def asr(request: Request):
+        await request.json()
+        await config.latencies["asr"].sleep()
+        if config.should_fail("asr"):
+            return _error("asr")
+        text = random.choice(ASR_TEXTS)
+        return {
+            "reqid": uuid.uuid4().hex,
+            "operation": "asr",
+            "data": {"audio_info": {"duration": 1200}, "result": {"additions": {"duration": "1200"}, "text": text}},
+        }
+
+    @app.post("/v1/voice/tts")
+    async def podcast_tts(request: Request):
+        payload = await request.json()
+        text = payload.get("request", {}).get("text", "")
+        seconds = len(text) * config.seconds_per_char
+        await config.latencies["podcast_tts"].sleep()
+        if config.should_fail("podcast_tts"):
+            return _error("podcast_tts")
+        return {
+            "reqid": uuid.uuid4().hex,
+            "operation": "query",
+            "sequence": -1,
+            "data": base64.b64encode(audio.wav(seconds)).decode("ascii"),
+            "addition": {"duration": str(int(seconds * 1000))},
+        }
+
+    @app.get("/v1/voice/list")
+    async def voice_list():
+        return [{"voice_name": "桩音色", "voice_type": "qiniu_zh_female_wwxkjx", "url": "", "category": "stub"}]
+
+    return app
+
+
+def create_llm_server_app(config: StubConfig, audio: AudioFactory) -> FastAPI:
+    """llm_server接口, 每个实例有自己的推理并发上限"""
+    app = FastAPI()
+    semaphore = asyncio.Semaphore(config.llm_concurrency)
+    speakers = {}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.post("/speakers")
+    async def register_speaker(
+        speaker_id: str = Form(...),
+        prompt_text: str = Form(""),
+        prompt_language: str = Form("zh"),
+        file: UploadFile = File(...),
+    ):
+        data = await file.read()
+        version = speakers.get(speaker_id, {}).get("version", 0) + 1
+        speakers[speaker_id] = {"version": version, "size": len(data)}
+        return JSONResponse(status_code=200, content={"code": 0, "speaker_id": speaker_id, "version": version})
+
+    @app.post("/cancel")
+    async def cancel(request: Request):
+        await request.json()
+        return JSONResponse(status_code=200, content={"code": 0, "message": "success"})
+
+    @app.post("/")
+    async def tts(request: Request):
+        payload = await request.json()
+        speaker_id = payload.get("speaker_id")
+        if speaker_id and speaker_id not in speakers:
+            return JSONResponse(status_code=404, content={"code": 404, "message": f"说话人不存在: {speaker_id}"})
+        seconds = len(payload.get("text", "")) * config.seconds_per_char
+        async with semaphore:
+            await config.latencies["llm_server"].sleep(seconds * config.tts_rtf)
+        if config.should_fail("llm_server"):
+            return _error("llm_server")
+        return Response(audio.wav(seconds), media_type="audio/wav")
+
+    return app
+
+
+def create_storage_app(config: StubConfig, audio: AudioFactory, max_bytes: int = 256 * 1024 * 1024) -> FastAPI:
+    """七牛云存储上传/下载接口, 上传的文件保存在内存中(超过max_bytes时淘汰最早的)"""
+    app = FastAPI()
+    objects = OrderedDict()
+    uploads = {}
+    state = {"bytes": 0}
+
+    reference = audio.wav(3.0)
+    objects[REFERENCE_KEY] = reference
+
+    @app.middleware("http")
+    async def add_request_id(request: Request, call_next):
+        # 七牛SDK通过X-Reqid判断响应是否来自七牛服务器，缺少时视为上传失败
+        response = await call_next(request)
+        response.headers["X-Reqid"] = uuid.uuid4().hex
+        return response
+
+    def store(key: str, data: bytes) -> dict:
+        old = objects.pop(key, None)
+        if old is not None:
+            state["bytes"] -= len(old)
+        objects[key] = data
+        state["bytes"] += len(data)
+        while state["bytes"] > max_bytes and len(objects) > 1:
+            evicted_key, evicted = objects.popitem(last=False)
+            if evicted_key == REFERENCE_KEY:
+                objects[evicted_key] = evicted
+                continue
+            state["bytes"] -= len(evicted)
+        return {"hash": hashlib.sha1(data).hexdigest(), "key": key, "fsize": len(data)}
+
+    def decode_key(encoded: str) -> str:
+        if encoded == "~":
+            return uuid.uuid4().hex
+        return base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode("utf-8")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.post("/")
+    async def form_upload(key: str = Form(None), token: str = Form(...), file: UploadFile = File(...)):
+        data = await file.read()
+        await config.latencies["upload"].sleep()
+        if config.should_fail("upload"):
+            return _error("upload")
+        return store(key or uuid.uuid4().hex, data)
+
+    @app.post("/buckets/{bucket}/objects/{encoded_key}/uploads")
+    async def init_multipart(bucket: str, encoded_key: str):
+        upload_id = uuid.uuid4().hex
+        uploads[upload_id] = {"key": decode_key(encoded_key), "parts": {}}
+        return {"uploadId": upload_id, "expireAt": int(time.time()) + 7 * 24 * 3600}
+
+    @app.put("/buckets/{bucket}/objects/{encoded_key}/uploads/{upload_id}/{part_number}")
+    async def upload_part(bucket: str, encoded_key: str, upload_id: str, part_number: int, request: Request):
+        upload = uploads.get(upload_id)
+        if upload is None:
+            return JSONResponse(status_code=612, content={"error": "no such uploadId"})
+        data = await request.body()
+        await config.latencies["upload"].sleep()
+        upload["parts"][part_number] = data
+        md5 = hashlib.md5(data).hexdigest()
+        return {"etag": md5, "md5": md5}
+
+    @app.post("/buckets/{bucket}/objects/{encoded_key}/uploads/{upload_id}")
+    async def complete_multipart(bucket: str, encoded_key: str, upload_id: str, request: Request):
+        upload = uploads.pop(upload_id, None)
+        if upload is None:
+            return JSONResponse(status_code=612, content={"error": "no such uploadId"})
+        body = json.loads(await request.body() or b"{}")
+        numbers = [part["partNumber"] for part in body.get("parts", [])] or sorted(upload["parts"])
+        data = b"".join(upload["parts"][n] for n in numbers)
+        return store(upload["key"], data)
+
+    @app.get("/{key:path}")
+    async def download(key: str, request: Request):
+        data = objects.get(key)
+        if data is None:
+            return JSONResponse(status_code=404, content={"error": "no such file or directory"})
+        await config.latencies["download"].sleep()
+        etag = f'"{hashlib.sha1(data).hexdigest()}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(data, media_type="audio/wav" if key.endswith(".wav") else "application/octet-stream",
+                        headers={"ETag": etag})
+
+    return app
+
+
+class _Server(uvicorn.Server):
+    """多个uvicorn实例共用一个事件循环, 由 serve_all 统一处理退出信号"""
+
+    def install_signal_handlers(self):
+        pass
+
+
+async def serve_all(apps, host: str = "127.0.0.1"):
+    """apps: [(FastAPI, port), ...]"""
+    servers = [
+        _Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+        for app, port in apps
+    ]
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, lambda: [setattr(s, "should_exit", True) for s in servers])
+        except NotImplementedError:
+            pass
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def parse_mapping(values, cast=str):
+    """把 ["chat=fixed:0.1", ...] 解析为 {"chat": "fixed:0.1"}"""
+    result = {}
+    for value in values or []:
+        name, _, spec = value.partition("=")
+        if not spec:
+            raise argparse.ArgumentTypeError(f"格式应为 名称=值: {value}")
+        result[name.strip()] = cast(spec.strip())
+    return result
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """桩服务参数, run.py 复用"""
+    parser.add_argument("--stub-host", default="127.0.0.1")
+    parser.add_argument("--ai-port", type=int, default=18001, help="七牛云大模型桩端口")
+    parser.add_argument("--storage-port", type=int, default=18002, help="七牛云存储桩端口")
+    parser.add_argument("--llm-port", type=int, default=18010, help="第一个llm_server桩端口, 之后的实例依次加1")
+    parser.add_argument("--llm-instances", type=int, default=1, help="llm_server桩实例数")
+    parser.add_argument("--llm-concurrency", type=int, default=1, help="每个llm_server实例同时推理的请求数")
+    parser.add_argument("--latency", action="append", default=[],
+                        help=f"接口延迟分布, 可多次指定, 如 chat=lognormal:0.8:0.4; 接口: {', '.join(DEFAULT_LATENCIES)}")
+    parser.add_argument("--error-rate", action="append", default=[], help="注入失败的比例, 如 llm_server=0.02")
+    parser.add_argument("--seconds-per-char", type=float, default=0.25, help="合成音频每个字的时长")
+    parser.add_argument("--tts-rtf", type=float, default=0.3, help="llm_server推理耗时与音频时长之比")
+
+
+def stub_config_from_args(args) -> StubConfig:
+    return StubConfig(
+        latencies=parse_mapping(args.latency),
+        error_rates=parse_mapping(args.error_rate, float),
+        seconds_per_char=args.seconds_per_char,
+        tts_rtf=args.tts_rtf,
+        llm_concurrency=args.llm_concurrency,
+    )
+
+
+def build_apps(args):
+    config = stub_config_from_args(args)
+    audio = AudioFactory(config.sample_rate)
+    apps = [
+        (create_ai_app(config, audio), args.ai_port),
+        (create_storage_app(config, audio), args.storage_port),
+    ]
+    for i in range(args.llm_instances):
+        apps.append((create_llm_server_app(config, audio), args.llm_port + i))
+    return apps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="压测用的外部服务桩")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    apps = build_apps(args)
+    print(f"桩服务已启动: ai={args.ai_port} storage={args.storage_port} "
+          f"llm_server={args.llm_port}..{args.llm_port + args.llm_instances - 1}", flush=True)
+    asyncio.run(serve_all(apps, args.stub_host))
+
+
+if __name__ == "__main__":
+    main()